@@ -1,40 +1,64 @@
+import functools
+import itertools
+from contextlib import nullcontext
 import pandas as pd
 import backtrader as bt
 from strategies.strategy_registry import StrategyRegistry
-from filelock import FileLock
+from utils.bt_feeds import ChunkedData, NumpyData, FeedArrays, FeedCache, numpy_data_class
+from utils.bt_fills import DepthBroker, DepthFillModel
+from utils.dataset import DatasetSession
+from utils.data_store import get_store
+from utils.instrumentation import instrumented
+from utils.mtf import MultiTimeframeEngine
 import os
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+
+@functools.lru_cache(maxsize=None)
+def _after_warmup(strategy_class, warmup):
+    """Subclass of strategy_class whose next() (trading and equity) starts after `warmup` bars."""
+    class WarmedUp(strategy_class):
+        def next(self):
+            if len(self) > warmup:
+                super().next()
+    WarmedUp.__name__ = strategy_class.__name__
+    return WarmedUp
+
 class BacktestAgent:
-    def __init__(self, data_file=None):
+    def __init__(self, data_file=None, store=None):
         """
-        Initialize BacktestAgent with a CSV file path.
+        Initialize BacktestAgent with a CSV file path, DatasetSession or DataFrame.
         Args:
-            data_file: Path to CSV file with price data (default None)
+            data_file: Path to CSV file with price data, a DatasetSession, or a kline DataFrame (default None)
+            store: DataStore used for file I/O (default: the session's or the shared store)
         """
-        self.data_file = data_file
-        self.df = self.load_from_csv() if data_file else None
+        self.session = data_file if isinstance(data_file, DatasetSession) else None
+        self.store = store or (self.session.store if self.session else get_store())
+        if self.session is not None:
+            self.data_file = self.session.data_file
+            self.df = self.session.df
+        elif isinstance(data_file, pd.DataFrame):
+            self.data_file = None
+            self.df = data_file
+        else:
+            self.data_file = data_file
+            self.df = self.load_from_csv() if data_file else None
         self.initial_capital = 100000  # Default initial capital
         self.total_assets = self.initial_capital
         self.position_size_pct = 0.10  # Default 10% of capital per position
-        self.output_dir = "data/processed"
+        self.output_dir = self.store.processed_dir
+        self._feed_arrays = None
 
     def load_from_csv(self):
         """
-        Load data from CSV file.
+        Load data through the DataStore (cached until the file changes).
         Returns:
-            pandas.DataFrame: Data from CSV or empty DataFrame if file doesn't exist.
+            pandas.DataFrame: Data from CSV
         """
-        lock = FileLock(f"{self.data_file}.lock")
-        with lock:
-            if os.path.exists(self.data_file):
-                df = pd.read_csv(self.data_file, parse_dates=['open_time'])
-                logger.info(f"Loaded data from {self.data_file}")
-                return df
-            raise ValueError(f"No data file found at {self.data_file}")
+        return self.store.read_path(self.data_file)
 
     def save_results_to_csv(self, results, symbol, interval):
         """
@@ -44,18 +68,49 @@ class BacktestAgent:
             symbol: Trading pair symbol
             interval: Time interval
         """
-        os.makedirs(self.output_dir, exist_ok=True)
+        # Strategy.next() only starts once the indicators (and the warm-up bars of a time-range
+        # session) are through, so the equity list covers the last len(equity) bars
+        equity = results['equity']
         equity_df = pd.DataFrame({
-            'open_time': self.df['open_time'],
-            'equity': results['equity']
+            'open_time': self.df['open_time'].iloc[len(self.df) - len(equity):].to_numpy(),
+            'equity': equity
         })
-        output_file = os.path.join(self.output_dir, f"{symbol}_{interval}_backtest.csv")
-        lock = FileLock(f"{output_file}.lock")
-        with lock:
-            equity_df.to_csv(output_file, index=False)
-            logger.info(f"Saved backtest results to {output_file}")
+        self.store.write_path(equity_df, self.store.path(symbol, interval, "backtest", directory=self.output_dir))
+
+    def get_feed_arrays(self):
+        """
+        Get the NumPy arrays backing the backtrader feed, reusing them across runs.
+        Returns:
+            FeedArrays for self.df
+        """
+        if self._feed_arrays is None:
+            if self.session is not None:
+                self._feed_arrays = self.session.cached(('feed_arrays',), lambda: FeedArrays.from_dataframe(self.df))
+            elif self.data_file and os.path.exists(self.data_file):
+                self._feed_arrays = FeedCache.get(self.data_file, self.df)
+            else:
+                self._feed_arrays = FeedArrays.from_dataframe(self.df)
+        return self._feed_arrays
 
-    def run_backtest(self, strategy="ema_crossover", initial_cash=None, commission=0.001, position_size_pct=None, symbol="BTCUSDT", interval="1h"):
+    def get_mtf_feed_arrays(self, features, symbol, interval):
+        """
+        Feed arrays plus one column per multi-timeframe feature (see utils.mtf), aligned to self.df.
+        Returns:
+            (FeedArrays, tuple of feature line names)
+        """
+        engine = MultiTimeframeEngine(symbol, interval, features, store=self.store)
+
+        def build():
+            aligned = engine.features_frame(self.session if self.session is not None else self.df)
+            return FeedArrays({**self.get_feed_arrays().columns, **{name: aligned[name].to_numpy() for name in engine.columns}})
+        if self.session is not None:
+            arrays = self.session.cached(('feed_arrays', symbol, interval) + tuple(f.key for f in engine.features), build)
+        else:
+            arrays = build()
+        return arrays, tuple(engine.columns)
+
+    @instrumented()
+    def run_backtest(self, strategy="ema_crossover", initial_cash=None, commission=0.001, position_size_pct=None, symbol="BTCUSDT", interval="1h", preload=True, runonce=True, strategy_params=None, save=True, depth_slippage=False):
         """
         Run a backtest using the specified strategy with capital and position sizing.
         Args:
@@ -65,54 +120,152 @@ class BacktestAgent:
             position_size_pct: Percentage of capital per position (optional, overrides default)
             symbol: Trading pair symbol (for output file naming)
             interval: Time interval (for output file naming)
+            preload: Preload the whole feed into backtrader lines before running (default: True)
+            runonce: Run indicators in vectorized runonce mode (default: True)
+            strategy_params: Optional dict of strategy parameters (e.g. {'fast_length': 12})
+            save: Save the equity curve to CSV (default: True)
+            depth_slippage: Price market fills from the captured order books of the symbol
+                            (True for the default DepthStore, or a DepthStore; see utils.bt_fills)
         Returns:
-            Dictionary with backtest results (initial_cash, total_assets, profit, profit_pct, equity)
+            Dictionary with backtest results (initial_cash, total_assets, profit, profit_pct, equity;
+            with depth_slippage also 'slippage', the fill statistics)
         """
         if self.df is None or self.df.empty:
             raise ValueError("DataFrame is not set or empty. Please provide a valid data file.")
 
-        # Validate and set parameters
-        self.initial_capital = initial_cash if initial_cash is not None else self.initial_capital
-        self.total_assets = self.initial_capital
-        self.position_size_pct = position_size_pct if position_size_pct is not None else self.position_size_pct
-        if not 0 < self.position_size_pct <= 1:
-            raise ValueError("Position size percentage must be between 0 and 1.")
+        self._set_capital(initial_cash, position_size_pct)
 
         # Validate required columns
         required_columns = ['open_time', 'open', 'high', 'low', 'close']
         if not all(col in self.df.columns for col in required_columns):
             raise ValueError(f"DataFrame must contain columns: {required_columns}")
 
-        # Create a backtrader data feed
+        # Create a backtrader data feed; higher-timeframe features the strategy declares become extra lines
+        try:
+            features = getattr(StrategyRegistry.get_strategy(strategy), 'mtf_features', ())
+        except Exception as e:
+            raise ValueError(f"Error loading strategy '{strategy}': {e}")
         try:
-            data = bt.feeds.PandasData(dataname=self.df, datetime='open_time')
+            if features:
+                arrays, lines = self.get_mtf_feed_arrays(features, symbol, interval)
+                data = numpy_data_class(lines)(arrays=arrays)
+            else:
+                data = NumpyData(arrays=self.get_feed_arrays())
         except Exception as e:
             raise ValueError(f"Error creating backtrader data feed: {e}")
 
-        # Initialize Cerebro engine
-        cerebro = bt.Cerebro()
+        # Leading warm-up rows of a time-range read only feed the indicators
+        fill_model = self._fill_model(depth_slippage, symbol)
+        cerebro = self._cerebro(data, strategy, strategy_params, commission, warmup=self.df.attrs.get('warmup', 0),
+                                fill_model=fill_model, preload=preload, runonce=runonce)
+
+        # Run backtest
+        try:
+            strats = cerebro.run()
+            strategy_instance = strats[0]
+        except Exception as e:
+            raise RuntimeError(f"Error running backtest: {e}")
+
+        results = self._results(cerebro, strategy_instance.equity, fill_model)
+
+        # Save results to CSV
+        if save:
+            self.save_results_to_csv(results, symbol, interval)
+        return results
+
+    @instrumented()
+    def run_backtest_chunked(self, chunks, strategy="ema_crossover", initial_cash=None, commission=0.001, position_size_pct=None, symbol="BTCUSDT", interval="1h", strategy_params=None, save=True, depth_slippage=False):
+        """
+        Run a backtest streaming the bars from time-ordered blocks (e.g. DataStore.iter_chunks)
+        instead of self.df: backtrader runs bar by bar keeping only the lines it needs
+        (exactbars), and the equity curve is written out block by block. Results are the same as
+        run_backtest on the concatenated blocks.
+        Args:
+            chunks: Iterable of kline DataFrames in time order
+            strategy, initial_cash, commission, position_size_pct, symbol, interval, strategy_params, depth_slippage: See run_backtest
+            save: Stream the equity curve to the backtest CSV (default: True)
+        Returns:
+            Dictionary with backtest results as run_backtest; 'equity' is None (the curve is only
+            written to disk) and 'bars' holds the number of bars processed
+        """
+        self._set_capital(initial_cash, position_size_pct)
+        if getattr(StrategyRegistry.get_strategy(strategy), 'mtf_features', ()):
+            raise ValueError(f"Strategy '{strategy}' uses multi-timeframe features, run it with run_backtest")
+        state = {'times': None, 'bars': 0}
+        fill_model = self._fill_model(depth_slippage, symbol)
+
+        def flush_equity(writer):
+            # equity entries not yet written belong to the last bars delivered, all of them in the
+            # previous block (it is flushed at every block boundary)
+            strats = getattr(cerebro, 'runningstrats', None)
+            equity = strats[0].equity if strats else []
+            if equity and writer is not None:
+                writer.write(pd.DataFrame({'open_time': state['times'][len(state['times']) - len(equity):], 'equity': list(equity)}))
+            del equity[:]
+
+        path = self.store.path(symbol, interval, "backtest", directory=self.output_dir)
+        with self.store.chunk_writer(path) if save else nullcontext() as writer:
+            def on_chunk(df):
+                if state['times'] is not None:
+                    flush_equity(writer)
+                state['times'] = df['open_time'].to_numpy()
+                state['bars'] += len(df)
+
+            data = ChunkedData(chunks=chunks, on_chunk=on_chunk)
+            cerebro = self._cerebro(data, strategy, strategy_params, commission, fill_model=fill_model,
+                                    preload=False, runonce=False, exactbars=1)
+            try:
+                cerebro.run()
+            except Exception as e:
+                raise RuntimeError(f"Error running backtest: {e}")
+            if state['times'] is None:
+                raise ValueError("No bars in the given chunks.")
+            flush_equity(writer)
+        results = self._results(cerebro, None, fill_model)
+        results['bars'] = state['bars']
+        return results
+
+    def _set_capital(self, initial_cash, position_size_pct):
+        """Validate and set the capital and position sizing parameters of a run."""
+        self.initial_capital = initial_cash if initial_cash is not None else self.initial_capital
+        self.total_assets = self.initial_capital
+        self.position_size_pct = position_size_pct if position_size_pct is not None else self.position_size_pct
+        if not 0 < self.position_size_pct <= 1:
+            raise ValueError("Position size percentage must be between 0 and 1.")
+
+    def _fill_model(self, depth_slippage, symbol):
+        """DepthFillModel of a run's depth_slippage argument (None without it)."""
+        if not depth_slippage:
+            return None
+        return DepthFillModel(symbol, depth_store=None if depth_slippage is True else depth_slippage)
+
+    def _cerebro(self, data, strategy, strategy_params, commission, warmup=0, fill_model=None, **cerebro_kwargs):
+        """
+        Cerebro engine with the strategy (not trading during the first `warmup` bars), the data feed
+        and the broker configured (a DepthBroker pricing market fills with fill_model if given).
+        """
+        cerebro = bt.Cerebro(**cerebro_kwargs)
+        if fill_model is not None:
+            cerebro.setbroker(DepthBroker(fill_model=fill_model))
 
         # Get strategy class from registry
         try:
             strategy_class = StrategyRegistry.get_strategy(strategy)
         except Exception as e:
             raise ValueError(f"Error loading strategy '{strategy}': {e}")
+        if warmup:
+            strategy_class = _after_warmup(strategy_class, warmup)
 
-        cerebro.addstrategy(strategy_class)
+        cerebro.addstrategy(strategy_class, **(strategy_params or {}))
 
         # Add data feed and configure broker
         cerebro.adddata(data)
         cerebro.broker.setcash(self.initial_capital)
         cerebro.broker.setcommission(commission=commission)
+        return cerebro
 
-        # Run backtest
-        try:
-            strats = cerebro.run()
-            strategy_instance = strats[0]
-        except Exception as e:
-            raise RuntimeError(f"Error running backtest: {e}")
-
-        # Extract results and update total assets
+    def _results(self, cerebro, equity, fill_model=None):
+        """Results dictionary of a finished run; updates total assets."""
         final_value = cerebro.broker.getvalue()
         profit = final_value - self.initial_capital
         self.total_assets += profit  # Update total assets
@@ -124,10 +277,32 @@ class BacktestAgent:
             'total_assets': self.total_assets,
             'profit': profit,
             'profit_pct': (profit / self.initial_capital) * 100 if self.initial_capital else 0,
-            'equity': strategy_instance.equity,
+            'equity': equity,
             'position_size': position_size
         }
+        if fill_model is not None:
+            results['slippage'] = fill_model.summary()
+        return results
 
-        # Save results to CSV
-        self.save_results_to_csv(results, symbol, interval)
-        return results
\ No newline at end of file
+    @instrumented()
+    def run_sweep(self, param_grid, strategy="ema_crossover", progress=None, **backtest_kwargs):
+        """
+        Run one backtest per parameter combination, reusing the same preloaded feed arrays.
+        Args:
+            param_grid: Dict of parameter name -> list of values (e.g. {'fast_length': [5, 9], 'slow_length': [21, 50]})
+            strategy: Strategy name
+            progress: Optional callback progress(fraction, message)
+            backtest_kwargs: Extra arguments for run_backtest (initial_cash, commission, ...)
+        Returns:
+            pandas.DataFrame with one row per combination and columns [*params, profit, profit_pct, total_assets]
+        """
+        names = list(param_grid)
+        combos = list(itertools.product(*(param_grid[name] for name in names)))
+        rows = []
+        for i, values in enumerate(combos):
+            params = dict(zip(names, values))
+            results = self.run_backtest(strategy=strategy, strategy_params=params, save=False, **backtest_kwargs)
+            rows.append({**params, 'profit': results['profit'], 'profit_pct': results['profit_pct'], 'total_assets': results['total_assets']})
+            if progress:
+                progress((i + 1) / len(combos), f"{i + 1}/{len(combos)}: {params}")
+        return pd.DataFrame(rows).sort_values('profit', ascending=False).reset_index(drop=True)
\ No newline at end of file
@@ -0,0 +1,158 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+import pandas as pd
+from utils.data_store import get_store
+from utils.snapshot_io import write_atomic
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+EXCHANGE_INFO_FILE = "data/raw/exchange_info.json"
+SUMMARY_COLUMNS = ['symbol', 'interval', 'status', 'bars', 'bars_fetched', 'profit', 'profit_pct', 'total_assets', 'duration_s', 'error']
+
+
+def load_usdt_pairs(cache_file=EXCHANGE_INFO_FILE, max_age_hours=24):
+    """
+    All trading USDT-quoted spot symbols from a locally cached exchange-info file, refreshed from
+    Binance only when the cache is missing or older than max_age_hours.
+    Args:
+        cache_file: Path of the cached /api/v3/exchangeInfo response
+        max_age_hours: Maximum cache age before it is refreshed
+    Returns:
+        Sorted list of symbols
+    """
+    fresh = os.path.exists(cache_file) and time.time() - os.path.getmtime(cache_file) < max_age_hours * 3600
+    if not fresh:
+        try:
+            from utils.binance_client import get_client
+            info = get_client().get_exchange_info()
+            write_atomic(cache_file, lambda f: json.dump(info, f))
+            logger.info(f"Refreshed exchange info cache {cache_file}")
+        except Exception as e:
+            if not os.path.exists(cache_file):
+                raise
+            logger.warning(f"Could not refresh exchange info, using stale cache: {e}")
+    with open(cache_file, encoding='utf-8') as f:
+        info = json.load(f)
+    return sorted(s['symbol'] for s in info.get('symbols', [])
+                  if s.get('quoteAsset') == 'USDT' and s.get('status') == 'TRADING')
+
+
+def run_pair(symbol, interval, strategy="ema_crossover", start_date="2019-01-01", sync=True, data_dir=None):
+    """
+    Process-pool job: sync, indicators, signals and backtest for one pair. Never raises, so one
+    failing pair cannot stop the batch; the error is reported in the returned row instead.
+    Returns:
+        Summary row dict (see SUMMARY_COLUMNS)
+    """
+    from agents.historical_data_agent import HistoricalDataAgent
+    from agents.pipeline_agent import run_pipeline
+
+    row = {'symbol': symbol, 'interval': interval, 'status': 'ok', 'bars_fetched': 0}
+    started = time.perf_counter()
+    try:
+        agent = HistoricalDataAgent(symbol=symbol, interval=interval, data_dir=data_dir)
+        if sync:
+            row['bars_fetched'] = agent.sync_historical_data(start_date=start_date)
+        if not os.path.exists(agent.data_file):
+            raise ValueError(f"No data file found at {agent.data_file}")
+        metrics = run_pipeline(symbol, interval, agent.data_file, strategy)
+        row.update(profit=metrics['profit'], profit_pct=metrics['profit_pct'], total_assets=metrics['total_assets'])
+        row['bars'] = len(agent.read_data())
+    except Exception as e:
+        row.update(status='failed', error=f"{type(e).__name__}: {e}")
+    row['duration_s'] = round(time.perf_counter() - started, 3)
+    return row
+
+
+class BatchAgent:
+    """
+    Headless batch run over many symbols and intervals: each pair is synced and pushed through
+    the pipeline in its own worker process, with no chart rendering, and the results are written
+    to one consolidated summary table.
+    """
+
+    def __init__(self, symbols, intervals, strategy="ema_crossover", start_date="2019-01-01", max_workers=None,
+                 sync=True, data_dir=None, output_dir=None):
+        """
+        Args:
+            symbols: List of symbols, or "ALL_USDT" for every trading USDT pair in the exchange-info cache
+            intervals: List of kline intervals
+            strategy: Strategy name used for signals and backtest
+            start_date: Start date for pairs without a data file
+            max_workers: Worker processes (default: CPU count)
+            sync: Fetch missing bars from Binance before processing
+            data_dir: Directory of raw kline files (default: the DataStore's raw directory)
+            output_dir: Directory for the summary table (default: the DataStore's processed directory)
+        """
+        store = get_store()
+        data_dir = data_dir or store.raw_dir
+        output_dir = output_dir or store.processed_dir
+        if symbols == "ALL_USDT" or symbols == ["ALL_USDT"]:
+            symbols = load_usdt_pairs(os.path.join(data_dir, os.path.basename(EXCHANGE_INFO_FILE)))
+        self.pairs = [(symbol, interval) for symbol in symbols for interval in intervals]
+        self.strategy = strategy
+        self.start_date = start_date
+        self.max_workers = max_workers or os.cpu_count()
+        self.sync = sync
+        self.data_dir = data_dir
+        self.output_dir = output_dir
+
+    def run(self, save=True):
+        """
+        Process all pairs in a process pool. A worker process that dies (e.g. out of memory) breaks
+        the whole pool and fails every pair still pending, so those pairs are run again, each in a
+        process of its own: only the pair that kills its process is reported as failed.
+        Returns:
+            pandas.DataFrame summary, one row per pair, best profit first
+        """
+        logger.info(f"Batch: {len(self.pairs)} pairs on {self.max_workers} workers")
+        rows = []
+        started = time.perf_counter()
+        unfinished = self._run_pool(self.pairs, self.max_workers, rows)
+        if unfinished:
+            logger.warning(f"A worker process died; rerunning {len(unfinished)} unfinished pairs one process each")
+            for pair in unfinished:
+                for symbol, interval in self._run_pool([pair], 1, rows):
+                    rows.append({'symbol': symbol, 'interval': interval, 'status': 'failed', 'error': "BrokenProcessPool: worker process died"})
+                    logger.info(f"Batch [{len(rows)}/{len(self.pairs)}] {symbol} {interval}: failed")
+        summary = pd.DataFrame(rows).reindex(columns=SUMMARY_COLUMNS)
+        summary = summary.sort_values('profit_pct', ascending=False, na_position='last').reset_index(drop=True)
+        failed = int((summary['status'] == 'failed').sum())
+        logger.info(f"Batch finished in {time.perf_counter() - started:.1f}s: {len(summary) - failed} ok, {failed} failed")
+        if save:
+            self.save_summary(summary)
+        return summary
+
+    def _run_pool(self, pairs, max_workers, rows):
+        """
+        Run pairs in a new process pool, appending their summary rows to rows.
+        Returns:
+            Pairs left unfinished because a worker process died
+        """
+        unfinished = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(run_pair, symbol, interval, self.strategy, self.start_date, self.sync, self.data_dir): (symbol, interval)
+                       for symbol, interval in pairs}
+            for future in as_completed(futures):
+                symbol, interval = futures[future]
+                try:
+                    row = future.result()
+                except BrokenProcessPool:
+                    unfinished.append((symbol, interval))
+                    continue
+                except Exception as e:  # the job could not be sent to or returned from the worker
+                    row = {'symbol': symbol, 'interval': interval, 'status': 'failed', 'error': f"{type(e).__name__}: {e}"}
+                rows.append(row)
+                logger.info(f"Batch [{len(rows)}/{len(self.pairs)}] {symbol} {interval}: {row['status']}")
+        return unfinished
+
+    def save_summary(self, summary):
+        path = os.path.join(self.output_dir, f"batch_summary_{datetime.now():%Y%m%d_%H%M%S}.csv")
+        get_store().write_path(summary, path)
+        return path
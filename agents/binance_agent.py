@@ -1,54 +1,58 @@
 import pandas as pd
-from binance.client import Client
 from utils.config import Config
-from filelock import FileLock
+from utils.binance_client import LazyClientMixin
+from utils.data_store import get_store
+from utils.kline_cache import get_kline_cache
+from utils.instrumentation import instrumented
 import os
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-class BinanceAgent:
-    def __init__(self):
-        self.client = Client(Config.BINANCE_API_KEY, Config.BINANCE_API_SECRET)
+class BinanceAgent(LazyClientMixin):
+    def __init__(self, store=None, cache=None):
+        """
+        Args:
+            store: DataStore used for file I/O (default: the shared store)
+            cache: KlineCache answering repeated requests (default: the shared cache)
+        """
+        # self.client is created on the first API call (see LazyClientMixin)
+        self.store = store or get_store()
+        self.cache = cache or get_kline_cache()
+        self._saved = None
         self.symbol = Config.DEFAULT_SYMBOL
         self.interval = Config.DEFAULT_INTERVAL
-        self.data_dir = Config.RAW_DATA_DIR
-        self.data_file = os.path.join(self.data_dir, f"{self.symbol}_{self.interval}.csv")
+        self.data_dir = self.store.raw_dir
+        self.data_file = self.store.path(self.symbol, self.interval)
 
+    @instrumented()
     def fetch_klines(self, limit=1000):
         """
-        Fetch historical kline data for the specified symbol and interval.
+        Fetch historical kline data for the specified symbol and interval. Served from the kline
+        cache when the request was already answered in the current candle or its bars are closed.
         Args:
             limit (int): Number of data points to fetch.
         Returns:
             pandas.DataFrame: Kline data with columns [open_time, open, high, low, close, volume].
         """
         logger.info(f"Fetching klines for {self.symbol} at {self.interval}")
-        klines = self.client.get_klines(symbol=self.symbol, interval=self.interval, limit=limit)
-        df = pd.DataFrame(klines, columns=[
-            'open_time', 'open', 'high', 'low', 'close', 'volume',
-            'close_time', 'quote_asset_volume', 'number_of_trades',
-            'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
-        ])
-        df['open_time'] = pd.to_datetime(df['open_time'], unit='ms')
-        numeric_cols = ['open', 'high', 'low', 'close', 'volume']
-        df[numeric_cols] = df[numeric_cols].astype(float)
-        df = df[['open_time', 'open', 'high', 'low', 'close', 'volume']]
-        self.save_to_csv(df)
+        df = self.cache.get_klines(self.client, self.symbol, self.interval, limit=limit)
+        # Repeated requests within a candle return the same bars; skip rewriting a file that still
+        # holds exactly them
+        mtime_ns = os.stat(self.data_file).st_mtime_ns if os.path.exists(self.data_file) else None
+        if self._saved is None or self._saved[:2] != (self.data_file, mtime_ns) or not self._saved[2].equals(df):
+            self.save_to_csv(df)
+            self._saved = (self.data_file, os.stat(self.data_file).st_mtime_ns, df)
         return df
 
     def save_to_csv(self, df):
         """
-        Save DataFrame to CSV with file locking.
+        Save DataFrame through the DataStore.
         Args:
             df: DataFrame to save.
         """
-        os.makedirs(self.data_dir, exist_ok=True)
-        lock = FileLock(f"{self.data_file}.lock")
-        with lock:
-            df.to_csv(self.data_file, index=False)
-            logger.info(f"Saved data to {self.data_file}")
+        self.store.write_path(df, self.data_file)
 
     def load_from_csv(self):
         """
@@ -56,21 +60,17 @@ class BinanceAgent:
         Returns:
             pandas.DataFrame: Data from CSV or empty DataFrame if file doesn't exist.
         """
-        lock = FileLock(f"{self.data_file}.lock")
-        with lock:
-            if os.path.exists(self.data_file):
-                df = pd.read_csv(self.data_file, parse_dates=['open_time'])
-                logger.info(f"Loaded data from {self.data_file}")
-                return df
-            logger.warning(f"No data file found at {self.data_file}")
-            return pd.DataFrame(columns=['open_time', 'open', 'high', 'low', 'close', 'volume'])
+        if os.path.exists(self.data_file):
+            return self.store.read_path(self.data_file)
+        logger.warning(f"No data file found at {self.data_file}")
+        return pd.DataFrame(columns=['open_time', 'open', 'high', 'low', 'close', 'volume'])
 
     def set_symbol(self, symbol):
         """Update the trading pair symbol and data file path."""
         self.symbol = symbol
-        self.data_file = os.path.join(self.data_dir, f"{self.symbol}_{self.interval}.csv")
+        self.data_file = self.store.path(self.symbol, self.interval)
 
     def set_interval(self, interval):
         """Update the time interval and data file path."""
         self.interval = interval
-        self.data_file = os.path.join(self.data_dir, f"{self.symbol}_{self.interval}.csv")
\ No newline at end of file
+        self.data_file = self.store.path(self.symbol, self.interval)
\ No newline at end of file
@@ -1,3 +1,5 @@
+import glob
+import numpy as np
 import plotly.graph_objects as go
 import plotly.subplots as sp
 import pandas as pd
@@ -5,7 +7,12 @@ from datetime import datetime
 from agents.data_calculation_agent import DataCalculationAgent
 from agents.strategy_agent import StrategyAgent
 from agents.indicator_agent import IndicatorAgent
-from filelock import FileLock
+from utils.dataset import DatasetSession, as_session
+from utils.chart_export import EXPORT_PATTERN, export_figure, prune_exports
+from utils.config import Config
+from utils.downsampling import downsample_line, downsample_ohlc, slice_viewport, x_range_from_relayout
+from utils.data_store import get_store
+from utils.instrumentation import instrumented
 import os
 import logging
 
@@ -13,26 +20,55 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 logger = logging.getLogger(__name__)
 
 class ChartAgent:
-    def __init__(self):
-        """Initialize ChartAgent with a DataCalculationAgent instance."""
-        self.output_dir = "data/processed"
-        self.data_calc_agent = DataCalculationAgent()
+    def __init__(self, max_points=4000, export_mode=None, store=None):
+        """
+        Initialize ChartAgent with a DataCalculationAgent instance.
+        Args:
+            max_points: Point budget per trace; longer series are downsampled server-side (None disables)
+            export_mode: 'compact' (shared plotly.js, binary arrays) or 'standalone' (default: Config.CHART_EXPORT_MODE)
+            store: DataStore used for file I/O (default: the shared store)
+        """
+        self.store = store or get_store()
+        self.output_dir = self.store.processed_dir
+        self.data_calc_agent = DataCalculationAgent(store=self.store)
+        self.max_points = max_points
+        self.export_mode = export_mode or Config.CHART_EXPORT_MODE
 
     def load_from_csv(self, data_file):
         """
-        Load data from CSV file.
+        Load data through the DataStore (cached until the file changes).
         Args:
-            data_file: Path to CSV file
+            data_file: Path to CSV file, or a DatasetSession (its already loaded data is returned)
         Returns:
             pandas.DataFrame: Data from CSV
         """
-        lock = FileLock(f"{data_file}.lock")
-        with lock:
-            if os.path.exists(data_file):
-                df = pd.read_csv(data_file, parse_dates=['open_time'])
-                logger.info(f"Loaded data from {data_file}")
-                return df
-            raise ValueError(f"No data file found at {data_file}")
+        if isinstance(data_file, DatasetSession):
+            return data_file.df
+        return self.store.read_path(data_file)
+
+    @instrumented()
+    def save_figure(self, fig, name):
+        """
+        Write a timestamped HTML export of a figure and apply the export retention policy to the
+        earlier exports of the same name, if one is configured (Config.CHART_EXPORT_MAX_AGE_DAYS /
+        CHART_EXPORT_MAX_FILES).
+        Args:
+            fig: Plotly figure
+            name: File name prefix, e.g. 'BTCUSDT_combined'
+        Returns:
+            Path of the written file
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.output_dir, f"{name}_{timestamp}.html")
+        if self.export_mode == "compact":
+            export_figure(fig, path, sidecar=Config.CHART_EXPORT_SIDECAR)
+        else:
+            fig.write_html(path)
+        if Config.CHART_EXPORT_MAX_AGE_DAYS or Config.CHART_EXPORT_MAX_FILES:
+            prune_exports(self.output_dir, pattern=glob.escape(name) + EXPORT_PATTERN[1:],
+                          max_age_days=Config.CHART_EXPORT_MAX_AGE_DAYS, max_files=Config.CHART_EXPORT_MAX_FILES)
+        return path
 
     def _validate_df(self, df):
         """Validate DataFrame with lenient checks."""
@@ -45,30 +81,146 @@ class ChartAgent:
         if df[required_columns].isnull().any().any():
             logger.warning("DataFrame contains null values, proceeding with available data")
 
-    def plot_combined_charts(self, data_file, symbol="BTCUSDT", interval="1h", indicators=None, strategy=None, chart_type="normal", save=False):
+    def _candles(self, df, max_points, cols=('open', 'high', 'low', 'close')):
+        """Bucket candles down to the point budget (highs and lows are kept)."""
+        budget = max_points or self.max_points
+        return downsample_ohlc(df, budget, cols=cols) if budget else df
+
+    def _line(self, x, y, max_points, method="lttb"):
+        """Downsample a line trace to the point budget with LTTB (or min/max)."""
+        budget = max_points or self.max_points
+        return downsample_line(x, y, budget, method=method) if budget else (x, y)
+
+    def zoomable(self, plot_method, **plot_kwargs):
+        """
+        Wrap a chart in a FigureWidget that re-queries data at full resolution for the zoomed range.
+        Args:
+            plot_method: Bound plot method, e.g. chart_agent.plot_combined_charts
+            plot_kwargs: Arguments for plot_method (x_range is managed by the widget)
+        Returns:
+            plotly.graph_objects.FigureWidget
+        """
+        widget = go.FigureWidget(plot_method(**plot_kwargs))
+
+        def on_range_change(layout, x_range):
+            fig = plot_method(x_range=tuple(x_range) if x_range else None, **plot_kwargs)
+            self.apply_traces(widget, fig)
+
+        widget.layout.on_change(on_range_change, 'xaxis.range')
+        return widget
+
+    def rerender_for_relayout(self, plot_method, relayout_data, **plot_kwargs):
+        """
+        Callback entry point for front ends that report zoom as Plotly relayout events (Dash, Streamlit components).
+        Args:
+            plot_method: Bound plot method, e.g. chart_agent.plot_combined_charts
+            relayout_data: Relayout event dict from plotly.js
+            plot_kwargs: Arguments for plot_method
+        Returns:
+            New figure for the visible range, or None if the event did not change the x axis
+        """
+        x_range = x_range_from_relayout(relayout_data)
+        if x_range is False:
+            return None
+        fig = plot_method(x_range=x_range, **plot_kwargs)
+        if x_range is not None:
+            fig.update_xaxes(range=list(x_range))
+        return fig
+
+    @staticmethod
+    def apply_traces(target, source):
+        """Copy trace data from a freshly rendered figure into an existing figure or widget."""
+        with target.batch_update():
+            if len(target.data) == len(source.data):
+                for old, new in zip(target.data, source.data):
+                    old.update(new.to_plotly_json(), overwrite=True)
+            else:
+                target.data = []
+                target.add_traces(list(source.data))
+
+    SIGNAL_CLASSES = (
+        # name, marker symbol, color, anchor side, marker offset, label offset, label position
+        ("Buy", 'triangle-up', 'green', 'low', 0.995, 0.99, 'bottom center'),
+        ("Sell", 'triangle-down', 'red', 'high', 1.005, 1.01, 'top center'),
+        ("Partial Exit", 'x', 'orange', 'high', 1.005, 1.01, 'top center'),
+    )
+
+    def _signal_traces(self, calc_df, low_col, high_col, price_col):
+        """
+        Build vectorized signal overlays: per class, one marker trace (entry IDs in text/customdata)
+        and one text-mode label trace, instead of a trace and an annotation per signal.
+        Args:
+            calc_df: Strategy DataFrame with 'position', 'entry_id' and optionally 'partial_exit'
+            low_col: Column used to place markers below the bar
+            high_col: Column used to place markers above the bar
+            price_col: Column shown as the signal price in hover
+        Returns:
+            List of go.Scatter traces
+        """
+        if 'partial_exit' in calc_df.columns:
+            partial = calc_df['partial_exit'].fillna(False).astype(bool).to_numpy()
+        else:
+            partial = np.zeros(len(calc_df), dtype=bool)
+        position = calc_df['position'].to_numpy()
+        masks = {
+            "Buy": position == 1,
+            "Sell": (position == -1) & ~partial,
+            "Partial Exit": (position == -1) & partial,
+        }
+        traces = []
+        for name, symbol, color, side, marker_offset, label_offset, label_position in self.SIGNAL_CLASSES:
+            signals = calc_df[masks[name]]
+            if signals.empty:
+                continue
+            entry_ids = signals['entry_id'].astype(object).where(signals['entry_id'].notna(), "N/A").astype(str).to_numpy()
+            anchor = signals[low_col if side == 'low' else high_col].to_numpy()
+            customdata = list(zip(entry_ids, signals[price_col].to_numpy()))
+            traces.append(go.Scatter(
+                x=signals['open_time'], y=anchor * marker_offset, mode='markers', name=name, legendgroup=name,
+                marker=dict(symbol=symbol, color=color, size=10), text=entry_ids, customdata=customdata,
+                hovertemplate=f"{name} %{{customdata[0]}}<br>%{{x}}<br>Price: %{{customdata[1]:.2f}}<extra></extra>"
+            ))
+            traces.append(go.Scatter(
+                x=signals['open_time'], y=anchor * label_offset, mode='text', name=f"{name} labels", legendgroup=name,
+                showlegend=False, text=entry_ids, textposition=label_position, textfont=dict(size=10), hoverinfo='skip'
+            ))
+        return traces
+
+    @staticmethod
+    def _session_range(data_file):
+        """Time range of a partial DatasetSession (None for paths and full sessions)."""
+        return data_file.x_range if isinstance(data_file, DatasetSession) else None
+
+    @instrumented()
+    def plot_combined_charts(self, data_file, symbol="BTCUSDT", interval="1h", indicators=None, strategy=None, chart_type="normal", save=False, x_range=None, max_points=None):
         """
         Plot combined charts with range slider for x-axis control, increased spacing, and entry/exit signals.
         Args:
-            data_file: Path to CSV file with ['open_time', 'open', 'high', 'low', 'close']
+            data_file: Path to CSV file with ['open_time', 'open', 'high', 'low', 'close'], or a DatasetSession
             symbol: Trading pair symbol (default: BTCUSDT)
             interval: Time interval (default: 1h)
             indicators: List of indicators (e.g., ['sma', 'rsi'])
             strategy: Strategy name (e.g., 'ema_crossover')
             chart_type: 'normal' (candlestick only) or 'heikin_ashi' (both with strategy on HA)
             save: Save chart to HTML file (default: False)
+            x_range: Visible (start, end) range; only bars inside it are sent (default: the session's
+                     time range, or the whole history)
+            max_points: Point budget per trace (default: self.max_points)
         Returns:
             Plotly figure object
         """
-        df = self.load_from_csv(data_file)
+        # One session per render: the raw file is read once and shared by every agent below
+        session = as_session(data_file, symbol, interval, store=self.store)
+        df = session.df
+        # A time-range session also loaded warm-up bars before its start: show only the range
+        x_range = x_range or session.x_range
         self._validate_df(df)
+        view_df = slice_viewport(df, x_range)
         indicators = indicators or []
         show_rsi = "rsi" in indicators
 
-        # Use precomputed Heikin Ashi data if available
-        ha_file = os.path.join(self.output_dir, f"{symbol}_{interval}_heikin_ashi.csv")
-        ha_df = self.load_from_csv(ha_file) if chart_type == "heikin_ashi" and os.path.exists(ha_file) else None
-        if chart_type == "heikin_ashi" and ha_df is None:
-            ha_df = self.data_calc_agent.calculate_heikin_ashi(data_file, symbol, interval)
+        # Use precomputed Heikin Ashi data if available (the session computes it otherwise)
+        ha_df = session.heikin_ashi() if chart_type == "heikin_ashi" else None
         logger.info(f"chart_type: {chart_type}, ha_df available: {ha_df is not None}, ha_df columns: {ha_df.columns.tolist() if ha_df is not None else 'None'}")
 
         total_rows = 1 + (1 if chart_type == "heikin_ashi" else 0) + (1 if show_rsi else 0)
@@ -88,9 +240,10 @@ class ChartAgent:
         )
 
         # Add Candlestick chart
+        candles = self._candles(view_df, max_points)
         fig.add_trace(
             go.Candlestick(
-                x=df['open_time'], open=df['open'], high=df['high'], low=df['low'], close=df['close'],
+                x=candles['open_time'], open=candles['open'], high=candles['high'], low=candles['low'], close=candles['close'],
                 name="Candlestick"
             ),
             row=1, col=1
@@ -100,78 +253,58 @@ class ChartAgent:
         if chart_type == "heikin_ashi" and ha_df is not None:
             logger.info(f"Adding Heikin Ashi trace, ha_df columns: {ha_df.columns.tolist()}")
             if not ha_df.empty:
+                ha_candles = self._candles(slice_viewport(ha_df, x_range), max_points, cols=('ha_open', 'ha_high', 'ha_low', 'ha_close'))
                 fig.add_trace(
                     go.Candlestick(
-                        x=ha_df['open_time'], open=ha_df['ha_open'], high=ha_df['ha_high'],
-                        low=ha_df['ha_low'], close=ha_df['ha_close'],
+                        x=ha_candles['open_time'], open=ha_candles['ha_open'], high=ha_candles['ha_high'],
+                        low=ha_candles['ha_low'], close=ha_candles['ha_close'],
                         name="Heikin Ashi", increasing_line_color='green', decreasing_line_color='red'
                     ),
                     row=2, col=1
                 )
 
         if strategy:
-            strategy_agent = StrategyAgent(data_file)
+            strategy_agent = StrategyAgent(session)
             calc_df = strategy_agent.ema_crossover_strategy(
-                fast_length=9, slow_length=21, use_ha_df=(chart_type == "heikin_ashi"), ha_file=ha_file, symbol=symbol, interval=interval
+                fast_length=9, slow_length=21, use_ha_df=(chart_type == "heikin_ashi"), symbol=symbol, interval=interval
             )
+            # Indicators are computed on the full history so the viewport starts warmed up
+            calc_df = slice_viewport(calc_df, x_range)
 
             # Add EMA lines
+            x, y = self._line(calc_df['open_time'], calc_df['fast_ema'], max_points)
             fig.add_trace(
-                go.Scatter(x=calc_df['open_time'], y=calc_df['fast_ema'], name="Fast EMA", line=dict(color='orange')),
+                go.Scatter(x=x, y=y, name="Fast EMA", line=dict(color='orange')),
                 row=1 if chart_type == "normal" else 2, col=1
             )
+            x, y = self._line(calc_df['open_time'], calc_df['slow_ema'], max_points)
             fig.add_trace(
-                go.Scatter(x=calc_df['open_time'], y=calc_df['slow_ema'], name="Slow EMA", line=dict(color='blue')),
+                go.Scatter(x=x, y=y, name="Slow EMA", line=dict(color='blue')),
                 row=1 if chart_type == "normal" else 2, col=1
             )
 
-            # Add buy signals with labels below
-            buy_signals = calc_df[calc_df['position'] == 1]
-            for i, row in buy_signals.iterrows():
-                entry_id = row['entry_id'] if pd.notna(row['entry_id']) else "N/A"
-                fig.add_trace(
-                    go.Scatter(
-                        x=[row['open_time']], y=[row['low'] * 0.995 if chart_type == "normal" else row['ha_low'] * 0.995],
-                        mode='markers', name=f'Buy {entry_id}', marker=dict(symbol='triangle-up', color='green', size=10)
-                    ),
-                    row=1 if chart_type == "normal" else 2, col=1
-                )
-                fig.add_annotation(
-                    x=row['open_time'], y=row['low'] * 0.99 if chart_type == "normal" else row['ha_low'] * 0.99,
-                    text=entry_id, showarrow=False, yshift=-10, font=dict(size=10),
-                    row=1 if chart_type == "normal" else 2, col=1
-                )
-
-            # Add sell signals with labels above
-            sell_signals = calc_df[calc_df['position'] == -1]
-            for i, row in sell_signals.iterrows():
-                entry_id = row['entry_id'] if pd.notna(row['entry_id']) else "N/A"
-                fig.add_trace(
-                    go.Scatter(
-                        x=[row['open_time']], y=[row['high'] * 1.005 if chart_type == "normal" else row['ha_high'] * 1.005],
-                        mode='markers', name=f'Sell {entry_id}', marker=dict(symbol='triangle-down', color='red', size=10)
-                    ),
-                    row=1 if chart_type == "normal" else 2, col=1
-                )
-                fig.add_annotation(
-                    x=row['open_time'], y=row['high'] * 1.01 if chart_type == "normal" else row['ha_high'] * 1.01,
-                    text=entry_id, showarrow=False, yshift=10, font=dict(size=10),
-                    row=1 if chart_type == "normal" else 2, col=1
-                )
+            # Add buy/sell/partial-exit signals: one marker trace and one label trace per class
+            signal_row = 1 if chart_type == "normal" else 2
+            low_col, high_col = ('low', 'high') if chart_type == "normal" else ('ha_low', 'ha_high')
+            price_col = 'close' if chart_type == "normal" else 'ha_close'
+            for trace in self._signal_traces(calc_df, low_col, high_col, price_col):
+                fig.add_trace(trace, row=signal_row, col=1)
 
         if indicators:
-            indicator_agent = IndicatorAgent(data_file if chart_type == "normal" else ha_file)
+            indicator_agent = IndicatorAgent(session, source="raw" if chart_type == "normal" else "heikin_ashi")
             for ind in indicators:
                 if ind == "sma":
-                    calc_df = indicator_agent.calculate_sma(length=14, symbol=symbol, interval=interval)
+                    calc_df = slice_viewport(indicator_agent.calculate_sma(length=14, symbol=symbol, interval=interval), x_range)
+                    x, y = self._line(calc_df['open_time'], calc_df['sma'], max_points)
                     fig.add_trace(
-                        go.Scatter(x=calc_df['open_time'], y=calc_df['sma'], name="SMA", line=dict(color='blue')),
+                        go.Scatter(x=x, y=y, name="SMA", line=dict(color='blue')),
                         row=1 if chart_type == "normal" else 2, col=1
                     )
                 elif ind == "rsi" and show_rsi:
-                    calc_df = indicator_agent.calculate_rsi(length=14, symbol=symbol, interval=interval)
+                    calc_df = slice_viewport(indicator_agent.calculate_rsi(length=14, symbol=symbol, interval=interval), x_range)
+                    x, y = self._line(calc_df['open_time'], calc_df['rsi'], max_points)
                     fig.add_trace(
-                        go.Scatter(x=calc_df['open_time'], y=calc_df['rsi'], name="RSI", line=dict(color='purple')),
+                        go.Scatter(x=x, y=y, name="RSI", line=dict(color='purple')),
                         row=total_rows, col=1
                     )
 
@@ -188,15 +321,17 @@ class ChartAgent:
         fig.update_yaxes(showgrid=True, fixedrange=False, scaleanchor=None)
 
         if save:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            fig.write_html(f"{self.output_dir}/{symbol}_combined_{timestamp}.html")
+            self.save_figure(fig, f"{symbol}_combined")
 
         return fig
 
-    def plot_candlestick(self, data_file, symbol="BTCUSDT", save=False):
-        """Plot a standalone candlestick chart."""
+    @instrumented()
+    def plot_candlestick(self, data_file, symbol="BTCUSDT", save=False, x_range=None, max_points=None):
+        """Plot a standalone candlestick chart (bucketed to the point budget)."""
         df = self.load_from_csv(data_file)
+        x_range = x_range or self._session_range(data_file)
         self._validate_df(df)
+        df = self._candles(slice_viewport(df, x_range), max_points)
         fig = go.Figure(data=[go.Candlestick(
             x=df['open_time'], open=df['open'], high=df['high'], low=df['low'], close=df['close'], name=symbol
         )])
@@ -207,15 +342,18 @@ class ChartAgent:
         fig.update_xaxes(rangeslider_visible=True, fixedrange=False)
         fig.update_yaxes(showgrid=True)
         if save:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            fig.write_html(f"{self.output_dir}/{symbol}_candlestick_{timestamp}.html")
+            self.save_figure(fig, f"{symbol}_candlestick")
         return fig
 
-    def plot_line(self, data_file, symbol="BTCUSDT", save=False):
-        """Plot a standalone line chart of closing prices."""
+    @instrumented()
+    def plot_line(self, data_file, symbol="BTCUSDT", save=False, x_range=None, max_points=None):
+        """Plot a standalone line chart of closing prices (LTTB-downsampled to the point budget)."""
         df = self.load_from_csv(data_file)
+        x_range = x_range or self._session_range(data_file)
         self._validate_df(df)
-        fig = go.Figure(data=[go.Scatter(x=df['open_time'], y=df['close'], mode='lines', name=symbol)])
+        df = slice_viewport(df, x_range)
+        x, y = self._line(df['open_time'], df['close'], max_points)
+        fig = go.Figure(data=[go.Scatter(x=x, y=y, mode='lines', name=symbol)])
         fig.update_layout(
             title=f"{symbol} Closing Price", yaxis_title="Price (USDT)", height=800, margin=dict(b=50, t=100),
             dragmode='zoom', xaxis=dict(rangeslider=dict(visible=True), rangeselector=dict(visible=True))
@@ -223,21 +361,23 @@ class ChartAgent:
         fig.update_xaxes(rangeslider_visible=True, fixedrange=False)
         fig.update_yaxes(showgrid=True)
         if save:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            fig.write_html(f"{self.output_dir}/{symbol}_line_{timestamp}.html")
+            self.save_figure(fig, f"{symbol}_line")
         return fig
 
-    def plot_equity_curve(self, data_file, symbol="BTCUSDT", interval="1h", save=False):
-        """Plot the equity curve from backtest results."""
+    @instrumented()
+    def plot_equity_curve(self, data_file, symbol="BTCUSDT", interval="1h", save=False, x_range=None, max_points=None):
+        """Plot the equity curve from backtest results (min/max-downsampled so drawdowns are kept)."""
         df = self.load_from_csv(data_file)
+        x_range = x_range or self._session_range(data_file)
         self._validate_df(df)
-        backtest_file = os.path.join(self.output_dir, f"{symbol}_{interval}_backtest.csv")
+        backtest_file = self.store.path(symbol, interval, "backtest", directory=self.output_dir)
         if os.path.exists(backtest_file):
             equity_df = self.load_from_csv(backtest_file)
-            backtest_results = equity_df['equity'].tolist()
         else:
-            backtest_results = [0] * len(df)
-        fig = go.Figure(data=[go.Scatter(x=df['open_time'], y=backtest_results, mode='lines', name="Equity Curve", line=dict(color='green'))])
+            equity_df = pd.DataFrame({'open_time': df['open_time'], 'equity': 0.0})
+        equity_df = slice_viewport(equity_df, x_range)
+        x, y = self._line(equity_df['open_time'], equity_df['equity'], max_points, method="minmax")
+        fig = go.Figure(data=[go.Scatter(x=x, y=y, mode='lines', name="Equity Curve", line=dict(color='green'))])
         fig.update_layout(
             title=f"{symbol} Equity Curve", yaxis_title="Portfolio Value (USDT)", height=800, margin=dict(b=50, t=100),
             dragmode='zoom', xaxis=dict(rangeslider=dict(visible=True), rangeselector=dict(visible=True))
@@ -245,6 +385,5 @@ class ChartAgent:
         fig.update_xaxes(rangeslider_visible=True, fixedrange=False)
         fig.update_yaxes(showgrid=True, fixedrange=False)
         if save:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            fig.write_html(f"{self.output_dir}/{symbol}_equity_{timestamp}.html")
+            self.save_figure(fig, f"{symbol}_equity")
         return fig
\ No newline at end of file
@@ -0,0 +1,104 @@
+import os
+from agents.backtest_agent import BacktestAgent
+from utils.chunked import EmaCrossoverStage, HeikinAshiStage, IndicatorStage
+from utils.config import Config
+from utils.data_store import get_store
+from utils.instrumentation import instrumented, span
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class ChunkedPipelineAgent:
+    """
+    Out-of-core Heikin Ashi -> indicators -> strategy signals -> backtest for one stored kline
+    file. The file is streamed in time-ordered blocks of chunk_bars rows through stateful
+    stages (utils.chunked), and every output is streamed to the same artifact the in-memory
+    agents write, so peak memory is bounded by the block size instead of the history length.
+    The outputs are the same as DataCalculationAgent / IndicatorAgent / StrategyAgent /
+    BacktestAgent on the whole file, except that the strategy file has no per-row
+    open_positions/completed_positions columns: the final position lists are returned instead.
+    """
+
+    def __init__(self, symbol="BTCUSDT", interval="1h", data_file=None, store=None, chunk_bars=None):
+        """
+        Args:
+            symbol: Trading pair symbol
+            interval: Kline interval
+            data_file: Kline file to process (default: the store's raw file of the pair)
+            store: DataStore used for file I/O (default: the shared store)
+            chunk_bars: Rows per block (default: Config.CHUNK_BARS)
+        """
+        self.symbol = symbol
+        self.interval = interval
+        self.store = store or get_store()
+        self.data_file = data_file or self.store.path(symbol, interval)
+        self.chunk_bars = chunk_bars or Config.CHUNK_BARS
+        self.output_dir = self.store.processed_dir
+        self.positions = {}
+        self.completed_positions = []
+
+    def iter_chunks(self):
+        """Blocks of the kline file in time order."""
+        return self.store.iter_chunks(self.data_file, self.chunk_bars)
+
+    def _path(self, kind):
+        return self.store.path(self.symbol, self.interval, kind, directory=self.output_dir)
+
+    @instrumented()
+    def process(self, indicators=('sma', 'rsi'), fast_length=9, slow_length=21, use_ha_df=False):
+        """
+        One pass over the file writing the heikin_ashi, indicators and strategy artifacts.
+        Args:
+            indicators: Indicator names or (name, params) pairs (see utils.chunked.IndicatorStage)
+            fast_length: Fast EMA period of the crossover strategy
+            slow_length: Slow EMA period of the crossover strategy
+            use_ha_df: Run the strategy on Heikin Ashi closes
+        Returns:
+            Number of bars processed
+        """
+        if not os.path.exists(self.data_file):
+            raise ValueError(f"No data file found at {self.data_file}")
+        compact = self.store.compact
+        ha_stage = HeikinAshiStage(compact=compact)
+        indicator_stage = IndicatorStage(indicators, compact=compact) if indicators else None
+        strategy_stage = EmaCrossoverStage(fast_length, slow_length, price_col='ha_close' if use_ha_df else 'close', compact=compact)
+        bars = 0
+        with self.store.chunk_writer(self._path("heikin_ashi")) as ha_writer, \
+                self.store.chunk_writer(self._path("indicators")) as indicator_writer, \
+                self.store.chunk_writer(self._path("strategy")) as strategy_writer:
+            for chunk in self.iter_chunks():
+                with span('ChunkedPipelineAgent.block', rows=len(chunk)):
+                    ha = ha_stage.process(chunk)
+                    ha_writer.write(ha)
+                    if indicator_stage is not None:
+                        indicator_writer.write(indicator_stage.process(chunk))
+                    strategy_writer.write(strategy_stage.process(ha if use_ha_df else chunk))
+                bars += len(chunk)
+                logger.info(f"Processed {bars} bars of {self.symbol} {self.interval}")
+        self.positions, self.completed_positions = strategy_stage.positions, strategy_stage.completed_positions
+        return bars
+
+    @instrumented()
+    def run(self, indicators=('sma', 'rsi'), strategy="ema_crossover", fast_length=9, slow_length=21, use_ha_df=False, backtest=True, **backtest_kwargs):
+        """
+        Full pipeline: process() followed by a second streaming pass for the backtest.
+        Args:
+            indicators, fast_length, slow_length, use_ha_df: See process
+            strategy: Strategy name ('ema_crossover')
+            backtest: Run the backtest pass (default: True)
+            backtest_kwargs: Extra arguments for BacktestAgent.run_backtest_chunked (initial_cash, commission, ...)
+        Returns:
+            Dict with bars, open/completed position counts and the backtest metrics
+        """
+        if strategy.lower() != "ema_crossover":
+            raise ValueError(f"Strategy '{strategy}' not supported.")
+        bars = self.process(indicators, fast_length, slow_length, use_ha_df)
+        summary = {'bars': bars, 'open_positions': len(self.positions), 'completed_positions': len(self.completed_positions)}
+        if backtest:
+            results = BacktestAgent(store=self.store).run_backtest_chunked(
+                self.iter_chunks(), strategy=strategy, symbol=self.symbol, interval=self.interval,
+                strategy_params={'fast_length': fast_length, 'slow_length': slow_length}, **backtest_kwargs)
+            summary.update({k: v for k, v in results.items() if k not in ('equity', 'bars')})
+        return summary
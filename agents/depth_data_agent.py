@@ -0,0 +1,254 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import websockets
+from utils.binance_client import LazyClientMixin
+from utils.config import Config
+from utils.depth_store import DepthSegment, DepthStore
+from utils.order_book import OrderBook, levels_array
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Diff events kept per symbol while waiting for a snapshot; beyond it the oldest are dropped
+# (the snapshot then turns out older than the buffer and a newer one is fetched)
+MAX_BUFFERED_EVENTS = 10_000
+
+
+class DepthDataAgent(LazyClientMixin):
+    """
+    Order-book depth capture for many symbols in one event loop thread: per symbol a local book
+    from a REST snapshot plus the @depth diff stream, rebuilt from a new snapshot whenever a
+    sequence gap shows that updates were missed (or the stream reconnects). The books are stored
+    in the DepthStore as segments of DEPTH_SEGMENT_SECONDS, each the book at its start plus the
+    diffs after it; segments are encoded and written on a separate writer thread.
+    """
+
+    def __init__(self, symbols, depth_store=None, limit=None, segment_seconds=None, update_speed="100ms", reconnect_delay=5):
+        """
+        Args:
+            symbols: Trading pair symbols
+            depth_store: DepthStore for the segments (default: one on Config.DEPTH_DATA_DIR)
+            limit: Levels per side of the REST snapshots (default: Config.DEPTH_SNAPSHOT_LIMIT)
+            segment_seconds: Segment length (default: Config.DEPTH_SEGMENT_SECONDS)
+            update_speed: Diff stream speed, "100ms" or None for Binance's 1000ms default
+            reconnect_delay: Seconds to wait before reconnecting a stream or refetching a failed snapshot
+        """
+        # self.client is created on the first API call (see LazyClientMixin)
+        self.symbols = [symbol.upper() for symbol in symbols]
+        self.depth = depth_store or DepthStore()
+        self.limit = limit or Config.DEPTH_SNAPSHOT_LIMIT
+        self.segment_ms = (segment_seconds or Config.DEPTH_SEGMENT_SECONDS) * 1000
+        self.update_speed = update_speed
+        self.reconnect_delay = reconnect_delay
+        self.books = {symbol: OrderBook() for symbol in self.symbols}
+        self.segments = {symbol: None for symbol in self.symbols}  # open DepthSegment per symbol
+        self._buffers = {symbol: [] for symbol in self.symbols}
+        self._last_start = {symbol: -1 for symbol in self.symbols}
+        self._snapshot_pending = set()
+        self.writer = None
+        self.running = False
+        self.loop = None
+        self.loop_thread = None
+        self.metrics = {
+            'events_total': 0,
+            'levels_total': 0,
+            'snapshots_total': 0,
+            'resyncs_total': 0,
+            'segments_written_total': 0,
+            'bytes_written_total': 0,
+        }
+
+    def stream_url(self, symbol):
+        speed = f"@{self.update_speed}" if self.update_speed else ""
+        return f"{Config.BINANCE_WS_URL.rstrip('/')}/{symbol.lower()}@depth{speed}"
+
+    @retry(
+        stop=stop_after_attempt(5),
+        wait=wait_exponential(multiplier=1, min=4, max=60),
+        retry=retry_if_exception_type(Exception)
+    )
+    def fetch_snapshot(self, symbol):
+        """
+        One /api/v3/depth request.
+        Returns:
+            Dict with lastUpdateId, bids, asks
+        """
+        return self.client.get_order_book(symbol=symbol, limit=self.limit)
+
+    # ---- lifecycle -------------------------------------------------------------------------
+
+    def start(self):
+        """Follow the depth streams of all symbols in one event loop thread."""
+        if self.running:
+            self.stop()
+        self.running = True
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="depth-writer")
+
+        async def run_all():
+            self.loop = asyncio.get_running_loop()
+            await asyncio.gather(*(self._follow(symbol) for symbol in self.symbols), return_exceptions=True)
+
+        self.loop_thread = threading.Thread(target=lambda: asyncio.run(run_all()), name="depth-streams", daemon=True)
+        self.loop_thread.start()
+        logger.info(f"Capturing depth of {len(self.symbols)} symbols")
+        return self
+
+    def stop(self):
+        """Stop the streams and write the open segments."""
+        self.running = False
+        if self.loop_thread is not None:
+            self.loop_thread.join(timeout=10)
+        for symbol in self.symbols:
+            self._close_segment(symbol)
+        if self.writer is not None:
+            self.writer.shutdown(wait=True)
+        self.loop_thread = self.writer = self.loop = None
+        logger.info(f"Stopped depth capture ({self.metrics['segments_written_total']} segments, "
+                    f"{self.metrics['bytes_written_total'] / 1e6:.1f} MB written)")
+
+    def book(self, symbol):
+        """
+        Current local book of a symbol.
+        Returns:
+            DepthBook, or None while the book is being rebuilt
+        """
+        def current():
+            book = self.books[symbol]
+            return book.snapshot() if book.synced else None
+        if self.loop is None or not self.loop.is_running():
+            return current()
+
+        async def on_loop():
+            return current()
+        return asyncio.run_coroutine_threadsafe(on_loop(), self.loop).result(timeout=5)
+
+    # ---- stream ----------------------------------------------------------------------------
+
+    async def _follow(self, symbol):
+        while self.running:
+            try:
+                async with websockets.connect(self.stream_url(symbol), max_size=None) as websocket:
+                    logger.info(f"Connected to depth stream for {symbol}")
+                    # A new connection may have missed updates: start from a fresh snapshot
+                    self._resync(symbol)
+                    while self.running:
+                        try:
+                            message = await asyncio.wait_for(websocket.recv(), timeout=1)
+                        except asyncio.TimeoutError:
+                            continue
+                        data = json.loads(message)
+                        if data.get('e') == 'depthUpdate':
+                            self.on_event(symbol, data)
+            except Exception as e:
+                logger.error(f"Depth stream error for {symbol}: {e}")
+                if self.running:
+                    await asyncio.sleep(self.reconnect_delay)
+
+    def on_event(self, symbol, data):
+        """Apply (or, while the book waits for a snapshot, buffer) one depthUpdate event."""
+        if not self.books[symbol].synced:
+            buffer = self._buffers[symbol]
+            buffer.append(data)
+            if len(buffer) > MAX_BUFFERED_EVENTS:
+                del buffer[:len(buffer) - MAX_BUFFERED_EVENTS]
+            return
+        event_time = int(data['E'])
+        segment = self.segments[symbol]
+        if segment is None:
+            # Synced from a snapshot alone (it has no time): its segment starts just before this event
+            self._open_segment(symbol, event_time - 1)
+        elif event_time - segment.start_ms >= self.segment_ms:
+            self._close_segment(symbol)
+            self._open_segment(symbol)
+        bids, asks = levels_array(data['b']), levels_array(data['a'])
+        try:
+            applied = self.books[symbol].apply(int(data['U']), int(data['u']), bids, asks, time=event_time)
+        except ValueError as e:
+            logger.warning(f"{symbol} depth: {e}, rebuilding the book")
+            self._resync(symbol)
+            self._buffers[symbol].append(data)
+            return
+        if applied:
+            self.segments[symbol].add(event_time, int(data['u']), bids, asks)
+            self.metrics['events_total'] += 1
+            self.metrics['levels_total'] += len(bids) + len(asks)
+
+    def _resync(self, symbol):
+        """Drop the book (its segment is written as it stands) and wait for a new snapshot."""
+        if self.books[symbol].synced:
+            self.metrics['resyncs_total'] += 1
+        self._close_segment(symbol)
+        self.books[symbol].reset()
+        self._buffers[symbol] = []
+        self._request_snapshot(symbol)
+
+    def _request_snapshot(self, symbol):
+        if symbol in self._snapshot_pending or not self.running:
+            return
+        self._snapshot_pending.add(symbol)
+        future = self.loop.run_in_executor(None, self.fetch_snapshot, symbol)
+        future.add_done_callback(lambda f: self._on_snapshot(symbol, f))
+
+    def _on_snapshot(self, symbol, future):
+        self._snapshot_pending.discard(symbol)
+        book = self.books[symbol]
+        if not self.running or book.synced:
+            return
+        try:
+            snapshot = future.result()
+        except Exception as e:
+            logger.error(f"Depth snapshot failed for {symbol}: {e}")
+            self.loop.call_later(self.reconnect_delay, self._request_snapshot, symbol)
+            return
+        last_id = int(snapshot['lastUpdateId'])
+        buffer = [event for event in self._buffers[symbol] if int(event['u']) > last_id]
+        if buffer and int(buffer[0]['U']) > last_id + 1:
+            # The snapshot predates the buffered events: fetch a newer one
+            self._buffers[symbol] = buffer
+            self._request_snapshot(symbol)
+            return
+        book.load_snapshot(last_id, snapshot['bids'], snapshot['asks'])
+        self._buffers[symbol] = []
+        self.metrics['snapshots_total'] += 1
+        try:
+            # Buffered events are folded into the segment's starting book
+            for event in buffer:
+                book.apply(int(event['U']), int(event['u']), event['b'], event['a'], time=int(event['E']))
+        except ValueError as e:
+            logger.warning(f"{symbol} depth: {e} in the buffered events, rebuilding the book")
+            self._resync(symbol)
+            return
+        if book.time is not None:
+            self._open_segment(symbol)
+        logger.info(f"{symbol} depth book synced at update {book.last_update_id}")
+
+    # ---- segments --------------------------------------------------------------------------
+
+    def _open_segment(self, symbol, start_ms=None):
+        book = self.books[symbol].snapshot()
+        # Segment files are named by start time: never reuse one
+        book.time = max(int(book.time if start_ms is None else start_ms), self._last_start[symbol] + 1)
+        self.segments[symbol] = DepthSegment(book)
+
+    def _close_segment(self, symbol):
+        segment, self.segments[symbol] = self.segments[symbol], None
+        if segment is None:
+            return
+        self._last_start[symbol] = segment.start_ms
+        if self.writer is not None:
+            self.writer.submit(self._write_segment, symbol, segment)
+        else:
+            self._write_segment(symbol, segment)
+
+    def _write_segment(self, symbol, segment):
+        try:
+            size = self.depth.write_segment(symbol, segment)
+        except Exception as e:
+            logger.error(f"Could not write {symbol} depth segment at {segment.start_ms}: {e}")
+            return
+        self.metrics['segments_written_total'] += 1
+        self.metrics['bytes_written_total'] += size
@@ -1,11 +1,14 @@
 import pandas as pd
 import asyncio
 import threading
+import time
 from datetime import datetime, timedelta
-from binance.client import Client
+from utils.binance_client import AsyncBinanceClient, LazyClientMixin
 from utils.config import Config
 from agents.websocket_agent import WebSocketAgent
-from filelock import FileLock
+from utils.ingest_hub import HubSubscriber, use_hub
+from utils.data_store import get_store
+from utils.instrumentation import instrumented
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 import os
 import logging
@@ -14,30 +17,59 @@ import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-class HistoricalDataAgent:
-    def __init__(self, symbol="BTCUSDT", interval="1h", data_dir="data/raw"):
+KLINE_COLUMNS = [
+    'open_time', 'open', 'high', 'low', 'close', 'volume',
+    'close_time', 'quote_asset_volume', 'number_of_trades',
+    'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
+]
+
+
+def klines_to_df(klines):
+    """
+    Convert raw kline rows from the REST API to the stored OHLCV frame.
+    Args:
+        klines: List of kline rows as returned by /api/v3/klines
+    Returns:
+        pandas.DataFrame with open_time, open, high, low, close, volume
+    """
+    df = pd.DataFrame(klines, columns=KLINE_COLUMNS)
+    df['open_time'] = pd.to_datetime(df['open_time'], unit='ms')
+    numeric_cols = ['open', 'high', 'low', 'close', 'volume']
+    df[numeric_cols] = df[numeric_cols].astype(float)
+    return df[['open_time', 'open', 'high', 'low', 'close', 'volume']]
+
+
+# Concurrent fetches run in batches of this many windows per allowed connection
+FETCH_BATCH_FACTOR = 8
+
+
+class HistoricalDataAgent(LazyClientMixin):
+    def __init__(self, symbol="BTCUSDT", interval="1h", data_dir=None, store=None):
         """
         Initialize HistoricalDataAgent for fetching and updating kline data.
         Args:
             symbol: Trading pair symbol (e.g., "BTCUSDT")
             interval: Kline interval (e.g., "1h", "1d")
-            data_dir: Directory to store data files
+            data_dir: Directory to store data files (default: the store's raw directory)
+            store: DataStore used for file I/O (default: the shared store)
         """
-        self.client = Client(Config.BINANCE_API_KEY, Config.BINANCE_API_SECRET)
+        # self.client is created on the first API call (see LazyClientMixin)
+        self.store = store or get_store()
         self.symbol = symbol
         self.interval = interval
-        self.data_dir = data_dir
-        self.data_file = os.path.join(data_dir, f"{symbol}_{interval}.csv")
+        self.data_dir = data_dir or self.store.raw_dir
+        self.data_file = self.store.path(symbol, interval, directory=self.data_dir)
         self.websocket_agent = None
         self.websocket_thread = None
         self.running = False
-        os.makedirs(data_dir, exist_ok=True)
+        os.makedirs(self.data_dir, exist_ok=True)
 
     @retry(
         stop=stop_after_attempt(5),
         wait=wait_exponential(multiplier=1, min=4, max=60),
         retry=retry_if_exception_type(Exception)
     )
+    @instrumented()
     def fetch_historical_klines(self, start_date, end_date, limit=1000):
         """
         Fetch historical kline data from Binance API.
@@ -56,92 +88,171 @@ class HistoricalDataAgent:
             endTime=int(end_date.timestamp() * 1000),
             limit=limit
         )
-        df = pd.DataFrame(klines, columns=[
-            'open_time', 'open', 'high', 'low', 'close', 'volume',
-            'close_time', 'quote_asset_volume', 'number_of_trades',
-            'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
-        ])
-        df['open_time'] = pd.to_datetime(df['open_time'], unit='ms')
-        numeric_cols = ['open', 'high', 'low', 'close', 'volume']
-        df[numeric_cols] = df[numeric_cols].astype(float)
-        return df[['open_time', 'open', 'high', 'low', 'close', 'volume']]
-
-    def collect_historical_data(self, start_date="2019-01-01"):
+        return klines_to_df(klines)
+
+    @instrumented()
+    def collect_historical_data(self, start_date="2019-01-01", progress=None):
         """
         Collect historical data from start_date to current time and save to CSV.
         Args:
             start_date: Start date for data collection (default: 2019-01-01)
+            progress: Optional callback progress(fraction, message) called after each request
+        """
+        # Chunks are streamed to the file as they arrive (published atomically at the end), so
+        # the full history is never held in memory. Windows are fetched in time order and only
+        # overlap at their boundary bar.
+        last_open = None
+        with self.store.chunk_writer(self.data_file) as writer:
+            for df in self._iter_range(pd.to_datetime(start_date), datetime.utcnow(), progress):
+                df = df.drop_duplicates(subset=['open_time']).sort_values('open_time')
+                if last_open is not None:
+                    df = df[df['open_time'] > last_open]
+                if not df.empty:
+                    writer.write(df)
+                    last_open = df['open_time'].iloc[-1]
+        if writer.rows:
+            logger.info(f"Saved historical data to {self.data_file}")
+
+    @instrumented()
+    def sync_historical_data(self, start_date="2019-01-01", progress=None):
+        """
+        Bring the CSV up to date: a full collection if it does not exist yet, otherwise only the
+        bars from the last stored one onwards are fetched and appended.
+        Args:
+            start_date: Start date used when there is no data file yet
+            progress: Optional callback progress(fraction, message)
+        Returns:
+            Number of bars fetched
+        """
+        if not os.path.exists(self.data_file):
+            self.collect_historical_data(start_date=start_date, progress=progress)
+            return len(self.read_data())
+        last_open = self.read_data()['open_time'].max()
+        all_data = self._fetch_range(last_open, datetime.utcnow(), progress)
+        if not all_data:
+            return 0
+        new_df = pd.concat(all_data).drop_duplicates(subset=['open_time'])
+        self.append_to_csv(new_df)
+        return len(new_df)
+
+    def _fetch_range(self, start_dt, end_dt, progress=None):
+        """Fetch [start_dt, end_dt); returns the list of non-empty chunks in time order (see _iter_range)."""
+        return list(self._iter_range(start_dt, end_dt, progress))
+
+    def _iter_range(self, start_dt, end_dt, progress=None):
+        """
+        Fetch [start_dt, end_dt) in 1000-bar requests, yielding the non-empty chunks in time
+        order as they arrive. With Config.HTTP_CONCURRENCY > 1 the requests run concurrently on
+        the async client, FETCH_BATCH_FACTOR x concurrency windows at a time so only one batch
+        is held in memory; a chunk that fails there is retried through fetch_historical_klines,
+        and the range stops at the first chunk that still fails, as in the sequential path.
         """
-        start_dt = pd.to_datetime(start_date)
-        end_dt = datetime.utcnow()
         interval_map = {"1m": 1, "5m": 5, "15m": 15, "1h": 60, "4h": 240, "1d": 1440}
         interval_minutes = interval_map.get(self.interval, 60)
         step = timedelta(minutes=interval_minutes * 1000)
 
-        all_data = []
+        windows = []
         current_dt = start_dt
         while current_dt < end_dt:
             next_dt = min(current_dt + step, end_dt)
-            try:
-                df = self.fetch_historical_klines(current_dt, next_dt)
+            windows.append((current_dt, next_dt))
+            current_dt = next_dt
+
+        concurrent = Config.HTTP_CONCURRENCY > 1 and len(windows) > 1 and not self._in_event_loop()
+        batch_size = Config.HTTP_CONCURRENCY * FETCH_BATCH_FACTOR if concurrent else len(windows)
+        for batch_start in range(0, len(windows), max(batch_size, 1)):
+            batch = windows[batch_start:batch_start + batch_size]
+            results = [None] * len(batch)
+            if concurrent:
+                try:
+                    results = asyncio.run(self._fetch_windows_async(batch, progress, batch_start, len(windows)))
+                except Exception as e:
+                    logger.warning(f"Concurrent fetch failed, falling back to sequential requests: {e}")
+                    results = [None] * len(batch)
+
+            for (current_dt, next_dt), df in zip(batch, results):
+                if df is None:
+                    try:
+                        df = self.fetch_historical_klines(current_dt, next_dt)
+                    except Exception as e:
+                        logger.error(f"Error fetching data for {current_dt} to {next_dt}: {e}")
+                        return
+                    if progress:
+                        progress((next_dt - start_dt) / (end_dt - start_dt), f"Fetched up to {next_dt:%Y-%m-%d %H:%M}")
                 if not df.empty:
-                    all_data.append(df)
-                current_dt = next_dt
-            except Exception as e:
-                logger.error(f"Error fetching data for {current_dt} to {next_dt}: {e}")
-                break
+                    yield df
 
-        if all_data:
-            full_df = pd.concat(all_data).drop_duplicates(subset=['open_time']).sort_values('open_time')
-            self.save_to_csv(full_df)
-            logger.info(f"Saved historical data to {self.data_file}")
+    async def _fetch_windows_async(self, windows, progress=None, offset=0, total=None):
+        """Fetch all windows concurrently; failed windows come back as None."""
+        requests = [{'symbol': self.symbol, 'interval': self.interval,
+                     'startTime': int(start.timestamp() * 1000), 'endTime': int(end.timestamp() * 1000)}
+                    for start, end in windows]
+        on_done = None
+        if progress:
+            total = total or len(windows)
+
+            def on_done(done, _):
+                progress((offset + done) / total, f"Fetched {offset + done}/{total} requests")
+        async with AsyncBinanceClient(concurrency=Config.HTTP_CONCURRENCY) as client:
+            raw = await client.gather_klines(requests, on_done=on_done)
+        logger.info(f"Fetched {len(windows)} kline requests concurrently for {self.symbol} {self.interval}")
+        return [None if isinstance(klines, BaseException) else klines_to_df(klines) for klines in raw]
+
+    @staticmethod
+    def _in_event_loop():
+        try:
+            asyncio.get_running_loop()
+            return True
+        except RuntimeError:
+            return False
 
     def save_to_csv(self, df):
         """
-        Save DataFrame to CSV with file locking to prevent conflicts.
+        Save DataFrame through the DataStore (atomic, readers never see a partial file; holds the
+        writer lock, so it never interleaves with append_to_csv).
         Args:
             df: DataFrame to save
         """
-        lock = FileLock(f"{self.data_file}.lock")
-        with lock:
-            df.to_csv(self.data_file, index=False)
-            logger.info(f"Data saved to {self.data_file}")
+        self.store.write_path(df, self.data_file)
 
+    @instrumented()
     def append_to_csv(self, df):
         """
-        Append new data to existing CSV with file locking.
+        Merge new data into the existing file. Bars after the last stored one are appended in
+        place; only bars replacing stored ones (e.g. the forming bar stored by a sync, once it
+        closes) rewrite the file. Writers serialize on the store's writer lock; readers keep
+        reading the previous version without waiting.
         Args:
-            df: DataFrame with new data
-        """
-        lock = FileLock(f"{self.data_file}.lock")
-        with lock:
-            if os.path.exists(self.data_file):
-                existing_df = pd.read_csv(self.data_file, parse_dates=['open_time'])
-                combined_df = pd.concat([existing_df, df]).drop_duplicates(subset=['open_time'], keep='last')
-                combined_df = combined_df.sort_values('open_time')
-            else:
-                combined_df = df
-            combined_df.to_csv(self.data_file, index=False)
-            logger.info(f"Appended new data to {self.data_file}")
+            df: DataFrame with new data, in open_time order
+        """
+        self.store.append_rows(df, self.data_file, key='open_time')
+        logger.info(f"Appended new data to {self.data_file}")
 
     def read_data(self):
         """
-        Read data from CSV file.
+        Read data from the kline file.
         Returns:
-            pandas.DataFrame: Data from CSV
+            pandas.DataFrame: Kline data (empty if the file does not exist)
         """
         if os.path.exists(self.data_file):
-            return pd.read_csv(self.data_file, parse_dates=['open_time'])
+            return self.store.read_path(self.data_file)
         return pd.DataFrame(columns=['open_time', 'open', 'high', 'low', 'close', 'volume'])
 
     def start_websocket(self):
         """
-        Start WebSocket to collect real-time kline data.
+        Start WebSocket to collect real-time kline data. When the local ingest hub is running
+        (agents/ingest_hub_agent.py) and this agent uses the store's raw directory, the klines
+        come from the hub instead, which also writes the closed bars, so nothing is appended here.
         """
         if self.websocket_agent and self.running:
             self.stop_websocket()
 
-        self.websocket_agent = WebSocketAgent(self.symbol, self.interval)
+        if os.path.abspath(self.data_dir) == os.path.abspath(self.store.raw_dir) and use_hub():
+            data = self.read_data()
+            since = int(data['open_time'].max().value // 10**6) + 1 if not data.empty else None
+            self.websocket_agent = HubSubscriber(self.symbol, self.interval, since=since)
+        else:
+            self.websocket_agent = WebSocketAgent(self.symbol, self.interval)
         self.running = True
         self.websocket_thread = threading.Thread(
             target=lambda: asyncio.run(self.websocket_agent.connect()),
@@ -149,6 +260,9 @@ class HistoricalDataAgent:
         )
         self.websocket_thread.start()
 
+        if isinstance(self.websocket_agent, HubSubscriber):
+            logger.info("Following real-time updates from the ingest hub")
+            return
         # Start a separate thread to periodically append WebSocket data
         threading.Thread(
             target=self._websocket_data_handler,
@@ -187,7 +301,7 @@ class HistoricalDataAgent:
         Update the trading pair symbol and restart WebSocket if running.
         """
         self.symbol = symbol
-        self.data_file = os.path.join(self.data_dir, f"{self.symbol}_{self.interval}.csv")
+        self.data_file = self.store.path(self.symbol, self.interval, directory=self.data_dir)
         if self.websocket_agent:
             self.stop_websocket()
             self.start_websocket()
@@ -197,7 +311,7 @@ class HistoricalDataAgent:
         Update the interval and restart WebSocket if running.
         """
         self.interval = interval
-        self.data_file = os.path.join(self.data_dir, f"{self.symbol}_{self.interval}.csv")
+        self.data_file = self.store.path(self.symbol, self.interval, directory=self.data_dir)
         if self.websocket_agent:
             self.stop_websocket()
             self.start_websocket()
\ No newline at end of file
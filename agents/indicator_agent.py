@@ -1,75 +1,99 @@
-import pandas as pd
-import talib
-from filelock import FileLock
-import os
+import numpy as np
+from utils.compact import float64_values
+from utils.data_store import get_store
+from utils.dataset import DatasetSession
+from utils.instrumentation import instrumented
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def _talib():
+    """TA-Lib is imported on first indicator calculation, not when the agent module is imported."""
+    import talib
+    return talib
+
+
 class IndicatorAgent:
-    def __init__(self, data_file):
+    def __init__(self, data_file, source="raw", store=None):
         """
-        Initialize IndicatorAgent with a CSV file path.
+        Initialize IndicatorAgent with a CSV file path or a DatasetSession.
         Args:
-            data_file: Path to CSV file with price data
+            data_file: Path to CSV file with price data, or a DatasetSession (no extra file read)
+            source: Session frame to use, 'raw' or 'heikin_ashi' (sessions only)
+            store: DataStore used for file I/O (default: the session's or the shared store)
         """
-        self.data_file = data_file
-        self.df = self.load_from_csv()
-        self.output_dir = "data/processed"
+        self.session = data_file if isinstance(data_file, DatasetSession) else None
+        self.store = store or (self.session.store if self.session else get_store())
+        self.source = source
+        self.data_file = self.session.data_file if self.session else data_file
+        self.df = self.session.frame(source) if self.session else self.load_from_csv()
+        self.output_dir = self.store.processed_dir
+
+    def _close(self):
+        """Close prices as float64 (TA-Lib input); compact float32 closes are restored exactly."""
+        return float64_values(self.df, 'close')
+
+    def _assign(self, **columns):
+        """Add indicator columns to self.df, as float32 when the store keeps compact frames."""
+        for name, values in columns.items():
+            self.df[name] = np.asarray(values, dtype=np.float32) if self.store.compact else values
+
+    def _cached(self, key, compute):
+        """Share indicator results through the session cache when one is attached."""
+        if self.session is None:
+            return compute()
+        return self.session.cached(key + (self.source,), compute)
 
     def load_from_csv(self):
         """
-        Load data from CSV file.
+        Load data through the DataStore (cached until the file changes).
         Returns:
             pandas.DataFrame: Data from CSV
         """
-        lock = FileLock(f"{self.data_file}.lock")
-        with lock:
-            if os.path.exists(self.data_file):
-                df = pd.read_csv(self.data_file, parse_dates=['open_time'])
-                logger.info(f"Loaded data from {self.data_file}")
-                return df
-            raise ValueError(f"No data file found at {self.data_file}")
+        return self.store.read_path(self.data_file)
 
     def save_to_csv(self, df, symbol, interval, suffix="indicators"):
         """
-        Save DataFrame to CSV with file locking.
+        Save DataFrame through the DataStore (atomic; readers never see a partial file).
         Args:
             df: DataFrame to save
             symbol: Trading pair symbol
             interval: Time interval
             suffix: Suffix for output file name
         """
-        os.makedirs(self.output_dir, exist_ok=True)
-        output_file = os.path.join(self.output_dir, f"{symbol}_{interval}_{suffix}.csv")
-        lock = FileLock(f"{output_file}.lock")
-        with lock:
-            df.to_csv(output_file, index=False)
-            logger.info(f"Saved data to {output_file}")
+        if self.session is not None and self.session.partial:
+            logger.info(f"Not saving {suffix} of a time-range session over the full-history file")
+            return
+        self.store.write_path(df, self.store.path(symbol, interval, suffix, directory=self.output_dir))
 
+    @instrumented()
     def calculate_sma(self, length=14, symbol="BTCUSDT", interval="1h"):
         """Calculate Simple Moving Average (SMA) and save to CSV."""
-        self.df['sma'] = talib.SMA(self.df['close'], timeperiod=length)
+        self._assign(sma=self._cached(('sma', length), lambda: _talib().SMA(self._close(), timeperiod=length)))
         self.save_to_csv(self.df, symbol, interval, suffix="indicators")
         return self.df
 
+    @instrumented()
     def calculate_ema(self, length=9, symbol="BTCUSDT", interval="1h"):
         """Calculate Exponential Moving Average (EMA) and save to CSV."""
-        self.df['ema'] = talib.EMA(self.df['close'], timeperiod=length)
+        self._assign(ema=self._cached(('ema', length), lambda: _talib().EMA(self._close(), timeperiod=length)))
         self.save_to_csv(self.df, symbol, interval, suffix="indicators")
         return self.df
 
+    @instrumented()
     def calculate_rsi(self, length=14, symbol="BTCUSDT", interval="1h"):
         """Calculate Relative Strength Index (RSI) and save to CSV."""
-        self.df['rsi'] = talib.RSI(self.df['close'], timeperiod=length)
+        self._assign(rsi=self._cached(('rsi', length), lambda: _talib().RSI(self._close(), timeperiod=length)))
         self.save_to_csv(self.df, symbol, interval, suffix="indicators")
         return self.df
 
+    @instrumented()
     def calculate_macd(self, fast=12, slow=26, signal=9, symbol="BTCUSDT", interval="1h"):
         """Calculate MACD and save to CSV."""
-        self.df['macd'], self.df['macd_signal'], self.df['macd_hist'] = talib.MACD(
-            self.df['close'], fastperiod=fast, slowperiod=slow, signalperiod=signal
-        )
+        macd, macd_signal, macd_hist = self._cached(('macd', fast, slow, signal), lambda: _talib().MACD(
+            self._close(), fastperiod=fast, slowperiod=slow, signalperiod=signal
+        ))
+        self._assign(macd=macd, macd_signal=macd_signal, macd_hist=macd_hist)
         self.save_to_csv(self.df, symbol, interval, suffix="indicators")
         return self.df
\ No newline at end of file
@@ -0,0 +1,363 @@
+import asyncio
+import json
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from agents.websocket_agent import WebSocketAgent
+from agents.historical_data_agent import HistoricalDataAgent
+from utils.data_store import get_store
+from utils.ingest_hub import encode, hub_address, hub_available, start_hub_server
+from utils.kline_cache import closed_bars
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class _Client:
+    """One subscriber connection: a bounded send queue and the pairs it follows."""
+
+    def __init__(self, writer, max_queue):
+        self.writer = writer
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.pairs = set()
+        self.pending = {}  # pair -> live messages held back while its catch-up is read
+        self.dropped = False
+
+    def send(self, pair, data, open_time):
+        if pair in self.pending:
+            self.pending[pair].append((data, open_time))
+        else:
+            self.put(data)
+
+    def put(self, data):
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            # Too slow: drop the connection, the subscriber catches up from the store on reconnect
+            if not self.dropped:
+                self.dropped = True
+                self.writer.close()
+
+
+class IngestHubAgent:
+    """
+    Local ingest hub: the one process holding the Binance kline websockets, so the Streamlit app,
+    `main.py --websocket`, the pipeline daemon and the scanner can follow the same pairs without
+    each opening exchange connections and rewriting the same kline file.
+
+    All streams and subscriber connections live in one event loop thread. Every closed bar is
+    appended to its kline file once, on a single writer thread, and published to the pair's
+    subscribers only after the write; forming bars are published as they arrive. Pairs given at
+    construction are streamed for the hub's lifetime, other pairs from their first subscriber
+    until their last one leaves. The subscriber side is utils.ingest_hub.HubSubscriber.
+    """
+
+    def __init__(self, symbols=(), intervals=(), start_date="2019-01-01", address=None, data_dir=None,
+                 max_queue=10000, sync=True, store=None):
+        """
+        Args:
+            symbols: Symbols streamed for the hub's lifetime
+            intervals: Intervals of those symbols (every symbol runs on every interval)
+            start_date: Start date for the initial historical backfill of missing files
+            address: Unix socket path or host:port (default: Config.INGEST_HUB_ADDRESS)
+            data_dir: Directory of raw kline files (default: the DataStore's raw directory)
+            max_queue: Messages buffered per subscriber before it is disconnected
+            sync: Bring the files of the configured pairs up to date over REST on start
+            store: DataStore the kline files are written to (default: the shared store)
+        """
+        self.pairs = [(symbol.upper(), interval) for symbol in symbols for interval in intervals]
+        self.start_date = start_date
+        self.address = address
+        self.data_dir = data_dir
+        self.max_queue = max_queue
+        self.sync = sync
+        self.store = store or get_store()
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hub-writer")
+        self.stop_event = threading.Event()
+        self.historical_agents = {}
+        self.streams = {}  # pair -> (WebSocketAgent, connect task, pump task, queue)
+        self.subscribers = {}  # pair -> set of _Client
+        self.clients = set()
+        self._draining = set()  # pump tasks of stopped on-demand streams still writing
+        self._handlers = set()  # connection handler tasks
+        self.loop = None
+        self.loop_thread = None
+        self.server = None
+        self._stopped = None
+        self.metrics = {
+            'bars_written_total': 0,
+            'write_failures_total': 0,
+            'messages_published_total': 0,
+            'catchup_bars_total': 0,
+            'subscribers_dropped_total': 0,
+        }
+        self.started_at = None
+
+    # ---- lifecycle -------------------------------------------------------------------------
+
+    def run(self):
+        """Start the hub and block until SIGINT/SIGTERM (or stop())."""
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, getattr(signal, 'SIGTERM', None)):
+                if sig is not None:
+                    signal.signal(sig, lambda signum, frame: self.stop())
+        self.start()
+        try:
+            self.stop_event.wait()
+        finally:
+            self.shutdown()
+
+    def start(self):
+        """
+        Backfill the configured pairs, then listen for subscribers and open the streams.
+        Raises:
+            RuntimeError: If another hub already listens on the address
+        """
+        if hub_available(self.address):
+            raise RuntimeError(f"An ingest hub is already running on {self.address or hub_address()[1]}")
+        self.started_at = time.time()
+        for symbol, interval in self.pairs:
+            agent = self._historical_agent(symbol, interval)
+            try:
+                if self.sync:
+                    agent.sync_historical_data(start_date=self.start_date)
+                elif not os.path.exists(agent.data_file):
+                    agent.collect_historical_data(start_date=self.start_date)
+            except Exception as e:
+                logger.error(f"Backfill failed for {symbol} {interval}: {e}")
+        ready = threading.Event()
+        errors = []
+
+        def loop_main():
+            try:
+                asyncio.run(self._main(ready))
+            except Exception as e:
+                errors.append(e)
+                ready.set()
+
+        self.loop_thread = threading.Thread(target=loop_main, name="ingest-hub", daemon=True)
+        self.loop_thread.start()
+        ready.wait()
+        if errors:
+            raise errors[0]
+        logger.info(f"Ingest hub listening on {self.address or hub_address()[1]} with {len(self.pairs)} pairs")
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def shutdown(self):
+        """Close the subscribers and streams, finish the pending writes, remove the socket file."""
+        logger.info("Shutting down ingest hub...")
+        if self._stopped is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(lambda: self._stopped.done() or self._stopped.set_result(None))
+        if self.loop_thread is not None:
+            self.loop_thread.join(timeout=30)
+        self.writer.shutdown(wait=True)
+        kind, target = hub_address(self.address)
+        if kind == 'unix' and os.path.exists(target):
+            os.unlink(target)
+        logger.info("Ingest hub stopped")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    async def _main(self, ready):
+        self.loop = asyncio.get_running_loop()
+        self._stopped = self.loop.create_future()
+        self.server = await start_hub_server(self._handle_client, self.address)
+        for symbol, interval in self.pairs:
+            self._ensure_stream(symbol, interval)
+        ready.set()
+        await self._stopped
+        self.server.close()
+        for client in list(self.clients):
+            client.writer.close()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        # Streams stop first; their pumps then write the closed bars still queued
+        pumps = [self._stop_stream(pair) for pair in list(self.streams)] + list(self._draining)
+        await asyncio.gather(*pumps, return_exceptions=True)
+        await self.server.wait_closed()
+
+    # ---- upstream --------------------------------------------------------------------------
+
+    def _historical_agent(self, symbol, interval):
+        pair = (symbol, interval)
+        if pair not in self.historical_agents:
+            self.historical_agents[pair] = HistoricalDataAgent(symbol=symbol, interval=interval, data_dir=self.data_dir, store=self.store)
+        return self.historical_agents[pair]
+
+    def _ensure_stream(self, symbol, interval):
+        pair = (symbol, interval)
+        if pair in self.streams:
+            return
+        self._historical_agent(symbol, interval)
+        ws_agent = WebSocketAgent(symbol, interval)
+        queue = asyncio.Queue()
+        ws_agent.add_listener(lambda kline, closed: queue.put_nowait((kline, closed)))
+        connect = asyncio.ensure_future(ws_agent.connect())
+        pump = asyncio.ensure_future(self._pump(pair, queue))
+        self.streams[pair] = (ws_agent, connect, pump, queue)
+        logger.info(f"Ingest hub streaming {symbol} {interval}")
+
+    def _stop_stream(self, pair):
+        """Stop a pair's stream; returns its pump task, done once the queued closed bars are written."""
+        ws_agent, connect, pump, queue = self.streams.pop(pair)
+        ws_agent.stop()
+        connect.cancel()
+        queue.put_nowait(None)
+        logger.info(f"Ingest hub stopped streaming {pair[0]} {pair[1]}")
+        return pump
+
+    async def _pump(self, pair, queue):
+        """Write closed bars (in order, one at a time) and publish every kline of a pair."""
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            kline, closed = item
+            if closed:
+                try:
+                    await self.loop.run_in_executor(self.writer, self._persist, pair, kline)
+                    self.metrics['bars_written_total'] += 1
+                except Exception as e:
+                    logger.error(f"Could not write {pair[0]} {pair[1]} bar {kline['open_time']}: {e}")
+                    self.metrics['write_failures_total'] += 1
+            self._publish(pair, {'symbol': pair[0], 'interval': pair[1], 'kline': kline, 'closed': closed})
+
+    def _persist(self, pair, kline):
+        """Append a closed bar to the pair's kline file in place (the cost of one row, not of the file)."""
+        bar = pd.DataFrame([{
+            'open_time': pd.to_datetime(kline['open_time'], unit='ms'),
+            'open': kline['open'], 'high': kline['high'], 'low': kline['low'],
+            'close': kline['close'], 'volume': kline['volume'],
+        }])
+        # Only the first close after a sync that stored its forming version rewrites the file
+        self.store.append_rows(bar, self.historical_agents[pair].data_file, key='open_time')
+
+    def _publish(self, pair, message):
+        clients = self.subscribers.get(pair)
+        if not clients:
+            return
+        data = encode(message)
+        for client in list(clients):
+            client.send(pair, data, message['kline']['open_time'])
+        self.metrics['messages_published_total'] += len(clients)
+
+    # ---- subscribers -----------------------------------------------------------------------
+
+    async def _handle_client(self, reader, writer):
+        client = _Client(writer, self.max_queue)
+        self.clients.add(client)
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        sender = asyncio.ensure_future(self._send_loop(client))
+        try:
+            while not client.dropped:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    op = request.get('op')
+                    pair = (str(request['symbol']).upper(), str(request['interval']))
+                except (ValueError, KeyError, AttributeError):
+                    client.put(encode({'error': 'Expected {"op": ..., "symbol": ..., "interval": ...}'}))
+                    continue
+                if op == 'subscribe':
+                    await self._subscribe(client, pair, request.get('since'))
+                elif op == 'unsubscribe':
+                    self._unsubscribe(client, pair)
+                else:
+                    client.put(encode({'error': f"Unknown op '{op}'"}))
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            if client.dropped:
+                self.metrics['subscribers_dropped_total'] += 1
+                logger.warning(f"Dropped a slow ingest hub subscriber of {sorted(client.pairs)}")
+            for pair in list(client.pairs):
+                self._unsubscribe(client, pair)
+            self.clients.discard(client)
+            self._handlers.discard(handler)
+            sender.cancel()
+            writer.close()
+
+    async def _send_loop(self, client):
+        try:
+            while True:
+                client.writer.write(await client.queue.get())
+                await client.writer.drain()
+        except (ConnectionError, OSError):
+            client.writer.close()
+
+    async def _subscribe(self, client, pair, since):
+        """Follow a pair: stored bars from `since` first, then the live messages held back meanwhile."""
+        if pair in client.pairs:
+            return
+        client.pairs.add(pair)
+        client.pending[pair] = []
+        self.subscribers.setdefault(pair, set()).add(client)
+        try:
+            self._ensure_stream(*pair)
+        except Exception as e:
+            client.put(encode({'error': f"Cannot stream {pair[0]} {pair[1]}: {e}"}))
+        last = None
+        if since is not None:
+            try:
+                bars = await self.loop.run_in_executor(None, self._catch_up, pair, int(since))
+            except Exception as e:
+                logger.error(f"Catch-up failed for {pair[0]} {pair[1]}: {e}")
+                bars = []
+            for kline in bars:
+                client.put(encode({'symbol': pair[0], 'interval': pair[1], 'kline': kline, 'closed': True, 'catchup': True}))
+            if bars:
+                last = bars[-1]['open_time']
+            self.metrics['catchup_bars_total'] += len(bars)
+        for data, open_time in client.pending.pop(pair, []):
+            # Bars closed during the read are in the file already, and so in the catch-up
+            if last is None or open_time > last:
+                client.put(data)
+
+    def _catch_up(self, pair, since):
+        """Stored closed bars with open_time >= since, as kline dicts (a stored forming candle is left out)."""
+        path = self._historical_agent(*pair).data_file
+        if not os.path.exists(path):
+            return []
+        df = closed_bars(self.store.read_range(path, start=pd.Timestamp(since, unit='ms'), warmup=0), pair[1])
+        open_ms = df['open_time'].to_numpy(dtype='datetime64[ms]').astype('int64')
+        columns = [df[column].to_numpy(dtype='float64') for column in ('open', 'high', 'low', 'close', 'volume')]
+        return [{'open_time': int(t), 'open': float(o), 'high': float(h), 'low': float(l), 'close': float(c),
+                 'volume': float(v), 'event_time': 0} for t, o, h, l, c, v in zip(open_ms, *columns)]
+
+    def _unsubscribe(self, client, pair):
+        client.pairs.discard(pair)
+        client.pending.pop(pair, None)
+        clients = self.subscribers.get(pair)
+        if clients is None:
+            return
+        clients.discard(client)
+        if not clients:
+            del self.subscribers[pair]
+            if pair in self.streams and pair not in self.pairs and not self._stopped.done():
+                pump = self._stop_stream(pair)
+                self._draining.add(pump)
+                pump.add_done_callback(self._draining.discard)
+
+    # ---- health ----------------------------------------------------------------------------
+
+    def health(self):
+        return {
+            'status': 'stopping' if self.stop_event.is_set() else 'ok',
+            'uptime_s': round(time.time() - self.started_at, 1) if self.started_at else 0,
+            'streams': sorted(f"{symbol}_{interval}" for symbol, interval in self.streams),
+            'subscribers': len(self.clients),
+            **self.metrics,
+        }
@@ -0,0 +1,346 @@
+import json
+import math
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.subplots as sp
+from plotly.offline import get_plotlyjs
+from utils.incremental_indicators import IncrementalEMA, IncrementalSMA, IncrementalRSI
+from utils.instrumentation import instrumented
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Trace layout of the live figure; patches address traces by these indices
+CANDLE, FORMING, FAST_EMA, SLOW_EMA, SMA, RSI = range(6)
+
+
+def _clean(value):
+    """JSON-safe float (NaN -> None so plotly.js leaves a gap)."""
+    return None if value is None or (isinstance(value, float) and math.isnan(value)) else value
+
+
+_PLOTLYJS = None
+
+
+def _plotlyjs():
+    """Bundled plotly.js, read once (served locally so the live page works offline)."""
+    global _PLOTLYJS
+    if _PLOTLYJS is None:
+        _PLOTLYJS = get_plotlyjs().encode('utf-8')
+    return _PLOTLYJS
+
+
+def _iso(open_time_ms):
+    return pd.Timestamp(open_time_ms, unit='ms').isoformat()
+
+
+class LiveChartAgent:
+    """
+    Live chart that is built once and then patched per kline.
+
+    Line overlays are WebGL (Scattergl) traces. Each closed bar extends every trace by one point
+    (Plotly.extendTraces) and each forming-bar update restyles a one-candle trace, so the work per
+    update does not depend on how much history is on screen. Overlay values come from incremental
+    indicator state seeded once from history.
+    """
+
+    def __init__(self, symbol="BTCUSDT", interval="1h", fast_length=9, slow_length=21, sma_length=14, rsi_length=14,
+                 max_points=2000, patch_buffer=500):
+        """
+        Args:
+            symbol: Trading pair symbol
+            interval: Kline interval
+            fast_length: Fast EMA period (same as the EMA crossover strategy)
+            slow_length: Slow EMA period
+            sma_length: SMA period
+            rsi_length: RSI period
+            max_points: Bars kept on screen; extendTraces drops older points
+            patch_buffer: Number of recent patches kept for clients catching up
+        """
+        self.symbol = symbol
+        self.interval = interval
+        self.max_points = max_points
+        self.fast_ema = IncrementalEMA(fast_length)
+        self.slow_ema = IncrementalEMA(slow_length)
+        self.sma = IncrementalSMA(sma_length)
+        self.rsi = IncrementalRSI(rsi_length)
+        self.last_open_time = None
+        self.figure = None
+        self.seq = 0
+        self.base_seq = 0  # seq the served figure snapshot corresponds to
+        self.patches = deque(maxlen=patch_buffer)
+        self.condition = threading.Condition()
+
+    @instrumented()
+    def build_figure(self, df):
+        """
+        Seed indicator state from closed-bar history and build the initial figure.
+        Args:
+            df: DataFrame with [open_time, open, high, low, close] of closed bars
+        Returns:
+            Plotly figure object
+        """
+        closes = df['close'].to_numpy(dtype=float)
+        fast = [self.fast_ema.update(c) for c in closes]
+        slow = [self.slow_ema.update(c) for c in closes]
+        sma = [self.sma.update(c) for c in closes]
+        rsi = [self.rsi.update(c) for c in closes]
+        if not df.empty:
+            self.last_open_time = int(pd.Timestamp(df['open_time'].iloc[-1]).value // 10**6)
+
+        view = slice(max(0, len(df) - self.max_points), len(df))
+        tail = df.iloc[view]
+        x = tail['open_time']
+        fig = sp.make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.05, row_heights=[0.75, 0.25],
+                               subplot_titles=[f"{self.symbol} {self.interval} (live)", "RSI"])
+        fig.add_trace(go.Candlestick(x=x, open=tail['open'], high=tail['high'], low=tail['low'], close=tail['close'],
+                                     name="Candlestick"), row=1, col=1)
+        fig.add_trace(go.Candlestick(x=[], open=[], high=[], low=[], close=[], name="Forming bar", opacity=0.6,
+                                     showlegend=False), row=1, col=1)
+        fig.add_trace(go.Scattergl(x=x, y=fast[view], name="Fast EMA", line=dict(color='orange')), row=1, col=1)
+        fig.add_trace(go.Scattergl(x=x, y=slow[view], name="Slow EMA", line=dict(color='blue')), row=1, col=1)
+        fig.add_trace(go.Scattergl(x=x, y=sma[view], name="SMA", line=dict(color='gray')), row=1, col=1)
+        fig.add_trace(go.Scattergl(x=x, y=rsi[view], name="RSI", line=dict(color='purple')), row=2, col=1)
+        fig.update_layout(height=900, showlegend=True, dragmode='zoom', xaxis_rangeslider_visible=False,
+                          uirevision=f"{self.symbol}_{self.interval}")
+        with self.condition:
+            self.figure = fig
+            self.base_seq = self.seq
+        return fig
+
+    @instrumented()
+    def on_kline(self, kline, closed):
+        """
+        WebSocketAgent listener: turn a kline update into a patch and publish it.
+        Args:
+            kline: Dict with open_time (epoch ms), open, high, low, close, volume
+            closed: True if the bar is final
+        Returns:
+            Patch dict (list of plotly.js operations) or None if the kline is stale
+        """
+        if self.last_open_time is not None and kline['open_time'] <= self.last_open_time:
+            return None
+        patch = self._closed_bar_patch(kline) if closed else self._forming_bar_patch(kline)
+        self.publish(patch)
+        return patch
+
+    def _forming_bar_patch(self, kline):
+        t = _iso(kline['open_time'])
+        return [{
+            'op': 'restyle',
+            'indices': [FORMING],
+            'update': {'x': [[t]], 'open': [[kline['open']]], 'high': [[kline['high']]],
+                       'low': [[kline['low']]], 'close': [[kline['close']]]},
+        }]
+
+    def _closed_bar_patch(self, kline):
+        price = kline['close']
+        fast = self.fast_ema.update(price)
+        slow = self.slow_ema.update(price)
+        sma = self.sma.update(price)
+        rsi = self.rsi.update(price)
+        self.last_open_time = kline['open_time']
+        t = _iso(kline['open_time'])
+        return [
+            {'op': 'extend', 'indices': [CANDLE], 'max_points': self.max_points,
+             'update': {'x': [[t]], 'open': [[kline['open']]], 'high': [[kline['high']]],
+                        'low': [[kline['low']]], 'close': [[kline['close']]]}},
+            {'op': 'extend', 'indices': [FAST_EMA, SLOW_EMA, SMA, RSI], 'max_points': self.max_points,
+             'update': {'x': [[t]] * 4, 'y': [[_clean(fast)], [_clean(slow)], [_clean(sma)], [_clean(rsi)]]}},
+            {'op': 'restyle', 'indices': [FORMING],
+             'update': {'x': [[]], 'open': [[]], 'high': [[]], 'low': [[]], 'close': [[]]}},
+        ]
+
+    def publish(self, patch):
+        with self.condition:
+            self.seq += 1
+            self.patches.append((self.seq, patch))
+            # Fold patches into the snapshot before the buffer could drop any a new client needs
+            if self.figure is not None and self.seq - self.base_seq >= self.patches.maxlen // 2:
+                self._rebase()
+            self.condition.notify_all()
+
+    def _rebase(self):
+        """Apply buffered patches to the figure snapshot (amortized: runs every patch_buffer/2 updates)."""
+        extended = {}
+        restyled = {}
+        for seq, patch in self.patches:
+            if seq <= self.base_seq:
+                continue
+            for op in patch:
+                for pos, index in enumerate(op['indices']):
+                    for key, values in op['update'].items():
+                        if op['op'] == 'extend':
+                            extended.setdefault((index, key), []).extend(values[pos])
+                        else:
+                            restyled[(index, key)] = values[pos]
+                            extended.pop((index, key), None)
+        with self.figure.batch_update():
+            for (index, key), values in extended.items():
+                trace = self.figure.data[index]
+                current = getattr(trace, key)
+                merged = (list(current) if current is not None else []) + values
+                setattr(trace, key, merged[-self.max_points:])
+            for (index, key), values in restyled.items():
+                setattr(self.figure.data[index], key, values)
+        self.base_seq = self.seq
+
+    def snapshot(self):
+        """
+        Returns:
+            Tuple (seq, figure JSON) for a newly connecting client
+        """
+        with self.condition:
+            figure = self.figure.to_json() if self.figure is not None else '{"data": [], "layout": {}}'
+            return self.base_seq, figure
+
+    def patches_since(self, seq, timeout=15.0):
+        """
+        Block until patches newer than seq exist (or timeout).
+        Returns:
+            Tuple (latest seq, list of patches); patches is None if seq fell out of the buffer
+            and the client must reload the full figure
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.seq > seq, timeout=timeout)
+            if self.seq <= seq:
+                return seq, []
+            if not self.patches or self.patches[0][0] > seq + 1:
+                return self.seq, None
+            return self.seq, [patch for s, patch in self.patches if s > seq]
+
+
+LIVE_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><script src="/plotly.min.js"></script></head>
+<body style="margin:0"><div id="chart" style="width:100%;height:100vh"></div>
+<script>
+let seq = 0;
+const gd = document.getElementById('chart');
+async function load() {
+  const res = await fetch('/figure');
+  const body = await res.json();
+  seq = body.seq;
+  await Plotly.react(gd, body.figure.data, body.figure.layout, {scrollZoom: true, responsive: true});
+}
+function apply(op) {
+  if (op.op === 'extend') {
+    return Plotly.extendTraces(gd, op.update, op.indices, op.max_points);
+  }
+  return Plotly.restyle(gd, op.update, op.indices);
+}
+function listen() {
+  const source = new EventSource('/events?since=' + seq);
+  source.onmessage = async (event) => {
+    const msg = JSON.parse(event.data);
+    if (msg.reset) { source.close(); await load(); listen(); return; }
+    for (const patch of msg.patches) { for (const op of patch) { await apply(op); } }
+    seq = msg.seq;
+  };
+  source.onerror = () => { source.close(); setTimeout(listen, 2000); };
+}
+load().then(listen);
+</script></body></html>
+"""
+
+
+class LivePatchServer:
+    """
+    Small local HTTP endpoint that serves the live figure once and then streams patches as
+    server-sent events. The browser applies them with Plotly.extendTraces/restyle.
+    """
+
+    def __init__(self, chart_agent, host="127.0.0.1", port=8765):
+        """
+        Args:
+            chart_agent: LiveChartAgent whose figure and patches are served
+            host: Interface to bind (local only by default)
+            port: Port to bind (0 picks a free port)
+        """
+        self.chart_agent = chart_agent
+        self.host = host
+        self.port = port
+        self.httpd = None
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/"
+
+    def _handler(self):
+        chart_agent = self.chart_agent
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, body, content_type):
+                data = body.encode('utf-8') if isinstance(body, str) else body
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == '/':
+                    self._send(LIVE_PAGE, 'text/html; charset=utf-8')
+                elif url.path == '/plotly.min.js':
+                    self._send(_plotlyjs(), 'application/javascript')
+                elif url.path == '/figure':
+                    seq, figure = chart_agent.snapshot()
+                    self._send(f'{{"seq": {seq}, "figure": {figure}}}', 'application/json')
+                elif url.path == '/events':
+                    self._stream(int(parse_qs(url.query).get('since', ['0'])[0]))
+                else:
+                    self.send_error(404)
+
+            def _stream(self, seq):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                try:
+                    while server.httpd is not None:
+                        seq, patches = chart_agent.patches_since(seq)
+                        if patches is None:
+                            message = {'seq': seq, 'reset': True}
+                        elif patches:
+                            message = {'seq': seq, 'patches': patches}
+                        else:
+                            self.wfile.write(b": keepalive\n\n")
+                            self.wfile.flush()
+                            continue
+                        self.wfile.write(f"data: {json.dumps(message)}\n\n".encode('utf-8'))
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler
+
+    def start(self):
+        """Start serving in a daemon thread."""
+        if self.httpd is not None:
+            return self
+        self.httpd = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        logger.info(f"Live chart server running at {self.url}")
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        if self.httpd is not None:
+            httpd, self.httpd = self.httpd, None
+            httpd.shutdown()
+            httpd.server_close()
+            logger.info("Live chart server stopped")
+
@@ -0,0 +1,398 @@
+import asyncio
+import json
+import os
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+from agents.websocket_agent import WebSocketAgent
+from utils.ingest_hub import HubSubscriber, use_hub
+from agents.historical_data_agent import HistoricalDataAgent
+from agents.data_calculation_agent import DataCalculationAgent
+from agents.indicator_agent import IndicatorAgent
+from agents.strategy_agent import StrategyAgent
+from agents.backtest_agent import BacktestAgent
+from strategies.strategy_registry import StrategyRegistry
+from utils.chunked import EmaCrossoverStage, HeikinAshiStage, IndicatorStage
+from utils.config import Config
+from utils.data_store import get_store
+from utils.dataset import DatasetSession
+from utils.instrumentation import instrumented, metrics as instrumentation
+from utils.kline_cache import INTERVAL_MS, closed_bars
+from utils.mtf import make_feature
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def run_pipeline(symbol, interval, data_file, strategy="ema_crossover", session=None):
+    """
+    Heikin Ashi -> indicators -> strategy signals -> backtest for one pair, without chart rendering.
+    All stages share one DatasetSession, so the kline file is read once.
+    Args:
+        session: DatasetSession to run on (default: a new one over data_file)
+    Returns:
+        Dict of backtest metrics (equity curve excluded)
+    """
+    session = session or DatasetSession(symbol, interval, data_file=data_file)
+    DataCalculationAgent(store=session.store).calculate_heikin_ashi(session, symbol, interval)
+    indicator_agent = IndicatorAgent(session)
+    indicator_agent.calculate_sma(symbol=symbol, interval=interval)
+    indicator_agent.calculate_rsi(symbol=symbol, interval=interval)
+    StrategyAgent(session).apply_strategy(strategy, symbol=symbol, interval=interval)
+    results = BacktestAgent(session).run_backtest(strategy=strategy, symbol=symbol, interval=interval)
+    return {k: v for k, v in results.items() if k != 'equity'}
+
+
+class _PairState:
+    """
+    Incremental pipeline state of one pair: the stateful stages (utils.chunked) as of the last
+    processed bar, the open times of the last window bars, and the versions of the derived files
+    as this state last wrote them (if anything else rewrites one, the pair starts over).
+    """
+
+    ARTIFACTS = ('heikin_ashi', 'indicators', 'strategy')
+
+    def __init__(self, store, symbol, interval, strategy, window):
+        self.store = store
+        self.paths = {kind: store.path(symbol, interval, kind, directory=store.processed_dir) for kind in self.ARTIFACTS}
+        self.ha = HeikinAshiStage(compact=store.compact)
+        self.indicators = IndicatorStage(('sma', 'rsi'), compact=store.compact)
+        # Other strategies have no stateful stage: their signals come from the trailing window
+        self.signals = EmaCrossoverStage(compact=store.compact) if strategy.lower() == "ema_crossover" else None
+        self.times = deque(maxlen=window)
+        # Higher-timeframe features may be resampled from the window itself (utils.mtf): warm it
+        # up by WARMUP_BARS bars of the longest feature interval
+        features = [make_feature(spec) for spec in getattr(StrategyRegistry.get_strategy(strategy), 'mtf_features', ())]
+        self.warmup = Config.WARMUP_BARS * max([INTERVAL_MS[f.interval] // INTERVAL_MS[interval] for f in features] or [1])
+        self.last_time = None
+        self.versions = {}
+        self.results = None
+
+    def advance(self, bars):
+        """
+        Run the stages over the bars after last_time.
+        Returns:
+            (heikin_ashi, indicators, signals) frames of the bars; signals is None without a strategy stage
+        """
+        ha = self.ha.process(bars)
+        indicators = self.indicators.process(bars)
+        signals = self.signals.process(bars) if self.signals is not None else None
+        self.times.extend(bars['open_time'].iloc[-self.times.maxlen:])
+        self.last_time = bars['open_time'].iloc[-1]
+        return ha, indicators, signals
+
+    def append(self, ha, indicators, signals):
+        """Append the derived rows of new bars to the pair's files."""
+        if self.signals is not None and not self.store.compact:
+            # as StrategyAgent: the position lists as of this run on every row it writes
+            signals['open_positions'] = [list(self.signals.positions.keys()) for _ in range(len(signals))]
+            signals['completed_positions'] = [self.signals.completed_positions.copy() for _ in range(len(signals))]
+        for kind, df in zip(self.ARTIFACTS, (ha, indicators, signals)):
+            if len(df):
+                self.store.append_rows(df, self.paths[kind])
+
+    def mark_written(self):
+        self.versions = {kind: self._version(path) for kind, path in self.paths.items()}
+
+    def current(self):
+        """True while the derived files are the versions this state wrote."""
+        return all(self._version(path) == self.versions.get(kind) for kind, path in self.paths.items())
+
+    @staticmethod
+    def _version(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+
+class PipelineAgent:
+    """
+    Long-running ingest -> Heikin Ashi -> indicators -> strategy -> backtest-metrics pipeline.
+
+    One event loop thread holds the WebSocket connections for all configured pairs (or the
+    subscriptions at the local ingest hub when it runs). Each closed bar is appended to the
+    pair's CSV (by the hub, if used) and schedules one pipeline run on a bounded worker pool;
+    bars arriving while a run is queued or in progress are coalesced into a single follow-up run.
+    Only a pair's first run goes over its whole history; later runs carry the stage state
+    forward from the new bars and backtest a trailing window (see process).
+    Nothing polls: the main thread waits on a stop event that SIGINT/SIGTERM set.
+    """
+
+    def __init__(self, symbols, intervals, start_date="2019-01-01", strategy="ema_crossover", max_workers=2,
+                 health_host="127.0.0.1", health_port=8787, data_dir=None, window_bars=None):
+        """
+        Args:
+            symbols: List of trading pair symbols
+            intervals: List of kline intervals (every symbol runs on every interval)
+            start_date: Start date for the initial historical backfill of missing files
+            strategy: Strategy name used for signals and backtest metrics
+            max_workers: Size of the pipeline worker pool
+            health_host: Interface for the health/metrics endpoint
+            health_port: Port for the health/metrics endpoint (None disables it)
+            data_dir: Directory of raw kline files (default: the DataStore's raw directory)
+            window_bars: Bars of the per-bar trailing-window backtest (default: Config.PIPELINE_WINDOW_BARS)
+        """
+        self.pairs = [(symbol, interval) for symbol in symbols for interval in intervals]
+        self.start_date = start_date
+        self.strategy = strategy
+        self.data_dir = data_dir
+        self.window_bars = window_bars or Config.PIPELINE_WINDOW_BARS
+        self.health_host = health_host
+        self.health_port = health_port
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline")
+        self.stop_event = threading.Event()
+        self.historical_agents = {}
+        self.websocket_agents = {}
+        self.loop = None
+        self.loop_thread = None
+        self.httpd = None
+        self._state_lock = threading.Lock()
+        self._scheduled = set()  # pairs with a run queued or in progress
+        self._dirty = set()  # pairs that received bars while a run was in progress
+        self._states = {}  # (symbol, interval) -> _PairState, touched only by the pair's (single) run
+        self.metrics = {
+            'bars_ingested_total': 0,
+            'pipeline_runs_total': 0,
+            'pipeline_failures_total': 0,
+            'pipeline_runs_coalesced_total': 0,
+        }
+        self.pair_status = {f"{s}_{i}": {'last_bar': None, 'last_run': None, 'last_duration_s': None,
+                                         'last_error': None, 'metrics': None} for s, i in self.pairs}
+        self.started_at = None
+
+    # ---- lifecycle -------------------------------------------------------------------------
+
+    def run(self):
+        """Start the daemon and block until SIGINT/SIGTERM (or stop())."""
+        self._install_signal_handlers()
+        self.start()
+        try:
+            self.stop_event.wait()
+        finally:
+            self.shutdown()
+
+    def start(self):
+        self.started_at = time.time()
+        for symbol, interval in self.pairs:
+            agent = HistoricalDataAgent(symbol=symbol, interval=interval, data_dir=self.data_dir)
+            self.historical_agents[(symbol, interval)] = agent
+            if not os.path.exists(agent.data_file):
+                logger.info(f"Backfilling {symbol} {interval} from {self.start_date}")
+                agent.collect_historical_data(start_date=self.start_date)
+            self.schedule(symbol, interval)
+        self._start_streams()
+        if self.health_port is not None:
+            self._start_health_server()
+        logger.info(f"Pipeline daemon running for {len(self.pairs)} pairs")
+
+    def stop(self):
+        self.stop_event.set()
+
+    def shutdown(self):
+        """Stop streams, let in-flight pipeline runs finish, close the health endpoint."""
+        logger.info("Shutting down pipeline daemon...")
+        for ws_agent in self.websocket_agents.values():
+            ws_agent.stop()
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(lambda: [task.cancel() for task in asyncio.all_tasks(self.loop)])
+        if self.loop_thread is not None:
+            self.loop_thread.join(timeout=10)
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+        logger.info("Pipeline daemon stopped")
+
+    def _install_signal_handlers(self):
+        if threading.current_thread() is not threading.main_thread():
+            return
+        for sig in (signal.SIGINT, getattr(signal, 'SIGTERM', None)):
+            if sig is not None:
+                signal.signal(sig, lambda signum, frame: self.stop())
+
+    # ---- ingest ----------------------------------------------------------------------------
+
+    def _start_streams(self):
+        # With the ingest hub running, the hub holds the connections and writes the closed bars
+        hub = self.data_dir is None and use_hub()
+        for symbol, interval in self.pairs:
+            ws_agent = HubSubscriber(symbol, interval) if hub else WebSocketAgent(symbol, interval)
+            ws_agent.add_listener(lambda kline, closed, s=symbol, i=interval: closed and self.on_closed_bar(s, i, kline))
+            self.websocket_agents[(symbol, interval)] = ws_agent
+
+        async def run_all():
+            await asyncio.gather(*(agent.connect() for agent in self.websocket_agents.values()), return_exceptions=True)
+
+        def loop_main():
+            self.loop = asyncio.new_event_loop()
+            try:
+                self.loop.run_until_complete(run_all())
+            except asyncio.CancelledError:
+                pass
+            finally:
+                self.loop.close()
+
+        self.loop_thread = threading.Thread(target=loop_main, name="pipeline-streams", daemon=True)
+        self.loop_thread.start()
+
+    def on_closed_bar(self, symbol, interval, kline):
+        """Persist a closed bar (unless the ingest hub already did) and trigger the pipeline for its pair."""
+        bar = pd.DataFrame([{
+            'open_time': pd.to_datetime(kline['open_time'], unit='ms'),
+            'open': kline['open'], 'high': kline['high'], 'low': kline['low'],
+            'close': kline['close'], 'volume': kline['volume'],
+        }])
+        if not isinstance(self.websocket_agents.get((symbol, interval)), HubSubscriber):
+            self.historical_agents[(symbol, interval)].append_to_csv(bar)
+        with self._state_lock:
+            self.metrics['bars_ingested_total'] += 1
+            self.pair_status[f"{symbol}_{interval}"]['last_bar'] = str(bar['open_time'].iloc[0])
+        self.schedule(symbol, interval)
+
+    # ---- processing ------------------------------------------------------------------------
+
+    def schedule(self, symbol, interval):
+        """Queue one pipeline run for a pair, coalescing with a queued or running one."""
+        pair = (symbol, interval)
+        with self._state_lock:
+            if pair in self._scheduled:
+                self._dirty.add(pair)
+                self.metrics['pipeline_runs_coalesced_total'] += 1
+                return
+            self._scheduled.add(pair)
+        if self.stop_event.is_set():
+            return
+        self.executor.submit(self._run_pair, symbol, interval)
+
+    def _run_pair(self, symbol, interval):
+        pair = (symbol, interval)
+        status = self.pair_status[f"{symbol}_{interval}"]
+        started = time.perf_counter()
+        try:
+            metrics = self.process(symbol, interval)
+            with self._state_lock:
+                self.metrics['pipeline_runs_total'] += 1
+                status.update(last_run=time.time(), last_duration_s=round(time.perf_counter() - started, 3),
+                              last_error=None, metrics=metrics)
+        except Exception as e:
+            logger.error(f"Pipeline failed for {symbol} {interval}: {e}")
+            with self._state_lock:
+                self.metrics['pipeline_failures_total'] += 1
+                status.update(last_run=time.time(), last_error=str(e))
+        finally:
+            with self._state_lock:
+                self._scheduled.discard(pair)
+                rerun = pair in self._dirty
+                self._dirty.discard(pair)
+            if rerun:
+                self.schedule(symbol, interval)
+
+    @instrumented()
+    def process(self, symbol, interval):
+        """
+        Run every stage for one pair, on closed bars only. The first run (and a run after a
+        derived file was rewritten elsewhere) goes over the whole file on a single shared dataset
+        read and seeds the pair's stage state. Later runs read only the bars after the last
+        processed one (through the file's time index, which appends only extend), advance the
+        stages by them, append the results to the derived files and backtest the trailing
+        window_bars bars (after Config.WARMUP_BARS warm-up bars, of the strategy's longest feature
+        interval when it has higher-timeframe features), so the cost of a closed bar does
+        not grow with the history. The full-history backtest file is only written by a full run.
+        Returns:
+            Dict of backtest metrics (equity curve excluded; of the trailing window after the first run)
+        """
+        data_file = self.historical_agents[(symbol, interval)].data_file
+        state = self._states.get((symbol, interval))
+        if state is None or not state.current():
+            return self._full_run(symbol, interval, data_file)
+        bars = state.store.read_range(data_file, start=state.last_time + pd.Timedelta(milliseconds=1), warmup=0)
+        # a forming bar is processed once it has closed (it is then stored again, closed)
+        bars = closed_bars(bars, interval)
+        if bars.empty:
+            return state.results
+        previous = state.last_time
+        ha, indicators, signals = state.advance(bars)
+        window = DatasetSession(symbol, interval, data_file=data_file, store=state.store,
+                                start=state.times[0], end=state.last_time, warmup=state.warmup)
+        if signals is None:
+            signals = StrategyAgent(window).apply_strategy(self.strategy, symbol=symbol, interval=interval)
+            signals = signals[signals['open_time'] > previous]
+        state.append(ha, indicators, signals)
+        state.mark_written()
+        results = BacktestAgent(window).run_backtest(strategy=self.strategy, symbol=symbol, interval=interval, save=False)
+        state.results = {k: v for k, v in results.items() if k != 'equity'}
+        state.results['window_start'] = str(state.times[0])
+        return state.results
+
+    def _full_run(self, symbol, interval, data_file):
+        """
+        run_pipeline over the closed bars of the whole file, then the pair's stage state from the
+        same read. A sync stores the forming bar too: it is left to the run after it closes.
+        """
+        store = get_store()
+        session = DatasetSession(symbol, interval, data_file=data_file, df=closed_bars(store.read_path(data_file), interval), store=store)
+        results = run_pipeline(symbol, interval, data_file, self.strategy, session=session)
+        state = _PairState(session.store, symbol, interval, self.strategy, self.window_bars)
+        state.advance(session.df)
+        state.mark_written()
+        state.results = results
+        self._states[(symbol, interval)] = state
+        return results
+
+    # ---- health / metrics ------------------------------------------------------------------
+
+    def health(self):
+        with self._state_lock:
+            return {
+                'status': 'stopping' if self.stop_event.is_set() else 'ok',
+                'uptime_s': round(time.time() - self.started_at, 1) if self.started_at else 0,
+                'pairs': json.loads(json.dumps(self.pair_status, default=str)),
+                'queued': len(self._scheduled),
+                **self.metrics,
+            }
+
+    def prometheus_metrics(self):
+        with self._state_lock:
+            lines = []
+            for name, value in self.metrics.items():
+                lines.append(f"# TYPE atm_{name} counter")
+                lines.append(f"atm_{name} {value}")
+            lines.append("# TYPE atm_pipeline_last_duration_seconds gauge")
+            for pair, status in self.pair_status.items():
+                if status['last_duration_s'] is not None:
+                    lines.append(f'atm_pipeline_last_duration_seconds{{pair="{pair}"}} {status["last_duration_s"]}')
+        return "\n".join(lines) + "\n" + instrumentation.to_prometheus()
+
+    def _start_health_server(self):
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == '/health':
+                    body, content_type = json.dumps(daemon.health()), 'application/json'
+                elif self.path == '/metrics':
+                    body, content_type = daemon.prometheus_metrics(), 'text/plain; version=0.0.4'
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer((self.health_host, self.health_port), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, name="pipeline-health", daemon=True).start()
+        logger.info(f"Health endpoint at http://{self.health_host}:{self.httpd.server_address[1]}/health")
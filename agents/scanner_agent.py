@@ -0,0 +1,149 @@
+import asyncio
+import os
+import threading
+import time
+import pandas as pd
+from utils.ingest_hub import kline_stream
+from utils.compact import float64_values
+from utils.data_store import get_store
+from utils.instrumentation import instrumented
+from utils.kline_cache import INTERVAL_MS, closed_bars
+from utils.scanner import PanelScanner
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class ScannerAgent:
+    """
+    Signal scanner over many symbols at once: the latest `bars` closes of every symbol's kline
+    file go into one aligned (symbol x time) panel and the registered scan conditions
+    (utils.scanner) are evaluated for all symbols together. With start(), closed bars from the
+    kline streams update the scan incrementally and listeners receive the new ranked triggers.
+    """
+
+    def __init__(self, symbols, interval="1h", bars=500, conditions=('ema_crossover', 'rsi_extreme'), store=None):
+        """
+        Args:
+            symbols: Trading pair symbols
+            interval: Kline interval (a fixed-length one, e.g. 1m..1d)
+            bars: Panel width in bars
+            conditions: Condition names or (name, params) pairs, e.g. ('ema_crossover', {'fast_length': 12})
+            store: DataStore the kline files are read from (default: the shared store)
+        """
+        if interval not in INTERVAL_MS:
+            raise ValueError(f"Interval '{interval}' is not supported by the scanner (use one of {', '.join(INTERVAL_MS)})")
+        self.symbols = list(symbols)
+        self.interval = interval
+        self.bars = bars
+        self.conditions = conditions
+        self.store = store or get_store()
+        self.scanner = None
+        self.triggers = None
+        self.last_update_ms = None
+        self.listeners = []
+        self.websocket_agents = {}
+        self.loop = None
+        self.loop_thread = None
+        self._lock = threading.Lock()
+
+    @instrumented()
+    def load(self):
+        """
+        Build the panel from the closed bars of the stored kline files (symbols without a file are
+        skipped). A forming candle stored by a sync is left out: its close arrives from the stream.
+        Returns:
+            pandas.DataFrame of the ranked current triggers (see PanelScanner.scan)
+        """
+        frames = {}
+        for symbol in self.symbols:
+            path = self.store.path(symbol, self.interval)
+            if not os.path.exists(path):
+                logger.warning(f"No data file for {symbol} {self.interval}, not scanned")
+                continue
+            df = closed_bars(self.store.read_path(path), self.interval).tail(self.bars)
+            frames[symbol] = pd.DataFrame({'open_time': df['open_time'], 'close': float64_values(df, 'close')})
+        with self._lock:
+            self.scanner = PanelScanner.from_frames(frames, INTERVAL_MS[self.interval], self.bars, self.conditions)
+            self.triggers = self.scanner.scan()
+        logger.info(f"Scanner loaded {len(frames)} symbols x {self.bars} bars at {self.interval}")
+        return self.triggers
+
+    def scan(self, max_age_bars=0):
+        """Ranked current triggers (see PanelScanner.scan)."""
+        if self.scanner is None:
+            self.load()
+        with self._lock:
+            return self.scanner.scan(max_age_bars)
+
+    def add_listener(self, callback):
+        """
+        Register a callback for scan updates.
+        Args:
+            callback: Callable taking (triggers, symbol) after every closed bar that changed the scan
+        """
+        if callback not in self.listeners:
+            self.listeners.append(callback)
+
+    def on_closed_bar(self, symbol, kline):
+        """
+        Update the panel with one closed bar and rescan.
+        Args:
+            symbol: Trading pair symbol
+            kline: Dict with open_time (epoch ms) and close, as passed to WebSocketAgent listeners
+        Returns:
+            The ranked triggers, or None if the bar did not change the panel
+        """
+        started = time.perf_counter()
+        with self._lock:
+            if not self.scanner.update(symbol, int(kline['open_time']), float(kline['close'])):
+                return None
+            self.triggers = self.scanner.scan()
+            triggers = self.triggers
+        self.last_update_ms = (time.perf_counter() - started) * 1000
+        for callback in list(self.listeners):
+            try:
+                callback(triggers, symbol)
+            except Exception as e:
+                logger.error(f"Scanner listener error: {e}")
+        return triggers
+
+    def start(self):
+        """Load the panel and follow the kline streams of all symbols in one event loop thread."""
+        if self.scanner is None:
+            self.load()
+        for symbol in self.scanner.symbols:
+            # Through the ingest hub, bars closed since the panel was loaded are replayed first
+            last_time = int(self.scanner.last_time[self.scanner.rows[symbol]])
+            ws_agent = kline_stream(symbol, self.interval, since=last_time + 1 if last_time >= 0 else None)
+            ws_agent.add_listener(lambda kline, closed, s=symbol: closed and self.on_closed_bar(s, kline))
+            self.websocket_agents[symbol] = ws_agent
+
+        async def run_all():
+            await asyncio.gather(*(agent.connect() for agent in self.websocket_agents.values()), return_exceptions=True)
+
+        def loop_main():
+            self.loop = asyncio.new_event_loop()
+            try:
+                self.loop.run_until_complete(run_all())
+            except asyncio.CancelledError:
+                pass
+            finally:
+                self.loop.close()
+
+        self.loop_thread = threading.Thread(target=loop_main, name="scanner-streams", daemon=True)
+        self.loop_thread.start()
+        logger.info(f"Scanner following {len(self.websocket_agents)} streams")
+
+    def stop(self):
+        """Stop the streams."""
+        for ws_agent in self.websocket_agents.values():
+            ws_agent.stop()
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(lambda: [task.cancel() for task in asyncio.all_tasks(self.loop)])
+        if self.loop_thread is not None:
+            self.loop_thread.join(timeout=10)
+        self.websocket_agents = {}
+        self.loop_thread = None
+        logger.info("Scanner stopped")
@@ -1,65 +1,96 @@
-import pandas as pd
-import numpy as np
 from strategies.strategy_registry import StrategyRegistry
-from filelock import FileLock
-import os
+from utils.chunked import EmaCrossoverStage, HeikinAshiStage
+from utils.data_store import get_store
+from utils.dataset import DatasetSession
+from utils.instrumentation import instrumented
+from utils.mtf import MultiTimeframeEngine
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class StrategyAgent:
-    def __init__(self, data_file):
+    def __init__(self, data_file, store=None):
         """
-        Initialize StrategyAgent with a CSV file path.
+        Initialize StrategyAgent with a CSV file path or a DatasetSession.
         Args:
-            data_file: Path to CSV file with price data
+            data_file: Path to CSV file with price data, or a DatasetSession (no extra file read)
+            store: DataStore used for file I/O (default: the session's or the shared store)
         """
-        self.data_file = data_file
-        self.df = self.load_from_csv()
+        self.session = data_file if isinstance(data_file, DatasetSession) else None
+        self.store = store or (self.session.store if self.session else get_store())
+        self.data_file = self.session.data_file if self.session else data_file
+        self.df = self.session.df if self.session else self.load_from_csv()
         self.positions = {}  # Store open positions: {entry_id: (quantity, entry_price)}
         self.completed_positions = []  # Store completed positions: [(entry_id, quantity, entry_price, exit_price, profit_loss)]
-        self.output_dir = "data/processed"
+        self.output_dir = self.store.processed_dir
 
-    def load_from_csv(self):
+    def load_from_csv(self, data_file=None):
         """
-        Load data from CSV file.
+        Load data through the DataStore (cached until the file changes).
+        Args:
+            data_file: Path to CSV file (default: self.data_file)
         Returns:
             pandas.DataFrame: Data from CSV
         """
-        lock = FileLock(f"{self.data_file}.lock")
-        with lock:
-            if os.path.exists(self.data_file):
-                df = pd.read_csv(self.data_file, parse_dates=['open_time'])
-                logger.info(f"Loaded data from {self.data_file}")
-                return df
-            raise ValueError(f"No data file found at {self.data_file}")
+        data_file = data_file or self.data_file
+        return self.store.read_path(data_file)
 
     def save_to_csv(self, df, symbol, interval, suffix="strategy"):
         """
-        Save DataFrame to CSV with file locking.
+        Save DataFrame through the DataStore (atomic; readers never see a partial file).
         Args:
             df: DataFrame to save
             symbol: Trading pair symbol
             interval: Time interval
             suffix: Suffix for output file name
         """
-        os.makedirs(self.output_dir, exist_ok=True)
-        output_file = os.path.join(self.output_dir, f"{symbol}_{interval}_{suffix}.csv")
-        lock = FileLock(f"{output_file}.lock")
-        with lock:
-            df.to_csv(output_file, index=False)
-            logger.info(f"Saved data to {output_file}")
+        if self.session is not None and self.session.partial:
+            logger.info(f"Not saving {suffix} of a time-range session over the full-history file")
+            return
+        self.store.write_path(df, self.store.path(symbol, interval, suffix, directory=self.output_dir))
 
+    @instrumented()
     def apply_strategy(self, strategy_name, symbol="BTCUSDT", interval="1h", **kwargs):
         """Apply the specified strategy and save results to CSV."""
         if strategy_name.lower() == "ema_crossover":
-            calc_df = self.ema_crossover_strategy(**kwargs)
-            self.save_to_csv(calc_df, symbol, interval, suffix="strategy")
-            return calc_df
+            # ema_crossover_strategy saves the result itself; pass the pair so it is written once,
+            # to this pair's file (not the BTCUSDT_1h default)
+            return self.ema_crossover_strategy(symbol=symbol, interval=interval, **kwargs)
+        if strategy_name.lower() in StrategyRegistry.names():
+            return self.registered_strategy(strategy_name, symbol=symbol, interval=interval, **kwargs)
+        raise ValueError(f"Strategy '{strategy_name}' not supported.")
+
+    @instrumented()
+    def registered_strategy(self, strategy_name, symbol="BTCUSDT", interval="1h", **params):
+        """
+        Signals of a registered strategy class through its calculate_signals. The frame it receives
+        has the klines plus the multi-timeframe features the class declares (mtf_features), aligned
+        without look-ahead (see utils.mtf).
+        Args:
+            strategy_name: Name in the StrategyRegistry
+            symbol: Trading pair symbol
+            interval: Time interval of the data
+            params: Strategy parameters overriding the class defaults
+        Returns:
+            DataFrame with strategy signals
+        """
+        strategy_class = StrategyRegistry.get_strategy(strategy_name)
+
+        def compute():
+            features = getattr(strategy_class, 'mtf_features', ())
+            source = self.session if self.session is not None else self.df
+            df = MultiTimeframeEngine(symbol, interval, features, store=self.store).align(source) if features \
+                else self.df.copy(deep=False)
+            return strategy_class.signals(df, **params)
+        if self.session is not None:
+            calc_df = self.session.cached((strategy_name.lower(), symbol, interval, tuple(sorted(params.items()))), compute)
         else:
-            raise ValueError(f"Strategy '{strategy_name}' not supported.")
+            calc_df = compute()
+        self.save_to_csv(calc_df, symbol, interval, suffix="strategy")
+        return calc_df
 
+    @instrumented()
     def ema_crossover_strategy(self, fast_length=9, slow_length=21, use_ha_df=False, ha_file=None, symbol="BTCUSDT", interval="1h"):
         """
         EMA crossover strategy with FIFO and profit/loss tracking.
@@ -67,52 +98,42 @@ class StrategyAgent:
             fast_length: Period for fast EMA
             slow_length: Period for slow EMA
             use_ha_df: If True, use ha_df for calculations
-            ha_file: Path to Heikin Ashi CSV file (optional)
+            ha_file: Path to Heikin Ashi CSV file (optional; default: computed from the klines)
             symbol: Trading pair symbol
             interval: Time interval
         Returns:
             DataFrame with strategy signals and position details
         """
-        calc_df = self.load_from_csv() if not use_ha_df else self.load_from_csv(ha_file)
-        calc_df['fast_ema'] = calc_df['close' if not use_ha_df else 'ha_close'].ewm(span=fast_length, adjust=False).mean()
-        calc_df['slow_ema'] = calc_df['close' if not use_ha_df else 'ha_close'].ewm(span=slow_length, adjust=False).mean()
-        calc_df['signal'] = 0
-        calc_df['signal'] = np.where(calc_df['fast_ema'] > calc_df['slow_ema'], 1, np.where(calc_df['fast_ema'] < calc_df['slow_ema'], -1, 0))
-        calc_df['position_change'] = calc_df['signal'].diff().fillna(0)
-        calc_df['position'] = 0  # Initialize position column
-        calc_df['entry_id'] = None  # New column to store entry IDs
-
-        entry_id_counter = 1
-        for index, row in calc_df.iterrows():
-            if row['position_change'] == 2:  # Buy signal
-                entry_id = f"#{entry_id_counter:06d}"
-                entry_price = row['close' if not use_ha_df else 'ha_close']
-                self.positions[entry_id] = (100, entry_price)  # Default quantity of 100
-                calc_df.loc[index, 'position'] = 1  # Mark as open long position
-                calc_df.loc[index, 'entry_id'] = entry_id  # Store entry ID
-                entry_id_counter += 1
-            elif row['position_change'] == -2:  # Sell signal
-                if self.positions:
-                    total_exit_quantity = 100  # Default exit quantity
-                    remaining_exit = total_exit_quantity
-                    while remaining_exit > 0 and self.positions:
-                        earliest_entry_id = min(self.positions.keys())
-                        quantity, entry_price = self.positions[earliest_entry_id]
-                        exit_quantity = min(remaining_exit, quantity)
-                        exit_price = row['close' if not use_ha_df else 'ha_close']
-                        profit_loss = exit_quantity * (exit_price - entry_price)
-                        self.completed_positions.append((earliest_entry_id, exit_quantity, entry_price, exit_price, profit_loss))
-                        calc_df.loc[index, 'position'] = -1  # Mark as exit
-                        calc_df.loc[index, 'entry_id'] = earliest_entry_id  # Use exiting entry ID
-                        if quantity == exit_quantity:
-                            del self.positions[earliest_entry_id]
-                        else:
-                            self.positions[earliest_entry_id] = (quantity - exit_quantity, entry_price)
-                            new_id = f"{earliest_entry_id}a"
-                            self.positions[new_id] = (quantity - exit_quantity, entry_price)
-                        remaining_exit -= exit_quantity
+        if self.session is not None:
+            key = ('ema_crossover', fast_length, slow_length, use_ha_df)
+            calc_df, positions, completed = self.session.cached(key, lambda: self._ema_crossover(fast_length, slow_length, use_ha_df, ha_file))
+            self.positions, self.completed_positions = dict(positions), list(completed)
+        else:
+            calc_df, self.positions, self.completed_positions = self._ema_crossover(fast_length, slow_length, use_ha_df, ha_file)
+        self.save_to_csv(calc_df, symbol, interval, suffix="strategy")
+        return calc_df
 
+    def _ema_crossover(self, fast_length, slow_length, use_ha_df, ha_file):
+        """Compute EMA crossover signals; returns (calc_df, open positions, completed positions)."""
+        if self.session is not None:
+            calc_df = self.session.frame('heikin_ashi' if use_ha_df else 'raw')
+        else:
+            if not use_ha_df:
+                # shallow copy: only new columns are written, the base columns are shared
+                calc_df = self.df.copy(deep=False)
+            elif ha_file is not None:
+                calc_df = self.load_from_csv(ha_file)
+            else:
+                # no precomputed file: Heikin Ashi of self.df, as a session computes it
+                calc_df = HeikinAshiStage(compact=self.store.compact).process(self.df)
+        stage = EmaCrossoverStage(fast_length, slow_length, price_col='close' if not use_ha_df else 'ha_close',
+                                  positions=self.positions, completed_positions=self.completed_positions, compact=self.store.compact)
+        calc_df = stage.process(calc_df)
+        # Work on the stage's copies so position snapshots cached on a session are never mutated afterwards
+        self.positions, self.completed_positions = stage.positions, stage.completed_positions
+        if self.store.compact:
+            # the position lists are kept once on the agent instead of a copy per row
+            return calc_df, self.positions, self.completed_positions
         calc_df['open_positions'] = [list(self.positions.keys()) if self.positions else [] for _ in range(len(calc_df))]
         calc_df['completed_positions'] = [self.completed_positions.copy() for _ in range(len(calc_df))]
-        self.save_to_csv(calc_df, symbol, interval, suffix="strategy")
-        return calc_df
\ No newline at end of file
+        return calc_df, self.positions, self.completed_positions
\ No newline at end of file
@@ -0,0 +1,331 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import websockets
+from utils.bar_builders import BarBuilder, bar_interval
+from utils.binance_client import LazyClientMixin
+from utils.config import Config
+from utils.data_store import get_store
+from utils.instrumentation import instrumented
+from utils.trade_store import DAY_MS, TradeStore, empty_trades
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Trades buffered in memory before they are written to the trade store during a backfill
+BACKFILL_FLUSH_TRADES = 100_000
+# /api/v3/aggTrades only accepts startTime/endTime less than an hour apart
+HOUR_MS = 3_600_000
+
+
+def agg_trades_to_df(rows):
+    """
+    Convert aggTrades rows (REST: a, p, q, T, m keys; the @aggTrade stream uses the same keys)
+    to the stored trades frame.
+    Args:
+        rows: List of aggregate trade dicts
+    Returns:
+        pandas.DataFrame with id, time, price, qty, buyer_maker
+    """
+    if not rows:
+        return empty_trades()
+    return pd.DataFrame({
+        'id': np.fromiter((row['a'] for row in rows), dtype=np.int64, count=len(rows)),
+        'time': np.fromiter((row['T'] for row in rows), dtype=np.int64, count=len(rows)),
+        'price': np.fromiter((float(row['p']) for row in rows), dtype=np.float64, count=len(rows)),
+        'qty': np.fromiter((float(row['q']) for row in rows), dtype=np.float64, count=len(rows)),
+        'buyer_maker': np.fromiter((row['m'] for row in rows), dtype=bool, count=len(rows)),
+    })
+
+
+class TradeDataAgent(LazyClientMixin):
+    """
+    Aggregated-trade ingestion for one symbol: REST backfill (resumable from the last stored
+    trade) and the live @aggTrade stream into the TradeStore, plus volume/dollar/tick bars built
+    from them (utils.bar_builders). Bars are kline-schema files at
+    store.path(symbol, bar_interval(kind, threshold)), e.g. BTCUSDT_volume_100.csv, so the kline
+    agents take them as data_file unchanged.
+    """
+
+    def __init__(self, symbol="BTCUSDT", trade_store=None, store=None):
+        """
+        Args:
+            symbol: Trading pair symbol (e.g., "BTCUSDT")
+            trade_store: TradeStore for the trades (default: one on Config.TRADE_DATA_DIR)
+            store: DataStore for the bar files (default: the shared store)
+        """
+        # self.client is created on the first API call (see LazyClientMixin)
+        self.symbol = symbol
+        self.trades = trade_store or TradeStore()
+        self.store = store or get_store()
+        self.builders = []  # live (builder, path or None, callback or None)
+        self.websocket_url = f"{Config.BINANCE_WS_URL.rstrip('/')}/{symbol.lower()}@aggTrade"
+        self.websocket_thread = None
+        self.handler_thread = None
+        self.running = False
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._builders_lock = threading.Lock()  # stored trades and builders change together
+        self._last_id = None
+        self._journal_days = set()  # days with trades journaled by this stream
+
+    def bar_file(self, kind, threshold):
+        """Path of a bar series file."""
+        return self.store.path(self.symbol, bar_interval(kind, threshold))
+
+    @retry(
+        stop=stop_after_attempt(5),
+        wait=wait_exponential(multiplier=1, min=4, max=60),
+        retry=retry_if_exception_type(Exception)
+    )
+    def fetch_agg_trades(self, from_id=None, start_ms=None, end_ms=None, limit=1000):
+        """
+        One /api/v3/aggTrades request.
+        Args:
+            from_id: First aggregate trade id (pages by id, takes precedence over the times)
+            start_ms, end_ms: Time window in epoch ms (less than an hour apart)
+            limit: Trades per request (max 1000)
+        Returns:
+            pandas.DataFrame of trades
+        """
+        params = {'symbol': self.symbol, 'limit': limit}
+        if from_id is not None:
+            params['fromId'] = from_id
+        else:
+            params.update(startTime=start_ms, endTime=end_ms)
+        return agg_trades_to_df(self.client.get_aggregate_trades(**params))
+
+    def _first_trades(self, start_ms, end_ms):
+        """First page of trades at or after start_ms, scanning one-hour windows forward."""
+        while start_ms < end_ms:
+            trades = self.fetch_agg_trades(start_ms=start_ms, end_ms=min(start_ms + HOUR_MS - 1, end_ms))
+            if not trades.empty:
+                return trades
+            start_ms += HOUR_MS
+        return empty_trades()
+
+    @instrumented()
+    def backfill(self, start_date="2024-01-01", end_date=None, progress=None):
+        """
+        Fetch aggregated trades into the trade store. Resumes after the last stored trade if
+        there is one (start_date is then ignored); pages by trade id so no trade is skipped.
+        Args:
+            start_date: Start date when nothing is stored yet
+            end_date: End date (default: now)
+            progress: Optional callback progress(fraction, message) after each flush
+        Returns:
+            Number of trades stored
+        """
+        end_ms = int(pd.Timestamp(end_date or datetime.utcnow()).timestamp() * 1000)
+        last = self.trades.last_trade(self.symbol)
+        if last is None:
+            start_ms = int(pd.Timestamp(start_date).timestamp() * 1000)
+            page = self._first_trades(start_ms, end_ms)
+        else:
+            start_ms = last[1]
+            page = self.fetch_agg_trades(from_id=last[0] + 1)
+        stored, buffered, buffered_rows = 0, [], 0
+        while not page.empty:
+            next_id, last_ms = int(page['id'].iloc[-1]) + 1, int(page['time'].iloc[-1])
+            page = page[page['time'] < end_ms]
+            buffered.append(page)
+            buffered_rows += len(page)
+            if buffered_rows >= BACKFILL_FLUSH_TRADES:
+                stored += self.trades.append(self.symbol, pd.concat(buffered, ignore_index=True))
+                buffered, buffered_rows = [], 0
+                if progress:
+                    done = (last_ms - start_ms) / max(end_ms - start_ms, 1)
+                    progress(min(done, 1.0), f"{stored} trades of {self.symbol}")
+            if last_ms >= end_ms:
+                break
+            page = self.fetch_agg_trades(from_id=next_id)
+        if buffered:
+            stored += self.trades.append(self.symbol, pd.concat(buffered, ignore_index=True))
+        logger.info(f"Stored {stored} aggregated trades of {self.symbol}")
+        return stored
+
+    @instrumented()
+    def build_bars(self, kind="volume", threshold=100, start_date=None, end_date=None, save=True):
+        """
+        Build a bar series from the stored trades, one day of trades at a time (the forming
+        bar at the end is not included).
+        Args:
+            kind: 'volume', 'dollar' or 'tick'
+            threshold: Measure per bar (base asset, quote asset or trades)
+            start_date, end_date: Optional trade time range
+            save: Write the bars to bar_file(kind, threshold) (replacing it)
+        Returns:
+            pandas.DataFrame of the bars if save is False, else the number of bars written
+        """
+        start_ms = int(pd.Timestamp(start_date).timestamp() * 1000) if start_date else None
+        end_ms = int(pd.Timestamp(end_date).timestamp() * 1000) if end_date else None
+        builder = BarBuilder(kind, threshold)
+        days = self.trades.iter_days(self.symbol, start_ms, end_ms)
+        batches = (builder.update(t['time'].to_numpy(), t['price'].to_numpy(), t['qty'].to_numpy()) for t in days)
+        if not save:
+            return pd.concat(list(batches), ignore_index=True)
+        path = self.bar_file(kind, threshold)
+        with self.store.chunk_writer(path) as writer:
+            for bars in batches:
+                if not bars.empty:
+                    writer.write(bars)
+        logger.info(f"Saved {writer.rows} {builder.interval} bars of {self.symbol} to {path}")
+        return writer.rows
+
+    def add_bar_builder(self, kind, threshold, callback=None, save=True):
+        """
+        Build bars from the live stream.
+        Args:
+            kind: 'volume', 'dollar' or 'tick'
+            threshold: Measure per bar
+            callback: Optional callable(bars) with each frame of completed bars
+            save: Append completed bars to bar_file(kind, threshold)
+        Returns:
+            The BarBuilder (see BarBuilder.forming for the bar in progress)
+        """
+        builder = BarBuilder(kind, threshold)
+        with self._builders_lock:
+            # Stored trades go to the builder and the live ones after them, with no flush in between
+            self._seed_builder(builder, self.bar_file(kind, threshold))
+            self.builders.append((builder, self.bar_file(kind, threshold) if save else None, callback))
+        return builder
+
+    def _seed_builder(self, builder, path):
+        """
+        Replay the stored trades after the last bar of an existing bar file (e.g. one written by
+        build_bars) into a new builder, so the bar forming at its end continues instead of
+        starting over with the live trades.
+        """
+        if not self.store.exists(self.symbol, builder.interval):
+            return
+        bars = self.store.read_path(path)
+        if bars.empty:
+            return
+        last = bars.iloc[-1]
+        open_ms, close_ms, count = int(last['open_time'].value // 10**6), int(last['close_time']), int(last['trades'])
+        # The last bar is the run of `count` trades from open_ms to close_ms: trades in the same
+        # millisecond as its closing trade may already belong to the next bar
+        span = pd.concat([empty_trades(), *self.trades.iter_days(self.symbol, open_ms, close_ms + 1)], ignore_index=True)
+        time_ms = span['time'].to_numpy()
+        starts = np.flatnonzero(time_ms == close_ms) - (count - 1)
+        starts = starts[starts >= 0]
+        starts = starts[time_ms[starts] == open_ms]
+        if len(starts):
+            rest = span.iloc[int(starts[0]) + count:]
+        else:
+            logger.warning(f"Stored trades do not match the last bar of {path}, replaying those after its close")
+            rest = span.iloc[len(span):]
+        for trades in (rest, *self.trades.iter_days(self.symbol, start_ms=close_ms + 1)):
+            builder.update(trades['time'].to_numpy(), trades['price'].to_numpy(), trades['qty'].to_numpy())
+
+    def start_websocket(self, flush_seconds=5):
+        """
+        Start the @aggTrade stream. Trades are handed to the bar builders and journaled every
+        flush_seconds (see TradeStore.journal; a day is compacted once it has closed). A gap in
+        trade ids, after the last stored trade or after a reconnect, is filled from REST first.
+        """
+        if self.running:
+            self.stop_websocket()
+        # Days left journaled by an earlier run are compacted once they have closed
+        self.trades.compact(self.symbol, before_day=int(time.time() * 1000) // DAY_MS)
+        last = self.trades.last_trade(self.symbol)
+        self._last_id = last[0] if last is not None else None
+        self._journal_days = set()
+        self.running = True
+        self.websocket_thread = threading.Thread(target=lambda: asyncio.run(self._connect()), daemon=True)
+        self.websocket_thread.start()
+        self.handler_thread = threading.Thread(target=self._trade_handler, args=(flush_seconds,), daemon=True)
+        self.handler_thread.start()
+        logger.info(f"Started aggTrade stream for {self.symbol}")
+
+    def stop_websocket(self):
+        """Stop the stream and store the trades received so far."""
+        self.running = False
+        for thread in (self.websocket_thread, self.handler_thread):
+            if thread:
+                thread.join(timeout=5)
+        self.websocket_thread = self.handler_thread = None
+        self._flush()
+        logger.info(f"Stopped aggTrade stream for {self.symbol}")
+
+    async def _connect(self):
+        while self.running:
+            try:
+                async with websockets.connect(self.websocket_url) as websocket:
+                    logger.info(f"Connected to aggTrade stream for {self.symbol}")
+                    while self.running:
+                        try:
+                            message = await asyncio.wait_for(websocket.recv(), timeout=1)
+                        except asyncio.TimeoutError:
+                            continue
+                        data = json.loads(message)
+                        if data.get('e') == 'aggTrade':
+                            with self._pending_lock:
+                                self._pending.append(data)
+            except Exception as e:
+                logger.error(f"aggTrade stream error: {e}")
+                await asyncio.sleep(5)  # Wait before reconnecting
+
+    def _trade_handler(self, flush_seconds):
+        while self.running:
+            time.sleep(flush_seconds)
+            try:
+                self._flush()
+            except Exception as e:
+                logger.error(f"Error handling aggTrade data: {e}")
+
+    def _flush(self):
+        with self._pending_lock:
+            rows, self._pending = self._pending, []
+        trades = agg_trades_to_df(rows)
+        if trades.empty:
+            return
+        trades = trades.drop_duplicates(subset=['id']).sort_values('id', kind='stable')
+        if self._last_id is not None:
+            trades = trades[trades['id'] > self._last_id]
+            if not trades.empty and trades['id'].iloc[0] > self._last_id + 1:
+                trades = pd.concat([self._fetch_gap(self._last_id + 1, int(trades['id'].iloc[0])), trades], ignore_index=True)
+        if trades.empty:
+            return
+        self._last_id = int(trades['id'].iloc[-1])
+        with self._builders_lock:
+            self._store_and_build(trades)
+
+    def _store_and_build(self, trades):
+        self.trades.journal(self.symbol, trades)
+        self._journal_days.update(np.unique(trades['time'].to_numpy() // DAY_MS).tolist())
+        closed = {day for day in self._journal_days if day < max(self._journal_days)}
+        if closed:
+            self.trades.compact(self.symbol, before_day=max(self._journal_days))
+            self._journal_days -= closed
+        time_ms, price, qty = trades['time'].to_numpy(), trades['price'].to_numpy(), trades['qty'].to_numpy()
+        for builder, path, callback in self.builders:
+            bars = builder.update(time_ms, price, qty)
+            if bars.empty:
+                continue
+            if path:
+                self._save_bars(bars, path)
+            if callback:
+                callback(bars)
+
+    def _save_bars(self, bars, path):
+        """Append live bars to the end of the file (not DataStore.append_path: bars closing in the same millisecond share their times)."""
+        self.store.append_rows(bars, path)
+
+    def _fetch_gap(self, from_id, to_id):
+        """Trades with from_id <= id < to_id from REST."""
+        logger.warning(f"Filling aggTrade gap {from_id}..{to_id - 1} for {self.symbol}")
+        pages = []
+        while from_id < to_id:
+            page = self.fetch_agg_trades(from_id=from_id)
+            if page.empty:
+                break
+            pages.append(page[page['id'] < to_id])
+            from_id = int(page['id'].iloc[-1]) + 1
+        return pd.concat(pages, ignore_index=True) if pages else empty_trades()
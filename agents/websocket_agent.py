@@ -4,23 +4,52 @@ import json
 import pandas as pd
 import logging
 from datetime import datetime
+from utils.config import Config
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class WebSocketAgent:
-    def __init__(self, symbol, interval):
+    def __init__(self, symbol, interval, reconnect_delay=5):
         """
         Initialize WebSocketAgent for real-time kline data.
         Args:
             symbol: Trading pair symbol (e.g., BTCUSDT)
             interval: Kline interval (e.g., 1h)
+            reconnect_delay: Seconds to wait before reconnecting after an error
         """
         self.symbol = symbol.lower()
         self.interval = interval
         self.running = False
         self.data = pd.DataFrame(columns=['open_time', 'open', 'high', 'low', 'close', 'volume'])
-        self.websocket_url = f"wss://stream.binance.com:9443/ws/{self.symbol}@kline_{self.interval}"
+        # Config.BINANCE_WS_URL can point at a local stand-in (see utils/replay.py)
+        self.websocket_url = f"{Config.BINANCE_WS_URL.rstrip('/')}/{self.symbol}@kline_{self.interval}"
+        self.reconnect_delay = reconnect_delay
+        self.connections = 0
+        self.listeners = []
+
+    def add_listener(self, callback):
+        """
+        Register a callback for every kline message (forming and closed bars).
+        Args:
+            callback: Callable taking (kline, closed) where kline is a dict with
+                      open_time (epoch ms), open, high, low, close, volume and event_time
+                      (epoch ms the exchange sent the message)
+        """
+        if callback not in self.listeners:
+            self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """Unregister a kline callback."""
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def _notify(self, kline, closed):
+        for callback in list(self.listeners):
+            try:
+                callback(kline, closed)
+            except Exception as e:
+                logger.error(f"Kline listener error: {e}")
 
     async def connect(self):
         """
@@ -30,12 +59,23 @@ class WebSocketAgent:
         while self.running:
             try:
                 async with websockets.connect(self.websocket_url) as websocket:
+                    self.connections += 1
                     logger.info(f"Connected to WebSocket for {self.symbol} at {self.interval}")
                     while self.running:
                         message = await websocket.recv()
                         data = json.loads(message)
                         if 'k' in data:
                             kline = data['k']
+                            if self.listeners:
+                                self._notify({
+                                    'open_time': int(kline['t']),
+                                    'open': float(kline['o']),
+                                    'high': float(kline['h']),
+                                    'low': float(kline['l']),
+                                    'close': float(kline['c']),
+                                    'volume': float(kline['v']),
+                                    'event_time': int(data.get('E', 0))
+                                }, bool(kline['x']))
                             if kline['x']:  # Only process closed klines
                                 df = pd.DataFrame([{
                                     'open_time': pd.to_datetime(kline['t'], unit='ms'),
@@ -49,7 +89,8 @@ class WebSocketAgent:
                                 logger.info(f"Received kline for {self.symbol} at {kline['t']}")
             except Exception as e:
                 logger.error(f"WebSocket error: {e}")
-                await asyncio.sleep(5)  # Wait before reconnecting
+                if self.running:
+                    await asyncio.sleep(self.reconnect_delay)  # Wait before reconnecting
 
     def stop(self):
         """Stop the WebSocket connection."""
@@ -0,0 +1,79 @@
+"""
+Compare BacktestAgent.run_backtest wall time with the old PandasData feed against the
+preloaded NumpyData feed (cold and cached).
+
+Usage:
+    python -m benchmarks.bench_backtest_feed --bars 60000 --runs 5
+"""
+import argparse
+import os
+import tempfile
+import time
+import logging
+import backtrader as bt
+from agents.backtest_agent import BacktestAgent
+from benchmarks.synthetic import generate_klines
+from strategies.strategy_registry import StrategyRegistry
+from utils.bt_feeds import NumpyData, FeedCache
+
+
+def _run_cerebro(data, strategy="ema_crossover"):
+    cerebro = bt.Cerebro()
+    cerebro.addstrategy(StrategyRegistry.get_strategy(strategy))
+    cerebro.adddata(data)
+    cerebro.broker.setcash(100000)
+    cerebro.broker.setcommission(commission=0.001)
+    strats = cerebro.run()
+    return cerebro.broker.getvalue(), strats[0].equity
+
+
+def _best_of(fn, runs):
+    timings = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backtrader feed ingestion for BacktestAgent.run_backtest")
+    parser.add_argument('--bars', type=int, default=60000, help='Number of synthetic bars')
+    parser.add_argument('--runs', type=int, default=5, help='Repetitions per variant (best time is reported)')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    df = generate_klines(args.bars)
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = os.path.join(tmp, "SYNTH_1h.csv")
+        df.to_csv(data_file, index=False)
+        agent = BacktestAgent(data_file)
+        agent.output_dir = tmp
+
+        pandas_time, (pandas_value, pandas_equity) = _best_of(
+            lambda: _run_cerebro(bt.feeds.PandasData(dataname=agent.df, datetime='open_time')), args.runs)
+
+        def numpy_cold():
+            FeedCache.clear()
+            agent._feed_arrays = None
+            return _run_cerebro(NumpyData(arrays=agent.get_feed_arrays()))
+        cold_time, (numpy_value, numpy_equity) = _best_of(numpy_cold, args.runs)
+
+        agent.get_feed_arrays()
+        warm_time, _ = _best_of(lambda: _run_cerebro(NumpyData(arrays=agent.get_feed_arrays())), args.runs)
+
+        run_backtest_time, _ = _best_of(lambda: agent.run_backtest(), args.runs)
+
+    if abs(pandas_value - numpy_value) > 1e-6 or pandas_equity != numpy_equity:
+        raise SystemExit("NumpyData results differ from PandasData results")
+
+    print(f"bars: {args.bars}, best of {args.runs}")
+    print(f"PandasData feed:          {pandas_time * 1000:9.1f} ms")
+    print(f"NumpyData feed (cold):    {cold_time * 1000:9.1f} ms  ({(1 - cold_time / pandas_time) * 100:5.1f}% less)")
+    print(f"NumpyData feed (cached):  {warm_time * 1000:9.1f} ms  ({(1 - warm_time / pandas_time) * 100:5.1f}% less)")
+    print(f"run_backtest (cached):    {run_backtest_time * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Throughput of the volume/dollar/tick BarBuilder (utils.bar_builders) and size/speed of the
+trade store (utils.trade_store) on synthetic aggregated trades (2-decimal prices, 5-decimal
+quantities, ~20 trades per second like a busy spot pair).
+
+Each builder runs over the trades in --batch sized updates (the live stream hands over a few
+thousand trades per flush, a backfill a day at a time) and is checked to produce the same bars
+as a single update over everything.
+
+Usage:
+    python -m benchmarks.bench_bar_builders --trades 5M --batch 5k,1M
+"""
+import argparse
+import os
+import tempfile
+import time
+import logging
+import numpy as np
+import pandas as pd
+from benchmarks.bench_pipeline_stages import parse_size
+from utils.bar_builders import BarBuilder
+from utils.trade_store import TradeStore
+
+BUILDERS = [('tick', 1000), ('volume', 50), ('dollar', 2_000_000)]
+
+
+def generate_trades(n, seed=7):
+    """Synthetic aggregated trades frame with the trade store columns."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'id': np.arange(n, dtype=np.int64) + 3_000_000_000,
+        'time': 1_700_000_000_000 + np.cumsum(rng.integers(0, 100, n)),
+        'price': np.round(40_000 + np.cumsum(rng.normal(0, 0.5, n)), 2),
+        'qty': np.round(rng.exponential(0.02, n) + 0.00001, 5),
+        'buyer_maker': rng.random(n) < 0.5,
+    })
+
+
+def _run(kind, threshold, time_ms, price, qty, batch):
+    builder = BarBuilder(kind, threshold)
+    bars = [builder.update(time_ms[i:i + batch], price[i:i + batch], qty[i:i + batch]) for i in range(0, len(price), batch)]
+    return pd.concat(bars, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bar builder throughput and trade store size")
+    parser.add_argument('--trades', default='5M', help='Synthetic trades (k/M suffixes)')
+    parser.add_argument('--batch', default='5k,1M', help='Comma-separated trades per update() call')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    trades = generate_trades(parse_size(args.trades))
+    time_ms, price, qty = (trades[c].to_numpy() for c in ('time', 'price', 'qty'))
+    print(f"{'bars':<18}{'batch':>10}{'M trades/s':>12}{'bars out':>10}  same as one update")
+    for kind, threshold in BUILDERS:
+        reference = _run(kind, threshold, time_ms, price, qty, len(price))
+        for batch in (parse_size(s) for s in args.batch.split(',')):
+            started = time.perf_counter()
+            bars = _run(kind, threshold, time_ms, price, qty, batch)
+            rate = len(price) / (time.perf_counter() - started) / 1e6
+            print(f"{kind + ' ' + str(threshold):<18}{batch:>10}{rate:12.1f}{len(bars):>10}  {bars.equals(reference)}", flush=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TradeStore(tmp)
+        started = time.perf_counter()
+        store.append('SYNTH', trades)
+        write = time.perf_counter() - started
+        started = time.perf_counter()
+        restored = pd.concat(list(store.iter_days('SYNTH')), ignore_index=True)
+        read = time.perf_counter() - started
+        size = sum(os.path.getsize(os.path.join(tmp, 'SYNTH', name)) for name in os.listdir(os.path.join(tmp, 'SYNTH')))
+        print(f"\ntrade store: {size / len(trades):.1f} bytes/trade, write {write:.2f}s, read {read:.2f}s, "
+              f"round trip exact: {restored.equals(trades)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Time and peak memory of the in-memory agents vs the out-of-core ChunkedPipelineAgent on one
+synthetic kline file, and a check that both write the same Heikin Ashi and indicator artifacts.
+
+The in-memory path runs DataCalculationAgent.calculate_heikin_ashi and the four IndicatorAgent
+methods; the chunked path runs ChunkedPipelineAgent.process (Heikin Ashi, the same indicators
+and the EMA crossover signals) for each --chunk-bars value. The in-memory strategy is left out
+(its per-row position list columns are quadratic). --backtest adds the backtest to both paths
+(backtrader bar-by-bar on the chunked side, so expect minutes per million bars).
+
+Peak memory is the RSS high-water growth of a forked child (see bench_pipeline_stages).
+
+Usage:
+    python -m benchmarks.bench_chunked_pipeline --bars 1M --chunk-bars 50k,250k
+"""
+import argparse
+import os
+import tempfile
+import time
+import logging
+from benchmarks.bench_pipeline_stages import _peak_memory, parse_size
+from benchmarks.synthetic import generate_klines
+
+INDICATORS = ['sma', 'ema', 'rsi', 'macd']
+
+
+def _in_memory(ctx):
+    from agents.data_calculation_agent import DataCalculationAgent
+    from agents.indicator_agent import IndicatorAgent
+    from agents.backtest_agent import BacktestAgent
+    store, path = ctx['store'], ctx['path']
+    store.invalidate()
+    DataCalculationAgent(store=store).calculate_heikin_ashi(path, symbol='SYNTH')
+    agent = IndicatorAgent(path, store=store)
+    for name in INDICATORS:
+        getattr(agent, f"calculate_{name}")(symbol='SYNTH')
+    if ctx['backtest']:
+        BacktestAgent(path, store=store).run_backtest(symbol='SYNTH')
+
+
+def _chunked(ctx):
+    from agents.chunked_pipeline_agent import ChunkedPipelineAgent
+    agent = ChunkedPipelineAgent('SYNTH', '1h', data_file=ctx['path'], store=ctx['store'], chunk_bars=ctx['chunk_bars'])
+    if ctx['backtest']:
+        agent.run(indicators=INDICATORS)
+    else:
+        agent.process(indicators=INDICATORS)
+
+
+def _case(name, fn, df, tmp, backtest, chunk_bars=None):
+    from utils.data_store import DataStore
+    directory = os.path.join(tmp, name)
+    store = DataStore(raw_dir=directory, processed_dir=directory, backend='csv')
+    ctx = {'store': store, 'path': store.path('SYNTH', '1h'), 'backtest': backtest, 'chunk_bars': chunk_bars}
+    store.write_path(df, ctx['path'])
+    started = time.perf_counter()
+    fn(ctx)
+    seconds = time.perf_counter() - started
+    peak = _peak_memory(fn, ctx)
+    return store, seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-memory vs chunked pipeline: time, peak memory and equality")
+    parser.add_argument('--bars', default='1M', help='Bars in the synthetic file (k/M suffixes)')
+    parser.add_argument('--chunk-bars', default='50k,250k', help='Comma-separated block sizes for the chunked path')
+    parser.add_argument('--backtest', action='store_true', help='Include the backtest in both paths')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    bars = parse_size(args.bars)
+    df = generate_klines(bars, price_decimals=2, volume_decimals=5)
+    print(f"{'path':<22}{'bars':>10}{'seconds':>10}{'peak MB':>10}  same output")
+    with tempfile.TemporaryDirectory() as tmp:
+        reference, seconds, peak = _case('in_memory', _in_memory, df, tmp, args.backtest)
+        print(f"{'in-memory':<22}{bars:>10}{seconds:10.1f}{peak / 2**20:10.1f}", flush=True)
+        for chunk_bars in (parse_size(s) for s in args.chunk_bars.split(',')):
+            store, seconds, peak = _case(f"chunked_{chunk_bars}", _chunked, df, tmp, args.backtest, chunk_bars)
+            kinds = ['heikin_ashi', 'indicators'] + (['backtest'] if args.backtest else [])
+            same = all(reference.load('SYNTH', '1h', kind).equals(store.load('SYNTH', '1h', kind)) for kind in kinds)
+            print(f"{'chunked ' + str(chunk_bars):<22}{bars:>10}{seconds:10.1f}{peak / 2**20:10.1f}  {same}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Memory per million bars of the kline and derived frames, default float64 frames vs compact
+frames (Config.COMPACT_FRAMES / DataStore(compact=True)), on synthetic klines quoted like an
+exchange (2-decimal prices, 5-decimal volume).
+
+Frames: raw klines (DataStore read), Heikin Ashi (DataCalculationAgent), indicators
+(IndicatorAgent sma/rsi/macd) and strategy output (StrategyAgent.ema_crossover_strategy). The
+strategy row loop is quadratic in the default mode, so it runs on --strategy-bars and is scaled
+to a million bars like the rest. Buffers shared between frames are counted once in the total.
+The compact run also checks that the restored float64 prices and the strategy signals match
+the default run.
+
+Usage:
+    python -m benchmarks.bench_compact_memory --bars 1M --strategy-bars 10k
+"""
+import argparse
+import json
+import tempfile
+import logging
+import numpy as np
+from benchmarks.bench_pipeline_stages import parse_size
+from benchmarks.synthetic import generate_klines
+from utils.compact import PRICE_COLUMNS, float64_values, memory_report
+
+
+def _frames(df, strategy_df, compact):
+    from agents.data_calculation_agent import DataCalculationAgent
+    from agents.indicator_agent import IndicatorAgent
+    from agents.strategy_agent import StrategyAgent
+    from utils.data_store import DataStore
+    directory = tempfile.mkdtemp(prefix='bench_compact_')
+    store = DataStore(raw_dir=f"{directory}/raw", processed_dir=f"{directory}/processed", compact=compact)
+    path = store.path('BTCUSDT', '1h', 'historical')
+    store.write_path(df, path)
+    store.invalidate()
+    raw = store.read_path(path)
+    heikin_ashi = DataCalculationAgent(store=store).calculate_heikin_ashi(path)
+    indicators = IndicatorAgent(path, store=store)
+    indicators.calculate_sma()
+    indicators.calculate_rsi()
+    indicators.calculate_macd()
+    strategy_path = store.path('BTCUSDT', '1h', 'strategy_input')
+    store.write_path(strategy_df, strategy_path)
+    strategy = StrategyAgent(strategy_path, store=store).ema_crossover_strategy()
+    return {'raw': raw, 'heikin_ashi': heikin_ashi, 'indicators': indicators.df}, strategy
+
+
+def run(bars, strategy_bars):
+    df = generate_klines(bars, price_decimals=2, volume_decimals=5)
+    strategy_df = df.iloc[:strategy_bars].reset_index(drop=True)
+    results = {}
+    frames = {}
+    for mode, compact in (('default', False), ('compact', True)):
+        frames[mode], strategy = _frames(df, strategy_df, compact)
+        report = memory_report(frames[mode], bars)
+        strategy_report = memory_report({'strategy': strategy}, strategy_bars)
+        results[mode] = {
+            'dtypes': {name: {col: str(dtype) for col, dtype in frame.dtypes.items()} for name, frame in frames[mode].items()},
+            'bytes_per_million_bars': dict(
+                {name: round(size / bars * 1_000_000) for name, size in report['frames'].items()},
+                strategy=strategy_report['bytes_per_million_bars'],
+                total_shared_once=report['bytes_per_million_bars'],
+            ),
+        }
+        frames[mode]['strategy'] = strategy
+    default, compact = frames['default'], frames['compact']
+    results['prices_exact'] = all(np.array_equal(default['raw'][col].to_numpy(), float64_values(compact['raw'], col)) for col in PRICE_COLUMNS)
+    results['signals_equal'] = all(np.array_equal(default['strategy'][col].to_numpy(), compact['strategy'][col].to_numpy()) for col in ('signal', 'position'))
+    results['bars'], results['strategy_bars'] = bars, strategy_bars
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory per million bars, default vs compact frames")
+    parser.add_argument('--bars', default='1M', help='Bars for the kline, Heikin Ashi and indicator frames (k/M suffixes)')
+    parser.add_argument('--strategy-bars', default='10k', help='Bars for the strategy frame (quadratic row loop)')
+    parser.add_argument('--output', default=None, help='Also write the results as JSON to this file')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    results = run(parse_size(args.bars), parse_size(args.strategy_bars))
+    default, compact = results['default']['bytes_per_million_bars'], results['compact']['bytes_per_million_bars']
+    print(f"{'frame':<20}{'default MB/1M':>15}{'compact MB/1M':>15}{'saved':>8}")
+    for name in default:
+        print(f"{name:<20}{default[name] / 1e6:15.1f}{compact[name] / 1e6:15.1f}{(1 - compact[name] / default[name]) * 100:7.1f}%")
+    print(f"prices exact after restore: {results['prices_exact']}, strategy signals equal: {results['signals_equal']}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
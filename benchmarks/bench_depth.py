@@ -0,0 +1,107 @@
+"""
+Order-book depth capture cost and reconstruction speed (utils/order_book.py, utils/depth_store.py)
+on synthetic @depth diff streams (benchmarks.synthetic.generate_depth): --symbols streams at
+100ms for --seconds each, i.e. what DepthDataAgent does per event (parse the JSON frame, apply it
+to the local book, add it to the open segment) and per segment (encode and write the file).
+
+Reported: CPU per event and the share of one core needed to keep up with all symbols in real
+time, bytes per level update on disk against the JSON frames, and DepthStore.book_at latency
+(cold: segment read from disk, warm: one symbol, mostly from the segment cache). Reconstructed
+books are checked against the live book.
+
+Usage:
+    python -m benchmarks.bench_depth --symbols 40 --seconds 600 --levels 20
+"""
+import argparse
+import json
+import tempfile
+import time
+import logging
+import numpy as np
+from benchmarks.synthetic import generate_depth
+from utils.depth_store import DepthSegment, DepthStore
+from utils.order_book import OrderBook, levels_array
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Depth capture and book reconstruction")
+    parser.add_argument('--symbols', type=int, default=40)
+    parser.add_argument('--seconds', type=int, default=600, help='Captured seconds per symbol (10 events per second)')
+    parser.add_argument('--levels', type=int, default=20, help='Mean levels per diff event')
+    parser.add_argument('--segment-seconds', type=int, default=60)
+    parser.add_argument('--lookups', type=int, default=2000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    n_events = args.seconds * 10
+    snapshot, events = generate_depth(n_events, levels_per_event=args.levels)
+    frames = [json.dumps(event, separators=(',', ':')) for event in events]
+    json_bytes = sum(len(frame) for frame in frames)
+    level_count = sum(len(event['b']) + len(event['a']) for event in events)
+    print(f"{args.symbols} symbols x {n_events} events ({level_count / n_events:.1f} levels each), "
+          f"{args.segment_seconds}s segments\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DepthStore(tmp)
+        apply_s = write_s = 0.0
+        disk_bytes = 0
+        checkpoints = {}  # time -> live book, to check the reconstruction
+        rng = np.random.default_rng(0)
+        for s in range(args.symbols):
+            symbol = f"SYM{s}USDT"
+            book = OrderBook()
+            book.load_snapshot(snapshot['lastUpdateId'], snapshot['bids'], snapshot['asks'], time=events[0]['E'] - 1)
+            segment = DepthSegment(book.snapshot())
+            check = set(rng.choice(n_events, 5, replace=False).tolist()) if s == 0 else ()
+            for i, frame in enumerate(frames):
+                started = time.perf_counter()
+                data = json.loads(frame)
+                event_time = data['E']
+                if event_time - segment.start_ms >= args.segment_seconds * 1000:
+                    encoded = time.perf_counter()
+                    disk_bytes += store.write_segment(symbol, segment)
+                    write_s += time.perf_counter() - encoded
+                    segment = DepthSegment(book.snapshot())
+                bids, asks = levels_array(data['b']), levels_array(data['a'])
+                book.apply(data['U'], data['u'], bids, asks, time=event_time)
+                segment.add(event_time, data['u'], bids, asks)
+                apply_s += time.perf_counter() - started
+                if i in check:
+                    checkpoints[event_time] = book.snapshot()
+            encoded = time.perf_counter()
+            disk_bytes += store.write_segment(symbol, segment)
+            write_s += time.perf_counter() - encoded
+
+        total_events = args.symbols * n_events
+        print(f"{'stage':<24}{'us/event':>10}{'core share':>12}")
+        print(f"{'parse + apply + add':<24}{apply_s / total_events * 1e6:>10.1f}{apply_s / args.seconds:>11.2%}")
+        print(f"{'encode + write':<24}{write_s / total_events * 1e6:>10.1f}{write_s / args.seconds:>11.2%}")
+        total_levels = args.symbols * level_count
+        print(f"\non disk {disk_bytes / 1e6:.1f} MB ({disk_bytes / total_levels:.1f} B/level incl. segment snapshots) "
+              f"vs JSON frames {args.symbols * json_bytes / 1e6:.1f} MB ({json_bytes / level_count:.1f} B/level); "
+              f"{disk_bytes / args.symbols / args.seconds * 86400 / 1e9:.2f} GB per symbol-day")
+
+        for time_ms, expected in checkpoints.items():
+            rebuilt = store.book_at("SYM0USDT", time_ms)
+            assert rebuilt.update_id == expected.update_id
+            for name in ('bid_price', 'bid_qty', 'ask_price', 'ask_qty'):
+                assert np.array_equal(getattr(rebuilt, name), getattr(expected, name)), name
+        print(f"book_at matches the live book at {len(checkpoints)} checkpoints")
+
+        times = rng.integers(events[0]['E'], events[-1]['E'], args.lookups)
+        symbols = [f"SYM{s}USDT" for s in rng.integers(0, args.symbols, args.lookups)]
+        for label, cached in (('cold (random symbol)', False), ('warm (one symbol)', True)):
+            latencies = []
+            for symbol, time_ms in zip(symbols, times):
+                if cached:
+                    symbol = "SYM0USDT"
+                else:
+                    store._decoded.clear()
+                started = time.perf_counter()
+                store.book_at(symbol, int(time_ms))
+                latencies.append((time.perf_counter() - started) * 1000)
+            print(f"book_at {label:<22} p50 {np.percentile(latencies, 50):6.2f} ms  p99 {np.percentile(latencies, 99):6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
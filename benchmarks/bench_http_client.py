@@ -0,0 +1,153 @@
+"""
+Binance REST access against a local stand-in server: a new client per call (the old behaviour:
+fresh session, ping, one request) versus the shared pooled client, and a historical range fetch
+sequentially versus concurrently on the async client. The stand-in adds a per-request latency and
+a connection setup cost (standing in for network RTT and the TLS handshake) and counts the
+connections it accepts.
+
+Usage:
+    python -m benchmarks.bench_http_client --requests 50 --latency-ms 20 --connect-ms 30
+"""
+import argparse
+import json
+import tempfile
+import threading
+import time
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import generate_klines
+from utils import binance_client
+from utils.binance_client import RequestWeightBudget, create_client, request_weight
+from utils.config import Config
+
+
+class StandInServer:
+    """Threaded HTTP/1.1 server answering /api/v3/ping and /api/v3/klines from synthetic bars."""
+
+    def __init__(self, bars, latency_ms=20, connect_ms=30):
+        klines = generate_klines(bars)
+        open_ms = klines['open_time'].astype('datetime64[ms]').astype('int64').to_numpy()
+        self.open_ms = open_ms
+        self.rows = [[int(t), f"{o:.2f}", f"{h:.2f}", f"{l:.2f}", f"{c:.2f}", f"{v:.4f}", int(t) + 3599999, "0", 0, "0", "0", "0"]
+                     for t, o, h, l, c, v in zip(open_ms, klines['open'], klines['high'], klines['low'], klines['close'], klines['volume'])]
+        self.latency = latency_ms / 1000
+        self.connect = connect_ms / 1000
+        self.connections = 0
+        self.requests = 0
+        self.used_weight = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/api"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def reset(self):
+        with self._lock:
+            self.connections = self.requests = self.used_weight = 0
+
+    def klines(self, params):
+        start = int(params.get('startTime', self.open_ms[0]))
+        end = int(params.get('endTime', self.open_ms[-1]))
+        limit = int(params.get('limit', 500))
+        lo, hi = np.searchsorted(self.open_ms, [start, end], side='left')
+        return self.rows[lo:min(hi + 1, lo + limit)]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+                time.sleep(server.connect)
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                time.sleep(server.latency)
+                body = json.dumps(server.klines(params) if url.path == '/api/v3/klines' else {}).encode()
+                with server._lock:
+                    server.requests += 1
+                    server.used_weight += request_weight(url.path, params)
+                    used = server.used_weight
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('X-MBX-USED-WEIGHT-1M', str(used))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+        return Handler
+
+
+def new_client_per_call(server, n):
+    """Old behaviour: every call builds a Client (own session, ping round trip)."""
+    from binance.client import Client
+    for i in range(n):
+        client = Client(ping=False)
+        client.API_URL = server.base_url
+        client.ping()
+        client.get_klines(symbol='BTCUSDT', interval='1h', startTime=int(server.open_ms[i]), limit=1000)
+        client.session.close()
+
+
+def shared_client(server, n):
+    client = create_client(base_url=server.base_url, budget=RequestWeightBudget())
+    for i in range(n):
+        client.get_klines(symbol='BTCUSDT', interval='1h', startTime=int(server.open_ms[i]), limit=1000)
+    client.session.close()
+
+
+def fetch_range(server, concurrency):
+    """HistoricalDataAgent._fetch_range over the whole stand-in history."""
+    from agents.historical_data_agent import HistoricalDataAgent
+    Config.HTTP_CONCURRENCY = concurrency
+    with tempfile.TemporaryDirectory() as tmp:
+        agent = HistoricalDataAgent('BTCUSDT', '1h', data_dir=tmp)
+        start = pd.Timestamp(int(server.open_ms[0]), unit='ms')
+        end = pd.Timestamp(int(server.open_ms[-1]) + 1, unit='ms')
+        chunks = agent._fetch_range(start, end)
+    return sum(len(chunk) for chunk in chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Binance REST client benchmark against a local stand-in server")
+    parser.add_argument('--requests', type=int, default=50, help='Sequential kline requests per client scenario')
+    parser.add_argument('--bars', type=int, default=40000, help='Bars served (range fetch = bars / 1000 requests)')
+    parser.add_argument('--latency-ms', type=float, default=20, help='Stand-in latency per request')
+    parser.add_argument('--connect-ms', type=float, default=30, help='Stand-in cost per new connection')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    server = StandInServer(args.bars, args.latency_ms, args.connect_ms)
+    Config.BINANCE_API_URL = server.base_url
+    binance_client.reset_client()
+    print(f"stand-in {server.base_url}: latency {args.latency_ms:.0f} ms, connect {args.connect_ms:.0f} ms")
+    print(f"{'scenario':<28}{'wall s':>9}{'requests':>10}{'conns':>7}{'weight':>8}")
+
+    scenarios = [
+        (f"new client x{args.requests}", lambda: new_client_per_call(server, args.requests)),
+        (f"shared client x{args.requests}", lambda: shared_client(server, args.requests)),
+        ("range fetch sequential", lambda: fetch_range(server, 1)),
+        ("range fetch concurrency 4", lambda: fetch_range(server, 4)),
+        ("range fetch concurrency 8", lambda: fetch_range(server, 8)),
+    ]
+    for name, run in scenarios:
+        server.reset()
+        started = time.perf_counter()
+        run()
+        wall = time.perf_counter() - started
+        print(f"{name:<28}{wall:>9.2f}{server.requests:>10}{server.connections:>7}{server.used_weight:>8}")
+    server.httpd.shutdown()
+
+
+if __name__ == "__main__":
+    main()
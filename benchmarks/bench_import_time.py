@@ -0,0 +1,82 @@
+"""
+Import-time regression check. Each scenario runs in a fresh interpreter under `python -X importtime`;
+the report shows total import time, the heaviest top-level packages, and whether modules that
+should stay lazy (backtrader, TA-Lib, python-binance, autogen) were loaded.
+
+Usage:
+    python -m benchmarks.bench_import_time --runs 3
+    python -m benchmarks.bench_import_time --max-ms 800   # exit 1 if a scenario is slower
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (code run in the fresh interpreter, modules that must not be imported)
+SCENARIOS = {
+    "main": ("import main", ("backtrader", "talib", "binance", "autogen")),
+    "chart path": (
+        "from agents.historical_data_agent import HistoricalDataAgent\n"
+        "from agents.chart_agent import ChartAgent\n"
+        "HistoricalDataAgent(); ChartAgent()",
+        ("backtrader", "talib", "binance"),
+    ),
+    # backtrader imports TA-Lib itself (bt.talib), so only the network stack is checked here
+    "backtest path": ("from agents.backtest_agent import BacktestAgent", ("binance", "autogen")),
+}
+
+
+def parse_importtime(stderr):
+    """
+    Parse `-X importtime` output.
+    Returns:
+        Tuple (total import microseconds, {top-level package: self microseconds summed over its modules})
+    """
+    packages = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        packages[name.strip().split(".")[0]] += int(self_us)
+    return sum(packages.values()), dict(packages)
+
+
+def run_scenario(code):
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=REPO_ROOT,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"Scenario failed:\n{proc.stderr[-2000:]}")
+    return parse_importtime(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time of the CLI entry points")
+    parser.add_argument('--runs', type=int, default=3, help='Fresh interpreters per scenario (best time is reported)')
+    parser.add_argument('--top', type=int, default=8, help='Number of heaviest packages shown per scenario')
+    parser.add_argument('--max-ms', type=float, default=None, help='Fail if any scenario imports for longer than this')
+    args = parser.parse_args()
+
+    failures = []
+    for name, (code, forbidden) in SCENARIOS.items():
+        results = [run_scenario(code) for _ in range(args.runs)]
+        total, packages = min(results, key=lambda r: r[0])
+        loaded = [module for module in forbidden if module in packages]
+        print(f"{name}: {total / 1000:8.1f} ms (best of {args.runs})")
+        for package, micros in sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+            print(f"    {package:<28}{micros / 1000:8.1f} ms")
+        if loaded:
+            failures.append(f"{name}: eagerly imported {', '.join(loaded)}")
+        if args.max_ms is not None and total / 1000 > args.max_ms:
+            failures.append(f"{name}: {total / 1000:.1f} ms > {args.max_ms:.1f} ms")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
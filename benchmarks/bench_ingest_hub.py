@@ -0,0 +1,143 @@
+"""
+Fan-out of one live kline stream to several local consumers: every consumer with its own
+exchange websocket appending each closed bar to the shared kline file (what several processes
+following the same pair did before), against one ingest hub (agents/ingest_hub_agent.py) that
+holds the only upstream connection, writes each closed bar once and publishes to HubSubscribers.
+The upstream is the replay stand-in (utils.replay.ReplayServer) serving forming and closed
+klines at --rate frames per second.
+
+Reported per mode: upstream websocket connections, kline file writes, whether every consumer
+saw every closed bar once and in order, the final file, and frame-send-to-listener latency.
+
+Usage:
+    python -m benchmarks.bench_ingest_hub --consumers 4 --bars 200 --rate 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import logging
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import generate_klines
+from utils.data_store import DataStore
+from utils.replay import RecordingWriter, ReplayServer
+
+
+def write_recording(path, klines):
+    """A forming and a closed frame per bar, 1/2 s of recorded time apart."""
+    open_ms = klines['open_time'].astype('datetime64[ms]').astype('int64').to_numpy()
+    with RecordingWriter(path) as writer:
+        for i, (t, o, h, l, c, v) in enumerate(zip(open_ms, klines['open'], klines['high'], klines['low'], klines['close'], klines['volume'])):
+            for closed in (False, True):
+                kline = {'t': int(t), 'T': int(t) + 3_599_999, 's': 'BTCUSDT', 'i': '1h', 'o': f"{o:.2f}", 'h': f"{h:.2f}",
+                         'l': f"{l:.2f}", 'c': f"{c:.2f}", 'v': f"{v:.3f}", 'x': closed}
+                writer.frame('btcusdt@kline_1h', json.dumps({'e': 'kline', 'E': 0, 's': 'BTCUSDT', 'k': kline}),
+                             t=i * 1000 + (500 if closed else 0))
+    return list(open_ms)
+
+
+def follow(streams, expected, on_closed=None):
+    """Run the streams in one loop thread until each saw all expected closed bars; returns (per-stream bars, latencies ms)."""
+    received = [[] for _ in streams]
+    latencies = []
+    done = threading.Event()
+
+    def listener(index):
+        def on_kline(kline, closed):
+            if kline['event_time']:
+                latencies.append(time.time() * 1000 - kline['event_time'])
+            if closed:
+                if on_closed:
+                    on_closed(kline)
+                received[index].append(kline['open_time'])
+                if all(len(r) >= len(expected) for r in received):
+                    done.set()
+        return on_kline
+
+    for index, stream in enumerate(streams):
+        stream.add_listener(listener(index))
+
+    async def run():
+        tasks = [asyncio.ensure_future(stream.connect()) for stream in streams]
+        while not done.is_set():
+            await asyncio.sleep(0.01)
+        for stream in streams:
+            stream.stop()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run(run())
+    return received, np.array(latencies)
+
+
+def report(mode, server, writes, received, expected, latencies, store, path, klines):
+    in_order = all(r == expected for r in received)
+    stored = store.read_path(path)
+    file_ok = stored['open_time'].equals(klines['open_time']) and len(stored) == len(klines)
+    print(f"{mode:<22}{server.stats['ws_connections']:>10}{writes:>8}{str(in_order):>10}{str(file_ok):>8}"
+          f"{np.percentile(latencies, 50):>10.2f}{np.percentile(latencies, 99):>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-consumer websockets vs one ingest hub")
+    parser.add_argument('--consumers', type=int, default=4)
+    parser.add_argument('--bars', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=50, help='Frames per second (two per bar)')
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+    from agents.ingest_hub_agent import IngestHubAgent
+    from agents.websocket_agent import WebSocketAgent
+    from utils.ingest_hub import HubSubscriber
+
+    klines = generate_klines(args.bars, price_decimals=2, volume_decimals=3, start="2020-01-01")
+    with tempfile.TemporaryDirectory() as tmp:
+        recording = os.path.join(tmp, 'stream.jsonl.gz')
+        expected = write_recording(recording, klines)
+        speed = args.rate / 2
+        print(f"{args.bars} bars ({2 * args.bars} frames at {args.rate:g}/s), {args.consumers} consumers\n")
+        print(f"{'mode':<22}{'upstream':>10}{'writes':>8}{'in order':>10}{'file':>8}{'p50 ms':>10}{'p99 ms':>10}")
+
+        store = DataStore(raw_dir=os.path.join(tmp, 'direct'), processed_dir=tmp)
+        path = store.path('BTCUSDT', '1h')
+        writes = [0]
+        lock = threading.Lock()
+
+        def append(kline):
+            bar = pd.DataFrame([{'open_time': pd.to_datetime(kline['open_time'], unit='ms'), 'open': kline['open'], 'high': kline['high'],
+                                 'low': kline['low'], 'close': kline['close'], 'volume': kline['volume']}])
+            store.append_path(bar, path)
+            with lock:
+                writes[0] += 1
+
+        with ReplayServer(recording, speed=speed) as server:
+            streams = [WebSocketAgent('BTCUSDT', '1h') for _ in range(args.consumers)]
+            # Each consumer has its own copy of the stream (the stand-in's position is per stream name)
+            original = server.stream
+
+            async def own_position(connection, stream):
+                server.positions.pop(stream, None)
+                await original(connection, stream)
+            server.stream = own_position
+            received, latencies = follow(streams, expected, on_closed=append)
+            report('own websocket each', server, writes[0], received, expected, latencies, store, path, klines)
+
+        store = DataStore(raw_dir=os.path.join(tmp, 'hub'), processed_dir=tmp)
+        path = store.path('BTCUSDT', '1h')
+        with ReplayServer(recording, speed=speed) as server:
+            # No configured pairs (so no REST backfill): the first subscriber opens the stream, bars
+            # closed before another subscriber is connected reach it as catch-up from the file
+            hub = IngestHubAgent(address=os.path.join(tmp, 'hub.sock'), store=store)
+            streams = [HubSubscriber('BTCUSDT', '1h', since=expected[0], address=hub.address) for _ in range(args.consumers)]
+            with hub:
+                received, latencies = follow(streams, expected)
+                writes = hub.metrics['bars_written_total']
+            report('ingest hub', server, writes, received, expected, latencies, store, path, klines)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Per-stage time and memory benchmark of the pipeline on deterministic synthetic klines, fully
+offline (every agent works on a DataStore in a temporary directory).
+
+Stages: CSV save/load, Heikin Ashi (DataCalculationAgent and the row-loop version in
+utils.data_processor), each IndicatorAgent method, StrategyAgent.ema_crossover_strategy,
+BacktestAgent.run_backtest and ChartAgent.plot_combined_charts figure construction.
+
+Each stage is timed (best of --runs) and then run once more in a forked child for its peak
+memory (growth of the child's RSS high-water mark). Stages that scale badly have a default bar limit (see STAGES) and are skipped
+above it unless --full is given.
+
+Usage:
+    python -m benchmarks.bench_pipeline_stages run --sizes 10k,100k,1M,5M --output results.json
+    python -m benchmarks.bench_pipeline_stages compare base.json new.json --threshold 0.1
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import logging
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import generate_klines
+
+
+def _stage_csv_save(ctx):
+    ctx['store'].write_path(ctx['df'], ctx['path'])
+
+
+def _stage_csv_load(ctx):
+    ctx['store'].invalidate()
+    return ctx['store'].read_path(ctx['path'])
+
+
+def _stage_heikin_ashi(ctx):
+    from agents.data_calculation_agent import DataCalculationAgent
+    return DataCalculationAgent(store=ctx['store']).calculate_heikin_ashi(ctx['path'], symbol=ctx['symbol'])
+
+
+def _stage_heikin_ashi_loop(ctx):
+    from utils.data_processor import calculate_heikin_ashi
+    return calculate_heikin_ashi(ctx['df'])
+
+
+def _indicator_stage(method):
+    def stage(ctx):
+        from agents.indicator_agent import IndicatorAgent
+        return getattr(IndicatorAgent(ctx['path'], store=ctx['store']), method)(symbol=ctx['symbol'])
+    return stage
+
+
+def _stage_ema_crossover(ctx):
+    from agents.strategy_agent import StrategyAgent
+    return StrategyAgent(ctx['path'], store=ctx['store']).ema_crossover_strategy(symbol=ctx['symbol'])
+
+
+def _stage_backtest(ctx):
+    from agents.backtest_agent import BacktestAgent
+    from utils.bt_feeds import FeedCache
+    FeedCache.clear()
+    return BacktestAgent(ctx['path'], store=ctx['store']).run_backtest(symbol=ctx['symbol'])
+
+
+def _stage_chart(ctx):
+    from agents.chart_agent import ChartAgent
+    return ChartAgent(store=ctx['store']).plot_combined_charts(ctx['path'], symbol=ctx['symbol'], indicators=['sma', 'rsi'], chart_type='heikin_ashi')
+
+
+# name -> (function, default maximum bars or None)
+STAGES = {
+    'csv_save': (_stage_csv_save, None),
+    'csv_load': (_stage_csv_load, None),
+    'heikin_ashi': (_stage_heikin_ashi, None),
+    'heikin_ashi_loop': (_stage_heikin_ashi_loop, 10_000),  # per-row .iloc writes (~1.8 s at 10k bars)
+    'sma': (_indicator_stage('calculate_sma'), None),
+    'ema': (_indicator_stage('calculate_ema'), None),
+    'rsi': (_indicator_stage('calculate_rsi'), None),
+    'macd': (_indicator_stage('calculate_macd'), None),
+    'ema_crossover': (_stage_ema_crossover, 20_000),  # row loop with quadratic cost (~9 s at 10k bars)
+    'backtest': (_stage_backtest, 1_000_000),
+    'chart_combined': (_stage_chart, None),
+}
+
+
+def parse_size(text):
+    """'10k' -> 10000, '5M' -> 5000000."""
+    text = text.strip()
+    factor = {'k': 1_000, 'm': 1_000_000}.get(text[-1].lower(), 1)
+    return int(float(text[:-1] if factor > 1 else text) * factor)
+
+
+def _best_time(fn, ctx, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn(ctx)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def _vm_status():
+    """(VmHWM, VmRSS) of this process in bytes."""
+    with open('/proc/self/status') as f:
+        fields = {line.split(':')[0]: int(line.split()[1]) * 1024 for line in f if line.startswith(('VmHWM', 'VmRSS'))}
+    return fields['VmHWM'], fields['VmRSS']
+
+
+def _peak_memory(fn, ctx):
+    """
+    Peak memory of one run of fn in bytes: the RSS high-water growth of a forked child running
+    it, whose high-water mark is reset first (no tracing overhead, and native allocations of
+    TA-Lib, backtrader etc. count too). Falls back to the tracemalloc peak where fork or
+    /proc/self/clear_refs is unavailable.
+    """
+    if not hasattr(os, 'fork') or not os.path.exists('/proc/self/clear_refs'):
+        tracemalloc.start()
+        try:
+            fn(ctx)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        peak = -1
+        try:
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')  # reset VmHWM to the current RSS
+            baseline = _vm_status()[1]
+            fn(ctx)
+            peak = _vm_status()[0] - baseline
+        finally:
+            os.write(write_fd, str(peak).encode())
+            os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        peak = int(f.read() or -1)
+    os.waitpid(pid, 0)
+    if peak < 0:
+        raise RuntimeError("stage failed in the memory measurement child")
+    return peak
+
+
+def run_suite(sizes, stages, runs=3, memory=True, full=False):
+    """
+    Returns:
+        List of result dicts {stage, bars, seconds, peak_mb, status}
+    """
+    from utils.data_store import DataStore, get_store, set_store
+    results = []
+    previous_store = get_store()
+    try:
+        for bars in sizes:
+            df = generate_klines(bars)
+            with tempfile.TemporaryDirectory() as tmp:
+                store = DataStore(raw_dir=tmp, processed_dir=tmp, backend='csv')
+                set_store(store)  # agents that build their own session use the temporary store too
+                ctx = {'df': df, 'store': store, 'symbol': 'SYNTH', 'path': store.path('SYNTH', '1h')}
+                store.write_path(df, ctx['path'])
+                for name in stages:
+                    fn, max_bars = STAGES[name]
+                    row = {'stage': name, 'bars': bars, 'seconds': None, 'peak_mb': None, 'status': 'ok'}
+                    if max_bars is not None and bars > max_bars and not full:
+                        row['status'] = 'skipped'
+                    else:
+                        try:
+                            row['seconds'] = round(_best_time(fn, ctx, runs), 6)
+                            if memory:
+                                row['peak_mb'] = round(_peak_memory(fn, ctx) / 2**20, 3)
+                        except Exception as e:
+                            row.update(status='failed', error=f"{type(e).__name__}: {e}")
+                    results.append(row)
+                    _print_row(row)
+    finally:
+        set_store(previous_store)
+    return results
+
+
+def _print_row(row):
+    seconds = f"{row['seconds'] * 1000:12.1f}" if row['seconds'] is not None else f"{'-':>12}"
+    peak = f"{row['peak_mb']:10.1f}" if row['peak_mb'] is not None else f"{'-':>10}"
+    print(f"{row['stage']:<18}{row['bars']:>10}{seconds}{peak}  {row['status']}", flush=True)
+
+
+def _environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'), 'commit': commit,
+        'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+        'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(base, new, threshold=0.10, mem_threshold=0.10, min_seconds=0.005):
+    """
+    Compare two result files stage by stage.
+    Args:
+        base, new: Loaded result dicts (see cmd_run)
+        threshold: Relative slowdown above which a stage is flagged
+        mem_threshold: Relative peak-memory growth above which a stage is flagged
+        min_seconds: Ignore time differences smaller than this (timer noise on tiny stages)
+    Returns:
+        List of (stage, bars, base_s, new_s, base_mb, new_mb, flags)
+    """
+    base_rows = {(r['stage'], r['bars']): r for r in base['results'] if r['status'] == 'ok'}
+    rows = []
+    for r in new['results']:
+        b = base_rows.get((r['stage'], r['bars']))
+        if b is None or r['status'] != 'ok':
+            continue
+        flags = []
+        if r['seconds'] > b['seconds'] * (1 + threshold) and r['seconds'] - b['seconds'] > min_seconds:
+            flags.append('time')
+        if r['peak_mb'] is not None and b['peak_mb'] is not None and r['peak_mb'] > b['peak_mb'] * (1 + mem_threshold) and r['peak_mb'] - b['peak_mb'] > 1:
+            flags.append('memory')
+        rows.append((r['stage'], r['bars'], b['seconds'], r['seconds'], b['peak_mb'], r['peak_mb'], flags))
+    return rows
+
+
+def cmd_run(args):
+    sizes = [parse_size(s) for s in args.sizes.split(',')]
+    stages = args.stages.split(',') if args.stages else list(STAGES)
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        raise SystemExit(f"Unknown stages: {', '.join(unknown)} (available: {', '.join(STAGES)})")
+    print(f"{'stage':<18}{'bars':>10}{'ms':>12}{'peak MB':>10}")
+    results = run_suite(sizes, stages, args.runs, not args.no_memory, args.full)
+    output = args.output or os.path.join('benchmarks', 'results', f"stages_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'meta': dict(_environment(), runs=args.runs), 'results': results}, f, indent=2)
+    print(f"Results written to {output}")
+
+
+def cmd_compare(args):
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.new, encoding='utf-8') as f:
+        new = json.load(f)
+    rows = compare(base, new, args.threshold, args.mem_threshold)
+    print(f"base {base['meta'].get('commit')} ({base['meta']['timestamp']}) -> new {new['meta'].get('commit')} ({new['meta']['timestamp']})")
+    print(f"{'stage':<18}{'bars':>10}{'base ms':>11}{'new ms':>11}{'change':>9}{'base MB':>10}{'new MB':>10}  flags")
+    for stage, bars, base_s, new_s, base_mb, new_mb, flags in rows:
+        mb = f"{base_mb if base_mb is not None else float('nan'):10.1f}{new_mb if new_mb is not None else float('nan'):10.1f}"
+        print(f"{stage:<18}{bars:>10}{base_s * 1000:11.1f}{new_s * 1000:11.1f}{(new_s / base_s - 1) * 100:+8.1f}%{mb}  {'REGRESSION: ' + ','.join(flags) if flags else ''}")
+    regressions = [row for row in rows if row[-1]]
+    print(f"{len(regressions)} regression(s) in {len(rows)} comparable stage(s)")
+    if regressions:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline stage benchmark suite on synthetic data")
+    sub = parser.add_subparsers(dest='command', required=True)
+    run = sub.add_parser('run', help='Run the suite and write a JSON result file')
+    run.add_argument('--sizes', default='10k,100k,1M,5M', help='Comma-separated bar counts (k/M suffixes)')
+    run.add_argument('--stages', default=None, help=f"Comma-separated subset of: {', '.join(STAGES)}")
+    run.add_argument('--runs', type=int, default=3, help='Timed repetitions per stage (best is kept)')
+    run.add_argument('--no-memory', action='store_true', help='Skip the peak-memory run')
+    run.add_argument('--full', action='store_true', help='Ignore per-stage bar limits')
+    run.add_argument('--output', default=None, help='Result file (default: benchmarks/results/stages_<timestamp>.json)')
+    run.set_defaults(func=cmd_run)
+    cmp_ = sub.add_parser('compare', help='Compare two result files and flag regressions (exit code 1)')
+    cmp_.add_argument('base')
+    cmp_.add_argument('new')
+    cmp_.add_argument('--threshold', type=float, default=0.10, help='Relative slowdown flagged as a regression')
+    cmp_.add_argument('--mem-threshold', type=float, default=0.10, help='Relative peak-memory growth flagged as a regression')
+    cmp_.set_defaults(func=cmd_compare)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
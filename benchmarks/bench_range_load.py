@@ -0,0 +1,59 @@
+"""
+Time-range reads (DataStore.read_range) against a full read of a multi-year 1m kline file:
+one month plus the default warm-up bars from the middle of the history, for the CSV backend
+(time index; the first range read builds it, later ones reuse it) and the Parquet backend (row
+group statistics). The range result is checked against slicing the full read.
+
+Usage:
+    python -m benchmarks.bench_range_load --years 5 --backend csv,parquet
+"""
+import argparse
+import os
+import tempfile
+import time
+import logging
+import numpy as np
+from benchmarks.synthetic import generate_klines
+from utils.config import Config
+from utils.data_store import DataStore
+
+MINUTES_PER_YEAR = 365 * 24 * 60
+
+
+def _timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-range read vs full read of a 1m kline file")
+    parser.add_argument('--years', type=float, default=5)
+    parser.add_argument('--backend', default='csv,parquet', help='Comma-separated DataStore backends')
+    parser.add_argument('--days', type=int, default=30, help='Range length in days')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    df = generate_klines(int(args.years * MINUTES_PER_YEAR), interval_minutes=1, price_decimals=2, volume_decimals=3)
+    start = df['open_time'].iloc[len(df) // 2]
+    end = start + np.timedelta64(args.days, 'D')
+    print(f"{len(df):,} bars, range {start} .. {end} + {Config.WARMUP_BARS} warm-up bars")
+    for backend in args.backend.split(','):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = DataStore(raw_dir=tmp, processed_dir=tmp, backend=backend, max_entries=0)
+            path = store.path('SYNTH', '1m')
+            store.write_path(df, path)
+            full, full_ms = _timed(lambda: store.read_path(path))
+            first, first_ms = _timed(lambda: store.read_range(path, start, end))
+            ranged, range_ms = _timed(lambda: store.read_range(path, start, end))
+            times = full['open_time']
+            lo = int(times.searchsorted(start)) - Config.WARMUP_BARS
+            expected = full.iloc[lo:int(times.searchsorted(end, side='right'))].reset_index(drop=True)
+            print(f"\n{backend} ({os.path.getsize(path) / 1e6:.0f} MB)")
+            print(f"  full read:              {full_ms:9.1f} ms  {len(full):>10,} rows")
+            print(f"  range read (first):     {first_ms:9.1f} ms  {len(first):>10,} rows")
+            print(f"  range read:             {range_ms:9.1f} ms  {len(ranged):>10,} rows  "
+                  f"same as sliced full read: {ranged.equals(expected)}")
+
+
+if __name__ == "__main__":
+    main()
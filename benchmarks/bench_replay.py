@@ -0,0 +1,117 @@
+"""
+Offline ingestion, reconnection and end-to-end latency against the replay stand-in
+(utils.replay.ReplayServer) serving a synthetic recording: REST kline pages for a historical
+backfill and a closed-kline websocket stream.
+
+- ingestion: HistoricalDataAgent.collect_historical_data with per-request latency and injected
+  REST errors (failed windows are fetched again)
+- reconnection: WebSocketAgent on a stream that drops the connection with --disconnect-rate
+  per frame; every frame must arrive exactly once, in order
+- latency: frame send (restamped event time) to listener callback, with the stream paced at
+  --speed x the recorded 10 frames per second
+
+Usage:
+    python -m benchmarks.bench_replay --bars 20000 --frames 500 --latency-ms 20 --disconnect-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import logging
+import numpy as np
+from benchmarks.synthetic import generate_klines
+from utils.config import Config
+from utils.data_store import DataStore
+from utils.replay import RecordingWriter, ReplayServer
+
+STREAM = 'btcusdt@kline_1h'
+
+
+def write_synthetic_recording(path, bars, frames, frame_ms=100):
+    """Recording of `bars` 1h klines in 1000-bar REST pages plus the last `frames` as closed-kline frames."""
+    klines = generate_klines(bars, price_decimals=2, volume_decimals=3, start="2020-01-01")
+    open_ms = klines['open_time'].astype('datetime64[ms]').astype('int64').to_numpy()
+    rows = [[int(t), f"{o:.2f}", f"{h:.2f}", f"{l:.2f}", f"{c:.2f}", f"{v:.3f}", int(t) + 3_599_999, "0", 0, "0", "0", "0"]
+            for t, o, h, l, c, v in zip(open_ms, klines['open'], klines['high'], klines['low'], klines['close'], klines['volume'])]
+    with RecordingWriter(path) as writer:
+        for i in range(0, len(rows), 1000):
+            writer.rest('/api/v3/klines', {'symbol': 'BTCUSDT', 'interval': '1h', 'startTime': rows[i][0], 'limit': 1000},
+                        200, json.dumps(rows[i:i + 1000]))
+        for i, row in enumerate(rows[-frames:]):
+            kline = {'t': row[0], 'T': row[6], 's': 'BTCUSDT', 'i': '1h', 'o': row[1], 'h': row[2], 'l': row[3], 'c': row[4], 'v': row[5], 'x': True}
+            writer.frame(STREAM, json.dumps({'e': 'kline', 'E': row[6], 's': 'BTCUSDT', 'k': kline}), t=i * frame_ms)
+    return rows
+
+
+def run_stream(frames):
+    """Follow the stream until `frames` closed klines arrived; returns (open times, latencies ms, connections, seconds)."""
+    from agents.websocket_agent import WebSocketAgent
+    agent = WebSocketAgent('BTCUSDT', '1h', reconnect_delay=0.01)
+    received, latencies = [], []
+
+    def on_kline(kline, closed):
+        latencies.append(time.time() * 1000 - kline['event_time'])
+        received.append(kline['open_time'])
+        if len(received) >= frames:
+            agent.stop()
+
+    agent.add_listener(on_kline)
+
+    async def run():
+        task = asyncio.ensure_future(agent.connect())
+        while agent.running or not received:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    started = time.perf_counter()
+    asyncio.run(run())
+    return received, np.array(latencies), agent.connections, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestion, reconnection and latency against the replay stand-in")
+    parser.add_argument('--bars', type=int, default=20000)
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--error-rate', type=float, default=0.02)
+    parser.add_argument('--disconnect-rate', type=float, default=0.02)
+    parser.add_argument('--speed', type=float, default=10, help='Stream pacing for the latency run')
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+    from agents.historical_data_agent import HistoricalDataAgent
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'synthetic.jsonl.gz')
+        rows = write_synthetic_recording(path, args.bars, args.frames)
+        print(f"recording: {args.bars} klines + {args.frames} frames, {os.path.getsize(path) / 1e3:.0f} kB")
+        store = DataStore(raw_dir=tmp, processed_dir=tmp)
+        with ReplayServer(path, speed=0, latency_ms=args.latency_ms, error_rate=args.error_rate) as server:
+            print(f"\n{'ingestion':<26}{'wall s':>8}{'bars':>8}{'requests':>10}{'errors':>8}")
+            for concurrency in (1, 4):
+                Config.HTTP_CONCURRENCY = concurrency
+                agent = HistoricalDataAgent('BTCUSDT', '1h', data_dir=os.path.join(tmp, str(concurrency)), store=store)
+                before = dict(server.stats)
+                started = time.perf_counter()
+                agent.collect_historical_data("2020-01-01")
+                wall = time.perf_counter() - started
+                bars = len(store.read_path(agent.data_file))
+                print(f"{'concurrency ' + str(concurrency):<26}{wall:>8.2f}{bars:>8}"
+                      f"{server.stats['rest_requests'] - before['rest_requests']:>10}{server.stats['rest_errors'] - before['rest_errors']:>8}")
+
+            server.latency_ms, server.disconnect_rate = 0, args.disconnect_rate
+            received, _, connections, wall = run_stream(args.frames)
+            in_order = received == [row[0] for row in rows[-args.frames:]]
+            print(f"\nreconnection: {len(received)} frames in {wall:.2f}s over {connections} connections "
+                  f"({server.stats['ws_disconnects']} injected drops), all once and in order: {in_order}")
+
+            server.disconnect_rate, server.speed = 0, args.speed
+            server.positions.clear()
+            _, latencies, _, wall = run_stream(args.frames)
+            print(f"latency at {args.speed:g}x: p50 {np.percentile(latencies, 50):.2f} ms, p99 {np.percentile(latencies, 99):.2f} ms, "
+                  f"max {latencies.max():.2f} ms ({wall:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Read tail latency with N reader processes and one appending writer, comparing the old protocol
+(FileLock around every read and an in-place rewrite under the lock) with lock-free snapshot reads
+(utils.snapshot_io: atomic rename by the writer, no lock for readers).
+
+Usage:
+    python -m benchmarks.bench_snapshot_reads --bars 50000 --readers 4 --seconds 10
+"""
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+import logging
+import numpy as np
+import pandas as pd
+from filelock import FileLock
+from benchmarks.synthetic import generate_klines
+from utils.snapshot_io import read_csv_snapshot, write_csv_atomic, writer_lock
+
+
+def legacy_read(path):
+    with FileLock(f"{path}.lock"):
+        return pd.read_csv(path, parse_dates=['open_time'])
+
+
+def legacy_append(path, new_rows):
+    with FileLock(f"{path}.lock"):
+        df = pd.concat([pd.read_csv(path, parse_dates=['open_time']), new_rows])
+        df.to_csv(path, index=False)
+
+
+def snapshot_read(path):
+    return read_csv_snapshot(path, parse_dates=['open_time'])
+
+
+def snapshot_append(path, new_rows):
+    with writer_lock(path):
+        df = pd.concat([read_csv_snapshot(path, parse_dates=['open_time']), new_rows])
+        write_csv_atomic(df, path)
+
+
+PROTOCOLS = {'filelock': (legacy_read, legacy_append), 'snapshot': (snapshot_read, snapshot_append)}
+
+
+def _reader(protocol, path, min_rows, deadline, queue):
+    logging.disable(logging.INFO)
+    read = PROTOCOLS[protocol][0]
+    latencies, torn = [], 0
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            df = read(path)
+            if len(df) < min_rows or df['close'].isna().any():
+                torn += 1
+        except Exception:
+            torn += 1
+        latencies.append(time.perf_counter() - start)
+    queue.put((latencies, torn))
+
+
+def _writer(protocol, path, deadline, queue):
+    logging.disable(logging.INFO)
+    append = PROTOCOLS[protocol][1]
+    row = generate_klines(1).iloc[[0]]
+    writes = 0
+    while time.time() < deadline:
+        append(path, row)
+        writes += 1
+    queue.put(writes)
+
+
+def run_protocol(protocol, base_df, readers, seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "SYNTH_1h.csv")
+        base_df.to_csv(path, index=False)
+        deadline = time.time() + seconds
+        queue, write_queue = mp.Queue(), mp.Queue()
+        procs = [mp.Process(target=_reader, args=(protocol, path, len(base_df), deadline, queue)) for _ in range(readers)]
+        procs.append(mp.Process(target=_writer, args=(protocol, path, deadline, write_queue)))
+        for proc in procs:
+            proc.start()
+        results = [queue.get() for _ in range(readers)]
+        writes = write_queue.get()
+        for proc in procs:
+            proc.join()
+    latencies = np.array([lat for lats, _ in results for lat in lats]) * 1000
+    return {
+        'reads': len(latencies), 'writes': writes, 'torn': sum(torn for _, torn in results),
+        'p50': np.percentile(latencies, 50), 'p99': np.percentile(latencies, 99), 'max': latencies.max(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="N readers + 1 writer read-latency benchmark")
+    parser.add_argument('--bars', type=int, default=50000, help='Rows in the shared kline file')
+    parser.add_argument('--readers', type=int, default=4, help='Reader processes')
+    parser.add_argument('--seconds', type=float, default=10, help='Duration per protocol')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    base_df = generate_klines(args.bars)
+    print(f"bars: {args.bars}, readers: {args.readers}, {args.seconds:.0f}s per protocol")
+    print(f"{'protocol':<10}{'reads':>8}{'writes':>8}{'torn':>6}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for protocol in PROTOCOLS:
+        r = run_protocol(protocol, base_df, args.readers, args.seconds)
+        print(f"{protocol:<10}{r['reads']:>8}{r['writes']:>8}{r['torn']:>6}{r['p50']:>10.1f}{r['p99']:>10.1f}{r['max']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+
+def generate_klines(n_bars, interval_minutes=60, start="2019-01-01", seed=42, start_price=10000.0, price_decimals=None, volume_decimals=None):
+    """
+    Generate deterministic synthetic OHLCV klines (geometric random walk).
+    Args:
+        n_bars: Number of bars to generate
+        interval_minutes: Bar length in minutes
+        start: Timestamp of the first bar
+        seed: Random seed, same seed always gives the same data
+        start_price: Price of the first open
+        price_decimals: Round prices to this many decimals, like exchange tick sizes (default: no rounding)
+        volume_decimals: Round volume to this many decimals (default: no rounding)
+    Returns:
+        pandas.DataFrame with columns [open_time, open, high, low, close, volume]
+    """
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0, 0.004, n_bars)
+    close = start_price * np.exp(np.cumsum(returns))
+    open_ = np.empty(n_bars)
+    open_[0] = start_price
+    open_[1:] = close[:-1]
+    spread = np.abs(rng.normal(0.0, 0.002, (2, n_bars))) * close
+    high = np.maximum(open_, close) + spread[0]
+    low = np.minimum(open_, close) - spread[1]
+    volume = rng.gamma(2.0, 50.0, n_bars)
+    if price_decimals is not None:
+        open_, high, low, close = (np.round(v, price_decimals) for v in (open_, high, low, close))
+    if volume_decimals is not None:
+        volume = np.round(volume, volume_decimals)
+    open_time = pd.date_range(start=start, periods=n_bars, freq=f"{interval_minutes}min")
+    return pd.DataFrame({
+        'open_time': open_time,
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'volume': volume,
+    })
+
+
+def generate_depth(n_events, symbol="BTCUSDT", start_ms=1_700_000_000_000, interval_ms=100, seed=42, mid=30000.0,
+                   tick=0.01, snapshot_levels=1000, levels_per_event=20, delete_share=0.2):
+    """
+    Generate a deterministic synthetic /api/v3/depth snapshot and the @depth diff events after it.
+    Bids sit 1..2*snapshot_levels ticks below mid and asks as far above, so the book never crosses;
+    each event updates about levels_per_event random levels (delete_share of them removed).
+    Args:
+        n_events: Number of diff events
+        symbol: Symbol in the events
+        start_ms: Time of the snapshot; event i is at start_ms + (i + 1) * interval_ms
+        interval_ms: Event spacing
+        seed: Random seed, same seed always gives the same data
+        mid, tick: Price center and tick size
+        snapshot_levels: Levels per side in the snapshot
+        levels_per_event: Mean number of levels per event
+        delete_share: Share of updated levels that are removed (qty 0)
+    Returns:
+        (snapshot dict with lastUpdateId/bids/asks, list of depthUpdate event dicts), Binance's
+        string-encoded [price, qty] pairs
+    """
+    rng = np.random.default_rng(seed)
+    decimals = max(0, int(round(-np.log10(tick))))
+
+    def pairs(side, offsets, qty):
+        price = mid + side * offsets * tick
+        return [[f"{p:.{decimals}f}", f"{q:.5f}"] for p, q in zip(price, qty)]
+
+    def sizes(n):
+        return np.round(rng.gamma(1.5, 0.4, n), 5) + 0.00001
+
+    span = 2 * snapshot_levels
+    update_id = 1_000_000
+    snapshot = {
+        'lastUpdateId': update_id,
+        'bids': pairs(-1, np.sort(rng.choice(np.arange(1, span + 1), snapshot_levels, replace=False)), sizes(snapshot_levels)),
+        'asks': pairs(1, np.sort(rng.choice(np.arange(1, span + 1), snapshot_levels, replace=False)), sizes(snapshot_levels)),
+    }
+    events = []
+    for i in range(n_events):
+        sides = []
+        for side in (-1, 1):
+            n = max(1, int(rng.poisson(levels_per_event / 2)))
+            # Updates concentrate near the top of the book
+            offsets = np.unique(np.minimum(rng.geometric(1 / 50, n), span))
+            qty = np.where(rng.random(len(offsets)) < delete_share, 0.0, sizes(len(offsets)))
+            sides.append(pairs(side, offsets, qty))
+        first_id = update_id + 1
+        update_id += int(rng.integers(1, 6))
+        events.append({'e': 'depthUpdate', 'E': start_ms + (i + 1) * interval_ms, 's': symbol, 'U': first_id, 'u': update_id,
+                       'b': sides[0], 'a': sides[1]})
+    return snapshot, events
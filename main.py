@@ -1,9 +1,8 @@
 import argparse
-from agents.historical_data_agent import HistoricalDataAgent
-from agents.chart_agent import ChartAgent
-from agents.strategy_agent import StrategyAgent
 import logging
 import os
+import signal
+import threading
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -20,13 +19,113 @@ def main():
     parser.add_argument('--chart-type', default='combined', choices=['combined', 'candlestick', 'line'], help='Chart type (combined, candlestick, line)')
     parser.add_argument('--indicators', default='sma,rsi', help='Comma-separated list of indicators (e.g., sma,rsi)')
     parser.add_argument('--strategy', default='ema_crossover', help='Trading strategy (e.g., ema_crossover)')
+    parser.add_argument('--serve', action='store_true', help='Run the long-lived pipeline daemon instead of a one-shot chart')
+    parser.add_argument('--hub', action='store_true', help='Run the local ingest hub for --symbols x --intervals: it holds the Binance websockets, writes every closed bar once and serves live klines to --websocket/--serve/--scan and the Streamlit app')
+    parser.add_argument('--depth', action='store_true', help='Capture the order-book depth (REST snapshots plus @depth diffs) of --symbols into Config.DEPTH_DATA_DIR until interrupted')
+    parser.add_argument('--batch', action='store_true', help='Headless batch run over --symbols x --intervals, writes a summary table')
+    parser.add_argument('--symbols', default=None, help='Comma-separated symbols for --serve/--hub/--depth/--batch/--scan, or ALL_USDT for --batch/--scan (default: --symbol)')
+    parser.add_argument('--intervals', default=None, help='Comma-separated intervals for --serve/--hub/--batch (default: --interval)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker pool size for --serve (default 2) or --batch (default: CPU count)')
+    parser.add_argument('--chunked', action='store_true', help='Headless out-of-core pipeline (Heikin Ashi, indicators, strategy, backtest) over the stored --symbol/--interval file')
+    parser.add_argument('--chunk-bars', type=int, default=None, help='--chunked: rows per block (default: Config.CHUNK_BARS)')
+    parser.add_argument('--scan', action='store_true', help='Rank current EMA crossover / RSI extreme triggers across --symbols (ALL_USDT for every USDT pair) at --interval; with --websocket keep rescanning on every closed bar')
+    parser.add_argument('--scan-bars', type=int, default=500, help='--scan: bars per symbol in the scan panel')
+    parser.add_argument('--no-sync', action='store_true', help='--batch: use local data only, do not fetch new bars')
+    parser.add_argument('--health-port', type=int, default=8787, help='Port of the --serve health/metrics endpoint (0: any free port)')
+    parser.add_argument('--metrics', default=None, choices=['off', 'on', 'memory'], help='Span instrumentation mode (default: Config.INSTRUMENTATION)')
+    parser.add_argument('--metrics-out', default=None, help='Write span/lock-wait metrics as JSON to this file on exit (turns --metrics on if it is off)')
     args = parser.parse_args()
 
+    from utils.instrumentation import metrics
+    if args.metrics:
+        metrics.set_mode(args.metrics)
+    elif args.metrics_out and not metrics.enabled:
+        metrics.set_mode('on')
+    try:
+        run(args)
+    finally:
+        if args.metrics_out:
+            metrics.to_json(args.metrics_out)
+            logger.info(f"Wrote metrics to {args.metrics_out}")
+
+
+def run(args):
+    """Run the mode selected on the command line (daemon, batch, or one-shot chart)."""
+    symbols = args.symbols.split(',') if args.symbols else [args.symbol]
+    intervals = args.intervals.split(',') if args.intervals else [args.interval]
+
+    if args.serve:
+        from agents.pipeline_agent import PipelineAgent
+        PipelineAgent(symbols, intervals, start_date=args.start_date, strategy=args.strategy,
+                      max_workers=args.workers or 2, health_port=args.health_port).run()
+        return
+
+    if args.hub:
+        from agents.ingest_hub_agent import IngestHubAgent
+        IngestHubAgent(symbols, intervals, start_date=args.start_date).run()
+        return
+
+    if args.depth:
+        from agents.depth_data_agent import DepthDataAgent
+        recorder = DepthDataAgent(symbols).start()
+        stop_event = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+        try:
+            stop_event.wait()
+        except KeyboardInterrupt:
+            pass
+        recorder.stop()
+        return
+
+    if args.batch:
+        from agents.batch_agent import BatchAgent
+        summary = BatchAgent(symbols, intervals, strategy=args.strategy, start_date=args.start_date,
+                             max_workers=args.workers, sync=not args.no_sync).run()
+        print(summary.to_string(index=False))
+        return
+
+    if args.scan:
+        from agents.scanner_agent import ScannerAgent
+        if args.symbols == 'ALL_USDT':
+            from agents.batch_agent import load_usdt_pairs
+            symbols = load_usdt_pairs()
+        scanner = ScannerAgent(symbols, args.interval, bars=args.scan_bars)
+        print(scanner.load().to_string(index=False))
+        if args.websocket:
+            scanner.add_listener(lambda triggers, symbol: print(f"\n{symbol} closed a bar:\n{triggers.to_string(index=False)}"))
+            scanner.start()
+            stop_event = threading.Event()
+            signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+            try:
+                stop_event.wait()
+            except KeyboardInterrupt:
+                pass
+            scanner.stop()
+        return
+
+    if args.chunked:
+        from agents.historical_data_agent import HistoricalDataAgent
+        from agents.chunked_pipeline_agent import ChunkedPipelineAgent
+        agent = HistoricalDataAgent(symbol=args.symbol, interval=args.interval)
+        if not os.path.exists(agent.data_file):
+            logger.info(f"Starting historical data collection for {args.symbol} at {args.interval} from {args.start_date}")
+            agent.collect_historical_data(start_date=args.start_date)
+        indicators = args.indicators.split(',') if args.indicators else []
+        summary = ChunkedPipelineAgent(args.symbol, args.interval, data_file=agent.data_file, chunk_bars=args.chunk_bars).run(
+            indicators=indicators, strategy=args.strategy)
+        for key, value in summary.items():
+            print(f"{key}: {value}")
+        return
+
+    # Agents are imported per code path so a chart command does not load the backtest/network stack
+    from agents.historical_data_agent import HistoricalDataAgent
+    from agents.chart_agent import ChartAgent
+
     # Initialize HistoricalDataAgent
     agent = HistoricalDataAgent(symbol=args.symbol, interval=args.interval)
     
     # Collect historical data if CSV doesn't exist
-    data_file = os.path.join("data/raw", f"{args.symbol}_{args.interval}.csv")
+    data_file = agent.data_file
     if not os.path.exists(data_file):
         logger.info(f"Starting historical data collection for {args.symbol} at {args.interval} from {args.start_date}")
         agent.collect_historical_data(start_date=args.start_date)
@@ -64,14 +163,16 @@ def main():
         fig = chart_agent.plot_line(data_file=data_file, symbol=args.symbol, save=True)
         fig.show()
 
-    # Keep WebSocket running if enabled
+    # Keep WebSocket running if enabled (block on an event instead of spinning a core)
     if args.websocket:
+        stop_event = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
         try:
-            while True:
-                pass
+            stop_event.wait()
         except KeyboardInterrupt:
-            logger.info("Stopping WebSocket and exiting...")
-            agent.stop_websocket()
+            pass
+        logger.info("Stopping WebSocket and exiting...")
+        agent.stop_websocket()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -8,6 +8,20 @@ class StrategyMeta(bt.MetaStrategy, type(ABC)):
 
 class BaseStrategy(bt.Strategy, ABC, metaclass=StrategyMeta):
     """Lớp cơ sở cho tất cả các chiến lược backtrader."""
+
+    # Đặc trưng khung thời gian lớn (utils/mtf.py), ví dụ (('1d', 'ema', {'length': 50}),):
+    # BacktestAgent thêm chúng thành các line của data (self.data.ema_50_1d), StrategyAgent thêm
+    # thành các cột của DataFrame truyền vào calculate_signals
+    mtf_features = ()
+
+    @classmethod
+    def signals(cls, df, **params):
+        """Gọi calculate_signals ngoài backtrader, với tham số mặc định của lớp được ghi đè bởi params."""
+        strategy = object.__new__(cls)
+        strategy.params = strategy.p = cls.params()
+        for name, value in params.items():
+            setattr(strategy.params, name, value)
+        return strategy.calculate_signals(df)
     
     @abstractmethod
     def __init__(self):
@@ -0,0 +1,35 @@
+from strategies.ema_crossover import EMACrossoverStrategy
+import pandas as pd
+import numpy as np
+
+class EMATrendFilterStrategy(EMACrossoverStrategy):
+    """Giao cắt EMA ở khung cơ sở, chỉ vào lệnh theo xu hướng khung ngày (giá đóng cửa 1d so với EMA 50 1d)."""
+
+    mtf_features = (('1d', 'close'), ('1d', 'ema', {'length': 50}))
+
+    def _trend(self):
+        # 1 = xu hướng tăng, -1 = giảm, 0 = chưa có nến ngày nào đóng (NaN)
+        close, ema = self.data.close_1d[0], self.data.ema_50_1d[0]
+        if np.isnan(close) or np.isnan(ema):
+            return 0
+        return 1 if close > ema else -1
+
+    def next(self):
+        self.equity.append(self.broker.getvalue())
+        trend = self._trend()
+        if self.fast_ema[0] > self.slow_ema[0] and self.fast_ema[-1] <= self.slow_ema[-1]:
+            # Mua theo xu hướng tăng, hoặc để đóng vị thế bán
+            if trend > 0 or self.position.size < 0:
+                self.buy()
+        elif self.fast_ema[0] < self.slow_ema[0] and self.fast_ema[-1] >= self.slow_ema[-1]:
+            if trend < 0 or self.position.size > 0:
+                self.sell()
+
+    def calculate_signals(self, df: pd.DataFrame) -> pd.DataFrame:
+        df = super().calculate_signals(df)
+        trend = np.sign(df['close_1d'] - df['ema_50_1d']).fillna(0)
+        # Chỉ giữ tín hiệu cùng chiều xu hướng ngày
+        df['trend'] = trend
+        df['filtered_signal'] = np.where(df['signal'] == trend, df['signal'], 0)
+        df['position'] = df['filtered_signal'].diff()
+        return df
\ No newline at end of file
@@ -1,21 +1,35 @@
-from strategies.ema_crossover import EMACrossoverStrategy
+import importlib
+
 
 class StrategyRegistry:
+    # Giá trị là lớp chiến lược hoặc đường dẫn "module:Class"; đường dẫn chỉ được import
+    # khi chiến lược được dùng lần đầu (tránh nạp backtrader khi chỉ vẽ biểu đồ)
     _strategies = {
-        "ema_crossover": EMACrossoverStrategy,
+        "ema_crossover": "strategies.ema_crossover:EMACrossoverStrategy",
+        "ema_trend_filter": "strategies.ema_trend_filter:EMATrendFilterStrategy",
         # Thêm các chiến lược khác ở đây, ví dụ:
-        # "other_strategy": OtherStrategy,
+        # "other_strategy": "strategies.other_strategy:OtherStrategy",
     }
 
     @classmethod
     def get_strategy(cls, strategy_name):
         """Lấy chiến lược theo tên."""
-        strategy = cls._strategies.get(strategy_name.lower())
+        name = strategy_name.lower()
+        strategy = cls._strategies.get(name)
         if not strategy:
             raise ValueError(f"Chiến lược '{strategy_name}' không tồn tại.")
+        if isinstance(strategy, str):
+            module_name, class_name = strategy.split(":")
+            strategy = getattr(importlib.import_module(module_name), class_name)
+            cls._strategies[name] = strategy
         return strategy
 
     @classmethod
     def register_strategy(cls, name, strategy_class):
-        """Đăng ký một chiến lược mới."""
-        cls._strategies[name.lower()] = strategy_class
\ No newline at end of file
+        """Đăng ký một chiến lược mới (lớp hoặc đường dẫn "module:Class")."""
+        cls._strategies[name.lower()] = strategy_class
+
+    @classmethod
+    def names(cls):
+        """Tên các chiến lược đã đăng ký (không import chúng)."""
+        return list(cls._strategies)
\ No newline at end of file
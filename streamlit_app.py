@@ -1,9 +1,16 @@
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
+import streamlit.components.v1 as components
 from agents.chart_agent import ChartAgent
+from agents.live_chart_agent import LiveChartAgent, LivePatchServer
 from agents.historical_data_agent import HistoricalDataAgent
 from agents.backtest_agent import BacktestAgent
+from utils.data_store import get_store
+from utils.dataset import DatasetSession
+from utils.ingest_hub import HubSubscriber
+from utils.jobs import JobRunner
+from utils.instrumentation import span
 from datetime import datetime, date
 import os
 import logging
@@ -14,15 +21,100 @@ logger = logging.getLogger(__name__)
 st.set_page_config(page_icon="favicon.ico", layout="wide")
 st.title("Real-Time Chart Dashboard")
 
-# Initialize agents
-chart_agent = ChartAgent()
-historical_agent = HistoricalDataAgent()
+
+# Cached resources: built once per process (chart agent, job pool) or once per browser session
+# (historical agent, which owns the Binance client and the WebSocket)
+@st.cache_resource
+def get_chart_agent():
+    return ChartAgent()
+
+
+@st.cache_resource
+def get_job_runner():
+    return JobRunner(max_workers=2)
+
+
+def get_historical_agent():
+    if 'historical_agent' not in st.session_state:
+        st.session_state.historical_agent = HistoricalDataAgent()
+    return st.session_state.historical_agent
+
+
+def file_fingerprint(path):
+    """(mtime_ns, size) of a file, or None if missing; cache key for everything derived from it."""
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except FileNotFoundError:
+        return None
+
+
+# Cached computations: keyed by the data file fingerprint, so reruns with an unchanged selection
+# reuse the figure instead of recomputing Heikin Ashi, indicators and signals
+def range_bounds(chart_range, start_date):
+    """
+    (start, end) timestamps of the Chart Range picker: None for an end that is not narrowed, so
+    the default range keeps reading the whole file; the end day is inclusive.
+    """
+    if len(chart_range) < 2:  # second date not picked yet
+        return None, None
+    first, last = chart_range
+    start = pd.Timestamp(first) if first > start_date else None
+    end = pd.Timestamp(last) + pd.Timedelta(days=1) - pd.Timedelta(milliseconds=1) if last < date.today() else None
+    return start, end
+
+
+@st.cache_data(max_entries=16, show_spinner="Building chart...")
+def build_combined_figure(data_file, fingerprint, symbol, interval, chart_type, start=None, end=None):
+    session = DatasetSession(symbol, interval, data_file=data_file, start=start, end=end)
+    return get_chart_agent().plot_combined_charts(
+        session, symbol=symbol, interval=interval, indicators=["sma", "rsi"], strategy="ema_crossover", chart_type=chart_type
+    )
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def build_equity_figure(data_file, fingerprint, backtest_fingerprint, symbol, interval, start=None, end=None):
+    session = DatasetSession(symbol, interval, data_file=data_file, start=start, end=end)
+    return get_chart_agent().plot_equity_curve(session, symbol=symbol, interval=interval)
+
+
+# Background jobs (run on the shared JobRunner; each receives a progress callback)
+def fetch_job(symbol, interval, start_date, progress):
+    agent = HistoricalDataAgent(symbol=symbol, interval=interval)
+    if not os.path.exists(agent.data_file):
+        logger.info(f"Fetching historical data for {symbol} at {interval} from {start_date}")
+        agent.collect_historical_data(start_date=start_date, progress=progress)
+    progress(1.0, "Precomputing Heikin Ashi")
+    session = DatasetSession(symbol, interval, data_file=agent.data_file)
+    get_chart_agent().data_calc_agent.calculate_heikin_ashi(session, symbol, interval)
+    return len(session.df)
+
+
+def backtest_job(data_file, symbol, interval, initial_cash, position_size_pct, start, end, progress):
+    progress(0.1, "Running backtest")
+    results = BacktestAgent(DatasetSession(symbol, interval, data_file=data_file, start=start, end=end)).run_backtest(
+        strategy="ema_crossover", initial_cash=initial_cash, position_size_pct=position_size_pct, symbol=symbol, interval=interval
+    )
+    return {k: v for k, v in results.items() if k != 'equity'}
+
+
+def sweep_job(data_file, symbol, interval, initial_cash, start, end, progress):
+    agent = BacktestAgent(DatasetSession(symbol, interval, data_file=data_file, start=start, end=end))
+    grid = {'fast_length': [5, 9, 12, 20], 'slow_length': [21, 34, 50, 100]}
+    return agent.run_sweep(grid, initial_cash=initial_cash, symbol=symbol, interval=interval, progress=progress)
+
+
+chart_agent = get_chart_agent()
+job_runner = get_job_runner()
+historical_agent = get_historical_agent()
 
 # Initialize session state
 if 'data_file' not in st.session_state:
     st.session_state.data_file = None
 if 'websocket_running' not in st.session_state:
     st.session_state.websocket_running = False
+if 'live_chart' not in st.session_state:
+    st.session_state.live_chart = None  # (LiveChartAgent, LivePatchServer) while live mode is on
 
 # Input fields
 with st.sidebar:
@@ -30,34 +122,26 @@ with st.sidebar:
     symbol = st.text_input("Symbol (e.g., BTCUSDT)", "BTCUSDT")
     interval = st.selectbox("Interval", ["1m", "5m", "15m", "1h", "4h", "1d"], index=3)
     start_date = st.date_input("Start Date", value=date(2019, 1, 1))
+    # Charts and backtests read only this range (plus indicator warm-up bars) from the data file
+    chart_range = st.date_input("Chart Range", value=(start_date, date.today()))
+    range_start, range_end = range_bounds(chart_range, start_date)
     chart_type = st.selectbox("Chart Type", ["Normal Candlestick", "Heikin Ashi"], index=0)
     chart_type_value = "normal" if chart_type == "Normal Candlestick" else "heikin_ashi"
     initial_cash = st.number_input("Initial Capital", min_value=1000, value=100000)
     position_size_pct = st.number_input("Position Size (%)", min_value=0.01, max_value=0.20, value=0.10, step=0.01)
     enable_websocket = st.checkbox("Enable Real-Time Updates (WebSocket)", value=False)
     run_backtest = st.checkbox("Run Backtest with EMA Crossover", value=False)
+    run_sweep = st.checkbox("Run EMA Parameter Sweep", value=False)
 
 # Set data file path
-data_file = os.path.join("data/raw", f"{symbol}_{interval}.csv")
+data_file = get_store().path(symbol, interval)
 st.session_state.data_file = data_file
+fingerprint = file_fingerprint(data_file)
 
-# Fetch initial data
+# Fetch initial data in the background
 if st.button("Fetch Historical Data"):
-    try:
-        historical_agent.set_symbol(symbol)
-        historical_agent.set_interval(interval)
-        if not os.path.exists(data_file):
-            logger.info(f"Fetching historical data for {symbol} at {interval} from {start_date}")
-            historical_agent.collect_historical_data(start_date=start_date.strftime("%Y-%m-%d"))
-        df = historical_agent.read_data()
-        if df.empty:
-            st.warning("No data available for the selected symbol and interval")
-        else:
-            st.write("Loaded DataFrame:", df.head())
-        # Precompute Heikin Ashi
-        chart_agent.data_calc_agent.calculate_heikin_ashi(data_file, symbol, interval)
-    except Exception as e:
-        st.error(f"Error fetching or calculating data: {e}")
+    job_runner.submit(f"Fetch {symbol} {interval}", fetch_job, symbol, interval, start_date.strftime("%Y-%m-%d"),
+                      key=('fetch', symbol, interval))
 
 # Handle WebSocket
 if enable_websocket and not st.session_state.websocket_running:
@@ -66,7 +150,10 @@ if enable_websocket and not st.session_state.websocket_running:
         historical_agent.set_interval(interval)
         historical_agent.start_websocket()
         st.session_state.websocket_running = True
-        st.write("Started WebSocket for real-time updates.")
+        if isinstance(historical_agent.websocket_agent, HubSubscriber):
+            st.write("Following real-time updates from the ingest hub.")
+        else:
+            st.write("Started WebSocket for real-time updates.")
     except Exception as e:
         st.error(f"Error starting WebSocket: {e}")
 
@@ -78,47 +165,85 @@ if not enable_websocket and st.session_state.websocket_running:
     except Exception as e:
         st.error(f"Error stopping WebSocket: {e}")
 
-# Run backtest if enabled
-backtest_results = None
-if run_backtest and os.path.exists(data_file):
+# Live chart: built once from history, then patched in the browser per kline (no reruns)
+if st.session_state.live_chart is not None:
+    live_agent, live_server = st.session_state.live_chart
+    if not st.session_state.websocket_running or (live_agent.symbol, live_agent.interval) != (symbol, interval):
+        if historical_agent.websocket_agent:
+            historical_agent.websocket_agent.remove_listener(live_agent.on_kline)
+        live_server.stop()
+        st.session_state.live_chart = None
+
+if st.session_state.websocket_running and st.session_state.live_chart is None and fingerprint:
     try:
-        backtest_agent = BacktestAgent(data_file)
-        results = backtest_agent.run_backtest(
-            strategy="ema_crossover",
-            initial_cash=initial_cash,
-            position_size_pct=position_size_pct,
-            symbol=symbol,
-            interval=interval
-        )
-        backtest_results = results.get('equity', [])
-        st.write("Backtest Results:", {k: v for k, v in results.items() if k != 'equity'})
+        live_agent = LiveChartAgent(symbol=symbol, interval=interval)
+        live_agent.build_figure(DatasetSession(symbol, interval, data_file=data_file, start=range_start, warmup=0).df)
+        live_server = LivePatchServer(live_agent, port=0).start()
+        historical_agent.websocket_agent.add_listener(live_agent.on_kline)
+        st.session_state.live_chart = (live_agent, live_server)
     except Exception as e:
-        st.error(f"Error running backtest: {e}")
+        st.error(f"Error starting live chart: {e}")
+
+# Backtest and sweep run in the background; results are keyed by data fingerprint and parameters
+backtest_key = ('backtest', data_file, fingerprint, initial_cash, position_size_pct, range_start, range_end)
+sweep_key = ('sweep', data_file, fingerprint, initial_cash, range_start, range_end)
+if run_backtest and fingerprint and job_runner.find(backtest_key) is None:
+    job_runner.submit(f"Backtest {symbol} {interval}", backtest_job, data_file, symbol, interval, initial_cash, position_size_pct,
+                      range_start, range_end, key=backtest_key)
+if run_sweep and fingerprint and job_runner.find(sweep_key) is None:
+    job_runner.submit(f"Sweep {symbol} {interval}", sweep_job, data_file, symbol, interval, initial_cash, range_start, range_end,
+                      key=sweep_key)
+
+
+def _poll_jobs():
+    """Show running jobs; when the last one finishes, rerun once so results appear."""
+    active = job_runner.active()
+    for job in active:
+        st.progress(job.progress, text=f"{job.name}: {job.message or job.status}")
+    if st.session_state.get('jobs_were_active') and not active:
+        st.session_state.jobs_were_active = False
+        st.rerun()
+    st.session_state.jobs_were_active = bool(active)
+
+
+if hasattr(st, "fragment"):
+    st.fragment(run_every=1)(_poll_jobs)()
+else:
+    _poll_jobs()
+
+for job in [job_runner.find(('fetch', symbol, interval)), job_runner.find(backtest_key), job_runner.find(sweep_key)]:
+    if job is not None and job.status == "failed":
+        st.error(f"{job.name} failed: {job.error}")
+
+backtest_job_state = job_runner.find(backtest_key) if run_backtest else None
+if backtest_job_state is not None and backtest_job_state.status == "done":
+    st.write("Backtest Results:", backtest_job_state.result)
+
+sweep_job_state = job_runner.find(sweep_key) if run_sweep else None
+if sweep_job_state is not None and sweep_job_state.status == "done":
+    st.header("EMA Parameter Sweep")
+    st.dataframe(sweep_job_state.result, use_container_width=True)
 
 # Plot charts
-if os.path.exists(data_file):
+if st.session_state.live_chart is not None:
+    st.header("Live Chart")
+    components.iframe(st.session_state.live_chart[1].url, height=920)
+elif fingerprint:
     try:
-        combined_fig = chart_agent.plot_combined_charts(
-            data_file,
-            symbol=symbol,
-            interval=interval,
-            indicators=["sma", "rsi"],
-            strategy="ema_crossover",
-            chart_type=chart_type_value
-        )
+        combined_fig = build_combined_figure(data_file, fingerprint, symbol, interval, chart_type_value, range_start, range_end)
         st.header("Real-Time Combined Charts")
-        st.plotly_chart(combined_fig, use_container_width=True, config={'scrollZoom': True}, key="combined_chart")
-        
+        with span('streamlit.plotly_chart'):  # Plotly serialization to the browser
+            st.plotly_chart(combined_fig, use_container_width=True, config={'scrollZoom': True}, key="combined_chart")
+
         # Plot equity curve if backtest was run
-        if backtest_results:
-            equity_fig = chart_agent.plot_equity_curve(data_file, symbol=symbol, interval=interval)
+        if backtest_job_state is not None and backtest_job_state.status == "done":
+            backtest_file = chart_agent.store.path(symbol, interval, "backtest")
+            equity_fig = build_equity_figure(data_file, fingerprint, file_fingerprint(backtest_file), symbol, interval,
+                                             range_start, range_end)
             st.header("Equity Curve")
-            st.plotly_chart(equity_fig, use_container_width=True, config={'scrollZoom': True}, key="equity_chart")
+            with span('streamlit.plotly_chart'):
+                st.plotly_chart(equity_fig, use_container_width=True, config={'scrollZoom': True}, key="equity_chart")
     except Exception as e:
         st.error(f"Error generating charts: {e}")
 
-# Auto-refresh for real-time updates
-if st.session_state.websocket_running:
-    st.experimental_rerun()
-
-st.write("Note: Real-time updates are enabled when WebSocket is active. Disable to stop auto-refresh.")
\ No newline at end of file
+st.write("Note: Real-time updates are streamed into the live chart while the WebSocket is active.")
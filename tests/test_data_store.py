@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+from utils.data_store import DataStore
+
+
+def _klines(start, periods, freq):
+    return pd.DataFrame({
+        'open_time': pd.date_range(start, periods=periods, freq=freq),
+        'open': 1.0, 'high': 2.0, 'low': 0.5, 'close': 1.5, 'volume': 10.0,
+    })
+
+
+@pytest.mark.parametrize('freq', ['1D', '1h', '1s'])
+def test_append_rows_keeps_the_file_readable(tmp_path, freq):
+    # 1d files are written date-only by pandas, shorter intervals with seconds: appended rows
+    # must use the same format or the column no longer parses
+    store = DataStore(raw_dir=str(tmp_path / 'raw'), processed_dir=str(tmp_path / 'processed'))
+    df = _klines('2024-01-01', 10, freq)
+    path = store.save(df.iloc[:8], 'X', '1d', 'heikin_ashi')
+    store.append_rows(df.iloc[8:9], path)
+    store.append_rows(df.iloc[9:], path)
+    loaded = store.load('X', '1d', 'heikin_ashi')
+    pd.testing.assert_frame_equal(loaded, df, check_dtype=False)
+
+
+def test_readers_skip_a_row_being_appended(tmp_path):
+    store = DataStore(raw_dir=str(tmp_path / 'raw'), processed_dir=str(tmp_path / 'processed'))
+    df = _klines('2024-01-01', 5, '1h')
+    path = store.save(df, 'X', '1h')
+    with open(path, 'ab') as f:
+        f.write(b'2024-01-01 05:00:00,1.0,2.0,0')  # torn tail: no newline yet
+    pd.testing.assert_frame_equal(store.read_path(path), df, check_dtype=False)
+    pd.testing.assert_frame_equal(pd.concat(store.iter_chunks(path, 2)), df, check_dtype=False)
+    pd.testing.assert_frame_equal(store.read_range(path, start='2024-01-01 02:00', warmup=0), df.iloc[2:].reset_index(drop=True), check_dtype=False)
+
+
+def test_append_rows_with_key_replaces_a_stored_bar(tmp_path):
+    # the forming bar stored by a sync is replaced by its closed version; newer bars are appended
+    store = DataStore(raw_dir=str(tmp_path / 'raw'), processed_dir=str(tmp_path / 'processed'))
+    df = _klines('2024-01-01', 6, '1h')
+    path = store.save(df.iloc[:4].assign(close=[1.5, 1.5, 1.5, 9.0]), 'X', '1h')
+    store.read_range(path, start='2024-01-01 01:00', warmup=0)  # index the file
+    store.append_rows(df.iloc[3:4], path, key='open_time')
+    store.append_rows(df.iloc[4:5], path, key='open_time')
+    store.append_rows(df.iloc[5:], path, key='open_time')
+    pd.testing.assert_frame_equal(store.read_path(path), df, check_dtype=False)
+    pd.testing.assert_frame_equal(store.read_range(path, start='2024-01-01 03:00', warmup=1), df.iloc[2:].reset_index(drop=True),
+                                  check_dtype=False)
@@ -1,12 +1,10 @@
-from autogen import UserProxyAgent
 from agents.binance_agent import BinanceAgent
 from agents.chart_agent import ChartAgent
 
-from agents.backtest_agent import BacktestAgent  
-
 
 class BinanceUserProxy:
     def __init__(self):
+        from autogen import UserProxyAgent  # heavy; only needed once the proxy is actually built
         self.binance_agent = BinanceAgent()
         self.chart_agent = ChartAgent()
         self.user_proxy = UserProxyAgent(
@@ -38,6 +36,7 @@ class BinanceUserProxy:
         backtest_results = None
         if strategy:
             print(f"\n🔍 Running backtest for strategy: {strategy}")
+            from agents.backtest_agent import BacktestAgent  # loads backtrader only when backtesting
             backtest_agent = BacktestAgent(df)
             results = backtest_agent.run_backtest(strategy=strategy)
             print("📊 Backtest Results:")
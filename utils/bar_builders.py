@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Information-driven bars from trades. A bar closes on the first trade at which its accumulated
+# measure (base volume, quote/dollar value or trade count) reaches the threshold; the overshoot of
+# that trade is not carried into the next bar. Measures are accumulated as integers (volume in
+# 1e-8 units, the exchange's quantity resolution; dollar value in 1e-4 units), so where a bar
+# closes never depends on how the trades were split into update() calls.
+BAR_KINDS = ('volume', 'dollar', 'tick')
+UNIT_SCALE = {'volume': 10**8, 'dollar': 10**4, 'tick': 1}
+VOLUME_SCALE = 10**8
+# open_time is a datetime like the kline files; close_time (time of the closing trade) stays epoch ms
+BAR_COLUMNS = ['open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'trades']
+
+
+def bar_interval(kind, threshold):
+    """Interval label of a bar series, used for its file name (e.g. 'volume_100', 'tick_1000')."""
+    if kind not in BAR_KINDS:
+        raise ValueError(f"Unknown bar kind '{kind}' (available: {', '.join(BAR_KINDS)})")
+    return f"{kind}_{threshold:g}"
+
+
+def empty_bars():
+    """Empty bars frame with BAR_COLUMNS."""
+    return pd.DataFrame({
+        'open_time': pd.to_datetime(np.empty(0, dtype=np.int64), unit='ms'),
+        'open': np.empty(0), 'high': np.empty(0), 'low': np.empty(0), 'close': np.empty(0), 'volume': np.empty(0),
+        'close_time': np.empty(0, dtype=np.int64), 'trades': np.empty(0, dtype=np.int64),
+    })
+
+
+class BarBuilder:
+    """
+    Incremental volume/dollar/tick bar builder. update() takes a batch of trades (arrays, in
+    trade order) and returns the bars completed by it in the kline OHLCV schema (plus
+    close_time and trades), so IndicatorAgent, StrategyAgent and BacktestAgent consume them
+    unchanged. Work per batch is vectorized: one cumulative sum, one binary search per
+    completed bar and reduceat for the OHLCV fields.
+    """
+
+    def __init__(self, kind, threshold):
+        """
+        Args:
+            kind: 'volume' (base asset), 'dollar' (quote asset value) or 'tick' (trade count)
+            threshold: Measure per bar, e.g. 100 (BTC), 5_000_000 (USDT) or 1000 (trades)
+        """
+        if kind not in BAR_KINDS:
+            raise ValueError(f"Unknown bar kind '{kind}' (available: {', '.join(BAR_KINDS)})")
+        self.kind = kind
+        self.threshold = threshold
+        self.threshold_units = int(round(threshold * UNIT_SCALE[kind]))
+        if self.threshold_units <= 0:
+            raise ValueError("Bar threshold must be positive")
+        self.interval = bar_interval(kind, threshold)
+        self._acc = 0  # measure units accumulated by the forming bar
+        self._forming = None  # [open_ms, open, high, low, close, volume units, close_ms, trades]
+
+    def _units(self, price, qty, volume_units):
+        if self.kind == 'tick':
+            return None
+        if self.kind == 'volume':
+            return volume_units
+        return np.rint(price * qty * UNIT_SCALE['dollar']).astype(np.int64)
+
+    def _bar_ends(self, units, n):
+        """Indices of the trades closing a bar in this batch; updates the accumulated measure."""
+        need = self.threshold_units - self._acc
+        if self.kind == 'tick':
+            ends = np.arange(need - 1, n, self.threshold_units, dtype=np.int64)
+            self._acc = (self._acc + n) if not len(ends) else n - 1 - int(ends[-1])
+            return ends
+        cumulative = np.cumsum(units)
+        ends, base = [], 0
+        while True:
+            end = int(np.searchsorted(cumulative, base + need, side='left'))
+            if end >= n:
+                break
+            ends.append(end)
+            base, need = int(cumulative[end]), self.threshold_units
+        self._acc = (self._acc + int(cumulative[-1])) if not ends else int(cumulative[-1]) - base
+        return np.array(ends, dtype=np.int64)
+
+    def update(self, time_ms, price, qty):
+        """
+        Consume a batch of trades.
+        Args:
+            time_ms: Trade times (epoch ms), array-like
+            price: Trade prices
+            qty: Trade quantities (base asset)
+        Returns:
+            pandas.DataFrame of the bars completed by this batch (possibly empty)
+        """
+        time_ms = np.asarray(time_ms, dtype=np.int64)
+        price = np.asarray(price, dtype=np.float64)
+        qty = np.asarray(qty, dtype=np.float64)
+        n = len(price)
+        if n == 0:
+            return empty_bars()
+        volume_units = np.rint(qty * VOLUME_SCALE).astype(np.int64)
+        ends = self._bar_ends(self._units(price, qty, volume_units), n)
+        tail_start = int(ends[-1]) + 1 if len(ends) else 0
+        bars = None
+        if len(ends):
+            starts = np.concatenate([[0], ends[:-1] + 1])
+            m = tail_start
+            open_ms, close_ms = time_ms[starts], time_ms[ends]
+            open_, close = price[starts], price[ends]
+            high = np.maximum.reduceat(price[:m], starts)
+            low = np.minimum.reduceat(price[:m], starts)
+            volume = np.add.reduceat(volume_units[:m], starts)
+            trades = ends - starts + 1
+            if self._forming is not None:
+                f_open_ms, f_open, f_high, f_low, _, f_volume, _, f_trades = self._forming
+                open_ms[0], open_[0] = f_open_ms, f_open
+                high[0], low[0] = max(high[0], f_high), min(low[0], f_low)
+                volume[0] += f_volume
+                trades[0] += f_trades
+                self._forming = None
+            bars = pd.DataFrame({
+                'open_time': pd.to_datetime(open_ms, unit='ms'), 'open': open_, 'high': high, 'low': low, 'close': close,
+                'volume': volume / VOLUME_SCALE, 'close_time': close_ms, 'trades': trades,
+            })
+        if tail_start < n:
+            tail = slice(tail_start, n)
+            t_high, t_low = float(price[tail].max()), float(price[tail].min())
+            t_volume, t_trades = int(volume_units[tail].sum()), n - tail_start
+            if self._forming is None:
+                self._forming = [int(time_ms[tail_start]), float(price[tail_start]), t_high, t_low, 0.0, 0, 0, 0]
+            forming = self._forming
+            forming[2], forming[3] = max(forming[2], t_high), min(forming[3], t_low)
+            forming[4], forming[6] = float(price[-1]), int(time_ms[-1])
+            forming[5] += t_volume
+            forming[7] += t_trades
+        return bars if bars is not None else empty_bars()
+
+    def forming(self):
+        """The bar being built as a dict in the bar schema (None before the first trade of a bar)."""
+        if self._forming is None:
+            return None
+        open_ms, open_, high, low, close, volume, close_ms, trades = self._forming
+        return {'open_time': pd.to_datetime(open_ms, unit='ms'), 'open': open_, 'high': high, 'low': low, 'close': close,
+                'volume': volume / VOLUME_SCALE, 'close_time': close_ms, 'trades': trades}
+
+    def reset(self):
+        """Drop the forming bar and the accumulated measure."""
+        self._acc = 0
+        self._forming = None
+
+
+def build_bars(trades, kind, threshold):
+    """
+    Bars of a whole trades frame in one call.
+    Args:
+        trades: Frame with 'time' (epoch ms), 'price' and 'qty' columns in trade order
+        kind: 'volume', 'dollar' or 'tick'
+        threshold: Measure per bar
+    Returns:
+        pandas.DataFrame of the completed bars
+    """
+    return BarBuilder(kind, threshold).update(trades['time'].to_numpy(), trades['price'].to_numpy(), trades['qty'].to_numpy())
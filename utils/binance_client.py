@@ -0,0 +1,270 @@
+import asyncio
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+from requests.adapters import HTTPAdapter
+from utils.config import Config
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Request weight per REST endpoint (Binance spot docs); unlisted endpoints count as 1
+ENDPOINT_WEIGHTS = {
+    '/api/v3/klines': 2,
+    '/api/v3/aggTrades': 4,
+    '/api/v3/exchangeInfo': 20,
+    '/api/v3/ticker/price': 2,
+}
+# /api/v3/depth weight by limit: (max limit, weight)
+DEPTH_WEIGHTS = ((100, 5), (500, 25), (1000, 50), (5000, 250))
+
+
+def request_weight(path, params=None):
+    """Request weight of one REST call, used to charge the shared budget before sending it."""
+    if path.endswith('/v3/depth'):
+        limit = int((params or {}).get('limit', 100))
+        return next((weight for max_limit, weight in DEPTH_WEIGHTS if limit <= max_limit), 250)
+    for endpoint, weight in ENDPOINT_WEIGHTS.items():
+        if path.endswith(endpoint[len('/api'):]):
+            return weight
+    return 1
+
+
+class RequestWeightBudget:
+    """
+    Process-wide request-weight budget per one-minute window (Binance resets weights on minute
+    boundaries). Callers charge a request before sending it and wait when the window is spent;
+    the X-MBX-USED-WEIGHT-1M response header is authoritative and corrects the local count
+    (other processes sharing the IP also consume weight).
+    """
+
+    def __init__(self, limit_per_minute=None):
+        """
+        Args:
+            limit_per_minute: Weight allowed per minute (default: Config.BINANCE_WEIGHT_LIMIT)
+        """
+        self.limit = limit_per_minute or Config.BINANCE_WEIGHT_LIMIT
+        self.window = None
+        self.used = 0
+        self.waited_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def _roll(self, now):
+        window = int(now // 60)
+        if window != self.window:
+            self.window = window
+            self.used = 0
+
+    def try_acquire(self, weight):
+        """
+        Charge weight if it fits in the current window.
+        Returns:
+            0.0 if charged, otherwise the seconds until the next window
+        """
+        with self._lock:
+            now = time.time()
+            self._roll(now)
+            if self.used + weight <= self.limit or self.used == 0:
+                self.used += weight
+                return 0.0
+            return 60 - now % 60 + 0.01
+
+    def acquire(self, weight):
+        """Charge weight, sleeping until the next window when the budget is spent."""
+        while True:
+            wait = self.try_acquire(weight)
+            if not wait:
+                return
+            logger.warning(f"Request weight budget spent ({self.used}/{self.limit}), waiting {wait:.1f}s")
+            self.waited_seconds += wait
+            time.sleep(wait)
+
+    async def acquire_async(self, weight):
+        while True:
+            wait = self.try_acquire(weight)
+            if not wait:
+                return
+            self.waited_seconds += wait
+            await asyncio.sleep(wait)
+
+    def observe(self, headers):
+        """Sync with the server-side count from response headers."""
+        used = headers.get('X-MBX-USED-WEIGHT-1M') or headers.get('x-mbx-used-weight-1m')
+        if used is None:
+            return
+        with self._lock:
+            self._roll(time.time())
+            self.used = max(self.used, int(used))
+
+
+class WeightedHTTPAdapter(HTTPAdapter):
+    """Pooled keep-alive adapter that charges every request against a RequestWeightBudget."""
+
+    def __init__(self, budget, pool_size=None, **kwargs):
+        pool_size = pool_size or Config.HTTP_POOL_SIZE
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size, **kwargs)
+        self.budget = budget
+        self.requests = 0
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.budget.acquire(request_weight(url.path, params))
+        response = super().send(request, **kwargs)
+        self.requests += 1
+        self.budget.observe(response.headers)
+        return response
+
+
+_budget = None
+_client = None
+_provider_lock = threading.Lock()
+
+
+def get_budget():
+    """The request-weight budget shared by every client in this process."""
+    global _budget
+    with _provider_lock:
+        if _budget is None:
+            _budget = RequestWeightBudget()
+        return _budget
+
+
+def create_client(base_url=None, budget=None):
+    """
+    Build a python-binance Client on a pooled, weight-budgeted session. No ping round trip: the
+    first real request opens the connection. python-binance is imported here so that modules
+    using this provider stay cheap to import.
+    Args:
+        base_url: REST base URL ending in '/api' (default: Config.BINANCE_API_URL)
+        budget: RequestWeightBudget (default: the process-wide one)
+    Returns:
+        binance.client.Client
+    """
+    from binance.client import Client
+    client = Client(Config.BINANCE_API_KEY, Config.BINANCE_API_SECRET, ping=False)
+    client.API_URL = (base_url or Config.BINANCE_API_URL).rstrip('/')
+    adapter = WeightedHTTPAdapter(budget or get_budget())
+    client.session.mount('https://', adapter)
+    client.session.mount('http://', adapter)
+    logger.info(f"Created Binance client for {client.API_URL}")
+    return client
+
+
+def get_client():
+    """Process-wide Binance client shared by all agents (one connection pool, one weight budget)."""
+    global _client
+    if _client is None:
+        client = create_client()
+        with _provider_lock:
+            if _client is None:
+                _client = client
+    return _client
+
+
+def reset_client():
+    """Drop the shared client (e.g. after changing Config.BINANCE_API_URL)."""
+    global _client
+    with _provider_lock:
+        if _client is not None:
+            _client.session.close()
+        _client = None
+
+
+class AsyncBinanceClient:
+    """
+    Minimal asyncio REST client for concurrent public-data requests (klines, depth, aggTrades),
+    on one keep-alive aiohttp connection pool and the shared weight budget.
+
+    Usage:
+        async with AsyncBinanceClient() as client:
+            results = await client.gather_klines([{'symbol': 'BTCUSDT', 'interval': '1h'}, ...])
+    """
+
+    def __init__(self, base_url=None, budget=None, pool_size=None, concurrency=None, timeout=30):
+        """
+        Args:
+            base_url: REST base URL ending in '/api' (default: Config.BINANCE_API_URL)
+            budget: RequestWeightBudget (default: the process-wide one)
+            pool_size: Maximum open connections (default: Config.HTTP_POOL_SIZE)
+            concurrency: Maximum requests in flight in gather_* (default: pool_size)
+            timeout: Total timeout per request in seconds
+        """
+        self.base_url = (base_url or Config.BINANCE_API_URL).rstrip('/')
+        self.budget = budget or get_budget()
+        self.pool_size = pool_size or Config.HTTP_POOL_SIZE
+        self.concurrency = concurrency or self.pool_size
+        self.timeout = timeout
+        self.session = None
+
+    async def __aenter__(self):
+        import aiohttp
+        connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def get(self, path, **params):
+        """
+        GET a public endpoint, e.g. get('v3/klines', symbol='BTCUSDT', interval='1h').
+        Raises:
+            RuntimeError: On a non-2xx response (message includes Binance's error body)
+        """
+        params = {k: v for k, v in params.items() if v is not None}
+        await self.budget.acquire_async(request_weight(f"/api/{path}", params))
+        async with self.session.get(f"{self.base_url}/{path}", params=params) as response:
+            self.budget.observe(response.headers)
+            if response.status >= 300:
+                raise RuntimeError(f"GET {path} failed with {response.status}: {await response.text()}")
+            return await response.json()
+
+    async def get_klines(self, symbol, interval, startTime=None, endTime=None, limit=1000):
+        return await self.get('v3/klines', symbol=symbol, interval=interval, startTime=startTime, endTime=endTime, limit=limit)
+
+    async def gather_klines(self, requests, return_exceptions=True, on_done=None):
+        """
+        Run many get_klines calls concurrently (bounded by self.concurrency).
+        Args:
+            requests: List of get_klines keyword dicts
+            return_exceptions: Return exceptions in place of failed results instead of raising
+            on_done: Optional callback on_done(completed_count, total) after each request
+        Returns:
+            List of results in request order
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        completed = 0
+
+        async def one(kwargs):
+            nonlocal completed
+            async with semaphore:
+                try:
+                    return await self.get_klines(**kwargs)
+                finally:
+                    completed += 1
+                    if on_done:
+                        on_done(completed, len(requests))
+        return await asyncio.gather(*(one(kwargs) for kwargs in requests), return_exceptions=return_exceptions)
+
+
+class LazyClientMixin:
+    """Gives an agent a `client` attribute resolved to the shared client on first access (and can be assigned)."""
+
+    _client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client()
+        return self._client
+
+    @client.setter
+    def client(self, value):
+        self._client = value
@@ -0,0 +1,220 @@
+import array
+import functools
+import os
+import threading
+import numpy as np
+import pandas as pd
+import backtrader as bt
+from utils.compact import float64_values
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# backtrader stores datetimes as float days since 0001-01-01 (date2num); the unix epoch is 719163.0
+BT_EPOCH_NUM = 719163.0
+MS_PER_DAY = 86400000.0
+
+FEED_LINES = ('datetime', 'open', 'high', 'low', 'close', 'volume', 'openinterest')
+
+
+class FeedArrays:
+    """Contiguous float64 column arrays ready to be handed to backtrader lines."""
+
+    def __init__(self, columns):
+        """
+        Args:
+            columns: Dict of line name -> 1-D numpy array (all of equal length)
+        """
+        self.columns = {name: np.ascontiguousarray(values, dtype=np.float64) for name, values in columns.items()}
+        lengths = {len(values) for values in self.columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Feed columns have mismatched lengths: {sorted(lengths)}")
+        self.length = lengths.pop() if lengths else 0
+
+    def __len__(self):
+        return self.length
+
+    def line_buffer(self, name):
+        """Buffer view of a line's values; contiguous, so array.frombytes is a single copy."""
+        return memoryview(self.columns[name]).cast('B')
+
+    @classmethod
+    def from_dataframe(cls, df, datetime_col='open_time'):
+        """
+        Build feed arrays from a kline DataFrame.
+        Args:
+            df: DataFrame with [open_time, open, high, low, close] and optionally volume/openinterest
+            datetime_col: Name of the datetime column
+        Returns:
+            FeedArrays instance
+        """
+        open_time = df[datetime_col]
+        if pd.api.types.is_datetime64_any_dtype(open_time):
+            epoch_ms = open_time.to_numpy(dtype='datetime64[ms]').astype(np.int64)
+        else:
+            epoch_ms = open_time.to_numpy(dtype=np.int64)
+        columns = {'datetime': BT_EPOCH_NUM + epoch_ms / MS_PER_DAY}
+        for name in FEED_LINES[1:]:
+            if name in df.columns:
+                # compact float32 columns are restored exactly to their tick size
+                columns[name] = float64_values(df, name)
+            else:
+                columns[name] = np.zeros(len(df), dtype=np.float64)
+        return cls(columns)
+
+
+class NumpyData(bt.feed.DataBase):
+    """
+    Backtrader data feed backed by FeedArrays.
+
+    With preload enabled the line buffers are filled in one shot from the arrays instead of
+    pushing bar by bar through load(); runonce and next modes both work on the result.
+    With preload disabled bars are delivered one at a time from the same arrays.
+    """
+    params = (
+        ('arrays', None),
+    )
+
+    def start(self):
+        super(NumpyData, self).start()
+        if self.p.arrays is None:
+            raise ValueError("NumpyData requires the 'arrays' parameter")
+        self._cursor = 0
+
+    def _can_bulk_load(self):
+        if self._filters or self._ffilters or self._tzinput:
+            return False
+        if self.p.fromdate is not None or self.p.todate is not None:
+            return False
+        return all(line.mode == line.UnBounded for line in self.lines)
+
+    def preload(self):
+        if not self._can_bulk_load():
+            return super(NumpyData, self).preload()
+
+        arrays = self.p.arrays
+        for name in self.lines.getlinealiases():
+            line = getattr(self.lines, name)
+            buf = array.array(str('d'))
+            if name in arrays.columns:
+                buf.frombytes(arrays.line_buffer(name))
+            else:
+                buf.extend([float('nan')] * len(arrays))
+            line.array = buf
+        self._cursor = len(arrays)
+        self._last()
+        self.home()
+
+    def _load(self):
+        arrays = self.p.arrays
+        if self._cursor >= len(arrays):
+            return False
+        i = self._cursor
+        for name, values in arrays.columns.items():
+            getattr(self.lines, name)[0] = values[i]
+        self._cursor += 1
+        return True
+
+
+@functools.lru_cache(maxsize=None)
+def numpy_data_class(extra_lines):
+    """
+    NumpyData subclass with extra lines (e.g. multi-timeframe features), filled from the
+    FeedArrays columns of the same names.
+    Args:
+        extra_lines: Tuple of line names
+    """
+    if not extra_lines:
+        return NumpyData
+    return type('NumpyData', (NumpyData,), {'lines': tuple(extra_lines)})
+
+
+class ChunkedData(bt.feed.DataBase):
+    """
+    Backtrader data feed pulling bars from an iterable of time-ordered kline blocks (e.g.
+    DataStore.iter_chunks), so only one block is in memory at a time. Requires Cerebro with
+    preload=False and runonce=False. on_chunk(df) is called before the first bar of each block
+    is delivered, when the strategy has processed every bar of the previous blocks.
+    """
+    params = (
+        ('chunks', None),
+        ('on_chunk', None),
+    )
+
+    def start(self):
+        super(ChunkedData, self).start()
+        if self.p.chunks is None:
+            raise ValueError("ChunkedData requires the 'chunks' parameter")
+        self._chunks = iter(self.p.chunks)
+        self._arrays = None
+        self._cursor = 0
+
+    def _load(self):
+        while self._arrays is None or self._cursor >= len(self._arrays):
+            df = next(self._chunks, None)
+            if df is None:
+                return False
+            if len(df) == 0:
+                continue
+            if self.p.on_chunk is not None:
+                self.p.on_chunk(df)
+            self._arrays = FeedArrays.from_dataframe(df)
+            self._cursor = 0
+        i = self._cursor
+        for name, values in self._arrays.columns.items():
+            getattr(self.lines, name)[0] = values[i]
+        self._cursor += 1
+        return True
+
+
+class FeedCache:
+    """
+    Process-wide cache of FeedArrays so repeated backtests and optimizations on the same
+    data skip DataFrame -> backtrader conversion. Entries are keyed by source file and the
+    version (mtime, size) the DataFrame was read from, as DataStore.read_path records it in
+    df.attrs['source'], so a file changed after the load never gets the old arrays cached
+    under its new version.
+    """
+    _entries = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def _file_key(cls, data_file, df):
+        """(path, mtime ns, size) of the file version df holds, or None if unknown."""
+        source = df.attrs.get('source')
+        if source is None or source[0] != os.path.abspath(data_file) or source[3] != len(df):
+            return None
+        return tuple(source[:3])
+
+    @classmethod
+    def get(cls, data_file, df):
+        """
+        Return cached FeedArrays for a data file, building them from df on a miss (without
+        caching them when df does not carry its file version).
+        Args:
+            data_file: Path the DataFrame was loaded from
+            df: DataFrame holding the price data of data_file
+        Returns:
+            FeedArrays instance
+        """
+        key = cls._file_key(data_file, df)
+        if key is None:
+            return FeedArrays.from_dataframe(df)
+        with cls._lock:
+            arrays = cls._entries.get(key)
+            if arrays is not None:
+                return arrays
+        arrays = FeedArrays.from_dataframe(df)
+        with cls._lock:
+            # Drop stale versions of the same file
+            for old in [k for k in cls._entries if k[0] == key[0]]:
+                del cls._entries[old]
+            cls._entries[key] = arrays
+        logger.info(f"Cached feed arrays for {data_file} ({len(arrays)} bars)")
+        return arrays
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._entries.clear()
@@ -0,0 +1,81 @@
+import numpy as np
+import backtrader as bt
+from utils.bt_feeds import BT_EPOCH_NUM, MS_PER_DAY
+from utils.depth_store import DepthStore
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class DepthFillModel:
+    """
+    Fill prices from captured order books (utils.depth_store): a market order of a given size
+    pays the slippage of walking the book at its execution time, i.e. the half spread plus the
+    impact of the levels it takes. Bars without a captured book fill at the bar price.
+    """
+
+    def __init__(self, symbol, depth_store=None, max_stale_ms=None):
+        """
+        Args:
+            symbol: Trading pair symbol of the captured books
+            depth_store: DepthStore holding them (default: one on Config.DEPTH_DATA_DIR)
+            max_stale_ms: See DepthStore.book_at
+        """
+        self.symbol = symbol.upper()
+        self.depth = depth_store or DepthStore()
+        self.max_stale_ms = max_stale_ms
+        self.slippage = []  # bps per fill priced from a book
+        self.no_book = 0
+        self.beyond_book = 0
+
+    def __call__(self, side, qty, price, time_ms):
+        """
+        Execution price of a market order.
+        Args:
+            side: 'buy' or 'sell'
+            qty: Order size in the base asset
+            price: Price the order would fill at without depth (e.g. the bar open)
+            time_ms: Execution time (epoch ms)
+        Returns:
+            price moved by the order's slippage against the book mid
+        """
+        book = self.depth.book_at(self.symbol, time_ms, self.max_stale_ms)
+        if book is None or not len(book.bid_price) or not len(book.ask_price):
+            self.no_book += 1
+            return price
+        fill, filled = book.fill_price(side, qty)
+        if filled < qty:
+            # Beyond the captured depth: the rest fills at the last captured level
+            self.beyond_book += 1
+            last = book.ask_price[-1] if side == 'buy' else book.bid_price[-1]
+            fill = (fill * filled + last * (qty - filled)) / qty
+        sign = 1 if side == 'buy' else -1
+        slippage = sign * (fill - book.mid) / book.mid
+        self.slippage.append(slippage * 10_000)
+        return price * (1 + sign * slippage)
+
+    def summary(self):
+        """Fill statistics of the run."""
+        slippage = np.asarray(self.slippage)
+        return {
+            'fills': len(slippage) + self.no_book,
+            'fills_without_book': self.no_book,
+            'fills_beyond_book': self.beyond_book,
+            'avg_slippage_bps': float(slippage.mean()) if len(slippage) else 0.0,
+            'max_slippage_bps': float(slippage.max()) if len(slippage) else 0.0,
+        }
+
+
+class DepthBroker(bt.brokers.BackBroker):
+    """BackBroker whose market order fills are priced by a fill model (e.g. DepthFillModel) at the bar time."""
+
+    params = (('fill_model', None),)
+
+    def _execute(self, order, ago=None, price=None, cash=None, position=None, dtcoc=None):
+        if (self.p.fill_model is not None and order.exectype == bt.Order.Market and ago is not None and price is not None
+                and order.executed.remsize):
+            time_ms = int(round((order.data.datetime[0] - BT_EPOCH_NUM) * MS_PER_DAY))
+            side = 'buy' if order.isbuy() else 'sell'
+            price = self.p.fill_model(side, abs(order.executed.remsize), price, time_ms)
+        return super()._execute(order, ago=ago, price=price, cash=cash, position=position, dtcoc=dtcoc)
@@ -0,0 +1,163 @@
+import base64
+import glob
+import os
+import re
+import time
+from datetime import datetime
+import numpy as np
+import plotly
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+PLOTLYJS_NAME = "plotly.min.js"
+# Typed arrays ({'dtype', 'bdata'}) need plotly.py >= 5.19 (bundling plotly.js >= 2.28); older
+# installs get plain lists, still with dates as epoch-ms numbers
+TYPED_ARRAYS = tuple(int(part) for part in re.findall(r'\d+', plotly.__version__)[:2]) >= (5, 19)
+# File names of ChartAgent exports ({name}_{YYYYmmdd_HHMMSS}.html), the only files pruned
+EXPORT_PATTERN = "*_" + "[0-9]" * 8 + "_" + "[0-9]" * 6 + ".html"
+# Trace attributes that hold per-point data worth binary encoding
+ARRAY_KEYS = ('x', 'y', 'open', 'high', 'low', 'close')
+# plotly.js typed-array dtypes (no 64-bit integers, so epoch-ms timestamps travel as whole-number float64)
+TYPED_DTYPES = {np.dtype('float64'): 'f8', np.dtype('float32'): 'f4', np.dtype('int32'): 'i4',
+                np.dtype('uint32'): 'u4', np.dtype('int16'): 'i2', np.dtype('uint16'): 'u2',
+                np.dtype('int8'): 'i1', np.dtype('uint8'): 'u1'}
+
+
+def ensure_plotlyjs(output_dir):
+    """
+    Write the plotly.js bundle once into output_dir so exports can reference it instead of embedding it.
+    Returns:
+        Path to the shared plotly.min.js
+    """
+    path = os.path.join(output_dir, PLOTLYJS_NAME)
+    if not os.path.exists(path):
+        os.makedirs(output_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+        os.replace(tmp, path)
+        logger.info(f"Wrote shared plotly.js to {path}")
+    return path
+
+
+def _to_numeric(values):
+    """
+    Convert trace data to a typed numpy array; datetimes become epoch milliseconds.
+    Returns:
+        Tuple (array or None if not numeric, True if the values were datetimes)
+    """
+    if isinstance(values, dict) or values is None:
+        return None, False
+    arr = np.asarray(values)
+    if arr.dtype.kind in 'OU':
+        sample = next((v for v in arr if v is not None), None)
+        try:
+            if isinstance(sample, (str, datetime, np.datetime64)):
+                arr = np.asarray(arr, dtype='datetime64[ms]')
+            else:
+                arr = arr.astype(np.float64)
+        except (TypeError, ValueError):
+            return None, False
+    if np.issubdtype(arr.dtype, np.datetime64):
+        return arr.astype('datetime64[ms]').astype(np.int64).astype(np.float64), True
+    if arr.dtype.kind in 'iu' and arr.dtype not in TYPED_DTYPES:
+        arr = arr.astype(np.float64)
+    if arr.dtype.kind == 'b':
+        arr = arr.astype(np.uint8)
+    if arr.dtype not in TYPED_DTYPES:
+        return None, False
+    return np.ascontiguousarray(arr), False
+
+
+def _typed_array(arr):
+    if not TYPED_ARRAYS:
+        return arr.tolist()
+    return {'dtype': TYPED_DTYPES[arr.dtype], 'bdata': base64.b64encode(arr.tobytes()).decode('ascii')}
+
+
+def compact_figure_dict(fig, float32=False):
+    """
+    Figure dict with per-point arrays stored as base64 typed arrays (plain lists before plotly
+    5.19, see TYPED_ARRAYS) and dates as epoch-ms numbers.
+    Args:
+        fig: Plotly figure
+        float32: Store float price data as float32 (half the size; ~7 significant digits)
+    Returns:
+        Tuple (figure dict, {"trace{i}_{key}": numpy array} of the encoded data)
+    """
+    fig_dict = fig.to_plotly_json()
+    arrays = {}
+    date_axes = set()
+    for i, trace in enumerate(fig_dict.get('data', [])):
+        for key in ARRAY_KEYS:
+            arr, is_date = _to_numeric(trace.get(key))
+            if arr is None or arr.ndim != 1:
+                continue
+            if float32 and not is_date and arr.dtype == np.float64:
+                arr = arr.astype(np.float32)
+            trace[key] = _typed_array(arr)
+            arrays[f"trace{i}_{key}"] = arr
+            if is_date and key == 'x':
+                date_axes.add('xaxis' + trace.get('xaxis', 'x')[1:])
+    layout = fig_dict.setdefault('layout', {})
+    for axis in date_axes:
+        layout.setdefault(axis, {})['type'] = 'date'
+    return fig_dict, arrays
+
+
+def export_figure(fig, path, sidecar=False, float32=False):
+    """
+    Write a compact HTML export that references the shared plotly.js next to it.
+    Args:
+        fig: Plotly figure
+        path: Output .html path
+        sidecar: Also write the trace data as a compressed .npz next to the HTML
+        float32: Store float data as float32
+    Returns:
+        Path of the written HTML
+    """
+    output_dir = os.path.dirname(path) or "."
+    ensure_plotlyjs(output_dir)
+    fig_dict, arrays = compact_figure_dict(fig, float32=float32)
+    html = pio.to_html(fig_dict, include_plotlyjs=PLOTLYJS_NAME, full_html=True, validate=False)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(html)
+    if sidecar and arrays:
+        np.savez_compressed(os.path.splitext(path)[0] + ".npz", **arrays)
+    logger.info(f"Exported chart to {path}")
+    return path
+
+
+def prune_exports(output_dir, pattern=EXPORT_PATTERN, max_age_days=None, max_files=None):
+    """
+    Retention policy for chart exports: delete exports older than max_age_days and keep at most
+    max_files of the newest ones. Sidecar .npz files go with their HTML.
+    Args:
+        output_dir: Directory holding the exports
+        pattern: Glob for export files (default: any timestamped export name; other files are never touched)
+        max_age_days: Maximum age in days (None: no age limit)
+        max_files: Maximum number of exports kept (None: no count limit)
+    Returns:
+        List of deleted HTML paths
+    """
+    files = sorted(glob.glob(os.path.join(output_dir, pattern)), key=os.path.getmtime, reverse=True)
+    now = time.time()
+    doomed = []
+    for rank, path in enumerate(files):
+        too_old = max_age_days is not None and now - os.path.getmtime(path) > max_age_days * 86400
+        too_many = max_files is not None and rank >= max_files
+        if too_old or too_many:
+            doomed.append(path)
+    for path in doomed:
+        for victim in (path, os.path.splitext(path)[0] + ".npz"):
+            try:
+                os.remove(victim)
+            except FileNotFoundError:
+                pass
+    if doomed:
+        logger.info(f"Pruned {len(doomed)} old chart exports from {output_dir}")
+    return doomed
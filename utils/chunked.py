@@ -0,0 +1,257 @@
+import numpy as np
+import pandas as pd
+from utils.compact import compact_derived, float64_values
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Stateful pipeline stages for out-of-core processing: each stage consumes time-ordered blocks
+# of a kline file (DataStore.iter_chunks) and carries what it needs across block boundaries, so
+# the concatenated output equals the output of the in-memory agents on the whole file:
+#   - Heikin Ashi carries the last ha_open/ha_close (the only recursive part).
+#   - SMA carries TA-Lib's running window total and the trailing window, and repeats its
+#     add/divide/subtract order exactly.
+#   - EMA, RSI and MACD are recursive with geometrically decaying memory; they carry a tail of
+#     WARMUP_FACTOR x lookback closes and TA-Lib is re-run on tail + block. The start-up
+#     difference shrinks below float64 resolution long before the tail ends, so the values in
+#     the block are the same as in the full run.
+#   - The EMA crossover carries the last EMA values (pandas ewm with adjust=False only keeps its
+#     last value), the last signal and the FIFO position book.
+# The in-memory agents run the same stages on a single block.
+
+WARMUP_FACTOR = 80
+HA_COLUMNS = ['open_time', 'ha_open', 'ha_high', 'ha_low', 'ha_close', 'close']
+
+
+def _talib():
+    import talib
+    return talib
+
+
+class HeikinAshiStage:
+    """Heikin Ashi over consecutive blocks; output columns as DataCalculationAgent.calculate_heikin_ashi."""
+
+    def __init__(self, compact=False):
+        self.compact = compact
+        self.prev_open = None
+        self.prev_close = None
+
+    def process(self, df):
+        """
+        Args:
+            df: Block with ['open_time', 'open', 'high', 'low', 'close']
+        Returns:
+            pandas.DataFrame with HA_COLUMNS (NaN filled with 0)
+        """
+        if len(df) == 0:
+            return pd.DataFrame(columns=HA_COLUMNS)
+        # float64 inputs (compact float32 columns are restored exactly to their tick size)
+        o, h, l, c = (float64_values(df, col) for col in ('open', 'high', 'low', 'close'))
+        ha_close = (o + h + l + c) / 4
+        # ha_open is recursive (previous ha_open and ha_close), so it is the one part that needs a
+        # loop; a plain float loop is exact and orders of magnitude faster than per-row .loc writes
+        ha_open = [0.0] * len(df)
+        ha_open[0] = (o[0] + c[0]) / 2 if self.prev_open is None else (self.prev_open + self.prev_close) / 2
+        prev_close = ha_close.tolist()
+        for i in range(1, len(df)):
+            ha_open[i] = (ha_open[i-1] + prev_close[i-1]) / 2
+        self.prev_open, self.prev_close = ha_open[-1], prev_close[-1]
+        ha_open = np.array(ha_open)
+        # fmax/fmin skip NaN like DataFrame.max/min(axis=1)
+        ha_df = pd.DataFrame({
+            'open_time': df['open_time'],
+            'ha_open': ha_open,
+            'ha_high': np.fmax(np.fmax(h, ha_open), ha_close),
+            'ha_low': np.fmin(np.fmin(l, ha_open), ha_close),
+            'ha_close': ha_close,
+            'close': df['close'],
+        }, index=df.index).fillna(0)
+        if self.compact:
+            # close keeps the base column's dtype (and its decimals for float64_values)
+            ha_df = compact_derived(ha_df, float_columns=['ha_open', 'ha_high', 'ha_low', 'ha_close'])
+            ha_df.attrs['decimals'] = {k: v for k, v in df.attrs.get('decimals', {}).items() if k == 'close'}
+        return ha_df
+
+
+class _RunningSMA:
+    """TA-Lib SMA with its state (running window total) carried across blocks."""
+
+    def __init__(self, length):
+        self.length = length
+        self.window = []  # last length-1 prices
+        self.total = 0.0
+
+    def __call__(self, close):
+        n, out = self.length, []
+        prices = self.window + close.tolist()
+        total, start = self.total, len(self.window)
+        if start < n - 1:
+            # still filling the first window: TA-Lib sums the first length-1 prices up front
+            fill = min(n - 1, len(prices))
+            for i in range(start, fill):
+                total += prices[i]
+            out = [np.nan] * (fill - start)
+            start = fill
+        for i in range(start, len(prices)):
+            total += prices[i]
+            out.append(total / n)
+            total -= prices[i - n + 1]
+        self.total = total
+        self.window = prices[-(n - 1):] if n > 1 else []
+        return np.array(out, dtype=np.float64)
+
+
+class _WarmupTalib:
+    """TA-Lib function re-run on a carried tail of closes plus the block (see module comment)."""
+
+    def __init__(self, compute, lookback):
+        self.compute = compute
+        self.warmup = WARMUP_FACTOR * lookback
+        self.tail = np.empty(0)
+
+    def __call__(self, close):
+        values = self.compute(np.concatenate([self.tail, close]))
+        skip = len(self.tail)
+        self.tail = np.concatenate([self.tail, close])[-self.warmup:]
+        if isinstance(values, tuple):
+            return tuple(v[skip:] for v in values)
+        return values[skip:]
+
+
+# name -> (default parameters, output columns); defaults as in IndicatorAgent
+INDICATORS = {
+    'sma': ({'length': 14}, ('sma',)),
+    'ema': ({'length': 9}, ('ema',)),
+    'rsi': ({'length': 14}, ('rsi',)),
+    'macd': ({'fast': 12, 'slow': 26, 'signal': 9}, ('macd', 'macd_signal', 'macd_hist')),
+}
+
+
+def _indicator(name, params):
+    if name == 'sma':
+        return _RunningSMA(params['length'])
+    if name == 'ema':
+        return _WarmupTalib(lambda x: _talib().EMA(x, timeperiod=params['length']), params['length'])
+    if name == 'rsi':
+        return _WarmupTalib(lambda x: _talib().RSI(x, timeperiod=params['length']), params['length'])
+    return _WarmupTalib(lambda x: _talib().MACD(x, fastperiod=params['fast'], slowperiod=params['slow'], signalperiod=params['signal']),
+                        params['slow'] + params['signal'])
+
+
+class IndicatorStage:
+    """
+    Indicator columns over consecutive blocks, appended to the block like IndicatorAgent does.
+    Args:
+        indicators: Names ('sma', 'ema', 'rsi', 'macd') or (name, params) pairs, e.g. ('sma', {'length': 20})
+        compact: Store indicator columns as float32
+    """
+
+    def __init__(self, indicators=('sma', 'rsi'), compact=False):
+        self.compact = compact
+        self.indicators = []
+        for spec in indicators:
+            name, params = (spec, {}) if isinstance(spec, str) else spec
+            if name not in INDICATORS:
+                raise ValueError(f"Unknown indicator '{name}' (available: {', '.join(INDICATORS)})")
+            defaults, columns = INDICATORS[name]
+            self.indicators.append((columns, _indicator(name, dict(defaults, **params))))
+
+    def process(self, df):
+        close = float64_values(df, 'close')
+        out = df.copy(deep=False)
+        for columns, compute in self.indicators:
+            values = compute(close)
+            for col, v in zip(columns, values if isinstance(values, tuple) else (values,)):
+                out[col] = np.asarray(v, dtype=np.float32) if self.compact else v
+        return out
+
+
+class EmaCrossoverStage:
+    """
+    EMA crossover signals with FIFO position tracking over consecutive blocks (the logic of
+    StrategyAgent.ema_crossover_strategy). Open and completed positions accumulate on the stage.
+    Args:
+        fast_length: Period of the fast EMA
+        slow_length: Period of the slow EMA
+        price_col: Price column ('close', or 'ha_close' on Heikin Ashi blocks)
+        positions: Open positions to start from {entry_id: (quantity, entry_price)}
+        completed_positions: Completed positions to start from
+        compact: Downcast the signal columns (float32 EMAs, int8 flags, categorical entry ids)
+    """
+
+    def __init__(self, fast_length=9, slow_length=21, price_col='close', positions=None, completed_positions=None, compact=False):
+        self.fast_length = fast_length
+        self.slow_length = slow_length
+        self.price_col = price_col
+        self.compact = compact
+        self.positions = dict(positions or {})
+        self.completed_positions = list(completed_positions or [])
+        self.entry_id_counter = 1
+        self.last_fast = None
+        self.last_slow = None
+        self.last_signal = None
+
+    def _ewm(self, price, span, last):
+        # pandas ewm(adjust=False) keeps only its last value as state: seeding a block with it
+        # continues the recursion exactly
+        if last is None:
+            return price.ewm(span=span, adjust=False).mean()
+        seeded = pd.concat([pd.Series([last]), price], ignore_index=True)
+        return pd.Series(seeded.ewm(span=span, adjust=False).mean().to_numpy()[1:], index=price.index)
+
+    def process(self, df):
+        calc_df = df.copy(deep=False)
+        if len(calc_df) == 0:
+            return calc_df
+        # float64 prices (compact float32 columns are restored exactly to their tick size)
+        price = pd.Series(float64_values(calc_df, self.price_col), index=calc_df.index)
+        prices = price.tolist()
+        calc_df['fast_ema'] = self._ewm(price, self.fast_length, self.last_fast)
+        calc_df['slow_ema'] = self._ewm(price, self.slow_length, self.last_slow)
+        calc_df['signal'] = np.where(calc_df['fast_ema'] > calc_df['slow_ema'], 1, np.where(calc_df['fast_ema'] < calc_df['slow_ema'], -1, 0))
+        change = calc_df['signal'].diff()
+        if self.last_signal is not None:
+            change.iloc[0] = calc_df['signal'].iloc[0] - self.last_signal
+        calc_df['position_change'] = change.fillna(0)
+        self.last_fast = float(calc_df['fast_ema'].iloc[-1])
+        self.last_slow = float(calc_df['slow_ema'].iloc[-1])
+        self.last_signal = int(calc_df['signal'].iloc[-1])
+
+        position = np.zeros(len(calc_df), dtype=np.int64)
+        entry_ids = np.full(len(calc_df), None, dtype=object)  # entry ID per signal row
+        partial_exit = np.zeros(len(calc_df), dtype=bool)  # True when an exit only closes part of a position
+        position_change = calc_df['position_change'].to_numpy()
+        for i in np.flatnonzero(np.abs(position_change) == 2):
+            if position_change[i] == 2:  # Buy signal
+                entry_id = f"#{self.entry_id_counter:06d}"
+                self.positions[entry_id] = (100, prices[i])  # Default quantity of 100
+                position[i] = 1  # Mark as open long position
+                entry_ids[i] = entry_id
+                self.entry_id_counter += 1
+            elif self.positions:  # Sell signal
+                remaining_exit = 100  # Default exit quantity
+                while remaining_exit > 0 and self.positions:
+                    earliest_entry_id = min(self.positions.keys())
+                    quantity, entry_price = self.positions[earliest_entry_id]
+                    exit_quantity = min(remaining_exit, quantity)
+                    exit_price = prices[i]
+                    profit_loss = exit_quantity * (exit_price - entry_price)
+                    self.completed_positions.append((earliest_entry_id, exit_quantity, entry_price, exit_price, profit_loss))
+                    position[i] = -1  # Mark as exit
+                    entry_ids[i] = earliest_entry_id  # Use exiting entry ID
+                    if quantity == exit_quantity:
+                        del self.positions[earliest_entry_id]
+                    else:
+                        partial_exit[i] = True
+                        self.positions[earliest_entry_id] = (quantity - exit_quantity, entry_price)
+                        new_id = f"{earliest_entry_id}a"
+                        self.positions[new_id] = (quantity - exit_quantity, entry_price)
+                    remaining_exit -= exit_quantity
+        calc_df['position'] = position
+        calc_df['entry_id'] = entry_ids
+        calc_df['partial_exit'] = partial_exit
+        if self.compact:
+            calc_df = compact_derived(calc_df, float_columns=['fast_ema', 'slow_ema'],
+                                      int8_columns=['signal', 'position', 'position_change'], category_columns=['entry_id'])
+        return calc_df
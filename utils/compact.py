@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+from utils.config import Config
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Compact frames (Config.COMPACT_FRAMES, opt-in):
+#   - raw price/volume columns become float32 only when that is exact at the column's tick size
+#     (the decimals it is quoted in): float32 keeps ~7 significant digits, so its rounding error
+#     must stay below half a tick. float64_values() then restores the exact float64 value by
+#     rounding to those decimals, so indicators, signals and backtests see the same numbers as in
+#     the float64 frame. Columns that are not on a decimal grid (or whose magnitude is too large
+#     for their tick, e.g. a 2-decimal price above ~131072) stay float64.
+#   - derived float columns (Heikin Ashi, EMAs, indicators) are stored as float32: relative error
+#     up to 6e-8, far below any price tick, but values are no longer bit-identical to float64.
+#     Files written from them carry float32 precision too, and a strategy run on Heikin Ashi
+#     prices sees those values (same signals in practice, trade prices off in the 7th digit).
+#     Signals and backtests on raw klines are unchanged.
+#   - flags become int8/bool and entry ids a categorical; per-row copies of position lists are
+#     not materialized (the lists are kept once on the StrategyAgent).
+#   - open_time stays datetime64: an int64 epoch column would take the same 8 bytes per row.
+
+PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+MAX_DECIMALS = 8
+
+
+def enabled(compact=None):
+    """Resolve an explicit compact flag against Config.COMPACT_FRAMES."""
+    return Config.COMPACT_FRAMES if compact is None else compact
+
+
+def tick_decimals(values, max_decimals=MAX_DECIMALS):
+    """
+    Number of decimals the values are quoted in (0..max_decimals), or None if they are not on a
+    decimal grid (e.g. computed values).
+    """
+    values = values[np.isfinite(values)]
+    for decimals in range(max_decimals + 1):
+        scaled = values * 10.0 ** decimals
+        # values parsed from decimal text are within a few ulps of the grid
+        if np.all(np.abs(scaled - np.round(scaled)) <= 1e-9 * np.maximum(1.0, np.abs(scaled))):
+            return decimals
+    return None
+
+
+def float32_exact(values, decimals):
+    """True if float32 storage of values rounds back to them at the given number of decimals."""
+    restored = np.round(values.astype(np.float32).astype(np.float64), decimals)
+    return bool(np.array_equal(restored, values, equal_nan=True))
+
+
+def compact_klines(df):
+    """
+    Store OHLCV columns as float32 where that is exact at their tick size; the decimals are kept
+    in df.attrs['decimals'] for float64_values(). Other columns are left as they are (not copied).
+    Returns:
+        pandas.DataFrame
+    """
+    decimals = dict(df.attrs.get('decimals', {}))
+    converted = {}
+    for col in PRICE_COLUMNS:
+        if col not in df.columns or df[col].dtype != np.float64:
+            continue
+        values = df[col].to_numpy()
+        col_decimals = tick_decimals(values)
+        if col_decimals is not None and float32_exact(values, col_decimals):
+            converted[col] = values.astype(np.float32)
+            decimals[col] = col_decimals
+    if not converted:
+        return df
+    df = df.assign(**converted)
+    df.attrs['decimals'] = decimals
+    return df
+
+
+def float64_values(df, col):
+    """
+    Column values as float64 numpy array; float32 compact columns are rounded back to their
+    decimals, which restores the exact original values.
+    """
+    values = df[col].to_numpy()
+    if values.dtype == np.float32:
+        decimals = df.attrs.get('decimals', {}).get(col)
+        values = values.astype(np.float64)
+        if decimals is not None:
+            values = np.round(values, decimals)
+        return values
+    return values.astype(np.float64, copy=False)
+
+
+def expand_klines(df):
+    """
+    Inverse of compact_klines: float32 columns with recorded decimals back to exact float64, so
+    files written from a compact frame are the same as from the float64 one.
+    Returns:
+        pandas.DataFrame
+    """
+    decimals = df.attrs.get('decimals')
+    if not decimals:
+        return df
+    restored = {col: float64_values(df, col) for col in decimals if col in df.columns and df[col].dtype == np.float32}
+    if not restored:
+        return df
+    df = df.assign(**restored)
+    df.attrs['decimals'] = {}
+    return df
+
+
+def compact_derived(df, float_columns=(), int8_columns=(), category_columns=()):
+    """
+    Downcast derived columns of a frame in place of new copies: floats to float32, small integer
+    flags to int8, ids to categoricals.
+    Returns:
+        pandas.DataFrame
+    """
+    converted = {}
+    for col in float_columns:
+        if col in df.columns:
+            converted[col] = df[col].astype(np.float32)
+    for col in int8_columns:
+        if col in df.columns:
+            converted[col] = df[col].fillna(0).astype(np.int8)
+    for col in category_columns:
+        if col in df.columns:
+            converted[col] = df[col].astype('category')
+    return df.assign(**converted) if converted else df
+
+
+def frame_bytes(df):
+    """Bytes held by a frame's columns, counting object/string payloads (memory_usage deep)."""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def memory_report(frames, bars=None):
+    """
+    Memory of several frames, counting buffers shared between them (e.g. a derived frame built
+    from base columns without copying) once.
+    Args:
+        frames: Dict of name -> DataFrame
+        bars: Row count used for the per-million-bars figure (default: longest frame)
+    Returns:
+        Dict with per-frame bytes, the de-duplicated total and bytes per million bars
+    """
+    seen = {}
+    per_frame = {}
+    for name, df in frames.items():
+        per_frame[name] = frame_bytes(df)
+        for col in df.columns:
+            values = df[col].array
+            array = getattr(values, '_ndarray', None)
+            if array is None:
+                array = getattr(values, 'codes', None) if isinstance(values, pd.Categorical) else None
+            if isinstance(array, np.ndarray) and array.dtype != object:
+                key = (array.__array_interface__['data'][0], array.nbytes)
+                seen[key] = array.nbytes
+            else:
+                seen[(name, col)] = int(df[col].memory_usage(index=False, deep=True))
+    bars = bars or max((len(df) for df in frames.values()), default=0)
+    total = sum(seen.values())
+    return {
+        'frames': per_frame,
+        'total_bytes': total,
+        'bytes_per_million_bars': round(total / bars * 1_000_000) if bars else None,
+    }
@@ -1,4 +1,5 @@
 import os
+import socket
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,4 +10,30 @@ class Config:
     DEFAULT_SYMBOL = "BTCUSDT"  # Default trading pair
     DEFAULT_INTERVAL = "1h"     # Default time interval
     RAW_DATA_DIR = "data/raw"
-    PROCESSED_DATA_DIR = "data/processed"
\ No newline at end of file
+    PROCESSED_DATA_DIR = "data/processed"
+    TRADE_DATA_DIR = os.getenv("TRADE_DATA_DIR", "data/trades")  # Aggregated trades (utils/trade_store.py)
+    TRADE_JOURNAL_BYTES = int(os.getenv("TRADE_JOURNAL_BYTES", str(64 * 1024 * 1024)))  # Live trade journal file size before rotating to the next part
+    DEPTH_DATA_DIR = os.getenv("DEPTH_DATA_DIR", "data/depth")  # Order-book depth segments (utils/depth_store.py)
+    DEPTH_SEGMENT_SECONDS = int(os.getenv("DEPTH_SEGMENT_SECONDS", "60"))  # Book snapshot interval: one segment file per symbol per period
+    DEPTH_SNAPSHOT_LIMIT = int(os.getenv("DEPTH_SNAPSHOT_LIMIT", "1000"))  # Levels per side of the REST snapshot a local book starts from
+    DATA_BACKEND = os.getenv("DATA_BACKEND", "csv")  # DataStore file format: "csv" or "parquet"
+    DATA_CACHE_ENTRIES = int(os.getenv("DATA_CACHE_ENTRIES", "32"))  # Frames kept in the in-process DataStore cache
+    CHUNK_BARS = int(os.getenv("CHUNK_BARS", "250000"))  # Rows per block in the out-of-core (chunked) pipeline
+    WARMUP_BARS = int(os.getenv("WARMUP_BARS", "1000"))  # Bars loaded before the start of a time-range read (indicator warm-up)
+    PIPELINE_WINDOW_BARS = int(os.getenv("PIPELINE_WINDOW_BARS", "5000"))  # Bars of the trailing-window backtest the pipeline daemon runs per closed bar
+    COMPACT_FRAMES = os.getenv("COMPACT_FRAMES", "0") == "1"  # float32/int8/categorical frames, see utils/compact.py
+    KLINE_CACHE_MODE = os.getenv("KLINE_CACHE_MODE", "disk")  # BinanceAgent REST cache: "memory", "disk" or "off"
+    KLINE_CACHE_DIR = os.getenv("KLINE_CACHE_DIR", "data/cache")
+    INSTRUMENTATION = os.getenv("INSTRUMENTATION", "off")  # Span metrics: "off", "on" (time/CPU/rows) or "memory" (also peak memory)
+    CHART_EXPORT_MODE = os.getenv("CHART_EXPORT_MODE", "compact")  # "compact" or "standalone"
+    CHART_EXPORT_SIDECAR = os.getenv("CHART_EXPORT_SIDECAR", "0") == "1"  # Also write compressed .npz trace data
+    CHART_EXPORT_MAX_AGE_DAYS = float(os.getenv("CHART_EXPORT_MAX_AGE_DAYS", "0")) or None  # Prune ChartAgent exports older than this (unset/0: never)
+    CHART_EXPORT_MAX_FILES = int(os.getenv("CHART_EXPORT_MAX_FILES", "0")) or None  # Keep at most this many exports per chart name (unset/0: all)
+    BINANCE_API_URL = os.getenv("BINANCE_API_URL", "https://api.binance.com/api")  # REST base URL (point at a local stand-in server for tests)
+    BINANCE_WS_URL = os.getenv("BINANCE_WS_URL", "wss://stream.binance.com:9443/ws")  # Websocket stream base URL
+    BINANCE_WEIGHT_LIMIT = int(os.getenv("BINANCE_WEIGHT_LIMIT", "5000"))  # Request weight per minute shared by all clients (Binance allows 6000)
+    HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))  # Keep-alive connections per client
+    HTTP_CONCURRENCY = int(os.getenv("HTTP_CONCURRENCY", "4"))  # Concurrent requests when fetching historical ranges (1 = sequential)
+    INGEST_HUB = os.getenv("INGEST_HUB", "auto")  # Live klines through the local ingest hub when it runs ("auto") or never ("off")
+    # Unix socket path of the ingest hub, or host:port for TCP (platforms without Unix sockets)
+    INGEST_HUB_ADDRESS = os.getenv("INGEST_HUB_ADDRESS", "data/ingest_hub.sock" if hasattr(socket, "AF_UNIX") else "127.0.0.1:8788")
\ No newline at end of file
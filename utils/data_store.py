@@ -0,0 +1,557 @@
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+from utils.compact import PRICE_COLUMNS, compact_klines, expand_klines, enabled as compact_enabled
+from utils.config import Config
+from utils.instrumentation import span
+from utils.snapshot_io import AtomicWriter, complete_size, open_complete, read_csv_snapshot, read_snapshot, write_atomic, write_csv_atomic, writer_lock
+from utils.time_index import csv_index, to_ms, trim_range
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Kinds stored in the raw directory; every other kind (heikin_ashi, indicators, strategy,
+# backtest, ...) is a derived artifact in the processed directory
+RAW_KINDS = ('klines',)
+# Parquet row group size: row groups carry open_time min/max statistics, so range reads skip
+# the groups outside the range
+PARQUET_ROW_GROUP_ROWS = 65536
+
+
+def _float_prices(df):
+    # Price columns are always float: a block whose values all look like integers must not
+    # come back (and be written) as int64 when the whole file would parse as float
+    ints = [c for c in PRICE_COLUMNS if c in df.columns and pd.api.types.is_integer_dtype(df[c])]
+    return df.astype({c: 'float64' for c in ints}) if ints else df
+
+
+def _date_format(value):
+    """strftime format of a datetime field as pandas writes it: date only (every time midnight), seconds or fractional."""
+    if ' ' not in value and 'T' not in value:
+        return '%Y-%m-%d'
+    return '%Y-%m-%d %H:%M:%S.%f' if '.' in value else '%Y-%m-%d %H:%M:%S'
+
+
+class CsvBackend:
+    """Plain CSV files (the historical format); 'open_time' is parsed to datetimes on read."""
+
+    extension = ".csv"
+
+    def read(self, path):
+        df = read_csv_snapshot(path)
+        if 'open_time' in df.columns:
+            df['open_time'] = pd.to_datetime(df['open_time'])
+        return df
+
+    def write(self, df, path):
+        write_csv_atomic(df, path)
+
+    def append(self, df, path):
+        # One write of whole lines at the end of the file, datetimes in the format of its first row
+        # (pandas reads a column only in one format)
+        with open(path, 'rb') as f:
+            header = f.readline().decode().rstrip('\r\n').split(',')
+            first = f.readline().decode().rstrip('\r\n').split(',')
+        date_format = '%Y-%m-%d %H:%M:%S.%f'
+        if 'open_time' in header and len(first) > header.index('open_time'):
+            date_format = _date_format(first[header.index('open_time')])
+        data = df.reindex(columns=header).to_csv(header=False, index=False, date_format=date_format).encode()
+        with open(path, 'ab') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def last_value(self, path, column):
+        # Header and last complete line only (None for a file without rows)
+        with open(path, 'rb') as f:
+            header = f.readline()
+            end = complete_size(f)
+            start = max(end - 65536, len(header))
+            f.seek(start)
+            lines = f.read(end - start).splitlines()
+        if end <= len(header) or not lines:
+            return None
+        value = pd.read_csv(io.BytesIO(header + lines[-1] + b'\n'), usecols=[column])[column].iloc[0]
+        return pd.Timestamp(value) if column == 'open_time' else value
+
+    def iter_chunks(self, path, chunksize):
+        with read_snapshot(path, open_complete) as f, pd.read_csv(f, chunksize=chunksize) as reader:
+            for df in reader:
+                if 'open_time' in df.columns:
+                    df['open_time'] = pd.to_datetime(df['open_time'])
+                yield _float_prices(df)
+
+    def read_range(self, path, start_ms, end_ms, columns, warmup):
+        # Header and the indexed byte range come from the same open file version
+        def read(p):
+            with open(p, 'rb') as f:
+                index = csv_index(p, f, os.fstat(f.fileno()))
+                lo, hi = index.byte_range(start_ms, end_ms, warmup)
+                f.seek(0)
+                header = f.readline()
+                f.seek(lo)
+                data = f.read(hi - lo)
+                # up to the last complete line (a row may be being appended in place)
+                return header + data[:data.rfind(b'\n') + 1]
+        df = pd.read_csv(io.BytesIO(read_snapshot(path, read)), usecols=columns)
+        df['open_time'] = pd.to_datetime(df['open_time'])
+        return trim_range(_float_prices(df), start_ms, end_ms, warmup)
+
+    def open_sink(self, f):
+        return _CsvSink(f)
+
+
+class _CsvSink:
+    """Appends chunks to one CSV file: header once, datetimes in the format of the first chunk."""
+
+    def __init__(self, f):
+        self.f = f
+        self.first = True
+        self.date_format = None
+
+    def write(self, df):
+        if self.first:
+            # DataFrame.to_csv prints date-only values when a whole column is at midnight; pin the
+            # first chunk's choice so a short all-midnight chunk does not switch formats midway
+            # (and keep fractional seconds if the first chunk has any)
+            dates = [df[c] for c in df.columns if pd.api.types.is_datetime64_any_dtype(df[c])]
+            if any((d.dt.floor('s') != d).any() for d in dates):
+                self.date_format = '%Y-%m-%d %H:%M:%S.%f'
+            elif any((d.dt.normalize() != d).any() for d in dates):
+                self.date_format = '%Y-%m-%d %H:%M:%S'
+        df.to_csv(self.f, header=self.first, index=False, date_format=self.date_format)
+        self.first = False
+
+    def close(self):
+        pass
+
+
+class ParquetBackend:
+    """Parquet files (requires pyarrow); typed columns, no datetime parsing on read."""
+
+    extension = ".parquet"
+
+    def read(self, path):
+        return read_snapshot(path, pd.read_parquet)
+
+    def write(self, df, path):
+        # Columns of Python containers (e.g. strategy position lists) are stored as their text
+        # form, which is what the CSV backend writes for them too
+        nested = [c for c in df.columns if df[c].dtype == object and df[c].map(lambda v: isinstance(v, (list, tuple, dict))).any()]
+        if nested:
+            df = df.assign(**{c: df[c].astype(str) for c in nested})
+        write_atomic(path, lambda f: df.to_parquet(f, index=False, row_group_size=PARQUET_ROW_GROUP_ROWS), binary=True)
+
+    def iter_chunks(self, path, chunksize):
+        import pyarrow.parquet as pq
+        parquet = read_snapshot(path, pq.ParquetFile)
+        offset = 0
+        for batch in parquet.iter_batches(batch_size=chunksize):
+            df = batch.to_pandas()
+            df.index = pd.RangeIndex(offset, offset + len(df))
+            offset += len(df)
+            yield df
+
+    def read_range(self, path, start_ms, end_ms, columns, warmup):
+        import pyarrow.parquet as pq
+        parquet = read_snapshot(path, pq.ParquetFile)
+        metadata = parquet.metadata
+        column = parquet.schema_arrow.get_field_index('open_time')
+        groups = [metadata.row_group(g) for g in range(metadata.num_row_groups)]
+        stats = [group.column(column).statistics for group in groups]
+        first, last = 0, len(groups) - 1
+        if all(s is not None and s.has_min_max for s in stats):
+            low = [to_ms(s.min) for s in stats]
+            high = [to_ms(s.max) for s in stats]
+            if start_ms is not None:
+                first = next((g for g in range(len(groups)) if high[g] >= start_ms), len(groups))
+                # Warm-up rows may reach back into earlier groups
+                needed = warmup
+                while first > 0 and needed > 0:
+                    first -= 1
+                    needed -= groups[first].num_rows
+            if end_ms is not None:
+                last = max((g for g in range(len(groups)) if low[g] <= end_ms), default=-1)
+        df = parquet.read_row_groups(list(range(first, last + 1)), columns=columns).to_pandas() if first <= last \
+            else parquet.schema_arrow.empty_table().to_pandas()
+        return trim_range(df, start_ms, end_ms, warmup)
+
+    def open_sink(self, f):
+        return _ParquetSink(f)
+
+
+class _ParquetSink:
+    """Appends chunks as row groups of one Parquet file (schema of the first chunk)."""
+
+    def __init__(self, f):
+        self.f = f
+        self.writer = None
+
+    def write(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        nested = [c for c in df.columns if df[c].dtype == object and df[c].map(lambda v: isinstance(v, (list, tuple, dict))).any()]
+        if nested:
+            df = df.assign(**{c: df[c].astype(str) for c in nested})
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.f, table.schema)
+        self.writer.write_table(table.cast(self.writer.schema), row_group_size=PARQUET_ROW_GROUP_ROWS)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+BACKENDS = {'csv': CsvBackend, 'parquet': ParquetBackend}
+
+
+class DataStore:
+    """
+    Single entry point for reading and writing kline data and derived artifacts.
+
+    Artifacts are resolved by (symbol, interval, kind): raw klines live in raw_dir as
+    {symbol}_{interval}{ext}, derived kinds in processed_dir as {symbol}_{interval}_{kind}{ext}.
+    Reads go through an in-process LRU cache validated by file mtime and size, so a file that has
+    not changed is parsed once per process no matter how many agents load it. Writes use the
+    atomic snapshot protocol from utils.snapshot_io. Cached frames are returned as shallow copies:
+    adding columns is free, existing columns must be treated as read-only.
+    """
+
+    def __init__(self, raw_dir=None, processed_dir=None, backend=None, max_entries=None, compact=None):
+        """
+        Args:
+            raw_dir: Directory of raw kline files (default: Config.RAW_DATA_DIR)
+            processed_dir: Directory of derived artifacts (default: Config.PROCESSED_DATA_DIR)
+            backend: Backend name ('csv', 'parquet') or instance (default: Config.DATA_BACKEND)
+            max_entries: Maximum number of cached frames (default: Config.DATA_CACHE_ENTRIES)
+            compact: Store price columns as float32 where exact (default: Config.COMPACT_FRAMES)
+        """
+        self.raw_dir = raw_dir or Config.RAW_DATA_DIR
+        self.processed_dir = processed_dir or Config.PROCESSED_DATA_DIR
+        backend = backend or Config.DATA_BACKEND
+        self.backend = BACKENDS[backend]() if isinstance(backend, str) else backend
+        self.max_entries = max_entries or Config.DATA_CACHE_ENTRIES
+        self.compact = compact_enabled(compact)
+        self._cache = OrderedDict()  # abspath -> (mtime_ns, size, DataFrame)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'bytes_read': 0, 'read_seconds': 0.0, 'write_seconds': 0.0}
+
+    # ---- path resolution -------------------------------------------------------------------
+
+    def path(self, symbol, interval, kind="klines", directory=None):
+        """
+        Path of an artifact.
+        Args:
+            symbol: Trading pair symbol
+            interval: Kline interval
+            kind: 'klines' for raw data, or a derived kind such as 'heikin_ashi', 'indicators', 'strategy', 'backtest'
+            directory: Override the raw/processed directory
+        """
+        if kind in RAW_KINDS:
+            return os.path.join(directory or self.raw_dir, f"{symbol}_{interval}{self.backend.extension}")
+        return os.path.join(directory or self.processed_dir, f"{symbol}_{interval}_{kind}{self.backend.extension}")
+
+    def exists(self, symbol, interval, kind="klines"):
+        return os.path.exists(self.path(symbol, interval, kind))
+
+    # ---- reads -----------------------------------------------------------------------------
+
+    def load(self, symbol, interval, kind="klines", start=None, end=None, columns=None, warmup=None):
+        """
+        Load an artifact by (symbol, interval, kind): the whole file through the cache (see
+        read_path), or only a time range when start, end or columns are given (see read_range).
+        """
+        path = self.path(symbol, interval, kind)
+        if start is None and end is None and columns is None:
+            return self.read_path(path)
+        return self.read_range(path, start, end, columns, warmup)
+
+    def read_path(self, path):
+        """
+        Read a data file through the cache.
+        Returns:
+            pandas.DataFrame (shallow copy of the cached frame)
+        Raises:
+            ValueError: If the file does not exist
+        """
+        key = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            raise ValueError(f"No data file found at {path}")
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                self._cache.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[2].copy(deep=False)
+        started = time.perf_counter()
+        with span('DataStore.read') as s:
+            df = self._backend_for(path).read(path)
+            s.rows = len(df)
+        if self.compact:
+            df = compact_klines(df)
+        # Version the frame was read from (stat taken before the read: a newer version read
+        # meanwhile is only ever labeled older, never the reverse); see FeedCache
+        df.attrs['source'] = (key, stat.st_mtime_ns, stat.st_size, len(df))
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.stats['misses'] += 1
+            self.stats['bytes_read'] += stat.st_size
+            self.stats['read_seconds'] += elapsed
+            self._cache[key] = (stat.st_mtime_ns, stat.st_size, df)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        logger.info(f"Loaded data from {path}")
+        return df.copy(deep=False)
+
+    def read_range(self, path, start=None, end=None, columns=None, warmup=None):
+        """
+        Read the rows of a time-sorted data file with start <= open_time <= end, touching only the
+        part of the file that holds them (CSV: the time index of utils.time_index, Parquet: row
+        group statistics). Range reads bypass the cache.
+        Args:
+            path: Data file with an open_time column
+            start, end: Range bounds (anything pandas.Timestamp accepts; None: open-ended)
+            columns: Columns to read (open_time is always included; None: all)
+            warmup: Rows kept before start so indicators are warmed up at start (default:
+                    Config.WARMUP_BARS when start is given); their count is in df.attrs['warmup']
+        Returns:
+            pandas.DataFrame
+        Raises:
+            ValueError: If the file does not exist
+        """
+        if not os.path.exists(path):
+            raise ValueError(f"No data file found at {path}")
+        if warmup is None:
+            warmup = Config.WARMUP_BARS if start is not None else 0
+        if columns is not None:
+            columns = list(dict.fromkeys(['open_time', *columns]))
+        started = time.perf_counter()
+        with span('DataStore.read_range') as s:
+            df = self._backend_for(path).read_range(path, to_ms(start), to_ms(end), columns, warmup)
+            s.rows = len(df)
+        if self.compact:
+            attrs = dict(df.attrs)
+            df = compact_klines(df)
+            df.attrs.update(attrs)
+        with self._lock:
+            self.stats['misses'] += 1
+            self.stats['read_seconds'] += time.perf_counter() - started
+        logger.info(f"Loaded {len(df)} rows ({df.attrs['warmup']} warm-up) of {path} in [{start}, {end}]")
+        return df
+
+    # ---- writes ----------------------------------------------------------------------------
+
+    def save(self, df, symbol, interval, kind="klines"):
+        """
+        Write an artifact by (symbol, interval, kind).
+        Returns:
+            Path written
+        """
+        path = self.path(symbol, interval, kind)
+        self.write_path(df, path)
+        return path
+
+    def write_path(self, df, path):
+        """
+        Atomically publish df at path and drop any cached version of it. Takes the writer lock,
+        so a full write never interleaves with an append's read-modify-write of the same file.
+        """
+        with writer_lock(path):
+            self._publish(df, path)
+
+    def _publish(self, df, path):
+        """write_path for callers already holding the writer lock of path."""
+        started = time.perf_counter()
+        with span('DataStore.write', rows=len(df)):
+            self._backend_for(path).write(expand_klines(df), path)
+        with self._lock:
+            self.stats['writes'] += 1
+            self.stats['write_seconds'] += time.perf_counter() - started
+            self._cache.pop(os.path.abspath(path), None)
+        logger.info(f"Saved data to {path}")
+
+    def append(self, df, symbol, interval, kind="klines", key="open_time"):
+        """Merge rows into an artifact by (symbol, interval, kind); see append_path."""
+        return self.append_path(df, self.path(symbol, interval, kind), key)
+
+    def append_path(self, df, path, key="open_time"):
+        """
+        Merge new rows into a file (later rows win on duplicate keys, sorted by key). Appenders
+        serialize on the writer lock; readers are never blocked.
+        Returns:
+            The merged DataFrame
+        """
+        with writer_lock(path):
+            return self._merge(df, path, key)
+
+    def _merge(self, df, path, key):
+        """append_path for callers already holding the writer lock of path."""
+        if os.path.exists(path):
+            combined = pd.concat([expand_klines(self.read_path(path)), expand_klines(df)]).drop_duplicates(subset=[key], keep='last')
+            combined = combined.sort_values(key).reset_index(drop=True)
+        else:
+            combined = df
+        self._publish(combined, path)
+        return combined
+
+    def append_rows(self, df, path, key=None):
+        """
+        Add rows after the last row of a file without reading it back, for series that only grow
+        at the end (e.g. live bars; the caller keeps them in order). A CSV file is appended to in
+        place with one write of whole lines, so the cost is that of the new rows, not of the file;
+        other formats cannot be appended to and the file is rewritten. Appenders serialize on the
+        writer lock; CSV readers stop at the last complete line, so they never see a row that is
+        still being written.
+        Args:
+            df: Rows to add, in key order
+            path: Data file
+            key: Optional key column: rows that are not all after the file's last key (e.g. the
+                 closed version of a bar stored while it was forming) are merged as append_path
+                 does instead, at the cost of a rewrite
+        """
+        with writer_lock(path):
+            backend = self._backend_for(path)
+            if key is not None and len(df) and os.path.exists(path):
+                # only a CSV file's last key is read without reading the whole file
+                last = backend.last_value(path, key) if isinstance(backend, CsvBackend) else None
+                if not isinstance(backend, CsvBackend) or (last is not None and df[key].min() <= last):
+                    self._merge(df, path, key)
+                    return
+            if os.path.exists(path) and isinstance(backend, CsvBackend):
+                started = time.perf_counter()
+                backend.append(expand_klines(df), path)
+                with self._lock:
+                    self.stats['writes'] += 1
+                    self.stats['write_seconds'] += time.perf_counter() - started
+                    self._cache.pop(os.path.abspath(path), None)
+            elif os.path.exists(path):
+                self._publish(pd.concat([expand_klines(self.read_path(path)), expand_klines(df)], ignore_index=True), path)
+            elif isinstance(backend, CsvBackend):
+                # Millisecond datetimes from the start, so later appends keep them
+                write_csv_atomic(expand_klines(df), path, date_format='%Y-%m-%d %H:%M:%S.%f')
+                self.invalidate(path)
+            else:
+                self._publish(df, path)
+
+    # ---- chunked (out-of-core) access ------------------------------------------------------
+
+    def iter_chunks(self, path, chunksize=None):
+        """
+        Read a data file as time-ordered blocks of at most chunksize rows, bypassing the cache,
+        so memory stays bounded by the block size. The file version opened first is read to the
+        end even if a writer publishes a new one meanwhile.
+        Args:
+            path: Data file
+            chunksize: Rows per block (default: Config.CHUNK_BARS)
+        Yields:
+            pandas.DataFrame blocks (index continues across blocks)
+        Raises:
+            ValueError: If the file does not exist
+        """
+        if not os.path.exists(path):
+            raise ValueError(f"No data file found at {path}")
+        for df in self._backend_for(path).iter_chunks(path, chunksize or Config.CHUNK_BARS):
+            yield compact_klines(df) if self.compact else df
+
+    def chunk_writer(self, path):
+        """
+        Writer publishing a file built from consecutive blocks (see ChunkWriter); the file is
+        replaced atomically once the writer is closed, readers see the old version until then.
+        """
+        return ChunkWriter(self, path)
+
+    # ---- housekeeping ----------------------------------------------------------------------
+
+    def invalidate(self, path=None):
+        """Drop one cached file (or everything)."""
+        with self._lock:
+            if path is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(os.path.abspath(path), None)
+
+    def _backend_for(self, path):
+        """Files keep being read with the backend matching their extension, whatever the default."""
+        if path.endswith(self.backend.extension):
+            return self.backend
+        for backend_cls in BACKENDS.values():
+            if path.endswith(backend_cls.extension):
+                return backend_cls()
+        return self.backend
+
+
+class ChunkWriter:
+    """
+    Streams blocks into a temp file and publishes it on a clean exit. Nothing is published when
+    no rows were written or the block raised.
+
+    Usage:
+        with store.chunk_writer(path) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+    """
+
+    def __init__(self, store, path):
+        self.store = store
+        self.path = path
+        self.rows = 0
+        self._atomic = None
+        self._sink = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        backend = self.store._backend_for(self.path)
+        self._atomic = AtomicWriter(self.path, binary=isinstance(backend, ParquetBackend))
+        self._sink = backend.open_sink(self._atomic.__enter__())
+        return self
+
+    def write(self, df):
+        if len(df) == 0:
+            return
+        with span('DataStore.write_chunk', rows=len(df)):
+            self._sink.write(expand_klines(df))
+        self.rows += len(df)
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._sink.close()
+        finally:
+            if not self.rows:
+                self._atomic.discard()
+            self._atomic.__exit__(exc_type, exc, tb)
+        if exc_type is None and self.rows:
+            with self.store._lock:
+                self.store.stats['writes'] += 1
+                self.store.stats['write_seconds'] += time.perf_counter() - self._started
+                self.store._cache.pop(os.path.abspath(self.path), None)
+            logger.info(f"Saved {self.rows} rows to {self.path}")
+        return False
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide DataStore shared by all agents (created from Config on first use)."""
+    global _default_store
+    if _default_store is None:
+        with _default_lock:
+            if _default_store is None:
+                _default_store = DataStore()
+    return _default_store
+
+
+def set_store(store):
+    """Replace the process-wide DataStore (e.g. other directories or backend)."""
+    global _default_store
+    with _default_lock:
+        _default_store = store
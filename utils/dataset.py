@@ -0,0 +1,142 @@
+import os
+import threading
+import pandas as pd
+from utils.data_store import get_store
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class DatasetSession:
+    """
+    In-memory dataset for one symbol/interval shared by all agents during a render.
+
+    The raw klines are read once (through the DataStore cache); derived series such as Heikin Ashi,
+    indicators and strategy signals are computed once and cached on the session. Agents accept a
+    session anywhere they accept a data_file path.
+
+    With start/end the session holds only that time range plus warm-up bars before start (see
+    DataStore.read_range); derived series computed on such a partial session are not saved, so
+    the full-history artifacts are never overwritten by a window.
+    """
+
+    def __init__(self, symbol="BTCUSDT", interval="1h", data_file=None, df=None, data_dir=None, processed_dir=None, store=None,
+                 start=None, end=None, warmup=None):
+        """
+        Args:
+            symbol: Trading pair symbol
+            interval: Kline interval
+            data_file: Path to the raw kline file (default: resolved by the store unless df is given)
+            df: Already loaded kline DataFrame (skips the file read)
+            data_dir: Directory of raw kline files (default: the store's raw directory)
+            processed_dir: Directory of derived artifacts, e.g. precomputed Heikin Ashi (default: the store's)
+            store: DataStore used for file I/O (default: the shared store)
+            start, end: Time range to load (None: open-ended; both None: the whole file)
+            warmup: Bars loaded before start (default: Config.WARMUP_BARS)
+        """
+        self.symbol = symbol
+        self.interval = interval
+        self.store = store or get_store()
+        if data_file is None and df is None:
+            data_file = self.store.path(symbol, interval, directory=data_dir)
+        self.data_file = data_file
+        self.processed_dir = processed_dir or self.store.processed_dir
+        self.start = start
+        self.end = end
+        self.warmup = warmup
+        self.partial = start is not None or end is not None
+        self._df = df
+        self._derived = {}
+        self._lock = threading.RLock()
+
+    @property
+    def df(self):
+        """Raw kline DataFrame, loaded on first access. Treat as read-only; use frame() to add columns."""
+        if self._df is None:
+            with self._lock:
+                if self._df is None:
+                    self._df = self.store.read_range(self.data_file, self.start, self.end, warmup=self.warmup) if self.partial \
+                        else self.store.read_path(self.data_file)
+        return self._df
+
+    @property
+    def x_range(self):
+        """Requested (start, end) of a partial session, e.g. as the initial chart viewport; None otherwise."""
+        return (self.start, self.end) if self.partial else None
+
+    @property
+    def warmup_rows(self):
+        """Number of leading rows of df loaded only as indicator warm-up (before start)."""
+        return self.df.attrs.get('warmup', 0)
+
+    def frame(self, source="raw"):
+        """
+        Shallow copy of a shared frame: new columns can be added without touching the shared
+        one, while existing column arrays are not copied.
+        Args:
+            source: 'raw' or 'heikin_ashi'
+        Returns:
+            pandas.DataFrame
+        """
+        if source == "raw":
+            return self.df.copy(deep=False)
+        if source == "heikin_ashi":
+            return self.heikin_ashi().copy(deep=False)
+        raise ValueError(f"Unknown dataset source '{source}'")
+
+    def cached(self, key, compute):
+        """
+        Return a derived object from the session cache, computing it on first use.
+        Args:
+            key: Hashable cache key, e.g. ('sma', 14, 'raw')
+            compute: Zero-argument callable producing the value
+        """
+        with self._lock:
+            if key in self._derived:
+                return self._derived[key]
+        value = compute()
+        with self._lock:
+            return self._derived.setdefault(key, value)
+
+    def heikin_ashi(self):
+        """
+        Heikin Ashi frame [open_time, ha_open, ha_high, ha_low, ha_close, close].
+        Uses the precomputed file when it is at least as new as the raw data (the same range of
+        it for a partial session), otherwise computes (and, for a full session, saves) it through
+        DataCalculationAgent.
+        """
+        def compute():
+            ha_file = self.store.path(self.symbol, self.interval, "heikin_ashi", directory=self.processed_dir)
+            raw_exists = self.data_file is not None and os.path.exists(self.data_file)
+            if raw_exists and os.path.exists(ha_file) and os.path.getmtime(ha_file) >= os.path.getmtime(self.data_file):
+                if self.partial:
+                    return self.store.read_range(ha_file, self.start, self.end, warmup=self.warmup)
+                return self.store.read_path(ha_file)
+            from agents.data_calculation_agent import DataCalculationAgent
+            return DataCalculationAgent(store=self.store).calculate_heikin_ashi(self, self.symbol, self.interval)
+        return self.cached(('heikin_ashi',), compute)
+
+    def invalidate(self):
+        """Drop the loaded data and all derived series (e.g. after the raw file was updated)."""
+        with self._lock:
+            self._df = None
+            self._derived.clear()
+
+
+def as_session(source, symbol="BTCUSDT", interval="1h", store=None):
+    """
+    Wrap a data_file path (or DataFrame) in a DatasetSession; sessions are returned unchanged.
+    Args:
+        source: DatasetSession, path to a kline CSV, or kline DataFrame
+        symbol: Trading pair symbol used for new sessions
+        interval: Kline interval used for new sessions
+        store: DataStore used by new sessions (default: the shared store)
+    Returns:
+        DatasetSession
+    """
+    if isinstance(source, DatasetSession):
+        return source
+    if isinstance(source, pd.DataFrame):
+        return DatasetSession(symbol, interval, df=source, store=store)
+    return DatasetSession(symbol, interval, data_file=source, store=store)
@@ -0,0 +1,234 @@
+import glob
+import io
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+import numpy as np
+from utils.compact import tick_decimals
+from utils.config import Config
+from utils.order_book import DepthBook
+from utils.snapshot_io import read_snapshot, write_atomic
+from utils.trade_store import _decode_float, _encode_float
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Order-book depth, one immutable .npz segment file per symbol and DEPTH_SEGMENT_SECONDS:
+#   the full local book at the segment start (snapshot) followed by every diff event after it,
+#   so the book at any time is the snapshot of the segment holding it plus a prefix of its
+#   events, and a capture gap (resync) simply starts a new segment from the new snapshot.
+#   header        start/end ms, first/last update id, counts, price/qty decimals, price base tick
+#   time          int32 ms since the segment start, one per event
+#   update_id     uint32 offset of the event's last update id from the snapshot's
+#   counts        int32 (bid levels, ask levels) per event; each event's levels are its bids then asks
+#   price         int32 ticks above the segment's lowest price when the prices are on a decimal
+#                 grid (else float64), snapshot levels first (bids, then asks)
+#   qty           float32 when that is exact at the quantities' decimals (see utils.compact), else float64
+# i.e. about 8 bytes per level update instead of ~30 for the JSON diff. Files follow the snapshot
+# protocol (written once, atomically).
+DEPTH_CACHE_SEGMENTS = 8
+
+
+def _encode_price(price):
+    decimals = tick_decimals(price)
+    if decimals is None or not len(price):
+        return price, -1, 0
+    ticks = np.round(price * 10.0 ** decimals).astype(np.int64)
+    base = int(ticks.min())
+    offsets = ticks - base
+    return offsets.astype(np.int32) if offsets.max() < 2**31 else offsets, decimals, base
+
+
+def _decode_price(values, decimals, base):
+    if decimals < 0:
+        return values
+    return np.round((values.astype(np.int64) + base) / 10.0 ** decimals, decimals)
+
+
+class DepthSegment:
+    """The book at start_ms plus the diff events after it, collected in memory until written."""
+
+    def __init__(self, book):
+        """
+        Args:
+            book: DepthBook at the segment start (its time and update_id are set)
+        """
+        self.snapshot = book
+        self.start_ms = int(book.time)
+        self.first_update_id = int(book.update_id)
+        self.end_ms = self.start_ms
+        self.last_update_id = self.first_update_id
+        self.times = []
+        self.update_ids = []
+        self.counts = []
+        self.levels = []  # per event: (n, 2) [price, qty] of its bids then asks
+        self.level_count = 0
+
+    def __len__(self):
+        return len(self.times)
+
+    def add(self, time, last_update_id, bids, asks):
+        """
+        Record one applied diff event.
+        Args:
+            time: Event time (epoch ms)
+            last_update_id: u of the event
+            bids, asks: (n, 2) float64 [price, qty] arrays (qty 0 removes the level)
+        """
+        self.times.append(time)
+        self.update_ids.append(last_update_id)
+        self.counts.append((len(bids), len(asks)))
+        self.levels.append(np.concatenate([bids, asks]) if len(asks) else bids)
+        self.level_count += len(bids) + len(asks)
+        self.end_ms = max(self.end_ms, time)
+        self.last_update_id = last_update_id
+
+    def encode(self):
+        """Bytes of the segment file."""
+        book = self.snapshot
+        levels = np.concatenate(self.levels) if self.levels else np.empty((0, 2))
+        price, price_decimals, price_base = _encode_price(np.concatenate([book.bid_price, book.ask_price, levels[:, 0]]))
+        qty, qty_decimals = _encode_float(np.concatenate([book.bid_qty, book.ask_qty, levels[:, 1]]))
+        buffer = io.BytesIO()
+        np.savez(buffer,
+                 header=np.array([self.start_ms, self.end_ms, self.first_update_id, self.last_update_id, len(self.times),
+                                  len(book.bid_price), len(book.ask_price), price_decimals, price_base, qty_decimals], dtype=np.int64),
+                 time=(np.asarray(self.times, dtype=np.int64) - self.start_ms).astype(np.int32),
+                 update_id=(np.asarray(self.update_ids, dtype=np.int64) - self.first_update_id).astype(np.uint32),
+                 counts=np.asarray(self.counts, dtype=np.int32).reshape(-1, 2),
+                 price=price, qty=qty)
+        return buffer.getvalue()
+
+
+def decode_segment(path):
+    """
+    Arrays of one segment file.
+    Returns:
+        Dict with start_ms, end_ms, first_update_id, last_update_id, time, update_id (absolute,
+        int64), snapshot levels (snap_price, snap_qty, snap_ask) and event levels (price, qty,
+        ask, offsets: levels of events [0, i) are price[:offsets[i]])
+    """
+    with np.load(path) as data:
+        start_ms, end_ms, first_id, last_id, n_events, n_bids, n_asks, price_decimals, price_base, qty_decimals = \
+            (int(v) for v in data['header'])
+        price = _decode_price(data['price'], price_decimals, price_base)
+        qty = _decode_float(data['qty'], qty_decimals).astype(np.float64)
+        counts = data['counts'].reshape(-1, 2)
+        time = data['time'].astype(np.int64) + start_ms
+        update_id = data['update_id'].astype(np.int64) + first_id
+    n_snap = n_bids + n_asks
+    return {
+        'start_ms': start_ms, 'end_ms': end_ms, 'first_update_id': first_id, 'last_update_id': last_id,
+        'time': time, 'update_id': update_id,
+        'snap_price': price[:n_snap], 'snap_qty': qty[:n_snap],
+        'snap_ask': np.r_[np.zeros(n_bids, dtype=bool), np.ones(n_asks, dtype=bool)],
+        'price': price[n_snap:], 'qty': qty[n_snap:],
+        'ask': np.repeat(np.tile([False, True], n_events), counts.ravel()),
+        'offsets': np.r_[0, np.cumsum(counts.sum(axis=1))],
+    }
+
+
+def _last_levels(price, qty):
+    """Final quantity per price (the last update of a price wins)."""
+    keys = price.view(np.int64)[::-1]
+    _, first = np.unique(keys, return_index=True)
+    index = len(price) - 1 - first
+    return price[index], qty[index]
+
+
+class DepthStore:
+    """Segment files of captured order books per symbol (see the format above) and book reconstruction."""
+
+    def __init__(self, directory=None):
+        """
+        Args:
+            directory: Root directory (default: Config.DEPTH_DATA_DIR)
+        """
+        self.directory = directory or Config.DEPTH_DATA_DIR
+        self._segments = {}  # symbol -> (sorted start ms, paths)
+        self._decoded = OrderedDict()  # path -> decoded segment
+        self._lock = threading.Lock()
+
+    def path(self, symbol, start_ms):
+        """File of the segment starting at start_ms (grouped in one directory per UTC day)."""
+        date = datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)
+        return os.path.join(self.directory, symbol, f"{date:%Y-%m-%d}", f"{symbol}_depth_{start_ms}.npz")
+
+    def write_segment(self, symbol, segment):
+        """
+        Write a segment file.
+        Returns:
+            Size of the file in bytes
+        """
+        data = segment.encode()
+        path = self.path(symbol, segment.start_ms)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, lambda f: f.write(data), binary=True)
+        with self._lock:
+            self._segments.pop(symbol, None)
+        return len(data)
+
+    def segments(self, symbol, refresh=False):
+        """(start ms, paths) of a symbol's segments in time order."""
+        with self._lock:
+            cached = self._segments.get(symbol)
+        if cached is not None and not refresh:
+            return cached
+        prefix = f"{symbol}_depth_"
+        paths = glob.glob(os.path.join(self.directory, symbol, '*', f"{prefix}*.npz"))
+        starts = np.array([int(os.path.basename(p)[len(prefix):-4]) for p in paths], dtype=np.int64)
+        order = np.argsort(starts, kind='stable')
+        cached = (starts[order], [paths[i] for i in order])
+        with self._lock:
+            self._segments[symbol] = cached
+        return cached
+
+    def read_segment(self, path):
+        """Decoded segment (kept in a small LRU cache; segment files never change)."""
+        with self._lock:
+            segment = self._decoded.get(path)
+            if segment is not None:
+                self._decoded.move_to_end(path)
+                return segment
+        segment = read_snapshot(path, decode_segment)
+        with self._lock:
+            self._decoded[path] = segment
+            while len(self._decoded) > DEPTH_CACHE_SEGMENTS:
+                self._decoded.popitem(last=False)
+        return segment
+
+    def book_at(self, symbol, time_ms, max_stale_ms=None):
+        """
+        The captured book of a symbol as of time_ms: the segment snapshot plus its events up to time_ms.
+        Args:
+            symbol: Trading pair symbol
+            time_ms: Epoch ms
+            max_stale_ms: Latest accepted distance from the last captured update before time_ms
+                          (default: one segment length); beyond it the capture has a gap there
+        Returns:
+            DepthBook, or None if nothing was captured at that time
+        """
+        max_stale_ms = Config.DEPTH_SEGMENT_SECONDS * 1000 if max_stale_ms is None else max_stale_ms
+        starts, paths = self.segments(symbol)
+        i = int(np.searchsorted(starts, time_ms, side='right')) - 1
+        if i == len(starts) - 1 and (i < 0 or time_ms > self.read_segment(paths[i])['end_ms']):
+            # Segments written since the listing may hold time_ms
+            starts, paths = self.segments(symbol, refresh=True)
+            i = int(np.searchsorted(starts, time_ms, side='right')) - 1
+        if i < 0:
+            return None
+        segment = self.read_segment(paths[i])
+        if time_ms - segment['end_ms'] > max_stale_ms:
+            return None
+        k = int(np.searchsorted(segment['time'], time_ms, side='right'))
+        end = segment['offsets'][k]
+        price = np.concatenate([segment['snap_price'], segment['price'][:end]])
+        qty = np.concatenate([segment['snap_qty'], segment['qty'][:end]])
+        ask = np.concatenate([segment['snap_ask'], segment['ask'][:end]])
+        bid_price, bid_qty = _last_levels(price[~ask], qty[~ask])
+        ask_price, ask_qty = _last_levels(price[ask], qty[ask])
+        return DepthBook.from_levels(bid_price, bid_qty, ask_price, ask_qty,
+                                     time=int(segment['time'][k - 1]) if k else segment['start_ms'],
+                                     update_id=int(segment['update_id'][k - 1]) if k else segment['first_update_id'])
@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+
+
+def _as_float_x(x):
+    """Convert an x axis (datetimes or numbers) to float64 for geometry calculations."""
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+
+def bucket_edges(n, n_buckets):
+    """
+    Split n points into n_buckets contiguous index ranges of near-equal size.
+    Returns:
+        numpy.ndarray of n_buckets + 1 edges (bucket i is edges[i]:edges[i+1])
+    """
+    n_buckets = max(1, min(n_buckets, n))
+    return np.linspace(0, n, n_buckets + 1).astype(np.int64)
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    Args:
+        x: X values (datetimes or numbers), sorted ascending
+        y: Y values; NaN points are skipped (e.g. indicator warm-up)
+        n_out: Number of points to keep
+    Returns:
+        numpy.ndarray of selected indices into x/y, ascending
+    """
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(np.isfinite(y))
+    n = len(valid)
+    if n_out >= n or n_out < 3:
+        return valid
+    xs = _as_float_x(x)[valid]
+    ys = y[valid]
+
+    # Bucket i (of n_out - 2) covers edges[i]:edges[i+1]; first and last points are always kept
+    every = (n - 2) / (n_out - 2)
+    edges = (np.floor(np.arange(n_out - 1) * every) + 1).astype(np.int64)
+    edges[-1] = n - 1
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = xs[end:next_end].mean()
+        avg_y = ys[end:next_end].mean()
+        area = np.abs((xs[a] - avg_x) * (ys[start:end] - ys[a]) - (xs[a] - xs[start:end]) * (avg_y - ys[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return valid[selected]
+
+
+def minmax_indices(y, n_out):
+    """
+    Min/max downsampling: keep the lowest and highest point of each bucket so spikes survive.
+    Args:
+        y: Y values
+        n_out: Approximate number of points to keep (two per bucket)
+    Returns:
+        numpy.ndarray of selected indices, ascending and unique
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    n_buckets = max(1, n_out // 2)
+    if n <= n_out:
+        return np.arange(n)
+    size = -(-n // n_buckets)
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:n] = y
+    # Pad with the last value so no row is all-NaN
+    padded[n:] = y[-1]
+    rows = padded.reshape(n_buckets, size)
+    finite_rows = ~np.all(np.isnan(rows), axis=1)
+    offsets = np.arange(n_buckets)[finite_rows] * size
+    rows = rows[finite_rows]
+    lo = offsets + np.nanargmin(rows, axis=1)
+    hi = offsets + np.nanargmax(rows, axis=1)
+    idx = np.unique(np.concatenate([lo, hi, [0, n - 1]]))
+    return idx[idx < n]
+
+
+def downsample_line(x, y, n_out, method="lttb"):
+    """
+    Downsample a line series.
+    Args:
+        x: X values
+        y: Y values
+        n_out: Target point budget
+        method: 'lttb' (shape preserving) or 'minmax' (extremes preserving)
+    Returns:
+        Tuple (x, y) of numpy arrays
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=np.float64)
+    if len(y) <= n_out:
+        return x, y
+    if method == "minmax":
+        idx = minmax_indices(y, n_out)
+    elif method == "lttb":
+        idx = lttb_indices(x, y, n_out)
+    else:
+        raise ValueError(f"Unknown downsampling method '{method}'")
+    return x[idx], y[idx]
+
+
+def downsample_ohlc(df, n_out, time_col='open_time', cols=('open', 'high', 'low', 'close')):
+    """
+    Aggregate candles into at most n_out buckets (first open, max high, min low, last close).
+    Highs and lows are preserved exactly, so no wick is lost.
+    Args:
+        df: DataFrame with time_col and the OHLC columns named in cols
+        n_out: Target number of candles
+        time_col: Name of the time column (bucket time is the first bar's time)
+        cols: Names of the (open, high, low, close) columns
+    Returns:
+        pandas.DataFrame with the same columns, at most n_out rows
+    """
+    n = len(df)
+    if n <= n_out:
+        return df
+    open_col, high_col, low_col, close_col = cols
+    edges = np.unique(bucket_edges(n, n_out))
+    starts, ends = edges[:-1], edges[1:]
+    high = df[high_col].to_numpy(dtype=np.float64)
+    low = df[low_col].to_numpy(dtype=np.float64)
+    out = {
+        time_col: df[time_col].to_numpy()[starts],
+        open_col: df[open_col].to_numpy()[starts],
+        high_col: np.fmax.reduceat(high, starts),
+        low_col: np.fmin.reduceat(low, starts),
+        close_col: df[close_col].to_numpy()[ends - 1],
+    }
+    return pd.DataFrame(out)
+
+
+def slice_viewport(df, x_range, time_col='open_time'):
+    """
+    Restrict a time-sorted DataFrame to a visible x range.
+    Args:
+        df: DataFrame sorted by time_col
+        x_range: (start, end) pair (anything pandas.Timestamp accepts; None for open ends) or None
+        time_col: Name of the time column
+    Returns:
+        pandas.DataFrame slice (the full frame when x_range is None)
+    """
+    if x_range is None or df.empty:
+        return df
+    times = df[time_col].to_numpy()
+    start, end = x_range
+    lo = 0 if start is None else np.searchsorted(times, np.datetime64(pd.Timestamp(start)), side='left')
+    hi = len(df) if end is None else np.searchsorted(times, np.datetime64(pd.Timestamp(end)), side='right')
+    # Keep one bar either side so lines reach the viewport edges
+    return df.iloc[max(0, lo - 1):min(len(df), hi + 1)]
+
+
+def x_range_from_relayout(relayout_data, axis='xaxis'):
+    """
+    Extract the visible x range from a Plotly relayout event.
+    Args:
+        relayout_data: Dict emitted by plotly.js on zoom/pan (e.g. {'xaxis.range[0]': ..., 'xaxis.range[1]': ...})
+        axis: Axis name to read
+    Returns:
+        (start, end) tuple, None when the axis was reset to autorange, or False when the event does not touch the axis
+    """
+    if not relayout_data:
+        return False
+    if relayout_data.get(f'{axis}.autorange'):
+        return None
+    if f'{axis}.range[0]' in relayout_data:
+        return relayout_data[f'{axis}.range[0]'], relayout_data[f'{axis}.range[1]']
+    if f'{axis}.range' in relayout_data:
+        start, end = relayout_data[f'{axis}.range']
+        return start, end
+    return False
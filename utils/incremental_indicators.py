@@ -0,0 +1,122 @@
+from collections import deque
+import numpy as np
+
+NAN = float('nan')
+
+
+class IncrementalEMA:
+    """
+    Streaming EMA with O(1) state.
+    seed="first" matches pandas ewm(span=period, adjust=False) as used by the strategies;
+    seed="sma" matches talib.EMA (first value is the SMA of the first `period` inputs).
+    """
+
+    def __init__(self, period, seed="first"):
+        if seed not in ("first", "sma"):
+            raise ValueError(f"Unknown EMA seed '{seed}'")
+        self.period = period
+        self.seed_mode = seed
+        self.alpha = 2.0 / (period + 1)
+        self.value = NAN
+        self._seed_sum = 0.0
+        self._count = 0
+
+    def _next(self, price):
+        """Return (new value, new seed sum, new count) without committing."""
+        count = self._count + 1
+        if self.seed_mode == "first":
+            value = price if count == 1 else self.value + self.alpha * (price - self.value)
+            return value, 0.0, count
+        if count < self.period:
+            return NAN, self._seed_sum + price, count
+        if count == self.period:
+            seed_sum = self._seed_sum + price
+            return seed_sum / self.period, seed_sum, count
+        return self.value + self.alpha * (price - self.value), self._seed_sum, count
+
+    def update(self, price):
+        """Consume a closed bar's price and return the new EMA value."""
+        self.value, self._seed_sum, self._count = self._next(price)
+        return self.value
+
+    def peek(self, price):
+        """EMA value if the bar closed at `price` now, without changing state (for the forming bar)."""
+        return self._next(price)[0]
+
+
+class IncrementalSMA:
+    """Streaming SMA matching talib.SMA (NaN until `period` inputs have been seen)."""
+
+    def __init__(self, period):
+        self.period = period
+        self.window = deque(maxlen=period)
+        self.total = 0.0
+        self.value = NAN
+
+    def update(self, price):
+        if len(self.window) == self.period:
+            self.total -= self.window[0]
+        self.window.append(price)
+        self.total += price
+        self.value = self.total / self.period if len(self.window) == self.period else NAN
+        return self.value
+
+    def peek(self, price):
+        if len(self.window) < self.period - 1:
+            return NAN
+        total = self.total + price - (self.window[0] if len(self.window) == self.period else 0.0)
+        return total / self.period
+
+
+class IncrementalRSI:
+    """Streaming RSI with Wilder smoothing, matching talib.RSI (first value after `period` changes)."""
+
+    def __init__(self, period=14):
+        self.period = period
+        self.prev_price = None
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self._count = 0  # number of price changes seen
+        self.value = NAN
+
+    @staticmethod
+    def _rsi(avg_gain, avg_loss):
+        total = avg_gain + avg_loss
+        return 100.0 * avg_gain / total if total != 0 else 0.0
+
+    def _next(self, price):
+        if self.prev_price is None:
+            return NAN, 0.0, 0.0, 0
+        change = price - self.prev_price
+        gain, loss = (change, 0.0) if change > 0 else (0.0, -change)
+        count = self._count + 1
+        if count < self.period:
+            return NAN, self.avg_gain + gain, self.avg_loss + loss, count
+        if count == self.period:
+            avg_gain = (self.avg_gain + gain) / self.period
+            avg_loss = (self.avg_loss + loss) / self.period
+        else:
+            avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+            avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+        return self._rsi(avg_gain, avg_loss), avg_gain, avg_loss, count
+
+    def update(self, price):
+        self.value, self.avg_gain, self.avg_loss, self._count = self._next(price)
+        self.prev_price = price
+        return self.value
+
+    def peek(self, price):
+        return self._next(price)[0]
+
+
+def seed_indicator(indicator, prices):
+    """
+    Feed a history of closed-bar prices into an incremental indicator.
+    Args:
+        indicator: IncrementalEMA, IncrementalSMA or IncrementalRSI instance
+        prices: Iterable of prices in time order
+    Returns:
+        numpy.ndarray with the indicator value after every price
+    """
+    return np.array([indicator.update(float(p)) for p in prices], dtype=np.float64)
+
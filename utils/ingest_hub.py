@@ -0,0 +1,181 @@
+import asyncio
+import json
+import os
+import re
+import socket
+from agents.websocket_agent import WebSocketAgent
+from utils.config import Config
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Local ingest hub protocol (server: agents/ingest_hub_agent.py). The hub is the only process
+# holding Binance kline websockets; it writes every closed bar to the store once and fans the
+# normalized klines out to local subscribers over a Unix socket (TCP on localhost where Unix
+# sockets are unavailable). Both directions are newline-delimited JSON:
+#
+#   subscriber -> hub   {"op": "subscribe", "symbol": "BTCUSDT", "interval": "1h", "since": 1700000000000}
+#                       {"op": "unsubscribe", "symbol": "BTCUSDT", "interval": "1h"}
+#   hub -> subscriber   {"symbol": "BTCUSDT", "interval": "1h", "kline": {...}, "closed": true}
+#                       {"error": "..."}
+#
+# kline has the fields WebSocketAgent passes to its listeners. With "since" (epoch ms) the hub
+# first sends the stored closed bars with open_time >= since, marked "catchup": true, then the
+# live klines; a closed bar is published only after it is on disk, so the two never leave a gap.
+
+
+def hub_address(address=None):
+    """
+    Transport of a hub address.
+    Args:
+        address: Unix socket path or host:port (default: Config.INGEST_HUB_ADDRESS)
+    Returns:
+        ('unix', path) or ('tcp', (host, port))
+    """
+    address = address or Config.INGEST_HUB_ADDRESS
+    match = re.fullmatch(r'([\w.\-]+):(\d+)', address)
+    if match:
+        return 'tcp', (match.group(1), int(match.group(2)))
+    return 'unix', address
+
+
+def encode(message):
+    return (json.dumps(message, separators=(',', ':')) + '\n').encode()
+
+
+async def open_hub_connection(address=None):
+    """(reader, writer) of a new connection to the hub."""
+    kind, target = hub_address(address)
+    if kind == 'tcp':
+        return await asyncio.open_connection(*target)
+    return await asyncio.open_unix_connection(target)
+
+
+async def start_hub_server(handler, address=None):
+    """
+    Listen on the hub address (a leftover Unix socket file is replaced, so check hub_available first).
+    Returns:
+        asyncio.Server
+    """
+    kind, target = hub_address(address)
+    if kind == 'tcp':
+        return await asyncio.start_server(handler, *target)
+    os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+    if os.path.exists(target):
+        os.unlink(target)
+    return await asyncio.start_unix_server(handler, target)
+
+
+def hub_available(address=None, timeout=0.5):
+    """True if a hub accepts connections on the address."""
+    kind, target = hub_address(address)
+    if kind == 'unix' and (not hasattr(socket, 'AF_UNIX') or not os.path.exists(target)):
+        return False
+    with socket.socket(socket.AF_INET if kind == 'tcp' else socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(target)
+            return True
+        except OSError:
+            return False
+
+
+def use_hub(address=None):
+    """True if live klines should come from the hub (Config.INGEST_HUB 'auto' and a hub is running)."""
+    return Config.INGEST_HUB != 'off' and hub_available(address)
+
+
+class HubSubscriber(WebSocketAgent):
+    """
+    Kline stream of one pair from the local ingest hub instead of Binance: same listener interface
+    and connect()/stop() lifecycle as WebSocketAgent, but the hub holds the exchange connection
+    and persists the closed bars, so the subscriber never writes the kline file.
+    """
+
+    def __init__(self, symbol, interval, since=None, address=None, reconnect_delay=1):
+        """
+        Args:
+            symbol: Trading pair symbol (e.g., BTCUSDT)
+            interval: Kline interval (e.g., 1h)
+            since: Epoch ms; stored closed bars from this open time on are replayed to the
+                   listeners before the live klines (None: live klines only)
+            address: Hub address (default: Config.INGEST_HUB_ADDRESS)
+            reconnect_delay: Seconds to wait before reconnecting after an error
+        """
+        super().__init__(symbol, interval, reconnect_delay=reconnect_delay)
+        self.symbol = symbol.upper()
+        self.since = int(since) if since is not None else None
+        self.address = address
+        self.last_closed = None  # open_time of the last closed bar passed to the listeners
+        self._last_kline = None  # that bar, to tell a repeat from a newer close of the same open_time
+        self._loop = None
+        self._writer = None
+
+    async def connect(self):
+        """
+        Subscribe at the hub and pass its klines to the listeners. After a reconnect the hub
+        replays the closed bars stored since the last one received, so none are lost or repeated.
+        """
+        self.running = True
+        self._loop = asyncio.get_running_loop()
+        while self.running:
+            try:
+                reader, self._writer = await open_hub_connection(self.address)
+                since = self.since if self.last_closed is None else self.last_closed + 1
+                self._writer.write(encode({'op': 'subscribe', 'symbol': self.symbol, 'interval': self.interval, 'since': since}))
+                await self._writer.drain()
+                self.connections += 1
+                logger.info(f"Subscribed to the ingest hub for {self.symbol} at {self.interval}")
+                while self.running:
+                    line = await reader.readline()
+                    if not line:
+                        raise ConnectionError("Ingest hub closed the connection")
+                    message = json.loads(line)
+                    if 'error' in message:
+                        logger.error(f"Ingest hub: {message['error']}")
+                        continue
+                    kline, closed = message['kline'], message['closed']
+                    if closed:
+                        if self.last_closed is not None and (kline['open_time'] < self.last_closed or (
+                                kline['open_time'] == self.last_closed and self._same_bar(kline, self._last_kline))):
+                            continue
+                        self.last_closed, self._last_kline = kline['open_time'], kline
+                    if self.listeners:
+                        self._notify(kline, closed)
+            except Exception as e:
+                if self.running:
+                    logger.error(f"Ingest hub error: {e}")
+                    await asyncio.sleep(self.reconnect_delay)
+            finally:
+                if self._writer is not None:
+                    self._writer.close()
+                    self._writer = None
+
+    @staticmethod
+    def _same_bar(kline, other):
+        return all(kline.get(field) == other.get(field) for field in ('open', 'high', 'low', 'close', 'volume'))
+
+    def stop(self):
+        """Stop the subscription (the connection is closed right away, not at the next kline)."""
+        self.running = False
+        if self._loop is not None and not self._loop.is_closed():
+            writer = self._writer
+            if writer is not None:
+                self._loop.call_soon_threadsafe(writer.close)
+        logger.info("Ingest hub subscription stopped")
+
+
+def kline_stream(symbol, interval, since=None, address=None):
+    """
+    Live kline stream of a pair: a HubSubscriber when the ingest hub is running (see use_hub),
+    otherwise a WebSocketAgent with its own exchange connection.
+    Args:
+        symbol: Trading pair symbol
+        interval: Kline interval
+        since: Catch-up start (epoch ms) when served by the hub, see HubSubscriber
+        address: Hub address (default: Config.INGEST_HUB_ADDRESS)
+    """
+    if use_hub(address):
+        return HubSubscriber(symbol, interval, since=since, address=address)
+    return WebSocketAgent(symbol, interval)
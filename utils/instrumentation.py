@@ -0,0 +1,331 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from utils.config import Config
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds (Prometheus-style, cumulative on export)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, float('inf'))
+MODES = ('off', 'on', 'memory')
+
+
+class Histogram:
+    """Fixed-bucket histogram of durations plus the totals reported next to it."""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.cpu = 0.0
+        self.rows = 0
+        self.peak_bytes = None
+
+    def observe(self, seconds, cpu=0.0, rows=None, peak_bytes=None):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        self.cpu += cpu
+        if rows is not None:
+            self.rows += rows
+        if peak_bytes is not None:
+            self.peak_bytes = max(self.peak_bytes or 0, peak_bytes)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (the usual histogram estimate)."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count, 'sum_s': round(self.sum, 6), 'mean_s': round(self.sum / self.count, 6) if self.count else None,
+            'p50_s': self.quantile(0.5), 'p95_s': self.quantile(0.95), 'max_s': round(self.max, 6),
+            'cpu_s': round(self.cpu, 6), 'rows': self.rows, 'peak_bytes': self.peak_bytes,
+        }
+
+
+class _Memory:
+    """
+    Peak-memory probe for spans. On Linux the process RSS high-water mark is reset at span start
+    (/proc/self/clear_refs) and read at span end, which costs two small syscalls; elsewhere
+    tracemalloc is used (much slower for Python-heavy code). Nested spans fold their peak into
+    the enclosing span, so resetting the mark for an inner span does not lose the outer peak.
+    The mark is process-wide, so it is only reset while no span of another thread is measuring:
+    a span started while one is running elsewhere reports no peak rather than resetting the
+    other's (the running span's peak then includes the other thread's memory).
+    """
+
+    def __init__(self):
+        self.proc = os.path.exists('/proc/self/clear_refs') and os.access('/proc/self/clear_refs', os.W_OK)
+        self.active = {}  # thread id -> memory spans open in that thread
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Reset the mark for a new span; returns the current usage, or None if other threads have spans open."""
+        thread = threading.get_ident()
+        with self._lock:
+            overlap = any(n for t, n in self.active.items() if t != thread)
+            self.active[thread] = self.active.get(thread, 0) + 1
+            if overlap:
+                return None
+            if self.proc:
+                with open('/proc/self/clear_refs', 'w') as f:
+                    f.write('5')
+                return self._status()[1]
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            return tracemalloc.get_traced_memory()[0]
+
+    def stop(self):
+        """End of a span started with start()."""
+        thread = threading.get_ident()
+        with self._lock:
+            if self.active.get(thread, 0) > 1:
+                self.active[thread] -= 1
+            else:
+                self.active.pop(thread, None)
+
+    def peak(self):
+        """Absolute peak since the last start()."""
+        if self.proc:
+            return self._status()[0]
+        return tracemalloc.get_traced_memory()[1]
+
+    @staticmethod
+    def _status():
+        with open('/proc/self/status') as f:
+            fields = {line.split(':')[0]: int(line.split()[1]) * 1024 for line in f if line.startswith(('VmHWM', 'VmRSS'))}
+        return fields['VmHWM'], fields['VmRSS']
+
+
+class Instrumentation:
+    """
+    Span timings aggregated per name: wall time histogram, CPU time, rows processed and peak
+    memory, plus lock wait histograms. Mode 'off' makes spans no-ops (one attribute check per
+    call), 'on' records time/CPU/rows, 'memory' also records peak memory per span.
+    """
+
+    def __init__(self, mode=None):
+        self.mode = None
+        self.spans = {}
+        self.locks = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._memory = None
+        self.set_mode(mode or Config.INSTRUMENTATION)
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    def set_mode(self, mode):
+        if mode not in MODES:
+            raise ValueError(f"Instrumentation mode must be one of {MODES}, got {mode!r}")
+        self.mode = mode
+        if mode == 'memory' and self._memory is None:
+            self._memory = _Memory()
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self.locks.clear()
+
+    def observe(self, name, seconds, cpu=0.0, rows=None, peak_bytes=None):
+        with self._lock:
+            histogram = self.spans.get(name)
+            if histogram is None:
+                histogram = self.spans[name] = Histogram()
+            histogram.observe(seconds, cpu, rows, peak_bytes)
+
+    def observe_lock_wait(self, name, seconds):
+        with self._lock:
+            histogram = self.locks.get(name)
+            if histogram is None:
+                histogram = self.locks[name] = Histogram()
+            histogram.observe(seconds)
+
+    # ---- export ------------------------------------------------------------------------------
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'spans': {name: h.to_dict() for name, h in sorted(self.spans.items())},
+                'lock_waits': {name: h.to_dict() for name, h in sorted(self.locks.items())},
+            }
+
+    def to_json(self, path=None):
+        """JSON text of all metrics; also written to path when given."""
+        text = json.dumps(self.to_dict(), indent=2)
+        if path:
+            from utils.snapshot_io import write_atomic
+            write_atomic(path, lambda f: f.write(text))
+        return text
+
+    def to_prometheus(self, prefix="atm"):
+        """Prometheus text exposition format (histograms are cumulative per 'le' bound)."""
+        lines = []
+        with self._lock:
+            for metric, label, histograms in ((f"{prefix}_span_seconds", 'span', self.spans), (f"{prefix}_lock_wait_seconds", 'lock', self.locks)):
+                if not histograms:
+                    continue
+                lines.append(f"# TYPE {metric} histogram")
+                for name, h in sorted(histograms.items()):
+                    cumulative = 0
+                    for bound, n in zip(BUCKETS, h.counts):
+                        cumulative += n
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f'{metric}_bucket{{{label}="{name}",le="{le}"}} {cumulative}')
+                    lines.append(f'{metric}_sum{{{label}="{name}"}} {h.sum}')
+                    lines.append(f'{metric}_count{{{label}="{name}"}} {h.count}')
+            if self.spans:
+                lines.append(f"# TYPE {prefix}_span_cpu_seconds_total counter")
+                lines.extend(f'{prefix}_span_cpu_seconds_total{{span="{name}"}} {h.cpu}' for name, h in sorted(self.spans.items()))
+                lines.append(f"# TYPE {prefix}_span_rows_total counter")
+                lines.extend(f'{prefix}_span_rows_total{{span="{name}"}} {h.rows}' for name, h in sorted(self.spans.items()))
+                peaks = [(name, h.peak_bytes) for name, h in sorted(self.spans.items()) if h.peak_bytes is not None]
+                if peaks:
+                    lines.append(f"# TYPE {prefix}_span_peak_memory_bytes gauge")
+                    lines.extend(f'{prefix}_span_peak_memory_bytes{{span="{name}"}} {peak}' for name, peak in peaks)
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+class Span:
+    """One timed section; set .rows inside the block when the row count is known only then."""
+
+    __slots__ = ('name', 'rows', '_registry', '_wall', '_cpu', '_mem_base', '_mem_peak', '_mem_open', '_parent')
+
+    def __init__(self, registry, name, rows=None):
+        self.name = name
+        self.rows = rows
+        self._registry = registry
+
+    def __enter__(self):
+        registry = self._registry
+        self._parent = getattr(registry._local, 'span', None)
+        registry._local.span = self
+        self._mem_open = registry._memory is not None and registry.mode == 'memory'
+        if self._mem_open:
+            if self._parent is not None and self._parent._mem_base is not None:
+                self._parent._mem_peak = max(self._parent._mem_peak, registry._memory.peak())
+            self._mem_base = registry._memory.start()
+            self._mem_peak = self._mem_base
+        else:
+            self._mem_base = None
+        self._cpu = time.thread_time()
+        self._wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._wall
+        cpu = time.thread_time() - self._cpu
+        registry = self._registry
+        peak = None
+        if self._mem_base is not None:
+            absolute = max(self._mem_peak, registry._memory.peak())
+            peak = absolute - self._mem_base
+            if self._parent is not None and self._parent._mem_base is not None:
+                self._parent._mem_peak = max(self._parent._mem_peak, absolute)
+        if self._mem_open:
+            registry._memory.stop()
+        registry._local.span = self._parent
+        registry.observe(self.name, wall, cpu, self.rows, peak)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ('rows',)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+metrics = Instrumentation()
+
+
+def span(name, rows=None):
+    """
+    Context manager timing a block under name.
+
+    Usage:
+        with span("chart.serialize") as s:
+            payload = fig.to_json()
+            s.rows = len(df)
+    """
+    if metrics.mode == 'off':
+        return _NULL_SPAN
+    return Span(metrics, name, rows)
+
+
+def _row_count(result):
+    """Rows of a DataFrame/array/list result (first element of a tuple result); None otherwise."""
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    if hasattr(result, 'shape') and getattr(result, 'shape', None):
+        return int(result.shape[0])
+    if isinstance(result, list):
+        return len(result)
+    return None
+
+
+def instrumented(name=None):
+    """
+    Decorator recording a span per call, named after the method (Class.method) unless given;
+    rows are taken from the returned DataFrame/array/list.
+    """
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if metrics.mode == 'off':
+                return func(*args, **kwargs)
+            with Span(metrics, span_name) as s:
+                result = func(*args, **kwargs)
+                s.rows = _row_count(result)
+                return result
+        return wrapper
+    return decorator
+
+
+class TimedLock:
+    """Wraps a lock (e.g. a FileLock) so the time spent waiting to acquire it is recorded under name."""
+
+    def __init__(self, lock, name):
+        self.lock = lock
+        self.name = name
+
+    def __enter__(self):
+        if metrics.mode == 'off':
+            self.lock.acquire()
+            return self
+        started = time.perf_counter()
+        self.lock.acquire()
+        metrics.observe_lock_wait(self.name, time.perf_counter() - started)
+        return self
+
+    def __exit__(self, *exc):
+        self.lock.release()
+        return False
+
+    def __getattr__(self, attr):
+        return getattr(self.lock, attr)
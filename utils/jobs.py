@@ -0,0 +1,109 @@
+import itertools
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """State of one background job; progress is reported by the job function itself."""
+
+    def __init__(self, job_id, name, key=None):
+        self.id = job_id
+        self.name = name
+        self.key = key
+        self.status = "pending"  # pending -> running -> done | failed
+        self.progress = 0.0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+    def report(self, fraction, message=None):
+        """Progress callback handed to job functions (fraction in [0, 1])."""
+        self.progress = min(max(float(fraction), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+
+class JobRunner:
+    """
+    Bounded thread pool for long dashboard tasks (historical fetches, backtests, sweeps).
+    Jobs with the same key are deduplicated while one is still pending or running.
+    """
+
+    def __init__(self, max_workers=2, keep_finished=50):
+        """
+        Args:
+            max_workers: Maximum number of jobs running at once
+            keep_finished: Number of finished jobs kept for status display
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.keep_finished = keep_finished
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, name, fn, *args, key=None, **kwargs):
+        """
+        Run fn(*args, progress=job.report, **kwargs) in the background.
+        Args:
+            name: Display name
+            fn: Job function; must accept a `progress` keyword argument
+            key: Optional dedup key (e.g. ('backtest', fingerprint, params))
+        Returns:
+            Job instance
+        """
+        with self._lock:
+            if key is not None:
+                for job in self._jobs.values():
+                    if job.key == key and not job.done:
+                        return job
+            job = Job(next(self._ids), name, key)
+            self._jobs[job.id] = job
+            self._trim()
+        self.executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = "running"
+        try:
+            job.result = fn(*args, progress=job.report, **kwargs)
+            job.progress = 1.0
+            job.status = "done"
+        except Exception as e:
+            job.error = f"{e}"
+            job.status = "failed"
+            logger.error(f"Job '{job.name}' failed: {e}\n{traceback.format_exc()}")
+        finally:
+            job.finished_at = time.time()
+
+    def _trim(self):
+        finished = sorted((j for j in self._jobs.values() if j.done), key=lambda j: j.finished_at)
+        for job in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def find(self, key):
+        """Most recent job submitted with the given key, or None."""
+        with self._lock:
+            matches = [job for job in self._jobs.values() if job.key == key]
+        return max(matches, key=lambda j: j.id) if matches else None
+
+    def active(self):
+        with self._lock:
+            return [job for job in self._jobs.values() if not job.done]
+
+    def shutdown(self, wait=False):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
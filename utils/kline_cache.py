@@ -0,0 +1,310 @@
+import io
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from utils.config import Config
+from utils.snapshot_io import read_snapshot, write_atomic, writer_lock
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Intervals whose candles are aligned to the epoch, so candle boundaries can be computed locally
+# (weekly and monthly candles are not; requests for them bypass the cache)
+INTERVAL_MS = {
+    '1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+    '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '6h': 21_600_000, '8h': 28_800_000,
+    '12h': 43_200_000, '1d': 86_400_000,
+}
+OHLCV = ['open', 'high', 'low', 'close', 'volume']
+PAGE_LIMIT = 1000
+
+
+def closed_bars(df, interval, now_ms=None):
+    """
+    Rows of a kline frame whose candle has closed by now_ms: a fetch up to the current time also
+    returns the forming candle, which is later replaced by its closed version. Intervals without
+    a fixed length (and bar series) are returned unchanged.
+    Args:
+        df: Kline frame with open_time
+        interval: Kline interval
+        now_ms: Current time (epoch ms, default: the clock)
+    Returns:
+        pandas.DataFrame
+    """
+    if interval not in INTERVAL_MS or not len(df):
+        return df
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    open_ms = df['open_time'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+    closed = int(np.searchsorted(open_ms, now_ms - INTERVAL_MS[interval], side='right'))
+    return df if closed == len(df) else df.iloc[:closed]
+
+
+def _empty():
+    return np.empty(0, dtype=np.int64), np.empty((0, len(OHLCV)))
+
+
+def _rows_to_arrays(klines):
+    """Raw REST kline rows -> (open_ms int64 array, OHLCV float array)."""
+    if not klines:
+        return _empty()
+    open_ms = np.array([row[0] for row in klines], dtype=np.int64)
+    values = np.array([row[1:6] for row in klines], dtype=float)
+    return open_ms, values
+
+
+def _merge(open_ms, values, new_open, new_values):
+    """Union of two bar sets, sorted by open time; new bars win on equal open times."""
+    open_all = np.concatenate([new_open, open_ms])
+    values_all = np.concatenate([new_values, values])
+    open_unique, first = np.unique(open_all, return_index=True)
+    return open_unique, values_all[first]
+
+
+def _add_range(covered, start, end):
+    """Insert [start, end) into a sorted list of disjoint [start, end) ranges, merging overlaps and neighbours."""
+    merged = []
+    for s, e in sorted(covered + [(start, end)]):
+        if merged and s <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+        else:
+            merged.append((s, e))
+    return merged
+
+
+def _gaps(covered, start, end):
+    """Sub-ranges of [start, end) not in covered."""
+    gaps, cursor = [], start
+    for s, e in covered:
+        if e <= cursor or s >= end:
+            continue
+        if s > cursor:
+            gaps.append((cursor, s))
+        cursor = max(cursor, e)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+class _PairCache:
+    """Cached bars of one (symbol, interval): closed bars with the time ranges known complete, plus the forming candle."""
+
+    def __init__(self):
+        self.open_ms, self.values = _empty()
+        self.covered = []  # disjoint [start_ms, end_ms) ranges of closed candles fully fetched
+        self.tail_open = None  # forming candle: open time, OHLCV row and expiry (its close time)
+        self.tail_values = None
+        self.tail_expires = 0
+        self.mtime_ns = None  # version of the disk file this state was loaded from / saved to
+
+    def to_bytes(self):
+        buffer = io.BytesIO()
+        np.savez(buffer, open_ms=self.open_ms, values=self.values, covered=np.array(self.covered, dtype=np.int64).reshape(-1, 2),
+                 tail=np.array([self.tail_open or 0, self.tail_expires], dtype=np.int64),
+                 tail_values=self.tail_values if self.tail_values is not None else np.empty(0))
+        return buffer.getvalue()
+
+    @classmethod
+    def from_file(cls, path):
+        pair = cls()
+        with np.load(path) as data:
+            pair.open_ms, pair.values = data['open_ms'], data['values']
+            pair.covered = [tuple(int(v) for v in row) for row in data['covered']]
+            tail_open, pair.tail_expires = (int(v) for v in data['tail'])
+            if len(data['tail_values']):
+                pair.tail_open, pair.tail_values = tail_open, data['tail_values']
+        return pair
+
+
+class KlineCache:
+    """
+    Cache of Binance kline responses keyed by candle time instead of by request.
+
+    Closed candles never change, so every closed bar fetched is kept indefinitely, together with
+    the time ranges known to be complete; a request is answered from these ranges and only the
+    missing sub-ranges are fetched (overlapping and adjacent windows merge instead of being
+    refetched). The forming candle is cached until its close, i.e. exactly until the next candle
+    close for that interval. With mode="disk" the per-pair state is also kept in one .npz file per
+    (symbol, interval) under cache_dir, so other processes and later runs share it.
+    """
+
+    def __init__(self, mode=None, cache_dir=None):
+        """
+        Args:
+            mode: 'memory', 'disk' (memory plus files in cache_dir) or 'off' (default: Config.KLINE_CACHE_MODE)
+            cache_dir: Directory of the disk cache (default: Config.KLINE_CACHE_DIR)
+        """
+        self.mode = mode or Config.KLINE_CACHE_MODE
+        self.cache_dir = cache_dir or Config.KLINE_CACHE_DIR
+        self._pairs = {}
+        self._lock = threading.RLock()
+        self.stats = {'hits': 0, 'misses': 0, 'partial_hits': 0, 'api_calls': 0, 'bars_fetched': 0}
+
+    def get_klines(self, client, symbol, interval, limit=500, startTime=None, endTime=None):
+        """
+        Same selection as client.get_klines (bars by open time, first `limit` from startTime, or
+        the last `limit` up to endTime / now), served from the cache where possible.
+        Args:
+            client: python-binance Client used for the missing parts
+            symbol: Trading pair symbol
+            interval: Kline interval
+            limit: Maximum number of bars
+            startTime: Optional first open time in ms
+            endTime: Optional last open time in ms
+        Returns:
+            pandas.DataFrame with columns [open_time, open, high, low, close, volume]
+        """
+        interval_ms = INTERVAL_MS.get(interval)
+        if self.mode == 'off' or interval_ms is None:
+            self.stats['misses'] += 1
+            self.stats['api_calls'] += 1
+            kwargs = {k: v for k, v in (('startTime', startTime), ('endTime', endTime)) if v is not None}
+            return self._to_frame(*_rows_to_arrays(client.get_klines(symbol=symbol, interval=interval, limit=limit, **kwargs)))
+
+        now_ms = int(time.time() * 1000)
+        forming = now_ms // interval_ms * interval_ms
+        lo, hi = self._window(interval_ms, forming, limit, startTime, endTime)
+        with self._lock:
+            pair = self._load(symbol, interval)
+            outcome = self._fill(pair, client, symbol, interval, interval_ms, forming, now_ms, lo, hi) if lo <= hi else 'hits'
+            self.stats[outcome] += 1
+            if outcome != 'hits':
+                self._save(pair, symbol, interval)
+            mask = (pair.open_ms >= lo) & (pair.open_ms <= hi)
+            open_ms, values = pair.open_ms[mask], pair.values[mask]
+            if hi >= forming and pair.tail_open == forming:
+                open_ms = np.append(open_ms, pair.tail_open)
+                values = np.vstack([values, pair.tail_values])
+        return self._to_frame(open_ms, values)
+
+    def hit_rate(self):
+        lookups = self.stats['hits'] + self.stats['partial_hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def clear(self, symbol=None, interval=None):
+        """Drop cached bars of one pair (or all pairs), including their disk files."""
+        with self._lock:
+            keys = [k for k in list(self._pairs) if symbol is None or k == (symbol, interval)]
+            if symbol is not None and (symbol, interval) not in keys:
+                keys.append((symbol, interval))
+            for key in keys:
+                self._pairs.pop(key, None)
+                if self.mode == 'disk' and os.path.exists(self._path(*key)):
+                    os.remove(self._path(*key))
+
+    # ---- request resolution ------------------------------------------------------------------
+
+    @staticmethod
+    def _window(interval_ms, forming, limit, start, end):
+        """Open times [lo, hi] (inclusive, candle-aligned) selected by a get_klines request."""
+        if start is not None:
+            lo = -(-int(start) // interval_ms) * interval_ms
+            hi = lo + (limit - 1) * interval_ms
+            if end is not None:
+                hi = min(hi, int(end) // interval_ms * interval_ms)
+            return lo, min(hi, forming)
+        hi = forming if end is None else min(int(end) // interval_ms * interval_ms, forming)
+        return hi - (limit - 1) * interval_ms, hi
+
+    def _fill(self, pair, client, symbol, interval, interval_ms, forming, now_ms, lo, hi):
+        """
+        Fetch whatever [lo, hi] is missing from the pair cache.
+        Returns:
+            'hits' (nothing fetched), 'partial_hits' (only gaps fetched) or 'misses'
+        """
+        closed_end = min(hi + interval_ms, forming)  # closed candles: open times in [lo, closed_end)
+        gaps = _gaps(pair.covered, lo, closed_end) if lo < closed_end else []
+        partial = sum(end - start for start, end in gaps) < closed_end - lo
+        if hi >= forming and not (pair.tail_open == forming and now_ms < pair.tail_expires):
+            # the forming candle rides along with a gap that ends at it
+            if gaps and gaps[-1][1] == forming:
+                gaps[-1] = (gaps[-1][0], forming + interval_ms)
+            else:
+                gaps.append((forming, forming + interval_ms))
+        if not gaps:
+            return 'hits'
+        for start, end in gaps:
+            self._fetch_gap(pair, client, symbol, interval, interval_ms, forming, start, end)
+        return 'partial_hits' if partial else 'misses'
+
+    def _fetch_gap(self, pair, client, symbol, interval, interval_ms, forming, start, end):
+        cursor = start
+        while cursor < end:
+            klines = client.get_klines(symbol=symbol, interval=interval, startTime=cursor, endTime=end - 1, limit=PAGE_LIMIT)
+            self.stats['api_calls'] += 1
+            self.stats['bars_fetched'] += len(klines)
+            open_ms, values = _rows_to_arrays(klines)
+            closed = open_ms < forming
+            pair.open_ms, pair.values = _merge(pair.open_ms, pair.values, open_ms[closed], values[closed])
+            if (~closed).any():
+                pair.tail_open = int(open_ms[~closed][-1])
+                pair.tail_values = values[~closed][-1]
+                pair.tail_expires = pair.tail_open + interval_ms
+            page_end = min(end, forming) if len(klines) < PAGE_LIMIT else int(open_ms[-1]) + interval_ms
+            if cursor < min(page_end, forming):
+                pair.covered = _add_range(pair.covered, cursor, min(page_end, forming))
+            if len(klines) < PAGE_LIMIT:
+                break
+            cursor = page_end
+
+    @staticmethod
+    def _to_frame(open_ms, values):
+        df = pd.DataFrame(values, columns=OHLCV)
+        df.insert(0, 'open_time', pd.to_datetime(open_ms, unit='ms'))
+        return df
+
+    # ---- storage -----------------------------------------------------------------------------
+
+    def _path(self, symbol, interval):
+        return os.path.join(self.cache_dir, f"{symbol}_{interval}_klines.npz")
+
+    def _load(self, symbol, interval):
+        """Pair state from memory, reloaded from disk when another process has updated the file."""
+        key = (symbol, interval)
+        pair = self._pairs.get(key)
+        if self.mode == 'disk':
+            path = self._path(symbol, interval)
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                mtime_ns = None
+            if mtime_ns is not None and (pair is None or pair.mtime_ns != mtime_ns):
+                pair = read_snapshot(path, _PairCache.from_file)
+                pair.mtime_ns = mtime_ns
+                self._pairs[key] = pair
+        if pair is None:
+            pair = self._pairs[key] = _PairCache()
+        return pair
+
+    def _save(self, pair, symbol, interval):
+        if self.mode != 'disk':
+            return
+        path = self._path(symbol, interval)
+        with writer_lock(path):
+            # fold in bars another process saved since this state was loaded
+            if os.path.exists(path) and os.stat(path).st_mtime_ns != pair.mtime_ns:
+                other = read_snapshot(path, _PairCache.from_file)
+                pair.open_ms, pair.values = _merge(other.open_ms, other.values, pair.open_ms, pair.values)
+                for start, end in other.covered:
+                    pair.covered = _add_range(pair.covered, start, end)
+                if other.tail_open is not None and other.tail_expires > pair.tail_expires:
+                    pair.tail_open, pair.tail_values, pair.tail_expires = other.tail_open, other.tail_values, other.tail_expires
+            data = pair.to_bytes()
+            write_atomic(path, lambda f: f.write(data), binary=True)
+            pair.mtime_ns = os.stat(path).st_mtime_ns
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_kline_cache():
+    """Process-wide KlineCache (created from Config on first use)."""
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = KlineCache()
+    return _default_cache
@@ -0,0 +1,217 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from utils.chunked import INDICATORS, _indicator
+from utils.compact import float64_values
+from utils.data_store import get_store
+from utils.dataset import as_session
+from utils.kline_cache import INTERVAL_MS
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Multi-timeframe features: indicators computed on higher-timeframe (HTF) bars of the same symbol
+# and aligned onto the base bars without look-ahead. A base bar sees an HTF bar only once that
+# bar has closed by the base bar's own close: with close times as int64 epoch ms, the value on
+# base bar i is the one of the last HTF bar with close_ms <= base_close_ms[i], one searchsorted
+# over the sorted HTF close times (an as-of join). The HTF bars come from the stored kline file
+# of that interval when it covers the base data, otherwise they are resampled from the base bars
+# (a still forming HTF bar then closes after every base bar that could see it). HTF indicator
+# results are kept in a process-wide cache keyed by the source file version.
+
+MTF_CACHE_ENTRIES = 64
+_cache = OrderedDict()  # (source key, interval, indicator, params) -> (htf_close_ms, {column: values})
+_cache_lock = threading.Lock()
+
+
+class MtfFeature:
+    """One indicator on one higher timeframe; its column names are also the backtrader line names."""
+
+    def __init__(self, interval, indicator, params=None):
+        if interval not in INTERVAL_MS:
+            raise ValueError(f"Interval '{interval}' is not supported for features (use one of {', '.join(INTERVAL_MS)})")
+        if indicator != 'close' and indicator not in INDICATORS:
+            raise ValueError(f"Unknown indicator '{indicator}' (available: close, {', '.join(INDICATORS)})")
+        defaults, columns = INDICATORS.get(indicator, ({}, ('close',)))
+        unknown = set(params or {}) - set(defaults)
+        if unknown:
+            raise ValueError(f"Unknown parameters for '{indicator}': {', '.join(sorted(unknown))}")
+        self.interval = interval
+        self.indicator = indicator
+        self.params = dict(defaults, **(params or {}))
+        suffix = ''.join(f"_{value}" for value in self.params.values())
+        self.columns = tuple(f"{column}{suffix}_{interval}" for column in columns)
+        self.key = (interval, indicator, tuple(self.params.items()))
+
+    def compute(self, close):
+        """Indicator values over the HTF closes, one array per column."""
+        if self.indicator == 'close':
+            return {self.columns[0]: close}
+        values = _indicator(self.indicator, self.params)(close)
+        return dict(zip(self.columns, values if isinstance(values, tuple) else (values,)))
+
+
+def make_feature(spec):
+    """
+    Build a feature from (interval, indicator) or (interval, indicator, params), e.g.
+    ('1d', 'ema', {'length': 50}) -> column ema_50_1d; MtfFeature instances are returned unchanged.
+    """
+    if isinstance(spec, MtfFeature):
+        return spec
+    return MtfFeature(*spec)
+
+
+def resample_klines(df, interval_ms):
+    """
+    Aggregate time-sorted klines into bars of interval_ms (epoch-aligned like Binance's 1m..1d).
+    Returns:
+        pandas.DataFrame with open_time, open, high, low, close, volume
+    """
+    open_ms = df['open_time'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+    bucket = open_ms // interval_ms
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]]) if len(df) else np.empty(0, dtype=np.int64)
+    ends = np.r_[starts[1:], len(df)] - 1
+    out = {'open_time': pd.to_datetime(bucket[starts] * interval_ms, unit='ms')}
+    if len(df):
+        out['open'] = float64_values(df, 'open')[starts]
+        out['high'] = np.maximum.reduceat(float64_values(df, 'high'), starts)
+        out['low'] = np.minimum.reduceat(float64_values(df, 'low'), starts)
+        out['close'] = float64_values(df, 'close')[ends]
+        if 'volume' in df.columns:
+            out['volume'] = np.add.reduceat(float64_values(df, 'volume'), starts)
+    return pd.DataFrame(out)
+
+
+def align_asof(base_close_ms, htf_close_ms, values):
+    """
+    Value of the last HTF bar closed by each base close (NaN before the first one).
+    Args:
+        base_close_ms: Close times (epoch ms) of the base bars
+        htf_close_ms: Sorted close times (epoch ms) of the HTF bars
+        values: HTF values, one per HTF bar
+    """
+    index = np.searchsorted(htf_close_ms, base_close_ms, side='right') - 1
+    out = np.asarray(values, dtype=np.float64)[np.maximum(index, 0)] if len(values) else np.full(len(index), np.nan)
+    out[index < 0] = np.nan
+    return out
+
+
+def _file_key(path):
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def _cached(key, compute):
+    if key is None:
+        return compute()
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            _cache.move_to_end(key)
+            return entry
+    entry = compute()
+    with _cache_lock:
+        # Drop entries of older versions of the same source file
+        for old in [k for k in _cache if k[0][0] == key[0][0] and k[0][1:3] != key[0][1:3]]:
+            del _cache[old]
+        _cache[key] = entry
+        while len(_cache) > MTF_CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return entry
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+class MultiTimeframeEngine:
+    """
+    Higher-timeframe features of one symbol aligned onto a base interval.
+
+    Usage:
+        engine = MultiTimeframeEngine("BTCUSDT", "1h", [('1d', 'ema', {'length': 50}), ('1d', 'close')])
+        df = engine.align(session)  # base klines plus ema_50_1d and close_1d
+    """
+
+    def __init__(self, symbol, interval, features, store=None):
+        """
+        Args:
+            symbol: Trading pair symbol
+            interval: Base interval (one of utils.kline_cache.INTERVAL_MS)
+            features: Feature specs, see make_feature; their intervals must not be shorter than the base
+            store: DataStore the HTF kline files are read from (default: the shared store)
+        """
+        if interval not in INTERVAL_MS:
+            raise ValueError(f"Interval '{interval}' is not supported for features (use one of {', '.join(INTERVAL_MS)})")
+        self.symbol = symbol
+        self.interval = interval
+        self.interval_ms = INTERVAL_MS[interval]
+        self.features = [make_feature(spec) for spec in features]
+        for feature in self.features:
+            if INTERVAL_MS[feature.interval] < self.interval_ms:
+                raise ValueError(f"Feature interval {feature.interval} is shorter than the base interval {interval}")
+        self.store = store or get_store()
+
+    @property
+    def columns(self):
+        return [column for feature in self.features for column in feature.columns]
+
+    def _htf_source(self, session, interval, base_close_ms):
+        """
+        (cache key, bars) of the HTF data: the stored kline file when it holds every HTF bar closed
+        by the last base bar, else the base bars resampled (key None for in-memory base frames).
+        """
+        htf_ms = INTERVAL_MS[interval]
+        if htf_ms == self.interval_ms:
+            return None, session.df
+        path = self.store.path(self.symbol, interval)
+        if len(base_close_ms) and os.path.exists(path):
+            df = self.store.read_path(path)
+            last_open = int(df['open_time'].iloc[-1].value // 10**6) if len(df) else -1
+            if last_open + htf_ms >= base_close_ms[-1] // htf_ms * htf_ms:
+                return _file_key(path), df
+            logger.info(f"{path} ends before the base data, resampling {self.interval} bars to {interval}")
+        key = None
+        if session.data_file is not None and os.path.exists(session.data_file):
+            key = _file_key(session.data_file) + (self.interval, str(session.start), str(session.end), session.warmup)
+        return key, resample_klines(session.df, htf_ms)
+
+    def features_frame(self, source):
+        """
+        Aligned feature columns for the base bars of source.
+        Args:
+            source: DatasetSession, path to the base kline file, or base kline DataFrame
+        Returns:
+            pandas.DataFrame with one float64 column per feature column, index as the base frame
+        """
+        session = as_session(source, self.symbol, self.interval, store=self.store)
+
+        def compute():
+            df = session.df
+            base_close_ms = df['open_time'].to_numpy(dtype='datetime64[ms]').astype(np.int64) + self.interval_ms
+            out, sources = {}, {}
+            for feature in self.features:
+                if feature.interval not in sources:
+                    sources[feature.interval] = self._htf_source(session, feature.interval, base_close_ms)
+                key, htf = sources[feature.interval]
+
+                def compute_htf(feature=feature, htf=htf):
+                    htf_close_ms = htf['open_time'].to_numpy(dtype='datetime64[ms]').astype(np.int64) + INTERVAL_MS[feature.interval]
+                    return htf_close_ms, feature.compute(float64_values(htf, 'close'))
+                htf_close_ms, values = _cached(None if key is None else (key,) + feature.key, compute_htf)
+                for column, series in values.items():
+                    out[column] = align_asof(base_close_ms, htf_close_ms, series)
+            return pd.DataFrame(out, index=df.index)
+        return session.cached(('mtf',) + tuple(feature.key for feature in self.features), compute)
+
+    def align(self, source):
+        """Base kline frame of source (shallow copy) with the feature columns added."""
+        session = as_session(source, self.symbol, self.interval, store=self.store)
+        df = session.frame('raw')
+        for column, values in self.features_frame(session).items():
+            df[column] = values
+        return df
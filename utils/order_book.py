@@ -0,0 +1,160 @@
+import numpy as np
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def levels_array(levels):
+    """(n, 2) float64 array of [price, qty] rows from Binance's string pairs."""
+    if not len(levels):
+        return np.empty((0, 2))
+    return np.asarray(levels, dtype=np.float64).reshape(-1, 2)
+
+
+class DepthBook:
+    """
+    One state of an order book as sorted arrays: bids by descending, asks by ascending price.
+    Returned by OrderBook.snapshot() and DepthStore.book_at().
+    """
+
+    def __init__(self, bid_price, bid_qty, ask_price, ask_qty, time=None, update_id=None):
+        self.bid_price = bid_price
+        self.bid_qty = bid_qty
+        self.ask_price = ask_price
+        self.ask_qty = ask_qty
+        self.time = time  # epoch ms of the last update in this state
+        self.update_id = update_id  # last update id in this state
+
+    @classmethod
+    def from_levels(cls, bid_price, bid_qty, ask_price, ask_qty, time=None, update_id=None):
+        """Book from unsorted levels (zero quantities are dropped)."""
+        bids = bid_qty > 0
+        asks = ask_qty > 0
+        bid_order = np.argsort(-bid_price[bids], kind='stable')
+        ask_order = np.argsort(ask_price[asks], kind='stable')
+        return cls(bid_price[bids][bid_order], bid_qty[bids][bid_order], ask_price[asks][ask_order], ask_qty[asks][ask_order],
+                   time, update_id)
+
+    @property
+    def best_bid(self):
+        return float(self.bid_price[0]) if len(self.bid_price) else np.nan
+
+    @property
+    def best_ask(self):
+        return float(self.ask_price[0]) if len(self.ask_price) else np.nan
+
+    @property
+    def mid(self):
+        return (self.best_bid + self.best_ask) / 2
+
+    @property
+    def spread_bps(self):
+        return (self.best_ask - self.best_bid) / self.mid * 10_000
+
+    def fill_price(self, side, qty):
+        """
+        Average price of a market order walking the book.
+        Args:
+            side: 'buy' (takes asks) or 'sell' (takes bids)
+            qty: Order size in the base asset
+        Returns:
+            (average price, filled qty); filled qty is below qty when the book is not deep enough,
+            the average price is NaN for an empty side
+        """
+        price, size = (self.ask_price, self.ask_qty) if side == 'buy' else (self.bid_price, self.bid_qty)
+        if not len(price) or qty <= 0:
+            return (float(price[0]) if len(price) else np.nan), 0.0
+        cumulative = np.cumsum(size)
+        full = int(np.searchsorted(cumulative, qty, side='left'))
+        if full >= len(price):
+            return float(np.dot(price, size) / cumulative[-1]), float(cumulative[-1])
+        taken = cumulative[full - 1] if full else 0.0
+        cost = (np.dot(price[:full], size[:full]) if full else 0.0) + (qty - taken) * price[full]
+        return float(cost / qty), float(qty)
+
+    def slippage_bps(self, side, qty):
+        """Cost of a market order against the mid price in basis points (half spread plus book impact)."""
+        price, _ = self.fill_price(side, qty)
+        sign = 1 if side == 'buy' else -1
+        return sign * (price - self.mid) / self.mid * 10_000
+
+    def top(self, levels=10):
+        """(bids, asks) as (n, 2) [price, qty] arrays of the best levels."""
+        return (np.column_stack([self.bid_price[:levels], self.bid_qty[:levels]]),
+                np.column_stack([self.ask_price[:levels], self.ask_qty[:levels]]))
+
+
+class OrderBook:
+    """
+    Local order book kept from a REST snapshot plus the @depth diff stream (Binance's procedure):
+    diffs already contained in the snapshot are skipped, and every other diff must start at most
+    one update after the last one applied, otherwise updates were missed and the book has to be
+    rebuilt from a new snapshot.
+    """
+
+    def __init__(self):
+        self.bids = {}  # price -> qty
+        self.asks = {}
+        self.last_update_id = None
+        self.time = None
+
+    @property
+    def synced(self):
+        return self.last_update_id is not None
+
+    def reset(self):
+        self.bids.clear()
+        self.asks.clear()
+        self.last_update_id = None
+        self.time = None
+
+    def load_snapshot(self, last_update_id, bids, asks, time=None):
+        """
+        Replace the book with a /api/v3/depth snapshot.
+        Args:
+            last_update_id: lastUpdateId of the snapshot
+            bids, asks: [price, qty] pairs (strings or numbers)
+            time: Epoch ms the snapshot stands for
+        """
+        self.reset()
+        self._update(self.bids, levels_array(bids))
+        self._update(self.asks, levels_array(asks))
+        self.last_update_id = int(last_update_id)
+        self.time = time
+
+    def apply(self, first_id, last_id, bids, asks, time=None):
+        """
+        Apply one diff event (U, u, b, a of a depthUpdate).
+        Returns:
+            True if applied, False if the snapshot already contains it
+        Raises:
+            ValueError: If no snapshot is loaded, or updates between the book and the event are missing
+        """
+        if self.last_update_id is None:
+            raise ValueError("No snapshot loaded")
+        if last_id <= self.last_update_id:
+            return False
+        if first_id > self.last_update_id + 1:
+            raise ValueError(f"Sequence gap: expected update {self.last_update_id + 1}, got {first_id}..{last_id}")
+        self._update(self.bids, levels_array(bids) if not isinstance(bids, np.ndarray) else bids)
+        self._update(self.asks, levels_array(asks) if not isinstance(asks, np.ndarray) else asks)
+        self.last_update_id = int(last_id)
+        self.time = time
+        return True
+
+    @staticmethod
+    def _update(side, levels):
+        for price, qty in levels.tolist():
+            if qty == 0:
+                side.pop(price, None)
+            else:
+                side[price] = qty
+
+    def snapshot(self):
+        """Current state as a DepthBook."""
+        bid_price = np.fromiter(self.bids.keys(), dtype=np.float64, count=len(self.bids))
+        bid_qty = np.fromiter(self.bids.values(), dtype=np.float64, count=len(self.bids))
+        ask_price = np.fromiter(self.asks.keys(), dtype=np.float64, count=len(self.asks))
+        ask_qty = np.fromiter(self.asks.values(), dtype=np.float64, count=len(self.asks))
+        return DepthBook.from_levels(bid_price, bid_qty, ask_price, ask_qty, self.time, self.last_update_id)
@@ -0,0 +1,504 @@
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+from utils.config import Config
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Record and replay of Binance traffic. A recording is a gzip file of JSON lines: a header, then
+# one event per REST response ({"t", "rest": path, "q": params, "status", "body"}) or websocket
+# frame ({"t", "ws": stream, "data"}), t in ms since the recording started. RecordingProxy sits
+# between the agents and Binance and writes one; ReplayServer stands in for api.binance.com and
+# stream.binance.com from one, with pacing, latency, REST errors and disconnects injected. Both
+# listen on localhost; agents are pointed at them through Config.BINANCE_API_URL and
+# Config.BINANCE_WS_URL (env vars, or `with server:` inside a process).
+#
+# Kline and aggTrades responses are indexed by symbol/interval and answer any range query
+# (startTime/endTime/fromId/limit as Binance does), so agents whose windows depend on the current
+# time still replay; other endpoints replay the recorded response to the same parameters.
+
+RECORDING_FORMAT = "atm-replay"
+RECORDING_VERSION = 1
+IGNORED_PARAMS = ('timestamp', 'signature', 'recvWindow')
+ERROR_BODIES = {
+    429: {"code": -1003, "msg": "Too many requests; please use the websocket for live updates to avoid polling the API."},
+    418: {"code": -1003, "msg": "Way too many requests; IP banned until further notice."},
+}
+DEFAULT_ERROR_BODY = {"code": -1001, "msg": "Internal error; unable to process your request. Please try your request again."}
+
+
+def _canonical(params):
+    return tuple(sorted((k, str(v)) for k, v in params.items() if k not in IGNORED_PARAMS))
+
+
+class RecordingWriter:
+    """Appends REST responses and websocket frames to a recording (thread-safe)."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.events = 0
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        self._write({'format': RECORDING_FORMAT, 'version': RECORDING_VERSION, 'started_ms': int(time.time() * 1000)})
+
+    def _write(self, event):
+        line = json.dumps(event, separators=(',', ':')) + '\n'
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+                self.events += 1
+
+    def _t(self):
+        return int((time.monotonic() - self._started) * 1000)
+
+    def rest(self, path, params, status, body, t=None):
+        """Record one REST response (body as text; t: ms since the recording started, default now)."""
+        self._write({'t': self._t() if t is None else t, 'rest': path, 'q': dict(params), 'status': status, 'body': body})
+
+    def frame(self, stream, data, t=None):
+        """Record one websocket frame of a stream, e.g. 'btcusdt@kline_1h' (t as in rest())."""
+        self._write({'t': self._t() if t is None else t, 'ws': stream, 'data': data})
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        logger.info(f"Recorded {self.events - 1} events to {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Recording:
+    """A loaded recording, indexed for replay."""
+
+    def __init__(self):
+        self.klines = {}  # (symbol, interval) -> {open_ms: row}, sorted into _sorted on first use
+        self.agg_trades = {}  # symbol -> {id: trade}
+        self.responses = {}  # (path, canonical params) -> [(status, body)]
+        self.streams = {}  # stream -> [(t, data)]
+        self._sorted = {}
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a recording file.
+        Raises:
+            ValueError: If the file is not a recording
+        """
+        recording = cls()
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline() or '{}')
+            if header.get('format') != RECORDING_FORMAT:
+                raise ValueError(f"{path} is not a replay recording")
+            for line in f:
+                event = json.loads(line)
+                if 'ws' in event:
+                    recording.add_frame(event['ws'], event['t'], event['data'])
+                else:
+                    recording.add_rest(event['rest'], event['q'], event['status'], event['body'])
+        logger.info(f"Loaded recording {path}: {sum(len(rows) for rows in recording.klines.values())} klines, "
+                    f"{sum(len(frames) for frames in recording.streams.values())} frames in {len(recording.streams)} streams")
+        return recording
+
+    def add_rest(self, path, params, status, body):
+        if status == 200 and path.endswith('/v3/klines'):
+            rows = self.klines.setdefault((params['symbol'], params['interval']), {})
+            for row in json.loads(body):
+                rows[int(row[0])] = row
+            self._sorted.pop((params['symbol'], params['interval']), None)
+        elif status == 200 and path.endswith('/v3/aggTrades'):
+            trades = self.agg_trades.setdefault(params['symbol'], {})
+            for trade in json.loads(body):
+                trades[int(trade['a'])] = trade
+            self._sorted.pop(params['symbol'], None)
+            self._sorted.pop((params['symbol'], 'T'), None)
+        else:
+            self.responses.setdefault((path, _canonical(params)), []).append((status, body))
+
+    def add_frame(self, stream, t, data):
+        self.streams.setdefault(stream, []).append((t, data))
+
+    def _index(self, key, rows, field):
+        if key not in self._sorted:
+            ordered = [rows[k] for k in sorted(rows)]
+            self._sorted[key] = (np.array([int(field(row)) for row in ordered], dtype=np.int64), ordered)
+        return self._sorted[key]
+
+    def kline_rows(self, params):
+        """Rows answering a /api/v3/klines query, or None if the symbol/interval was not recorded."""
+        key = (params.get('symbol'), params.get('interval'))
+        if key not in self.klines:
+            return None
+        open_ms, rows = self._index(key, self.klines[key], lambda row: row[0])
+        limit = min(int(params.get('limit', 500)), 1000)
+        start, end = params.get('startTime'), params.get('endTime')
+        lo = 0 if start is None else int(np.searchsorted(open_ms, int(start), side='left'))
+        hi = len(rows) if end is None else int(np.searchsorted(open_ms, int(end), side='right'))
+        if start is None:  # the latest bars up to endTime
+            return rows[max(hi - limit, lo):hi]
+        return rows[lo:min(hi, lo + limit)]
+
+    def agg_trade_rows(self, params):
+        """Trades answering a /api/v3/aggTrades query, or None if the symbol was not recorded."""
+        symbol = params.get('symbol')
+        if symbol not in self.agg_trades:
+            return None
+        ids, trades = self._index(symbol, self.agg_trades[symbol], lambda trade: trade['a'])
+        limit = min(int(params.get('limit', 500)), 1000)
+        if params.get('fromId') is not None:
+            lo = int(np.searchsorted(ids, int(params['fromId']), side='left'))
+            return trades[lo:lo + limit]
+        if (symbol, 'T') not in self._sorted:
+            self._sorted[(symbol, 'T')] = np.array([trade['T'] for trade in trades], dtype=np.int64)
+        times = self._sorted[(symbol, 'T')]
+        start, end = params.get('startTime'), params.get('endTime')
+        lo = 0 if start is None else int(np.searchsorted(times, int(start), side='left'))
+        hi = len(trades) if end is None else int(np.searchsorted(times, int(end), side='right'))
+        if start is None and end is None:
+            return trades[max(hi - limit, 0):hi]
+        return trades[lo:min(hi, lo + limit)]
+
+
+class _LocalBinance(ABC):
+    """
+    REST (HTTP) and websocket servers on localhost threads standing in for Binance. Subclasses
+    answer rest() and feed stream(). As a context manager the servers are started and Config's
+    Binance URLs (and the shared REST client) point at them until exit.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, ws_port=0):
+        self.host = host
+        self.port = port
+        self.ws_port = ws_port
+        self.stats = {'rest_requests': 0, 'rest_errors': 0, 'ws_connections': 0, 'ws_frames': 0, 'ws_disconnects': 0}
+        self.httpd = None
+        self.loop = None
+        self._stopped = None
+        self._threads = []
+        self._previous = None
+        self._lock = threading.Lock()
+
+    @property
+    def api_url(self):
+        return f"http://{self.host}:{self.port}/api"
+
+    @property
+    def ws_url(self):
+        return f"ws://{self.host}:{self.ws_port}/ws"
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.stats[name] += n
+
+    @abstractmethod
+    def rest(self, path, params):
+        """Answer a GET: (status, body text, extra headers)."""
+        pass
+
+    @abstractmethod
+    async def stream(self, connection, stream):
+        """Feed one websocket connection to a stream."""
+        pass
+
+    def start(self):
+        self.httpd = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        ready = threading.Event()
+        self._threads = [threading.Thread(target=self.httpd.serve_forever, name="replay-rest", daemon=True),
+                         threading.Thread(target=lambda: asyncio.run(self._serve_ws(ready)), name="replay-ws", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        ready.wait(10)
+        logger.info(f"{type(self).__name__} listening: BINANCE_API_URL={self.api_url} BINANCE_WS_URL={self.ws_url}")
+        return self
+
+    async def _serve_ws(self, ready):
+        from websockets.asyncio.server import serve
+        self.loop = asyncio.get_running_loop()
+        self._stopped = self.loop.create_future()
+        async with serve(self._ws_handler, self.host, self.ws_port) as server:
+            self.ws_port = server.sockets[0].getsockname()[1]
+            ready.set()
+            await self._stopped
+
+    async def _ws_handler(self, connection):
+        path = connection.request.path
+        if not path.startswith('/ws/'):
+            await connection.close(1008, "Unknown stream path")
+            return
+        self._count('ws_connections')
+        try:
+            await self.stream(connection, path[len('/ws/'):])
+        except Exception as e:
+            # the client went away (or the upstream failed); the connection is closed either way
+            logger.debug(f"Stream {path} ended: {e}")
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(lambda: self._stopped.done() or self._stopped.set_result(None))
+        for thread in self._threads:
+            thread.join(timeout=10)
+        self._threads = []
+
+    def __enter__(self):
+        from utils.binance_client import reset_client
+        self.start()
+        self._previous = (Config.BINANCE_API_URL, Config.BINANCE_WS_URL)
+        Config.BINANCE_API_URL, Config.BINANCE_WS_URL = self.api_url, self.ws_url
+        reset_client()
+        return self
+
+    def __exit__(self, *exc):
+        from utils.binance_client import reset_client
+        Config.BINANCE_API_URL, Config.BINANCE_WS_URL = self._previous
+        reset_client()
+        self.stop()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                server._count('rest_requests')
+                try:
+                    status, body, headers = server.rest(url.path, params)
+                except Exception as e:
+                    logger.error(f"Stand-in REST error for {url.path}: {e}")
+                    status, body, headers = 502, json.dumps(DEFAULT_ERROR_BODY), {}
+                data = body.encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+        return Handler
+
+
+class ReplayServer(_LocalBinance):
+    """
+    Serves a recording as Binance REST and websocket endpoints.
+
+    Usage:
+        with ReplayServer("data/recordings/btc.jsonl.gz", speed=0, latency_ms=20, error_rate=0.01) as server:
+            HistoricalDataAgent("BTCUSDT", "1h").collect_historical_data("2024-01-01")
+            print(server.stats)
+    """
+
+    def __init__(self, recording, speed=1.0, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, error_status=503,
+                 disconnect_rate=0.0, restamp=True, seed=0, host="127.0.0.1", port=0, ws_port=0):
+        """
+        Args:
+            recording: Recording or path to a recording file
+            speed: Websocket replay speed relative to the recorded timing (1 = real time; 0 or
+                   less: as fast as possible)
+            latency_ms: Delay added to every REST response and websocket frame
+            jitter_ms: Random extra delay, uniform in [0, jitter_ms)
+            error_rate: Fraction of REST requests answered with error_status instead
+            error_status: HTTP status of injected errors (429/418 get Binance's rate-limit bodies)
+            disconnect_rate: Probability per frame that the server drops the connection instead
+                             (the frame is sent again after the client reconnects)
+            restamp: Set the event time "E" of frames to the send time, so receivers can measure
+                     delivery latency against it
+            seed: Seed of the fault injection
+        """
+        super().__init__(host, port, ws_port)
+        self.recording = recording if isinstance(recording, Recording) else Recording.load(recording)
+        self.speed = speed
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.disconnect_rate = disconnect_rate
+        self.restamp = restamp
+        self.positions = {}  # stream -> index of the next frame (reconnections resume there)
+        self._rng = random.Random(seed)
+
+    def _delay(self):
+        with self._lock:
+            jitter = self._rng.random() * self.jitter_ms if self.jitter_ms else 0.0
+        return (self.latency_ms + jitter) / 1000
+
+    def _chance(self, rate):
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < rate
+
+    def rest(self, path, params):
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        if self._chance(self.error_rate):
+            self._count('rest_errors')
+            headers = {'Retry-After': '1'} if self.error_status in (418, 429) else {}
+            return self.error_status, json.dumps(ERROR_BODIES.get(self.error_status, DEFAULT_ERROR_BODY)), headers
+        if path.endswith('/v3/ping'):
+            return 200, '{}', {}
+        if path.endswith('/v3/time'):
+            return 200, json.dumps({'serverTime': int(time.time() * 1000)}), {}
+        rows = None
+        if path.endswith('/v3/klines'):
+            rows = self.recording.kline_rows(params)
+        elif path.endswith('/v3/aggTrades'):
+            rows = self.recording.agg_trade_rows(params)
+        if rows is not None:
+            return 200, json.dumps(rows, separators=(',', ':')), {}
+        responses = self.recording.responses.get((path, _canonical(params)))
+        if responses:
+            status, body = responses[0] if len(responses) == 1 else responses.pop(0)
+            return status, body, {}
+        return 400, json.dumps({"code": -1121, "msg": f"No recorded response for {path} {params}"}), {}
+
+    def _restamped(self, data):
+        try:
+            payload = json.loads(data)
+        except ValueError:
+            return data
+        if isinstance(payload, dict) and 'E' in payload:
+            payload['E'] = int(time.time() * 1000)
+            return json.dumps(payload, separators=(',', ':'))
+        return data
+
+    async def stream(self, connection, stream):
+        frames = self.recording.streams.get(stream, [])
+        index = self.positions.get(stream, 0)
+        started, first_t = time.monotonic(), frames[index][0] if index < len(frames) else 0
+        while index < len(frames):
+            t, data = frames[index]
+            if self.speed > 0:
+                wait = started + (t - first_t) / 1000 / self.speed - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            delay = self._delay()
+            if delay:
+                await asyncio.sleep(delay)
+            if self._chance(self.disconnect_rate):
+                self._count('ws_disconnects')
+                await connection.close(1001, "Injected disconnect")
+                return
+            await connection.send(self._restamped(data) if self.restamp else data)
+            index += 1
+            self.positions[stream] = max(self.positions.get(stream, 0), index)
+            self._count('ws_frames')
+        await connection.wait_closed()  # recording exhausted: a quiet stream until the client leaves
+
+
+class RecordingProxy(_LocalBinance):
+    """
+    Forwards REST requests and websocket streams to Binance (or another upstream) and records
+    every response and frame.
+
+    Usage:
+        with RecordingProxy("data/recordings/btc.jsonl.gz"):
+            agent = HistoricalDataAgent("BTCUSDT", "1h")
+            agent.collect_historical_data("2024-01-01")
+    """
+
+    def __init__(self, path, upstream_api=None, upstream_ws=None, host="127.0.0.1", port=0, ws_port=0):
+        """
+        Args:
+            path: Recording file to write
+            upstream_api: REST base URL ending in '/api' (default: Config.BINANCE_API_URL at construction)
+            upstream_ws: Websocket base URL ending in '/ws' (default: Config.BINANCE_WS_URL at construction)
+        """
+        import requests
+        super().__init__(host, port, ws_port)
+        self.upstream_api = (upstream_api or Config.BINANCE_API_URL).rstrip('/')
+        self.upstream_ws = (upstream_ws or Config.BINANCE_WS_URL).rstrip('/')
+        self.writer = RecordingWriter(path)
+        self.session = requests.Session()
+
+    def rest(self, path, params):
+        response = self.session.get(self.upstream_api + path[len('/api'):], params=params, timeout=30)
+        self.writer.rest(path, params, response.status_code, response.text)
+        headers = {k: v for k, v in response.headers.items() if k.lower().startswith('x-mbx-') or k.lower() == 'retry-after'}
+        return response.status_code, response.text, headers
+
+    async def stream(self, connection, stream):
+        import websockets
+        async with websockets.connect(f"{self.upstream_ws}/{stream}") as upstream:
+            async for message in upstream:
+                self.writer.frame(stream, message)
+                await connection.send(message)
+                self._count('ws_frames')
+
+    def stop(self):
+        super().stop()
+        self.session.close()
+        self.writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record Binance traffic or replay a recording as a local stand-in")
+    commands = parser.add_subparsers(dest='command', required=True)
+    record = commands.add_parser('record', help='Proxy to Binance and record the traffic')
+    record.add_argument('path', help='Recording file to write (.jsonl.gz)')
+    record.add_argument('--upstream-api', default=None, help='Upstream REST base URL (default: BINANCE_API_URL)')
+    record.add_argument('--upstream-ws', default=None, help='Upstream websocket base URL (default: BINANCE_WS_URL)')
+    serve = commands.add_parser('serve', help='Replay a recording')
+    serve.add_argument('path', help='Recording file')
+    serve.add_argument('--speed', type=float, default=1.0, help='Websocket replay speed (0: as fast as possible)')
+    serve.add_argument('--latency-ms', type=float, default=0.0)
+    serve.add_argument('--jitter-ms', type=float, default=0.0)
+    serve.add_argument('--error-rate', type=float, default=0.0, help='Fraction of REST requests answered with an error')
+    serve.add_argument('--error-status', type=int, default=503)
+    serve.add_argument('--disconnect-rate', type=float, default=0.0, help='Probability per frame of a dropped connection')
+    serve.add_argument('--seed', type=int, default=0)
+    for command in (record, serve):
+        command.add_argument('--port', type=int, default=0, help='REST port (default: any free port)')
+        command.add_argument('--ws-port', type=int, default=0, help='Websocket port (default: any free port)')
+    args = parser.parse_args()
+    if args.command == 'record':
+        server = RecordingProxy(args.path, args.upstream_api, args.upstream_ws, port=args.port, ws_port=args.ws_port)
+    else:
+        server = ReplayServer(args.path, speed=args.speed, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                              error_rate=args.error_rate, error_status=args.error_status, disconnect_rate=args.disconnect_rate,
+                              seed=args.seed, port=args.port, ws_port=args.ws_port)
+    server.start()
+    print(f"BINANCE_API_URL={server.api_url}\nBINANCE_WS_URL={server.ws_url}", flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        logger.info(f"Stopped: {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+from abc import ABC, abstractmethod
+import numpy as np
+import pandas as pd
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Cross-symbol scans on a (symbol x time) close panel. Conditions keep one state value per
+# symbol (EMA, Wilder averages, ...) in NumPy vectors: the panel is replayed through step()
+# column by column once, then every closed bar only steps the symbols that received it, so a
+# rescan after a bar close costs O(symbols) vector operations instead of rereading any file.
+# Values follow the strategy code (EMA seeded with the first close, Wilder RSI like talib), but
+# are computed over the panel window only, so they match a full-history run once the window is
+# long compared to the indicator periods (the default 500 bars vs. 21).
+
+
+class ScanCondition(ABC):
+    """
+    Vectorized per-symbol condition. Subclasses hold their state in arrays of length n_symbols,
+    advance it in step() and report the current trigger in evaluate().
+    """
+
+    name = None
+
+    @abstractmethod
+    def reset(self, n_symbols):
+        """Allocate empty state for n_symbols."""
+        pass
+
+    @abstractmethod
+    def step(self, rows, price):
+        """
+        Advance the state of some symbols by one closed bar.
+        Args:
+            rows: Row indices of the symbols (int array)
+            price: Their closes (NaN: no bar yet, the state is left unchanged)
+        """
+        pass
+
+    @abstractmethod
+    def evaluate(self, close):
+        """
+        Current trigger of every symbol.
+        Args:
+            close: Latest close per symbol
+        Returns:
+            (signal, score, value): int8 array (1 buy, -1 sell, 0 none), ranking score (higher
+            is stronger) and the indicator value shown with the trigger
+        """
+        pass
+
+
+class EmaCrossoverCondition(ScanCondition):
+    """Fast EMA crossing the slow EMA on the latest bar (signal/position logic of EMACrossoverStrategy)."""
+
+    name = 'ema_crossover'
+
+    def __init__(self, fast_length=9, slow_length=21):
+        self.fast_alpha = 2.0 / (fast_length + 1)
+        self.slow_alpha = 2.0 / (slow_length + 1)
+
+    def reset(self, n_symbols):
+        self.fast = np.full(n_symbols, np.nan)
+        self.slow = np.full(n_symbols, np.nan)
+        self.signal = np.zeros(n_symbols, dtype=np.int8)
+        self.prev_signal = np.zeros(n_symbols, dtype=np.int8)
+
+    def step(self, rows, price):
+        valid = ~np.isnan(price)
+        rows, price = rows[valid], price[valid]
+        fast, slow = self.fast[rows], self.slow[rows]
+        first = np.isnan(fast)
+        fast = np.where(first, price, fast + self.fast_alpha * (price - fast))
+        slow = np.where(first, price, slow + self.slow_alpha * (price - slow))
+        self.fast[rows], self.slow[rows] = fast, slow
+        self.prev_signal[rows] = np.where(first, 0, self.signal[rows])
+        self.signal[rows] = np.where(fast > slow, 1, -1)
+
+    def evaluate(self, close):
+        crossed = (self.prev_signal != 0) & (self.signal != self.prev_signal)
+        spread = (self.fast - self.slow) / close * 100.0
+        return np.where(crossed, self.signal, 0).astype(np.int8), np.abs(spread), spread
+
+
+class RsiExtremeCondition(ScanCondition):
+    """RSI (Wilder, as talib.RSI) below `lower` (buy) or above `upper` (sell) on the latest bar."""
+
+    name = 'rsi_extreme'
+
+    def __init__(self, period=14, lower=30.0, upper=70.0):
+        self.period = period
+        self.lower = lower
+        self.upper = upper
+
+    def reset(self, n_symbols):
+        self.prev = np.full(n_symbols, np.nan)
+        self.avg_gain = np.zeros(n_symbols)
+        self.avg_loss = np.zeros(n_symbols)
+        self.count = np.zeros(n_symbols, dtype=np.int64)  # price changes seen
+
+    def step(self, rows, price):
+        valid = ~np.isnan(price)
+        rows, price = rows[valid], price[valid]
+        prev = self.prev[rows]
+        change = np.where(np.isnan(prev), 0.0, price - prev)
+        has_change = ~np.isnan(prev)
+        count = self.count[rows] + has_change
+        gain, loss = np.maximum(change, 0.0), np.maximum(-change, 0.0)
+        avg_gain, avg_loss = self.avg_gain[rows], self.avg_loss[rows]
+        seeding = count <= self.period  # accumulate sums, averaged on the period-th change
+        smoothing = has_change & ~seeding
+        avg_gain = np.where(seeding, avg_gain + gain, avg_gain)
+        avg_loss = np.where(seeding, avg_loss + loss, avg_loss)
+        seeded = has_change & (count == self.period)
+        avg_gain = np.where(seeded, avg_gain / self.period, avg_gain)
+        avg_loss = np.where(seeded, avg_loss / self.period, avg_loss)
+        avg_gain = np.where(smoothing, (avg_gain * (self.period - 1) + gain) / self.period, avg_gain)
+        avg_loss = np.where(smoothing, (avg_loss * (self.period - 1) + loss) / self.period, avg_loss)
+        self.prev[rows], self.count[rows] = price, count
+        self.avg_gain[rows], self.avg_loss[rows] = avg_gain, avg_loss
+
+    def rsi(self):
+        total = self.avg_gain + self.avg_loss
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rsi = np.where(total != 0, 100.0 * self.avg_gain / total, 0.0)
+        return np.where(self.count >= self.period, rsi, np.nan)
+
+    def evaluate(self, close):
+        rsi = self.rsi()
+        signal = np.where(rsi < self.lower, 1, np.where(rsi > self.upper, -1, 0)).astype(np.int8)
+        score = np.where(signal == 1, self.lower - rsi, np.where(signal == -1, rsi - self.upper, 0.0))
+        return signal, score, rsi
+
+
+SCAN_CONDITIONS = {
+    EmaCrossoverCondition.name: EmaCrossoverCondition,
+    RsiExtremeCondition.name: RsiExtremeCondition,
+}
+
+
+def register_condition(name, condition_class):
+    """Register a ScanCondition subclass under a name (strategies use their registry name)."""
+    SCAN_CONDITIONS[name.lower()] = condition_class
+
+
+def make_condition(spec):
+    """
+    Build a condition from a name or a (name, params) pair, e.g. ('rsi_extreme', {'lower': 25}).
+    Raises:
+        ValueError: If the name is not registered
+    """
+    name, params = (spec, {}) if isinstance(spec, str) else spec
+    condition_class = SCAN_CONDITIONS.get(name.lower())
+    if condition_class is None:
+        raise ValueError(f"Unknown scan condition '{name}' (available: {', '.join(SCAN_CONDITIONS)})")
+    condition = condition_class(**params)
+    condition.name = name.lower()
+    return condition
+
+
+class PanelScanner:
+    """
+    Close panel of many symbols on a common time grid plus the registered conditions over it.
+    update() takes closed bars as they arrive; scan() returns the ranked current triggers.
+    """
+
+    def __init__(self, symbols, close, times, interval_ms, conditions=('ema_crossover', 'rsi_extreme')):
+        """
+        Args:
+            symbols: Symbol names, one per panel row
+            close: (symbols x bars) float array of closes, NaN where a symbol has no bar
+            times: Open time (epoch ms) of every panel column
+            interval_ms: Bar spacing of the grid
+            conditions: Condition names or (name, params) pairs
+        """
+        self.symbols = list(symbols)
+        self.rows = {symbol: row for row, symbol in enumerate(self.symbols)}
+        self.close = np.asarray(close, dtype=np.float64)
+        self.times = np.asarray(times, dtype=np.int64)
+        self.interval_ms = interval_ms
+        self.conditions = [make_condition(spec) for spec in conditions]
+        filled = ~np.isnan(self.close)
+        self.last_time = np.where(filled.any(axis=1), self.times[len(self.times) - 1 - np.argmax(filled[:, ::-1], axis=1)], -1)
+        self.last_close = pd.DataFrame(self.close.T).ffill().to_numpy()[-1].copy()
+        all_rows = np.arange(len(self.symbols))
+        for condition in self.conditions:
+            condition.reset(len(self.symbols))
+            for column in self.close.T:
+                condition.step(all_rows, column)
+
+    @classmethod
+    def from_frames(cls, frames, interval_ms, bars=500, conditions=('ema_crossover', 'rsi_extreme')):
+        """
+        Build the panel from kline frames.
+        Args:
+            frames: Dict symbol -> frame with open_time and close (float64 closes)
+            interval_ms: Bar spacing (see utils.kline_cache.INTERVAL_MS)
+            bars: Panel width (latest bars kept)
+            conditions: See __init__
+        """
+        symbols = list(frames)
+        close = np.full((len(symbols), bars), np.nan)
+        latest = max((int(df['open_time'].iloc[-1].value // 10**6) for df in frames.values() if len(df)), default=0)
+        times = latest - interval_ms * np.arange(bars - 1, -1, -1, dtype=np.int64)
+        for row, df in enumerate(frames.values()):
+            open_ms = df['open_time'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+            column = (open_ms - times[0]) // interval_ms
+            keep = (column >= 0) & (open_ms % interval_ms == times[0] % interval_ms)
+            close[row, column[keep]] = df['close'].to_numpy(dtype=np.float64)[keep]
+        # A symbol without a trade in some interval keeps its previous close (up to its last bar)
+        stale = np.isnan(close)[:, ::-1].cumprod(axis=1)[:, ::-1].astype(bool)
+        close = pd.DataFrame(close.T).ffill().to_numpy().T.copy()
+        close[stale] = np.nan
+        return cls(symbols, close, times, interval_ms, conditions)
+
+    def update(self, symbol, open_time_ms, close):
+        """
+        Take one closed bar. A bar not newer than the symbol's last one is ignored. The first
+        bar of a new interval shifts the whole panel (other symbols' cells stay NaN until their
+        bars arrive); intervals the symbol skipped get its previous close.
+        Returns:
+            True if the panel changed
+        """
+        row = self.rows.get(symbol)
+        if row is None or open_time_ms <= self.last_time[row]:
+            return False
+        shift = int((open_time_ms - self.times[-1]) // self.interval_ms)
+        if shift > 0:
+            shift = min(shift, len(self.times))
+            self.close[:, :-shift] = self.close[:, shift:]
+            self.close[:, -shift:] = np.nan
+            self.times = self.times + shift * self.interval_ms
+        column = self._column(open_time_ms)
+        if column < 0:
+            return False
+        first = max(self._column(self.last_time[row]) + 1, 0) if self.last_time[row] >= 0 else column
+        values = np.full(column - first + 1, self.last_close[row])
+        values[-1] = close
+        self.close[row, first:column + 1] = values
+        self.last_time[row], self.last_close[row] = open_time_ms, close
+        rows = np.array([row])
+        for condition in self.conditions:
+            for value in values:
+                condition.step(rows, np.array([value]))
+        return True
+
+    def _column(self, open_time_ms):
+        return len(self.times) - 1 - int((self.times[-1] - open_time_ms) // self.interval_ms)
+
+    def scan(self, max_age_bars=0):
+        """
+        Ranked current triggers.
+        Args:
+            max_age_bars: Also report symbols whose latest bar is up to this many bars older than
+                          the newest bar in the panel
+        Returns:
+            pandas.DataFrame with symbol, condition, signal ('buy'/'sell'), score, value, close,
+            open_time and rank (1 = strongest within its condition), strongest first per condition
+        """
+        fresh = self.last_time >= self.times[-1] - max_age_bars * self.interval_ms
+        frames = []
+        for condition in self.conditions:
+            signal, score, value = condition.evaluate(self.last_close)
+            hits = np.flatnonzero((signal != 0) & fresh)
+            order = hits[np.argsort(-score[hits], kind='stable')]
+            frames.append(pd.DataFrame({
+                'symbol': [self.symbols[i] for i in order],
+                'condition': condition.name,
+                'signal': np.where(signal[order] > 0, 'buy', 'sell'),
+                'score': score[order], 'value': value[order], 'close': self.last_close[order],
+                'open_time': pd.to_datetime(self.last_time[order], unit='ms'),
+                'rank': np.arange(1, len(order) + 1),
+            }))
+        return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,233 @@
+import glob
+import io
+import os
+import threading
+import time
+import pandas as pd
+from filelock import FileLock
+from utils.instrumentation import TimedLock
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Snapshot protocol for data files:
+#   writers write a complete new version to a temp file in the same directory and os.replace() it
+#   over the old one; the rename is atomic, so a reader opens either the old or the new version,
+#   never a partial one, and needs no lock. A reader that still has the old version open keeps
+#   reading it (POSIX keeps the unlinked inode alive until closed), so old versions are
+#   reclaimed automatically. Writers doing read-modify-write (append) serialize on writer_lock().
+#   Series that only grow at the end may instead be appended to in place, one write of whole
+#   lines under writer_lock() (DataStore.append_rows); CSV readers open such files through
+#   open_complete(), which ends at the last newline, so a line still being written is not read.
+#   Temp files left behind by a crashed writer are removed by gc_temp_files().
+
+TMP_SUFFIX = ".tmp"
+REPLACE_RETRIES = 20
+GC_INTERVAL_S = 3600
+_last_gc = {}
+_gc_lock = threading.Lock()
+
+
+def _tmp_path(path):
+    return f"{path}.{os.getpid()}.{threading.get_ident()}{TMP_SUFFIX}"
+
+
+def atomic_replace(tmp, path, retries=REPLACE_RETRIES, delay=0.005):
+    """
+    os.replace(tmp, path), retrying on PermissionError: on Windows a rename over a file fails while
+    another process has it open without FILE_SHARE_DELETE.
+    """
+    for attempt in range(retries):
+        try:
+            os.replace(tmp, path)
+            return
+        except PermissionError:
+            if attempt == retries - 1:
+                raise
+            time.sleep(delay * (attempt + 1))
+
+
+def write_atomic(path, write, binary=False):
+    """
+    Publish a new version of a file: write(f) fills a temp file in the same directory, which is
+    fsynced and atomically renamed over path.
+    Args:
+        path: Destination path
+        write: Callable taking the open temp file object
+        binary: Open the temp file in binary mode
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp = _tmp_path(path)
+    try:
+        with open(tmp, 'wb') if binary else open(tmp, 'w', encoding='utf-8', newline='') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        atomic_replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    _maybe_gc(directory)
+
+
+class AtomicWriter:
+    """
+    Context-manager form of write_atomic for files filled incrementally (e.g. chunk by chunk):
+    the temp file is published on a clean exit and removed on an exception or after discard().
+
+    Usage:
+        with AtomicWriter(path) as f:
+            for chunk in chunks:
+                chunk.to_csv(f, header=f.tell() == 0, index=False)
+    """
+
+    def __init__(self, path, binary=False):
+        self.path = path
+        self.binary = binary
+        self.tmp = _tmp_path(path)
+        self._file = None
+        self._discard = False
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self.tmp, 'wb') if self.binary else open(self.tmp, 'w', encoding='utf-8', newline='')
+        return self._file
+
+    def discard(self):
+        """Do not publish the file on exit (the previous version, if any, stays in place)."""
+        self._discard = True
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None and not self._discard:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            self._file.close()
+            if exc_type is None and not self._discard:
+                atomic_replace(self.tmp, self.path)
+        finally:
+            if os.path.exists(self.tmp):
+                os.remove(self.tmp)
+        _maybe_gc(os.path.dirname(self.path) or ".")
+        return False
+
+
+def write_csv_atomic(df, path, **to_csv_kwargs):
+    """
+    Publish df as the new version of a CSV file (temp file + fsync + atomic rename).
+    Args:
+        df: DataFrame to write
+        path: Destination CSV path
+        to_csv_kwargs: Passed to DataFrame.to_csv (default index=False)
+    """
+    to_csv_kwargs.setdefault('index', False)
+    write_atomic(path, lambda f: df.to_csv(f, **to_csv_kwargs))
+
+
+def read_snapshot(path, read, retries=REPLACE_RETRIES, delay=0.005):
+    """
+    Call read(path) without taking a lock, retrying on PermissionError (Windows, file being
+    swapped at that instant).
+    Raises:
+        FileNotFoundError: If the file does not exist
+    """
+    for attempt in range(retries):
+        try:
+            return read(path)
+        except PermissionError:
+            if attempt == retries - 1:
+                raise
+            time.sleep(delay * (attempt + 1))
+
+
+def complete_size(f):
+    """Bytes of an open binary file up to and including its last newline."""
+    end = os.fstat(f.fileno()).st_size
+    while end > 0:
+        step = min(end, 1 << 16)
+        f.seek(end - step)
+        newline = f.read(step).rfind(b'\n')
+        if newline >= 0:
+            return end - step + newline + 1
+        end -= step
+    return 0
+
+
+class _CompleteLines(io.RawIOBase):
+    """Read-only view of a binary file that ends at the last newline it had when opened."""
+
+    def __init__(self, f):
+        self._f = f
+        self._end = complete_size(f)
+        f.seek(0)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._f.read(max(min(len(buffer), self._end - self._f.tell()), 0))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._f.close()
+        super().close()
+
+
+def open_complete(path):
+    """
+    Open a file for reading its complete lines only (see the protocol comment): a line being
+    appended in place at that moment is left out.
+    Returns:
+        Buffered binary file object
+    """
+    return io.BufferedReader(_CompleteLines(open(path, 'rb')))
+
+
+def read_csv_snapshot(path, **read_csv_kwargs):
+    """Read the current version of a CSV file without taking a lock."""
+    def read(p):
+        with open_complete(p) as f:
+            return pd.read_csv(f, **read_csv_kwargs)
+    return read_snapshot(path, read)
+
+
+def writer_lock(path):
+    """
+    Inter-process lock for writers that read-modify-write a file. Readers never take it. Wait
+    times are recorded as the 'writer_lock' lock-wait metric.
+    """
+    return TimedLock(FileLock(f"{path}.lock"), 'writer_lock')
+
+
+def gc_temp_files(directory, max_age_s=GC_INTERVAL_S):
+    """
+    Delete temp files older than max_age_s left behind by crashed writers.
+    Returns:
+        List of removed paths
+    """
+    removed = []
+    now = time.time()
+    for tmp in glob.glob(os.path.join(directory, f"*{TMP_SUFFIX}")):
+        try:
+            if now - os.path.getmtime(tmp) > max_age_s:
+                os.remove(tmp)
+                removed.append(tmp)
+        except FileNotFoundError:
+            pass
+    if removed:
+        logger.info(f"Removed {len(removed)} stale temp files from {directory}")
+    return removed
+
+
+def _maybe_gc(directory):
+    """Run gc_temp_files at most once per GC_INTERVAL_S per directory and process."""
+    now = time.time()
+    with _gc_lock:
+        if now - _last_gc.get(directory, 0) < GC_INTERVAL_S:
+            return
+        _last_gc[directory] = now
+    gc_temp_files(directory)
@@ -0,0 +1,194 @@
+import io
+import os
+import threading
+import numpy as np
+import pandas as pd
+from utils.snapshot_io import read_snapshot, write_atomic
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Sparse time index of a time-sorted CSV file: the byte offset and open_time of every
+# INDEX_STRIDE-th row, so a time range is served by one seek and a read of the blocks that
+# overlap it (plus warm-up rows) instead of parsing the whole file. The index is built with one
+# newline scan, kept next to the file as {file}.idx.npz and in memory, and belongs to exactly
+# one (mtime, size) version of the file: a rewrite makes it stale and it is rebuilt on the next
+# range read. A file grown in place (same inode: rows appended by DataStore.append_rows) is only
+# scanned from the end of the indexed rows.
+INDEX_STRIDE = 4096
+INDEX_SUFFIX = ".idx.npz"
+SCAN_BYTES = 1 << 24
+
+_indexes = {}  # abspath -> CsvTimeIndex
+_indexes_lock = threading.Lock()
+
+
+def to_ms(value):
+    """Epoch milliseconds of anything pandas.Timestamp accepts (None stays None)."""
+    if value is None:
+        return None
+    return int(pd.Timestamp(value).value // 10**6)
+
+
+class CsvTimeIndex:
+    """Block offsets and block start times of one version of a CSV file."""
+
+    def __init__(self, mtime_ns, size, rows, time_column, block_ms, block_offset, inode=0, end=0):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.rows = rows
+        self.time_column = time_column  # field number of the time column
+        self.block_ms = block_ms  # time (epoch ms) of the first row of every block
+        self.block_offset = block_offset  # byte offset of the first row of every block
+        self.inode = inode  # 0: unknown, the index is never extended
+        self.end = end  # byte offset after the last indexed row
+
+    def matches(self, stat):
+        return self.mtime_ns == stat.st_mtime_ns and self.size == stat.st_size
+
+    def grown(self, stat):
+        """True if stat is this file grown in place (rows appended), so extend() applies."""
+        return bool(self.inode) and self.inode == stat.st_ino and stat.st_size > self.size and self.end > 0
+
+    @classmethod
+    def build(cls, f, stat, time_col='open_time'):
+        """
+        Index an open CSV file (binary mode) with one scan.
+        Raises:
+            ValueError: If the file has no time_col column
+        """
+        f.seek(0)
+        header = f.readline()
+        fields = header.decode('utf-8-sig').rstrip('\r\n').split(',')
+        if time_col not in fields:
+            raise ValueError(f"No '{time_col}' column to index")
+        row_starts, end = _scan_rows(f, len(header))
+        block_offset = row_starts[::INDEX_STRIDE]
+        column = fields.index(time_col)
+        return cls(stat.st_mtime_ns, stat.st_size, len(row_starts), column, _block_times(f, block_offset, column), block_offset,
+                   stat.st_ino, end)
+
+    def extend(self, f, stat):
+        """Index of the grown file version open as f: only the bytes after the indexed rows are scanned."""
+        row_starts, end = _scan_rows(f, self.end)
+        # first new row opening a block (rows are numbered from self.rows on)
+        new_offset = row_starts[(-self.rows) % INDEX_STRIDE::INDEX_STRIDE]
+        return CsvTimeIndex(stat.st_mtime_ns, stat.st_size, self.rows + len(row_starts), self.time_column,
+                            np.concatenate([self.block_ms, _block_times(f, new_offset, self.time_column)]),
+                            np.concatenate([self.block_offset, new_offset]).astype(np.int64), stat.st_ino, end)
+
+    def save(self, path):
+        buffer = io.BytesIO()
+        np.savez(buffer, meta=np.array([self.mtime_ns, self.size, self.rows, self.time_column, self.inode, self.end], dtype=np.int64),
+                 block_ms=self.block_ms, block_offset=self.block_offset)
+        data = buffer.getvalue()
+        write_atomic(path, lambda f: f.write(data), binary=True)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            # indexes saved without inode/end are used as they are but never extended
+            mtime_ns, size, rows, time_column, inode, end = ([int(v) for v in data['meta']] + [0, 0])[:6]
+            return cls(mtime_ns, size, rows, time_column, data['block_ms'], data['block_offset'], inode, end)
+
+    def byte_range(self, start_ms=None, end_ms=None, warmup=0):
+        """
+        Byte range [lo, hi) of the rows that can hold [start_ms, end_ms] plus `warmup` rows before
+        start_ms (whole blocks, so the caller trims the exact rows after parsing).
+        """
+        if not len(self.block_ms):
+            return 0, 0
+        lo_block = 0
+        if start_ms is not None:
+            # The first row at or after start_ms is in this block or the next one
+            block = max(int(np.searchsorted(self.block_ms, start_ms, side='right')) - 1, 0)
+            lo_block = max(block * INDEX_STRIDE - warmup, 0) // INDEX_STRIDE
+        hi_block = len(self.block_ms)
+        if end_ms is not None:
+            hi_block = int(np.searchsorted(self.block_ms, end_ms, side='right'))
+        # At least one block, so an empty range still parses with the file's column types
+        hi_block = max(hi_block, lo_block + 1)
+        lo = int(self.block_offset[lo_block])
+        hi = int(self.block_offset[hi_block]) if hi_block < len(self.block_offset) else self.size
+        return lo, hi
+
+
+def _scan_rows(f, start):
+    """
+    Start offsets of the rows from byte `start` on, and the offset after the last complete one
+    (rows end at a newline: a row still being appended is left out).
+    """
+    f.seek(start)
+    newlines, position = [], start
+    while True:
+        chunk = f.read(SCAN_BYTES)
+        if not chunk:
+            break
+        newlines.append(position + np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == 10))
+        position += len(chunk)
+    ends = np.concatenate(newlines) if newlines else np.empty(0, dtype=np.int64)
+    end = int(ends[-1]) + 1 if len(ends) else start
+    row_starts = np.concatenate([[start], ends + 1]).astype(np.int64)
+    return row_starts[row_starts < end], end
+
+
+def _block_times(f, block_offset, column):
+    """Epoch ms of the time field of the rows at block_offset."""
+    times = []
+    for offset in block_offset:
+        f.seek(int(offset))
+        times.append(f.readline().decode('utf-8').rstrip('\r\n').split(',')[column])
+    if not times:
+        return np.empty(0, dtype=np.int64)
+    return pd.to_datetime(pd.Series(times, dtype=object), format='mixed').to_numpy(dtype='datetime64[ms]').astype(np.int64)
+
+
+def csv_index(path, f, stat):
+    """
+    Index of the file version open as f (stat from os.fstat(f)), from memory, the sidecar file or
+    a scan (of the appended rows only if the file grew in place), which refreshes both.
+    """
+    key = os.path.abspath(path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+    if index is not None and index.matches(stat):
+        return index
+    sidecar = path + INDEX_SUFFIX
+    if (index is None or not index.grown(stat)) and os.path.exists(sidecar):
+        try:
+            index = read_snapshot(sidecar, CsvTimeIndex.load)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable time index {sidecar}: {e}")
+            index = None
+    if index is not None and index.grown(stat):
+        index = index.extend(f, stat)
+        _save_index(index, sidecar)
+    elif index is None or not index.matches(stat):
+        index = CsvTimeIndex.build(f, stat)
+        _save_index(index, sidecar)
+        logger.info(f"Built time index of {path} ({index.rows} rows, {len(index.block_ms)} blocks)")
+    with _indexes_lock:
+        _indexes[key] = index
+    return index
+
+
+def _save_index(index, sidecar):
+    try:
+        index.save(sidecar)
+    except OSError as e:
+        logger.warning(f"Could not save time index {sidecar}: {e}")
+
+
+def trim_range(df, start_ms=None, end_ms=None, warmup=0, time_col='open_time'):
+    """
+    Rows of a time-sorted frame with start_ms <= time <= end_ms plus up to `warmup` rows before
+    start_ms; the number of warm-up rows kept is stored in df.attrs['warmup'].
+    """
+    times = df[time_col].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+    lo = 0 if start_ms is None else int(np.searchsorted(times, start_ms, side='left'))
+    hi = len(df) if end_ms is None else int(np.searchsorted(times, end_ms, side='right'))
+    first = max(lo - warmup, 0)
+    df = df.iloc[first:max(hi, lo)].reset_index(drop=True)
+    df.attrs['warmup'] = lo - first
+    return df